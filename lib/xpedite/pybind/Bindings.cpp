@@ -1,17 +1,122 @@
 #include <pybind11/pybind11.h>
 #include <pybind11/operators.h>
 #include <pybind11/stl.h>
+#include <pybind11/numpy.h>
 #include <xpedite/probes/Sample.H>
 #include <xpedite/framework/SamplesLoader.H>
 #include <sstream>
 #include <iomanip>
 #include <ios>
+#include <limits>
+#include <algorithm>
 
 namespace py = pybind11;
 
 using xpedite::probes::Sample;
 using xpedite::framework::SamplesLoader;
 
+namespace {
+
+  // flags reported per sample in the columnar batches
+  constexpr uint8_t FLAG_DATA {1};
+  constexpr uint8_t FLAG_PMC  {2};
+
+  // Decodes up to limit_ samples from [begin_, end_) into a dict of numpy arrays
+  //   tsc        - uint64 time stamp counter (flags masked out)
+  //   returnSite - uint64 address of the probe return site
+  //   dataHi     - uint64 upper half of the 128 bit probe data
+  //   dataLo     - uint64 lower half of the 128 bit probe data
+  //   flags      - uint8 bitmask of FLAG_DATA and FLAG_PMC
+  //   pmcCount   - uint8 number of pmc values collected by each sample
+  //   pmc        - uint64 matrix (samples x max pmc count) of pmc values
+  py::dict decodeSamples(SamplesLoader::Iterator& begin_, SamplesLoader::Iterator end_, size_t limit_) {
+    size_t count {};
+    size_t pmcWidth {};
+    for(auto it = begin_; it != end_ && count < limit_; ++it, ++count) {
+      if((*it).hasPmc()) {
+        pmcWidth = std::max<size_t>(pmcWidth, (*it).pmcCount());
+      }
+    }
+
+    auto size = static_cast<py::ssize_t>(count);
+    py::array_t<uint64_t> tsc (size);
+    py::array_t<uint64_t> returnSite (size);
+    py::array_t<uint64_t> dataHi (size);
+    py::array_t<uint64_t> dataLo (size);
+    py::array_t<uint8_t> flags (size);
+    py::array_t<uint8_t> pmcCount (size);
+    py::array_t<uint64_t> pmc ({size, static_cast<py::ssize_t>(pmcWidth)});
+
+    auto tscView = tsc.mutable_unchecked<1>();
+    auto returnSiteView = returnSite.mutable_unchecked<1>();
+    auto dataHiView = dataHi.mutable_unchecked<1>();
+    auto dataLoView = dataLo.mutable_unchecked<1>();
+    auto flagsView = flags.mutable_unchecked<1>();
+    auto pmcCountView = pmcCount.mutable_unchecked<1>();
+    auto pmcView = pmc.mutable_unchecked<2>();
+
+    for(size_t i = 0; i < count; ++i, ++begin_) {
+      const Sample& sample = *begin_;
+      tscView(i) = sample.tsc();
+      returnSiteView(i) = reinterpret_cast<uintptr_t>(sample.returnSite());
+      uint8_t sampleFlags {};
+      if(sample.hasData()) {
+        sampleFlags |= FLAG_DATA;
+        std::tie(dataLoView(i), dataHiView(i)) = sample.data();
+      } else {
+        dataLoView(i) = dataHiView(i) = 0;
+      }
+      size_t samplePmcCount {};
+      if(sample.hasPmc()) {
+        sampleFlags |= FLAG_PMC;
+        samplePmcCount = sample.pmcCount();
+        for(size_t j = 0; j < samplePmcCount; ++j) {
+          pmcView(i, j) = sample.pmc(j);
+        }
+      }
+      for(size_t j = samplePmcCount; j < pmcWidth; ++j) {
+        pmcView(i, j) = 0;
+      }
+      flagsView(i) = sampleFlags;
+      pmcCountView(i) = samplePmcCount;
+    }
+
+    py::dict batch;
+    batch["tsc"] = tsc;
+    batch["returnSite"] = returnSite;
+    batch["dataHi"] = dataHi;
+    batch["dataLo"] = dataLo;
+    batch["flags"] = flags;
+    batch["pmcCount"] = pmcCount;
+    batch["pmc"] = pmc;
+    return batch;
+  }
+
+  // Iterates the samples in a file, as columnar batches of a fixed size
+  class SampleBatchIterator
+  {
+    SamplesLoader::Iterator _it;
+    SamplesLoader::Iterator _end;
+    size_t _batchSize;
+
+    public:
+
+    SampleBatchIterator(const SamplesLoader& loader_, size_t batchSize_)
+      : _it {loader_.begin()}, _end {loader_.end()}, _batchSize {batchSize_} {
+      if(!_batchSize) {
+        throw std::invalid_argument {"batch size must be a positive integer"};
+      }
+    }
+
+    py::dict next() {
+      if(_it == _end) {
+        throw py::stop_iteration {};
+      }
+      return decodeSamples(_it, _end, _batchSize);
+    }
+  };
+}
+
 PYBIND11_MODULE(xpediteBindings, m) {
 
   m.doc() = "Xpedite Samples Loader";
@@ -36,9 +141,28 @@ PYBIND11_MODULE(xpediteBindings, m) {
     .def("pmc", py::overload_cast<int>(&Sample::pmc, py::const_))
     .def("__repr__", &Sample::toString);
 
+    m.attr("FLAG_DATA") = FLAG_DATA;
+    m.attr("FLAG_PMC") = FLAG_PMC;
+
+    py::class_<SampleBatchIterator>(m, "SampleBatchIterator")
+        .def("__iter__", [](SampleBatchIterator& it) -> SampleBatchIterator& { return it; })
+        .def("__next__", &SampleBatchIterator::next);
+
     py::class_<SamplesLoader>(m, "SamplesLoader")
         .def(py::init<const char*>())
         .def_static("saveAsCsv", &SamplesLoader::saveAsCsv)
+        .def("pmcCount", &SamplesLoader::pmcCount)
+        /// Columnar interface - decodes samples to numpy arrays
+        .def("toArrays", [](const SamplesLoader& s) {
+            auto it = s.begin();
+            return decodeSamples(it, s.end(), std::numeric_limits<size_t>::max());
+          }
+        )
+        .def(
+            "iterBatches",
+            [](const SamplesLoader& s, size_t batchSize) { return SampleBatchIterator {s, batchSize}; },
+            py::arg("batchSize"),
+            py::keep_alive<0, 1>() /* batches are decoded lazily from the mapped file */)
         /// Bare bones interface
         .def(
             "__iter__",
@@ -6,7 +6,7 @@
 #################################################################################
 
 from xpedite import Probe, TxnBeginProbe, TxnSuspendProbe, TxnResumeProbe, TxnEndProbe
-from xpedite.txn.classifier import ProbeDataClassifier
+from xpedite.txn.classifier import ProbeDataClassifier, MemoizingProbeDataClassifier
 from xpedite.types import RouteConflation
 from xpedite import TopdownNode, Metric, Event, ResultOrder
 
@@ -86,6 +86,10 @@ probes = [
 #    if txn.hasProbe(Probe('Tx Begin', sysName = 'TxBegin')):
 #      return 'RoutedMessages'
 #    return 'DroppedMessages'
+#
+# Transactions can also be classified by data captured in a probe, for instance by message type
+# MemoizingProbeDataClassifier invokes the mapper only once, for each distinct value of probe data
+#classifier = MemoizingProbeDataClassifier(Probe('Parse Begin', sysName = 'parseBegin'), lambda data: 'MsgType ' + str(data))
 
 
 ############################################### Sort transactions ##############################################
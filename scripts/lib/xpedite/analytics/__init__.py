@@ -6,20 +6,25 @@ This package includes
   2. Classify and aggreate transactions based on route (control flow)
   3. Build timelines and duration series from aggregated transactions
   4. Logic to conflate transactions from mulitiple profiles
+  5. Break down statistics of transactions by dimensions like thread id
 
 Author: Manikandan Dhamodharan, Morgan Stanley
 """
 import sys
 import time
 import logging
+from collections                         import OrderedDict
 from xpedite.util                        import timeAction
 from xpedite.types                       import RouteConflation
 from xpedite.types.containers            import ProbeMap
 
-from xpedite.dependencies                import Package, DEPENDENCY_LOADER
+from xpedite.dependencies                import Package, DEPENDENCY_LOADER, CONFIG
 DEPENDENCY_LOADER.load(Package.Numpy, Package.Six)
 from xpedite.analytics.aggregator        import TxnAggregator, RouteAggregator, RouteConflatingAggregator # pylint: disable=wrong-import-position
-from xpedite.analytics.timeline          import buildTimelineStats # pylint: disable=wrong-import-position
+from xpedite.analytics.timeline          import (  # pylint: disable=wrong-import-position
+                                           buildTimelineStats, TimelineStats, DeltaSeries, DeltaSeriesRepo
+                                         )
+from xpedite.analytics.timelineMatrix    import TimelineMatrix # pylint: disable=wrong-import-position
 from xpedite.analytics.treeCollections   import TreeCollectionFactory # pylint: disable=wrong-import-position
 
 LOGGER = logging.getLogger(__name__)
@@ -31,12 +36,33 @@ class Analytics(object):
   """Analytics logic to build transactions for current profile session and bechmarks"""
 
   @staticmethod
-  def buildElapsedTimeBundles(txnCollections, classifier):
+  def sketchElapsedTime(elapsedTimeMap, relativeError):
+    """
+    Summarizes elapsed time for each of the keys in a map, with sketched delta series
+
+    :param elapsedTimeMap: Map of key (category or thread id) to elapsed time of transactions
+    :param relativeError: Relative error of sketches backing the delta series
+
+    """
+    sketchMap = OrderedDict()
+    for key, elapsedTimeList in elapsedTimeMap.items():
+      sketchMap[key] = DeltaSeries(key, key, relativeError)
+      sketchMap[key].extend(elapsedTimeList)
+    return sketchMap
+
+  @staticmethod
+  def buildElapsedTimeBundles(txnCollections, classifier, threadBundles=None, relativeError=None):
     """
     Builds elapsed timestamp counters for each of the categories in given transaction collections
 
+    With a relative error, elapsed time of each collection is summarized in sketched delta series,
+    as soon as the collection is aggregated, instead of retaining elapsed time of all transactions
+
     :param repo: List of transaction collections from current profile session and benchmarks
     :param classifier: Predicate to classify transactions into different categories
+    :param threadBundles: Map to collect elapsed time of the current run, by category and thread.
+                          Transactions are classified once for both the aggregates (Default value = None)
+    :param relativeError: Relative error of sketches summarizing elapsed time, None to retain all values
 
     """
     elapsedTscBundles = {}
@@ -44,13 +70,29 @@ class Analytics(object):
     for i, txnCollection in enumerate(txnCollections):
       txnSubCollection = txnCollection.getSubCollection()
       probes = txnCollection.probes
-      elapsedTscMap = timeAction(
-        'aggregating time stamp counters per transaction',
-        lambda txnsc=txnSubCollection, txnCollection=txnCollection: TxnAggregator.groupElapsedTime(
-          txnsc, txnCollection.cpuInfo, classifier=classifier
+      if i == 0 and threadBundles is not None:
+        elapsedTscMap, threadMap = timeAction(
+          'aggregating elapsed time per transaction and thread',
+          lambda txnsc=txnSubCollection, txnCollection=txnCollection: TxnAggregator.groupElapsedTimeWithThreads(
+            txnsc, txnCollection.cpuInfo, classifier=classifier
+          )
+        )
+        if relativeError:
+          threadMap = {
+            category : Analytics.sketchElapsedTime(elapsedTimeMap, relativeError)
+            for category, elapsedTimeMap in threadMap.items()
+          }
+        threadBundles.update(threadMap)
+      else:
+        elapsedTscMap = timeAction(
+          'aggregating time stamp counters per transaction',
+          lambda txnsc=txnSubCollection, txnCollection=txnCollection: TxnAggregator.groupElapsedTime(
+            txnsc, txnCollection.cpuInfo, classifier=classifier
+          )
         )
-      )
       if elapsedTscMap:
+        if relativeError:
+          elapsedTscMap = Analytics.sketchElapsedTime(elapsedTscMap, relativeError)
         for category, elapsedTscList in elapsedTscMap.items():
           if category in elapsedTscBundles:
             elapsedTscBundles[category].append(elapsedTscList)
@@ -74,6 +116,50 @@ class Analytics(object):
           raise Exception('report generation failed for current run. counters not available')
     return elapsedTscBundles
 
+  @staticmethod
+  def buildBreakdown(timelineStats, keys, relativeError=None):
+    """
+    Builds wall time statistics for groups of timelines, sharing a key along a dimension (like thread id)
+
+    Timelines are grouped on arrays of keys, and statistics of each group are built from rows of
+    the timeline matrix, without rebuilding transaction subcollections
+
+    :param timelineStats: Timeline statistics, with timelines stored in a timeline matrix
+    :param keys: Array of keys, for each of the timelines
+    :param relativeError: Relative error of sketches backing delta series, None to retain all values
+    :returns: Map of key to timeline statistics for timelines with the key
+
+    """
+    matrix = timelineStats.timelineCollection
+    breakdown = OrderedDict()
+    for key, indices in TxnAggregator.groupIndicesByKey(keys).items():
+      deltaSeriesRepo = DeltaSeriesRepo(None, [], timelineStats.reportProbes, relativeError)
+      tscDeltaSeriesCollection = deltaSeriesRepo.getTscDeltaSeriesCollection()
+      durations = matrix.durations[indices]
+      for i in range(len(tscDeltaSeriesCollection) - 1):
+        tscDeltaSeriesCollection[i].extend(durations[:, i])
+      tscDeltaSeriesCollection[-1].extend(durations[:, -1])
+      breakdown[key] = TimelineStats(
+        key, timelineStats.cpuInfo, timelineStats.category, timelineStats.route, timelineStats.reportProbes,
+        matrix.take(indices), deltaSeriesRepo
+      )
+    return breakdown
+
+  @staticmethod
+  def buildThreadBreakdown(timelineStats, relativeError=None):
+    """
+    Builds wall time statistics for timelines, broken down by the thread that began the timelines
+
+    :param timelineStats: Timeline statistics for current profile session or a benchmark
+    :param relativeError: Relative error of sketches backing delta series, None to retain all values
+    :returns: Map of thread id to timeline statistics, empty for collections without thread ids
+
+    """
+    matrix = timelineStats.timelineCollection
+    if not isinstance(matrix, TimelineMatrix) or matrix.threads is None:
+      return OrderedDict()
+    return Analytics.buildBreakdown(timelineStats, matrix.threads, relativeError)
+
   @staticmethod
   def buildTxnTree(txnRepo, txnClassifier, routeConflation):
     """
@@ -104,59 +190,79 @@ class Analytics(object):
     return(txnTree, benchmarkCompositeTree)
 
   @staticmethod
-  def computeStats(txnRepo, category, route, probes, txnSubCollection, benchmarkTxnsMap):
+  def buildTimelineStats(task):
     """
-    Computes timeline statistics for transactions from current profile session and all benchmarks
+    Builds timeline statistics for a (route, transaction collection) task
 
-    :param txnRepo: Repository of transactions from current profile session and benchmarks
-    :param category: Category of transactions in the given subcollection
-    :param route: Route taken by the transactions in subcollection
-    :param probes: List of probes enabled during the current profile session
-    :param txnSubCollection: Subcollection of transactions to compute statistics for
-    :param benchmarkTxnsMap: Map of transaction subcollections in benchmarks
+    :param task: Tuple of category, route, report probes and subcollection of transactions
+    :returns: tuple of timeline statistics and the time elapsed to build them
 
     """
-    timelineStats = buildTimelineStats(category, route, probes, txnSubCollection)
-    benchmarkTimelineStats = {}
-    if benchmarkTxnsMap:
-      benchmarkTimelineStats = {
-        txnSubCollection.name: buildTimelineStats(
-          category, route, probes, txnSubCollection) for txnSubCollection in benchmarkTxnsMap.values()
-      }
-    elif txnRepo.hasBenchmarks():
-      LOGGER.warn('[benchmarks missing category/route]')
-    return timelineStats, benchmarkTimelineStats
+    category, route, probes, txnSubCollection = task
+    begin = time.time()
+    timelineStats = buildTimelineStats(category, route, probes, txnSubCollection, CONFIG.deltaSeriesRelativeError)
+    return timelineStats, time.time() - begin
 
-  def generateProfiles(self, name, txnRepo, classifier, routeConflation):
+  @staticmethod
+  def sharedObjects(tasks):
+    """
+    Returns objects referenced by timeline statistics of the given tasks, that must not be copied across processes
+
+    :param tasks: Tasks to build timeline statistics
+
+    """
+    objects = {}
+    for _, route, probes, txnSubCollection in tasks:
+      for obj in [route, txnSubCollection.cpuInfo, txnSubCollection.topdownMetrics, txnSubCollection.events]:
+        objects[id(obj)] = obj
+      for obj in list(probes) + list(txnSubCollection.events or []) + list(txnSubCollection.transactions):
+        objects[id(obj)] = obj
+    return [obj for obj in objects.values() if obj is not None]
+
+  def generateProfiles(self, name, txnRepo, classifier, routeConflation, workerCount=None):
     """
     Generates profiles for the current profile session
 
+    Timeline statistics for each (route, transaction collection) pair are independent, and built in
+    parallel by a pool of worker processes. Profiles are assembled in the order of categories and routes.
+
     :param txnRepo: Repository of loaded transactions
     :param classifier: Predicate to classify transactions into different categories
     :param routeConflation: Parameter to control, whether routes can be conflated or not
+    :param workerCount: Number of processes to build timeline statistics, defaults to xpedite config
 
     """
     from xpedite.profiler.profile import Profiles, Profile
+    from xpedite.util.workerPool  import WorkerPool
     txnTree, benchmarkCompositeTree = self.buildTxnTree(txnRepo, classifier, routeConflation)
     profiles = Profiles(name, txnRepo)
 
+    profileSpecs = []
+    tasks = []
     for category, categoryNode in txnTree.getChildren().items():
-      i = 1
-      for route, txnNode in categoryNode.children.items():
+      for i, (route, txnNode) in enumerate(categoryNode.children.items(), 1):
         routeName = ' [route - {}]'.format(i) if len(categoryNode.children) > 1 else ''
         profileName = '{} - {}{}'.format(name, category, routeName)
-        begin = time.time()
-        LOGGER.info('generating profile %s (txns - %d) -> ', profileName, len(txnNode.collection))
-
         benchmarkTxnsMap = benchmarkCompositeTree.getCollectionMap([category, route])
+        if not benchmarkTxnsMap and txnRepo.hasBenchmarks():
+          LOGGER.warn('[benchmarks missing category/route]')
         reportProbes = self.mapReportProbes(route, txnRepo.getCurrent().probes)
-        timelineStats, benchmarkTimelineStats = self.computeStats(
-          txnRepo, category, route, reportProbes, txnNode.collection, benchmarkTxnsMap
-        )
-        profiles.addProfile(Profile(profileName, timelineStats, benchmarkTimelineStats))
-        elapsed = time.time() - begin
-        LOGGER.completed('completed in %0.2f sec.', elapsed)
-        i += 1
+        collections = [txnNode.collection] + (list(benchmarkTxnsMap.values()) if benchmarkTxnsMap else [])
+        profileSpecs.append((profileName, len(txnNode.collection), len(collections)))
+        tasks.extend((category, route, reportProbes, collection) for collection in collections)
+
+    pool = WorkerPool(workerCount, sharedObjects=self.sharedObjects(tasks))
+    results = pool.map(Analytics.buildTimelineStats, tasks)
+    for profileName, txnCount, taskCount in profileSpecs:
+      LOGGER.info('generating profile %s (txns - %d) -> ', profileName, txnCount)
+      taskResults = [next(results) for _ in range(taskCount)]
+      timelineStats = taskResults[0][0]
+      benchmarkTimelineStats = {stats.name : stats for stats, _ in taskResults[1:]}
+      profiles.addProfile(Profile(profileName, timelineStats, benchmarkTimelineStats))
+      LOGGER.completed('completed in %0.2f sec. [%s]', sum(elapsed for _, elapsed in taskResults),
+        ' | '.join('{} - {:0.2f} sec'.format(stats.name, elapsed) for stats, elapsed in taskResults)
+      )
+    results.close()
     return profiles
 
   @staticmethod
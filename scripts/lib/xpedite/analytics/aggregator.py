@@ -2,12 +2,14 @@
 Module to aggregate transactions, routes and counters
   1. RouteAggregator - Conflates long routes to short ones
   2. TxnAggregator - Classifies transaction based on a predicate and aggregates elasped cycles
+     and breaks down aggregated values by dimensions like thread id
 
 Author: Manikandan Dhamodharan, Morgan Stanley
 """
 
 from collections                import OrderedDict
-from xpedite.txn.classifier     import DefaultClassifier
+import numpy
+from xpedite.txn.classifier     import DefaultClassifier, classifyTxns
 
 def txnSubCollectionFactory(txnSubCollection, txn):
   """
@@ -57,7 +59,9 @@ class RouteConflatingAggregator(object):
   """Aggregates transactions to a set of conflatable source routes"""
 
   def __init__(self, srcTree):
+    from xpedite.types.route import RouteConflationIndex
     self.srcTree = srcTree
+    self.conflationIndex = RouteConflationIndex()
 
   def aggregateTxnsByRoutes(self, txnSubCollection, ancestry):
     """
@@ -68,14 +72,15 @@ class RouteConflatingAggregator(object):
     :param ancestry: A node in the tree collection
 
     """
-    from xpedite.types.route import conflateRoutes
     srcRouteMap = self.srcTree.getChildren(ancestry)
     routes = srcRouteMap.keys() if srcRouteMap else []
     routeMap = {}
+    compatibilityTable = self.conflationIndex.buildCompatibilityTable(
+      (txn.route for txn in txnSubCollection), routes
+    )
     for txn in txnSubCollection:
-      for dstRoute in routes:
-        if conflateRoutes(txn.route, dstRoute):
-          addTxn(routeMap, txnSubCollection, dstRoute, txn)
+      for dstRoute in compatibilityTable[id(txn.route)]:
+        addTxn(routeMap, txnSubCollection, dstRoute, txn)
     return routeMap
 
 class TxnAggregator(object):
@@ -85,22 +90,39 @@ class TxnAggregator(object):
   end = 1
 
   @staticmethod
-  def _addOrUpdateContainer(container, subCollectionFactory, classifier, key, value):
+  def _groupByCategory(subCollectionFactory, classifier, keys, values):
     """
-    Adds transaction to a transaction subcollection with matching category
+    Aggregates values to containers by category, classifying the batch of keys at once
 
-    :param container: Container with all categories of aggreagated values
     :param subCollectionFactory: Callable used to build an instance of subcollection
     :param classifier: Predicate to classify transactions into different categories
-    :param key: Key used for classification
-    :param value: Value to be aggregated
+    :param keys: Keys used for classification
+    :param values: Values to be aggregated, one for each of the keys
 
     """
-    category = classifier.classify(key)
-    if category in container:
-      container[category].append(value)
-    else:
-      container.update({category : subCollectionFactory(value)})
+    container = {}
+    for category, value in zip(classifyTxns(classifier, keys), values):
+      if category in container:
+        container[category].append(value)
+      else:
+        container.update({category : subCollectionFactory(value)})
+    return container
+
+  @staticmethod
+  def groupIndicesByKey(keys):
+    """
+    Groups positions of the given keys by value, without building containers for each of the values
+
+    :param keys: Array of keys (like thread ids) to be grouped
+    :returns: Map of distinct keys (in ascending order) to array of positions with the key
+
+    """
+    keys = numpy.asarray(keys)
+    if len(keys) == 0:
+      return OrderedDict()
+    distinctKeys, inverse, counts = numpy.unique(keys, return_inverse=True, return_counts=True)
+    positions = numpy.split(numpy.argsort(inverse.reshape(-1), kind='stable'), numpy.cumsum(counts)[:-1])
+    return OrderedDict(zip(distinctKeys.tolist(), positions))
 
   @staticmethod
   def groupElapsedTscByScope(txnSubCollection, beginProbe, endProbe, classifier=DefaultClassifier()):
@@ -113,16 +135,11 @@ class TxnAggregator(object):
     :param classifier: Predicate to classify transactions into different categories
 
     """
-    elapsedTscGroup = {}
-    for txn in txnSubCollection:
-      if txn.hasProbes([beginProbe, endProbe]):
-        beginCounter = txn.getCounterForProbe(beginProbe)
-        endCounter = txn.getCounterForProbe(endProbe)
-        TxnAggregator._addOrUpdateContainer(
-          elapsedTscGroup, lambda v: [v], classifier, txn,
-          endCounter.tsc - beginCounter.tsc
-        )
-    return elapsedTscGroup
+    txns = [txn for txn in txnSubCollection if txn.hasProbes([beginProbe, endProbe])]
+    elapsedTscs = [
+      txn.getCounterForProbe(endProbe).tsc - txn.getCounterForProbe(beginProbe).tsc for txn in txns
+    ]
+    return TxnAggregator._groupByCategory(lambda v: [v], classifier, txns, elapsedTscs)
 
   @staticmethod
   def groupElapsedTime(txnSubCollection, cpuInfo, classifier=DefaultClassifier()):
@@ -137,12 +154,51 @@ class TxnAggregator(object):
     :param cpuInfo: Cpu info to convert cycles to duration (micro seconds)
 
     """
-    elapsedTscGroup = {}
-    for txn in txnSubCollection:
-      if txn:
-        time = cpuInfo.convertCyclesToTime(txn.getElapsedTsc())
-        TxnAggregator._addOrUpdateContainer(elapsedTscGroup, lambda v: [v], classifier, txn, time)
-    return elapsedTscGroup
+    txns = [txn for txn in txnSubCollection if txn]
+    times = [cpuInfo.convertCyclesToTime(txn.getElapsedTsc()) for txn in txns]
+    return TxnAggregator._groupByCategory(lambda v: [v], classifier, txns, times)
+
+  @staticmethod
+  def groupElapsedTimeByThread(txnSubCollection, cpuInfo, classifier=DefaultClassifier()):
+    """
+    Aggregates elapsed time by category and by thread, that began the transactions
+
+    :param txnSubCollection: Transaction subcollection to be aggregated
+    :param cpuInfo: Cpu info to convert cycles to duration (micro seconds)
+    :param classifier: Predicate to classify transactions into different categories
+    :returns: Map of category to a map of thread id to array of elapsed time
+
+    """
+    return TxnAggregator.groupElapsedTimeWithThreads(txnSubCollection, cpuInfo, classifier)[1]
+
+  @staticmethod
+  def groupElapsedTimeWithThreads(txnSubCollection, cpuInfo, classifier=DefaultClassifier()):
+    """
+    Aggregates elapsed time by category, along with a break down by thread, that began the transactions
+
+    Transactions are classified once, for both the aggregates
+
+    :param txnSubCollection: Transaction subcollection to be aggregated
+    :param cpuInfo: Cpu info to convert cycles to duration (micro seconds)
+    :param classifier: Predicate to classify transactions into different categories
+    :returns: tuple of map of category to list of elapsed time and map of category to a map of thread
+              id to array of elapsed time
+
+    """
+    txns = [txn for txn in txnSubCollection if txn]
+    times = cpuInfo.convertCyclesToTime(numpy.array([txn.getElapsedTsc() for txn in txns], dtype=numpy.float64))
+    threads = numpy.array([txn[0].threadId for txn in txns], dtype=object)
+    categoryMap = TxnAggregator._groupByCategory(lambda v: [v], classifier, txns, range(len(txns)))
+    elapsedTimeMap = {}
+    threadMap = {}
+    for category, indices in categoryMap.items():
+      indices = numpy.array(indices, dtype=numpy.intp)
+      elapsedTimeMap[category] = times[indices].tolist()
+      threadMap[category] = OrderedDict(
+        (threadId, times[indices[positions]])
+        for threadId, positions in TxnAggregator.groupIndicesByKey(threads[indices]).items()
+      )
+    return elapsedTimeMap, threadMap
 
   @staticmethod
   def groupTxns(txnSubCollection, classifier=DefaultClassifier(), mustHaveProbes=None):
@@ -154,13 +210,9 @@ class TxnAggregator(object):
     :param mustHaveProbes: Probes used to exclude transaction from aggregation
 
     """
-    groupMap = {}
+    txns = [txn for txn in txnSubCollection if not mustHaveProbes or txn.hasProbes(mustHaveProbes)]
 
     # classifiy the counter breakups into categories
-    for txn in txnSubCollection:
-      if not mustHaveProbes or txn.hasProbes(mustHaveProbes):
-        TxnAggregator._addOrUpdateContainer(
-          groupMap, lambda t: txnSubCollectionFactory(txnSubCollection, t),
-          classifier, txn, txn
-        )
-    return groupMap
+    return TxnAggregator._groupByCategory(
+      lambda t: txnSubCollectionFactory(txnSubCollection, t), classifier, txns, txns
+    )
@@ -14,14 +14,40 @@ Author: Manikandan Dhamodharan, Morgan Stanley
 """
 
 import math
-from xpedite.analytics.timeline    import (
-                                     DeltaSeriesRepo, Timeline, TimePoint,
-                                     TimelineStats, CounterMap
-                                   )
+import numpy
+from xpedite.analytics.timeline       import DeltaSeriesRepo, TimelineStats, CounterMap
+from xpedite.analytics.timelineMatrix import (
+                                        Timeline, TimePoint, TimelineMatrix,
+                                        concatTimelines, NAN
+                                      )
+
+from xpedite.profiler.profile         import Profile
+from xpedite.pmu.event                import TopdownMetrics
+from xpedite.types.route              import conflateRoutes
+
+def reduceSegments(values, begins, lengths, skipMask=None):
+  """
+  Sums values in segments of consecutive columns, for each row of a matrix
+
+  Values of a segment are accumulated one column at a time, in the order of columns,
+  to reproduce the sums of timepoints conflated one after another.
+
+  :param values: Matrix (rows x columns [x width]) of values to be reduced
+  :param begins: Index of the first column in each of the segments
+  :param lengths: Number of columns in each of the segments
+  :param skipMask: Mask (same shape as values) to flag values, that are not accumulated
 
-from xpedite.profiler.profile      import Profile
-from xpedite.pmu.event             import TopdownMetrics
-from xpedite.types.route           import conflateRoutes
+  """
+  sums = values[:, begins]
+  for offset in range(1, int(lengths.max()) if len(lengths) else 0):
+    segments = numpy.nonzero(lengths > offset)[0]
+    columns = begins[segments] + offset
+    partialSums = sums[:, segments]
+    if skipMask is None:
+      sums[:, segments] = partialSums + values[:, columns]
+    else:
+      sums[:, segments] = numpy.where(skipMask[:, columns], partialSums, partialSums + values[:, columns])
+  return sums
 
 class Conflator(object):
   """
@@ -113,17 +139,19 @@ class Conflator(object):
         if self.conflateTimelineStats(route, benchmarkTLS, dstBenchmarkTLS):
           dst.benchmarks.update({name: dstBenchmarkTLS})
 
-    dst.current.timelineCollection.sort(key=lambda timeline: timeline.tsc)
-    Conflator.buildDeltaSeriesRepo(dst.current)
-    for benchmarkTLS in dst.benchmarks.values():
-      benchmarkTLS.timelineCollection.sort(key=lambda timeline: timeline.tsc)
-      Conflator.buildDeltaSeriesRepo(benchmarkTLS)
+    for tls in [dst.current] + list(dst.benchmarks.values()):
+      tls.timelineCollection.sort(key=lambda timeline: timeline.tsc)
+      if not tls.deltaSeriesRepo.isSketched():
+        Conflator.buildDeltaSeriesRepo(tls)
     return dst
 
   def conflateTimelineStats(self, route, src, dst):
     """
     Conflates timelines from source timeline stats to destination timeline stats
 
+    Sketched delta series of the destination are updated incrementally. Sketches of a source
+    with the same route as the destination are merged, without revisiting the timelines.
+
     :param route: route used for conflation
     :param src: Source timeline stats
     :param dst: Destination timeline stats
@@ -132,10 +160,15 @@ class Conflator(object):
     routeIndices = conflateRoutes(src.route, route)
     if routeIndices:
       topdownMetrics = self.getTopdownMetrics(src.cpuInfo.cpuId, src.topdownKeys)
-      self.conflateTimelineCollection(
-        routeIndices, src.timelineCollection, dst.timelineCollection,
-        src.buildEventsMap(), topdownMetrics
+      timelineCollection = self.conflateTimelines(
+        routeIndices, src.timelineCollection, src.buildEventsMap(), topdownMetrics
       )
+      dst.timelineCollection = concatTimelines(dst.timelineCollection, timelineCollection)
+      if dst.deltaSeriesRepo.isSketched():
+        if len(src.route) == len(route) and list(routeIndices) == list(range(len(route))):
+          dst.deltaSeriesRepo.merge(src.deltaSeriesRepo)
+        else:
+          Conflator.addTimelines(dst.deltaSeriesRepo, timelineCollection)
       return True
     return None
 
@@ -150,9 +183,24 @@ class Conflator(object):
     :param eventsMap: Map of pmu events for compution of topdown metrics
 
     """
-    for timeline in src:
-      conflatedTl = self.conflateTimeline(timeline, routeIndices, eventsMap, topdownMetrics)
-      dst.append(conflatedTl)
+    dst.extend(self.conflateTimelines(routeIndices, src, eventsMap, topdownMetrics))
+
+  def conflateTimelines(self, routeIndices, src, eventsMap, topdownMetrics):
+    """
+    Conflates timelines from source timeline collection
+
+    Returns a timeline matrix, if the source timelines share a layout, a list of timelines otherwise
+
+    :param routeIndices: Subset of route indices for conflation
+    :param src: Source timeline collection
+    :param eventsMap: Map of pmu events for compution of topdown metrics
+    :param topdownMetrics: Topdown metrics for the conflated timelines
+
+    """
+    timelines = self.conflateTimelineColumns(src, routeIndices, eventsMap, topdownMetrics) if src else []
+    if timelines is None:
+      timelines = [self.conflateTimelinePoints(timeline, routeIndices, eventsMap, topdownMetrics) for timeline in src]
+    return timelines
 
   def conflateTimeline(self, srcTl, routeIndices, eventsMap, topdownMetrics):
     """
@@ -163,6 +211,21 @@ class Conflator(object):
     :param eventsMap: Map of pmu events for compution of topdown metrics
     :param topdownMetrics: Topdown metrics for the conflated timelines
 
+    """
+    timelines = self.conflateTimelineColumns([srcTl], routeIndices, eventsMap, topdownMetrics)
+    if timelines is None:
+      return self.conflateTimelinePoints(srcTl, routeIndices, eventsMap, topdownMetrics)
+    return timelines[0]
+
+  def conflateTimelinePoints(self, srcTl, routeIndices, eventsMap, topdownMetrics):
+    """
+    Constructs a conflated timeline from source timeline, conflating one time point at a time
+
+    :param srcTl: Source timeline to conflate
+    :param routeIndices: Subset of route indices for conflation
+    :param eventsMap: Map of pmu events for compution of topdown metrics
+    :param topdownMetrics: Topdown metrics for the conflated timelines
+
     """
     timeline = Timeline(srcTl.txn)
     timeline.inception = srcTl.inception
@@ -206,6 +269,185 @@ class Conflator(object):
       timePoints.append(dstTp)
     return timePoints
 
+  @staticmethod
+  def gatherPmcs(timelines, pointCount):
+    """
+    Gathers pmc values of time points in the given timelines, as a (timelines x points x pmcs) matrix
+
+    Time points without pmc values and time points with pmc values lost to a change of thread (nan)
+    are gathered as zeros. Returns None, if the time points of the timelines don't share a pmc layout.
+
+    :param timelines: Timelines with time points to be gathered
+    :param pointCount: Number of time points in each of the timelines
+    :returns: tuple of pmc matrix, mask of time points without pmc values and mask of time points with nan values
+
+    """
+    layout = [len(timePoint.deltaPmcs) if timePoint.deltaPmcs else 0 for timePoint in timelines[0].points]
+    pmcCount = max(layout)
+    rows = []
+    for timeline in timelines:
+      for timePoint, width in zip(timeline.points, layout):
+        deltaPmcs = timePoint.deltaPmcs
+        if (len(deltaPmcs) if deltaPmcs else 0) != width:
+          return None
+        if width:
+          rows.append(deltaPmcs)
+    if pmcCount and any(width not in (0, pmcCount) for width in layout):
+      return None
+    nanRows = numpy.array([math.isnan(row[0]) for row in rows], dtype=bool)
+    zeros = [0] * pmcCount
+    values = numpy.array([zeros if isNan else row for row, isNan in zip(rows, nanRows)]).reshape(len(rows), pmcCount)
+    if values.dtype.kind not in 'iuf':
+      return None
+    hasPmcs = numpy.array(layout, dtype=bool)
+    shape = (len(timelines), int(hasPmcs.sum()))
+    pmcs = numpy.zeros((len(timelines), pointCount, pmcCount), dtype=values.dtype)
+    pmcs[:, hasPmcs] = values.reshape(shape + (pmcCount,))
+    nanMask = numpy.zeros((len(timelines), pointCount), dtype=bool)
+    nanMask[:, hasPmcs] = nanRows.reshape(shape)
+    return pmcs, ~hasPmcs, nanMask
+
+  @staticmethod
+  def reducePmcs(pmcs, missingPmcs, nanMask, begins, lengths):
+    """
+    Sums pmc values in segments of time points, skipping time points without pmc values or with nan values
+
+    :param pmcs: Matrix (timelines x points x pmcs) of pmc values
+    :param missingPmcs: Mask of points without pmc values
+    :param nanMask: Mask (timelines x points) of time points with nan values
+    :param begins: Index of the first time point in each of the segments
+    :param lengths: Number of time points in each of the segments
+
+    """
+    skipMask = numpy.logical_or(nanMask, missingPmcs)[:, :, numpy.newaxis]
+    if pmcs.dtype.kind == 'f':
+      skipMask = numpy.logical_or(skipMask, numpy.isnan(pmcs))
+    return reduceSegments(pmcs, begins, lengths, skipMask)
+
+  @staticmethod
+  def buildTimepoint(srcTp, duration, deltaPmcs):
+    """
+    Builds a conflated time point with the given duration and pmc values
+
+    Nan values of the source time point are retained as is, since nan values are never accumulated
+
+    :param srcTp: Time point at the beginning of the conflated segment
+    :param duration: Duration of the conflated segment
+    :param deltaPmcs: Sum of pmc values in the conflated segment (None to copy values of the source time point)
+
+    """
+    if srcTp.deltaPmcs:
+      if deltaPmcs is None:
+        deltaPmcs = list(srcTp.deltaPmcs)
+      else:
+        deltaPmcs = [
+          srcPmc if math.isnan(pmc) and math.isnan(srcPmc) else pmc for pmc, srcPmc in zip(deltaPmcs, srcTp.deltaPmcs)
+        ]
+    else:
+      deltaPmcs = None
+    return TimePoint(srcTp.name, point=srcTp.point, duration=duration, pmcNames=srcTp.pmcNames, deltaPmcs=deltaPmcs)
+
+  @staticmethod
+  def gatherTimelines(srcTimelines):
+    """
+    Gathers names, points, durations and pmc values of time points in the given timelines, as matrices
+
+    Timeline matrices are gathered without materializing the timelines. Returns None, if the
+    time points of the timelines don't share a layout.
+
+    :param srcTimelines: Timelines with time points to be gathered
+    :returns: tuple of names, points, durations, pmc names, pmc matrix, mask of time points without
+              pmc values and mask of time points with nan values
+
+    """
+    if isinstance(srcTimelines, TimelineMatrix):
+      names = srcTimelines.names[:-1]
+      if srcTimelines.pmcColumns is None:
+        pmcNames, pmcs = None, numpy.zeros((len(srcTimelines), len(names), 0), dtype=numpy.int64)
+        missingPmcs = numpy.ones(len(names), dtype=bool)
+        nanMask = numpy.zeros((len(srcTimelines), len(names)), dtype=bool)
+      else:
+        pmcNames, pmcs = srcTimelines.pmcNames, srcTimelines.pmcs[:, :-1]
+        missingPmcs, nanMask = ~srcTimelines.pmcColumns[:-1], srcTimelines.nanMask[:, :-1]
+      return names, srcTimelines.points[:, :-1], srcTimelines.durations[:, :-1], pmcNames, pmcs, missingPmcs, nanMask
+
+    pointCount = len(srcTimelines[0])
+    if any(len(timeline) != pointCount for timeline in srcTimelines):
+      return None
+    names = [timePoint.name for timePoint in srcTimelines[0].points]
+    if any([timePoint.name for timePoint in timeline.points] != names for timeline in srcTimelines):
+      return None
+    gatheredPmcs = Conflator.gatherPmcs(srcTimelines, pointCount)
+    if gatheredPmcs is None:
+      return None
+    pmcs, missingPmcs, nanMask = gatheredPmcs
+    pmcNames = next((timePoint.pmcNames for timePoint in srcTimelines[0].points if timePoint.deltaPmcs), None)
+    points = numpy.array(
+      [[timePoint.point for timePoint in timeline.points] for timeline in srcTimelines], dtype=numpy.float64
+    ).reshape(len(srcTimelines), pointCount)
+    durations = numpy.array(
+      [[timePoint.duration for timePoint in timeline.points] for timeline in srcTimelines], dtype=numpy.float64
+    ).reshape(len(srcTimelines), pointCount)
+    return names, points, durations, pmcNames, pmcs, missingPmcs, nanMask
+
+  @staticmethod
+  def conflateTimelineColumns(srcTimelines, routeIndices, eventsMap, topdownMetrics): # pylint: disable=too-many-locals
+    """
+    Constructs a matrix of conflated timelines, reducing durations and pmc values of all the timelines as matrices
+
+    Returns None, if the source timelines vary in length or layout of pmc values
+
+    :param srcTimelines: Source timelines to conflate
+    :param routeIndices: Subset of route indices for conflation
+    :param eventsMap: Map of pmu events for compution of topdown metrics
+    :param topdownMetrics: Topdown metrics for the conflated timelines
+
+    """
+    gatheredTimelines = Conflator.gatherTimelines(srcTimelines) if routeIndices else None
+    if gatheredTimelines is None:
+      return None
+    names, points, durations, pmcNames, pmcs, missingPmcs, nanMask = gatheredTimelines
+
+    begins = numpy.array(routeIndices, dtype=numpy.intp)
+    lengths = numpy.append(begins[1:], begins[-1] + 1) - begins
+    endpointLength = max(len(begins) - 1, 1)
+    conflatedMissingPmcs = missingPmcs[begins]
+    for segmentMissingPmcs in [missingPmcs[begin:begin + length] for begin, length in zip(begins, lengths)] + [
+        conflatedMissingPmcs[:endpointLength]]:
+      if segmentMissingPmcs[0] and not segmentMissingPmcs.all():
+        return None
+
+    conflatedDurations = reduceSegments(durations, begins, lengths)
+    conflatedPmcs = Conflator.reducePmcs(pmcs, missingPmcs, nanMask, begins, lengths)
+    conflatedNanMask = nanMask[:, begins]
+    conflatedPmcs[conflatedNanMask] = 0
+    endpointBegins = numpy.zeros(1, dtype=numpy.intp)
+    endpointLengths = numpy.array([endpointLength], dtype=numpy.intp)
+    endpointDurations = reduceSegments(conflatedDurations, endpointBegins, endpointLengths)
+    endpointPmcs = Conflator.reducePmcs(
+      conflatedPmcs, conflatedMissingPmcs, conflatedNanMask, endpointBegins, endpointLengths
+    )
+
+    if isinstance(srcTimelines, TimelineMatrix):
+      txns, inceptions = srcTimelines.txns, srcTimelines.inceptions
+    else:
+      txns, inceptions = [timeline.txn for timeline in srcTimelines], [timeline.inception for timeline in srcTimelines]
+    conflatedPoints = points[:, begins]
+    timelines = TimelineMatrix(
+      txns, inceptions, [names[begin] for begin in begins.tolist()] + [names[begins[0]]],
+      numpy.concatenate((conflatedPoints, conflatedPoints[:, :1]), axis=1),
+      numpy.concatenate((conflatedDurations, endpointDurations), axis=1)
+    )
+    if pmcNames:
+      pmcColumns = ~numpy.append(conflatedMissingPmcs, conflatedMissingPmcs[0])
+      timelines.setPmcs(
+        pmcNames, pmcColumns, numpy.concatenate((conflatedPmcs, endpointPmcs), axis=1),
+        numpy.concatenate((conflatedNanMask, conflatedNanMask[:, :1]), axis=1)
+      )
+      if topdownMetrics and pmcColumns.any() and len(timelines):
+        timelines.computeTopdown(topdownMetrics, eventsMap)
+    return timelines
+
   @staticmethod
   def createTimelineStats(src, category, route):
     """
@@ -216,7 +458,7 @@ class Conflator(object):
     :param route: Route to use for conflating transactions
 
     """
-    deltaSeriesRepo = DeltaSeriesRepo(src.events, src.topdownKeys, route.probes)
+    deltaSeriesRepo = DeltaSeriesRepo(src.events, src.topdownKeys, route.probes, src.deltaSeriesRepo.relativeError)
     return TimelineStats(src.name, src.cpuInfo, category, route, route.probes, [], deltaSeriesRepo)
 
   @staticmethod
@@ -246,9 +488,50 @@ class Conflator(object):
     :param timelineStats: Source timeline stats used to build delta series repository
 
     """
-    deltaSeriesRepo = timelineStats.deltaSeriesRepo
-    for timeline in timelineStats.timelineCollection:
+    return Conflator.addTimelines(timelineStats.deltaSeriesRepo, timelineStats.timelineCollection)
+
+  @staticmethod
+  def addTimelines(deltaSeriesRepo, timelineCollection):
+    """
+    Adds tsc and pmc data from time points of the given timelines to delta series repository
+
+    :param deltaSeriesRepo: Delta series repository to be enriched
+    :param timelineCollection: Timelines to be added
+
+    """
+    if isinstance(timelineCollection, TimelineMatrix):
+      return Conflator.addTimelineMatrix(deltaSeriesRepo, timelineCollection)
+    for timeline in timelineCollection:
       for i in range(len(timeline) -1):
         Conflator.addTimepoint(deltaSeriesRepo, timeline[i], i)
       Conflator.addTimepoint(deltaSeriesRepo, timeline.endpoint, len(timeline) -1)
     return deltaSeriesRepo
+
+  @staticmethod
+  def addTimelineMatrix(deltaSeriesRepo, timelineMatrix):
+    """
+    Adds tsc and pmc data from columns of the given timeline matrix to delta series repository
+
+    :param deltaSeriesRepo: Delta series repository to be enriched
+    :param timelineMatrix: Matrix of timelines to be added
+
+    """
+    from xpedite.analytics.timeline import TSC_EVENT_NAME
+    columnCount = len(timelineMatrix.names)
+    topdownColumns = []
+    if timelineMatrix.topdownMatrix is not None:
+      topdownColumns = [
+        (name, timelineMatrix.topdownColumn(j)) for j, name in enumerate(timelineMatrix.topdownMatrix.names)
+      ]
+    for index, column in enumerate(list(range(columnCount - 2)) + [columnCount - 1]):
+      deltaSeriesRepo[TSC_EVENT_NAME][index].extend(timelineMatrix.durations[:, column])
+      if timelineMatrix.hasPmcs(column):
+        pmcs = numpy.where(
+          timelineMatrix.nanMask[:, column, numpy.newaxis], NAN, timelineMatrix.pmcs[:, column]
+        )
+        for j, pmcName in enumerate(timelineMatrix.pmcNames):
+          deltaSeriesRepo[pmcName][index].extend(pmcs[:, j])
+        slot = int(timelineMatrix.pmcColumns[:column].sum())
+        for name, values in topdownColumns:
+          deltaSeriesRepo[name][index].extend(values[:, slot])
+    return deltaSeriesRepo
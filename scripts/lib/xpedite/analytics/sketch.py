@@ -0,0 +1,213 @@
+"""
+Quantile sketch with bounded relative error
+
+A sketch summarizes a stream of values in logarithmically sized buckets, instead of
+retaining every value. Quantiles are estimated with a relative error bounded by a
+configurable accuracy, independent of the number of values summarized.
+
+Sketches with the same accuracy can be merged, to combine partial results
+built from disjoint sets of transactions.
+"""
+
+import math
+import numpy
+
+class QuantileSketch(object):
+  """A mergeable sketch of values, with relative error bounded quantiles"""
+
+  # Values with magnitude smaller than this limit are accounted as zero
+  MIN_INDEXABLE_VALUE = 1e-9
+
+  def __init__(self, relativeError=0.01):
+    """
+    Constructs an empty sketch
+
+    :param relativeError: Upper bound for the relative error of quantiles estimated by this sketch
+
+    """
+    if not 0 < relativeError < 1:
+      raise ValueError('relative error of a sketch must be in the range (0, 1) - got {}'.format(relativeError))
+    self.relativeError = relativeError
+    self.gamma = (1 + relativeError) / (1 - relativeError)
+    self.logGamma = math.log(self.gamma)
+    self.positiveBuckets = {}
+    self.negativeBuckets = {}
+    self.zeroCount = 0
+    self.nanCount = 0
+    self.count = 0
+    self.min = float('inf')
+    self.max = float('-inf')
+    self.sum = 0.0
+    self.sumOfSquares = 0.0
+    self._quantileIndex = None
+
+  def _keys(self, values):
+    """Returns keys of buckets for the given positive values"""
+    return numpy.ceil(numpy.log(values) / self.logGamma).astype(numpy.int64)
+
+  def _bucketValue(self, keys):
+    """Returns values representing buckets with the given keys"""
+    return 2 * numpy.power(self.gamma, numpy.asarray(keys, dtype=numpy.float64)) / (self.gamma + 1)
+
+  @staticmethod
+  def _accumulate(buckets, keys):
+    """Adds counts of the given keys to a map of buckets"""
+    keys, counts = numpy.unique(keys, return_counts=True)
+    for key, count in zip(keys.tolist(), counts.tolist()):
+      buckets[key] = buckets.get(key, 0) + count
+
+  def add(self, value):
+    """
+    Adds a value to this sketch
+
+    :param value: Value to be added
+
+    """
+    self.extend([value])
+
+  def extend(self, values):
+    """
+    Adds a sequence of values to this sketch
+
+    :param values: Values to be added
+
+    """
+    values = numpy.asarray(values, dtype=numpy.float64).ravel()
+    if values.size == 0:
+      return
+    self._quantileIndex = None
+    self.count += len(values)
+    nanMask = numpy.isnan(values)
+    nanCount = int(nanMask.sum())
+    if nanCount:
+      self.nanCount += nanCount
+      values = values[~nanMask]
+      if values.size == 0:
+        return
+    self.min = min(self.min, float(values.min()))
+    self.max = max(self.max, float(values.max()))
+    self.sum += float(values.sum())
+    self.sumOfSquares += float(numpy.square(values).sum())
+    positive = values[values >= self.MIN_INDEXABLE_VALUE]
+    negative = values[values <= -self.MIN_INDEXABLE_VALUE]
+    self.zeroCount += len(values) - len(positive) - len(negative)
+    if len(positive):
+      self._accumulate(self.positiveBuckets, self._keys(positive))
+    if len(negative):
+      self._accumulate(self.negativeBuckets, self._keys(-negative))
+
+  def merge(self, other):
+    """
+    Merges values summarized by other sketch to this sketch
+
+    :param other: Sketch with the same relative error as this sketch
+
+    """
+    if other.relativeError != self.relativeError:
+      raise ValueError('cannot merge sketches with relative error {} and {}'.format(
+        self.relativeError, other.relativeError
+      ))
+    self._quantileIndex = None
+    for buckets, otherBuckets in ((self.positiveBuckets, other.positiveBuckets),
+                                  (self.negativeBuckets, other.negativeBuckets)):
+      for key, count in otherBuckets.items():
+        buckets[key] = buckets.get(key, 0) + count
+    self.zeroCount += other.zeroCount
+    self.nanCount += other.nanCount
+    self.count += other.count
+    self.min = min(self.min, other.min)
+    self.max = max(self.max, other.max)
+    self.sum += other.sum
+    self.sumOfSquares += other.sumOfSquares
+
+  def _buildQuantileIndex(self):
+    """Returns values of buckets in ascending order, along with the cumulative count of values"""
+    if self._quantileIndex is None:
+      negativeKeys = sorted(self.negativeBuckets, reverse=True)
+      positiveKeys = sorted(self.positiveBuckets)
+      values = numpy.concatenate((
+        -self._bucketValue(negativeKeys), [0.0], self._bucketValue(positiveKeys)
+      ))
+      counts = numpy.array(
+        [self.negativeBuckets[key] for key in negativeKeys] + [self.zeroCount] +
+        [self.positiveBuckets[key] for key in positiveKeys], dtype=numpy.int64
+      )
+      self._quantileIndex = (values, counts)
+    return self._quantileIndex
+
+  def getValueCounts(self):
+    """
+    Returns values representing buckets of this sketch in ascending order, with counts of values in each bucket
+
+    Values are clipped to the min and max of the sketch, hence the first and last values are exact
+
+    """
+    if not self.count or self.nanCount:
+      return numpy.zeros(0), numpy.zeros(0, dtype=numpy.int64)
+    values, counts = self._buildQuantileIndex()
+    occupied = counts > 0
+    return numpy.clip(values[occupied], self.min, self.max), counts[occupied]
+
+  def getPercentiles(self, percentiles):
+    """
+    Returns a list of estimated values at the given percentiles
+
+    :param percentiles: Percentiles to be estimated
+
+    """
+    if not self.count or self.nanCount:
+      return [float('nan')] * len(percentiles)
+    values, counts = self._buildQuantileIndex()
+    ranks = numpy.asarray(percentiles, dtype=numpy.float64) / 100 * (self.count - 1)
+    indices = numpy.searchsorted(numpy.cumsum(counts), ranks, side='right')
+    estimates = numpy.clip(values[numpy.minimum(indices, len(values) - 1)], self.min, self.max)
+    estimates[ranks <= 0] = self.min
+    estimates[ranks >= self.count - 1] = self.max
+    return estimates.tolist()
+
+  def getMean(self):
+    """Returns the mean of values in this sketch"""
+    if not self.count or self.nanCount:
+      return float('nan')
+    return self.sum / self.count
+
+  def getStandardDeviation(self):
+    """Returns the standard deviation of values in this sketch"""
+    if not self.count or self.nanCount:
+      return float('nan')
+    mean = self.sum / self.count
+    return math.sqrt(max(self.sumOfSquares / self.count - mean * mean, 0.0))
+
+  def buildDistribution(self, buckets):
+    """
+    Builds distribution of values in this sketch, for the given histogram buckets
+
+    A value is counted in the first bucket, with a boundary not less than the value.
+    Values exceeding the last boundary are conflated to the last bucket.
+
+    :param buckets: Sorted boundaries of buckets in a histogram
+    :returns: tuple of counts for each of the buckets and the count of conflated values
+
+    """
+    values, counts = self._buildQuantileIndex()
+    indices = numpy.searchsorted(numpy.asarray(buckets, dtype=numpy.float64), values, side='left')
+    conflatedCount = int(counts[indices >= len(buckets)].sum())
+    indices = numpy.minimum(indices, len(buckets) - 1)
+    bucketValues = numpy.bincount(indices, weights=counts, minlength=len(buckets))
+    return bucketValues.astype(numpy.int64).tolist(), conflatedCount
+
+  def __getstate__(self):
+    state = dict(self.__dict__)
+    state['_quantileIndex'] = None
+    return state
+
+  def __len__(self):
+    return self.count
+
+  def __eq__(self, other):
+    return isinstance(other, QuantileSketch) and self.__getstate__() == other.__getstate__()
+
+  def __repr__(self):
+    return 'Quantile sketch: {} values | {} buckets | relative error {}'.format(
+      self.count, len(self.positiveBuckets) + len(self.negativeBuckets), self.relativeError
+    )
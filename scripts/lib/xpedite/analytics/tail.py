@@ -0,0 +1,186 @@
+"""
+Module to attribute tail latency of transactions to segments of their timelines
+
+For a percentile (like p99 or p99.9) of total duration, transactions at or above the percentile form the
+tail and transactions within a narrow band around the median form the body of the distribution.
+Each segment (time elapsed between a pair of consecutive probes) is attributed the share of
+excess latency, i.e. the difference in the mean duration of the segment in tail vs median transactions.
+
+In addition to attribution, the module computes percentiles of segment durations conditioned on the tail
+and correlation of segment durations with total duration of transactions.
+
+Durations are gathered as a (timelines x segments) matrix, and all statistics are computed with
+vectorized operations over columns of the matrix.
+"""
+
+import numpy
+from xpedite.analytics.timelineMatrix import TimelineMatrix
+
+TAIL_PERCENTILES = (99, 99.9)
+CONDITIONAL_PERCENTILES = (50, 99)
+MEDIAN_BAND = 5
+
+class SegmentAttribution(object):
+  """Contribution of a segment of timelines, to the tail latency of transactions"""
+
+  def __init__(self, beginProbeName, endProbeName, medianMean, tailMean, share, percentiles, # pylint: disable=too-many-positional-arguments
+      tailPercentiles, correlation):
+    """
+    Creates an instance of SegmentAttribution
+
+    :param beginProbeName: Name of the probe at the beginning of the segment
+    :param endProbeName: Name of the probe at the end of the segment
+    :param medianMean: Mean duration of the segment in median transactions
+    :param tailMean: Mean duration of the segment in tail transactions
+    :param share: Share (in percent) of the excess latency of tail transactions, spent in this segment
+    :param percentiles: Map of percentile to duration of the segment, for all transactions
+    :param tailPercentiles: Map of percentile to duration of the segment, for tail transactions
+    :param correlation: Pearson correlation of the segment's duration with total duration
+
+    """
+    self.beginProbeName = beginProbeName
+    self.endProbeName = endProbeName
+    self.medianMean = medianMean
+    self.tailMean = tailMean
+    self.share = share
+    self.percentiles = percentiles
+    self.tailPercentiles = tailPercentiles
+    self.correlation = correlation
+
+  @property
+  def excess(self):
+    """Excess latency of the segment in tail transactions, relative to median transactions"""
+    return self.tailMean - self.medianMean
+
+  def __repr__(self):
+    return 'Segment {} -> {}: median mean {} | tail mean {} | share {}% | correlation {}'.format(
+      self.beginProbeName, self.endProbeName, self.medianMean, self.tailMean, self.share, self.correlation
+    )
+
+class TailAttribution(object):
+  """Attribution of tail latency to segments, for a percentile of total duration of transactions"""
+
+  def __init__(self, percentile, threshold, tailCount, medianCount, medianMean, tailMean, segments): # pylint: disable=too-many-positional-arguments
+    """
+    Creates an instance of TailAttribution
+
+    :param percentile: Percentile of total duration, marking the beginning of the tail
+    :param threshold: Total duration at the percentile
+    :param tailCount: Number of transactions in the tail
+    :param medianCount: Number of transactions in the band around the median
+    :param medianMean: Mean total duration of median transactions
+    :param tailMean: Mean total duration of tail transactions
+    :param segments: List of attributions for each of the segments
+
+    """
+    self.percentile = percentile
+    self.threshold = threshold
+    self.tailCount = tailCount
+    self.medianCount = medianCount
+    self.medianMean = medianMean
+    self.tailMean = tailMean
+    self.segments = segments
+
+  def rankSegments(self):
+    """Returns segments ordered by their excess latency in tail transactions"""
+    return sorted(self.segments, key=lambda segment: segment.excess, reverse=True)
+
+  def __repr__(self):
+    return 'Tail p{} (>= {}): {} tail txns | {} median txns | tail mean {} | median mean {}\n\t{}'.format(
+      self.percentile, self.threshold, self.tailCount, self.medianCount, self.tailMean, self.medianMean,
+      '\n\t'.join(str(segment) for segment in self.segments)
+    )
+
+def buildDurationMatrix(timelineCollection):
+  """
+  Gathers durations of segments and total duration of timelines in a collection
+
+  Durations are views of timeline matrices, timelines in other collections are gathered one at a time
+
+  :param timelineCollection: Collection of timelines with a common route
+  :returns: tuple of (segment names, (timelines x segments) matrix of durations, array of total durations)
+
+  """
+  if isinstance(timelineCollection, TimelineMatrix):
+    names = timelineCollection.names[:-1]
+    segmentCount = max(len(names) - 1, 0)
+    return (
+      list(zip(names[:-1], names[1:])), timelineCollection.durations[:, :segmentCount],
+      timelineCollection.durations[:, -1]
+    )
+  timelines = list(timelineCollection)
+  if not timelines:
+    return [], numpy.zeros((0, 0)), numpy.zeros(0)
+  names = [timePoint.name for timePoint in timelines[0].points]
+  segmentCount = max(len(names) - 1, 0)
+  segments = numpy.array(
+    [[timeline[i].duration for i in range(segmentCount)] for timeline in timelines], dtype=numpy.float64
+  ).reshape(len(timelines), segmentCount)
+  totals = numpy.array([timeline.endpoint.duration for timeline in timelines], dtype=numpy.float64)
+  return list(zip(names[:-1], names[1:])), segments, totals
+
+def correlate(segments, totals):
+  """
+  Computes Pearson correlation of each column of segment durations with total durations
+
+  Segments with constant durations have undefined (nan) correlation
+
+  :param segments: (timelines x segments) matrix of durations
+  :param totals: array of total durations
+
+  """
+  segmentDeviations = segments - segments.mean(axis=0)
+  totalDeviations = totals - totals.mean()
+  covariance = totalDeviations.dot(segmentDeviations)
+  scale = numpy.sqrt((segmentDeviations * segmentDeviations).sum(axis=0) * totalDeviations.dot(totalDeviations))
+  with numpy.errstate(divide='ignore', invalid='ignore'):
+    return numpy.where(scale > 0, covariance / numpy.where(scale > 0, scale, 1), numpy.nan)
+
+def attributeTail(timelineCollection, percentiles=TAIL_PERCENTILES, conditionalPercentiles=CONDITIONAL_PERCENTILES,
+    medianBand=MEDIAN_BAND):
+  """
+  Attributes tail latency of transactions in a collection, to segments of their timelines
+
+  :param timelineCollection: Collection of timelines with a common route
+  :param percentiles: Percentiles of total duration, marking the beginning of tails
+  :param conditionalPercentiles: Percentiles of segment durations, computed for all and tail transactions
+  :param medianBand: Width (in percentiles) of the band around the median, for median transactions
+  :returns: list of attributions for each of the tail percentiles
+
+  """
+  names, segments, totals = buildDurationMatrix(timelineCollection)
+  if len(totals) == 0:
+    return []
+  conditionalPercentiles = list(conditionalPercentiles)
+  percentileValues = numpy.percentile(segments, conditionalPercentiles, axis=0) if names else None
+  correlations = correlate(segments, totals)
+  medianLow, medianHigh = numpy.percentile(totals, [50 - medianBand / 2.0, 50 + medianBand / 2.0])
+  medianMask = (totals >= medianLow) & (totals <= medianHigh)
+  if not medianMask.any():
+    median = numpy.median(totals)
+    medianMask = totals == totals[numpy.abs(totals - median).argmin()]
+  medianSegments = segments[medianMask].mean(axis=0)
+  medianMean = totals[medianMask].mean()
+
+  attributions = []
+  for percentile, threshold in zip(percentiles, numpy.percentile(totals, percentiles)):
+    tailMask = totals >= threshold
+    tailSegments = segments[tailMask]
+    tailMeans = tailSegments.mean(axis=0)
+    excess = tailMeans - medianSegments
+    excessTotal = excess.sum()
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+      shares = excess * 100 / excessTotal if excessTotal else numpy.full(len(names), numpy.nan)
+    tailPercentileValues = numpy.percentile(tailSegments, conditionalPercentiles, axis=0) if names else None
+    segmentAttributions = [
+      SegmentAttribution(
+        beginProbeName, endProbeName, float(medianSegments[i]), float(tailMeans[i]), float(shares[i]),
+        dict(zip(conditionalPercentiles, percentileValues[:, i].tolist())),
+        dict(zip(conditionalPercentiles, tailPercentileValues[:, i].tolist())), float(correlations[i])
+      ) for i, (beginProbeName, endProbeName) in enumerate(names)
+    ]
+    attributions.append(TailAttribution(
+      percentile, float(threshold), int(tailMask.sum()), int(medianMask.sum()), float(medianMean),
+      float(totals[tailMask].mean()), segmentAttributions
+    ))
+  return attributions
@@ -0,0 +1,165 @@
+"""
+Module to aggregate latency statistics of timelines, over windows of time
+
+Timelines are binned to fixed size windows, by their inception (time elapsed since the first
+timeline in the profile). For each window, the module computes count, percentiles and max of
+durations, for each segment of the route and the total duration of transactions.
+
+Percentiles are estimated for all windows at once, without sorting durations. Durations are counted
+in logarithmically sized buckets (as in xpedite.analytics.sketch.QuantileSketch), with a histogram
+of buckets for each window. Estimates have a relative error bounded by a configurable accuracy.
+
+Series of windowed statistics are useful to spot pauses, warm up effects and periodic jitter in long
+profile sessions, without plotting every transaction.
+"""
+
+import math
+import numpy
+from xpedite.analytics.timelineMatrix import TimelineMatrix
+from xpedite.analytics.tail           import buildDurationMatrix
+from xpedite.analytics.sketch         import QuantileSketch
+
+WINDOW_PERCENTILES = (50, 99)
+
+# Upper bound for number of (window x bucket) counters, in a histogram built at once
+HISTOGRAM_CELL_LIMIT = 1 << 22
+
+class WindowSeries(object):
+  """Latency statistics of a segment (or total duration) of timelines, for consecutive windows of time"""
+
+  def __init__(self, beginProbeName, endProbeName, windowSize, begins, counts, percentiles, maxima): # pylint: disable=too-many-positional-arguments
+    """
+    Creates an instance of WindowSeries
+
+    :param beginProbeName: Name of the probe at the beginning of the segment
+    :param endProbeName: Name of the probe at the end of the segment
+    :param windowSize: Size of windows (in milli seconds)
+    :param begins: Array of begin time (in milli seconds since the first timeline) of windows
+    :param counts: Array of number of timelines in windows
+    :param percentiles: Map of percentile to array of durations at the percentile in windows
+    :param maxima: Array of max duration in windows
+
+    """
+    self.beginProbeName = beginProbeName
+    self.endProbeName = endProbeName
+    self.windowSize = windowSize
+    self.begins = begins
+    self.counts = counts
+    self.percentiles = percentiles
+    self.maxima = maxima
+
+  def toDataFrameDict(self):
+    """Returns windowed statistics in pandas DataFrame dict format"""
+    dfDict = {'begin' : self.begins.tolist(), 'count' : self.counts.tolist()}
+    for percentile, values in self.percentiles.items():
+      dfDict['{}%'.format(percentile)] = values.tolist()
+    dfDict['max'] = self.maxima.tolist()
+    return dfDict
+
+  def __len__(self):
+    return len(self.begins)
+
+  def __repr__(self):
+    return 'Window series {} -> {}: {} windows of {} ms | percentiles {}'.format(
+      self.beginProbeName, self.endProbeName, len(self), self.windowSize, list(self.percentiles)
+    )
+
+def gatherInceptions(timelineCollection):
+  """Returns an array with inception (in milli seconds) of timelines in a collection"""
+  if isinstance(timelineCollection, TimelineMatrix):
+    return timelineCollection.inceptions
+  return numpy.array([timeline.inception for timeline in timelineCollection], dtype=numpy.int64)
+
+def groupPercentiles(groups, groupCount, values, percentiles, relativeError):
+  """
+  Estimates percentiles of values in groups, without sorting the values
+
+  Values are counted in a (groups x buckets) histogram of logarithmically sized buckets, with
+  values smaller than QuantileSketch.MIN_INDEXABLE_VALUE accounted as zero. Percentiles of each group are located
+  in cumulative counts of the group's buckets, with the same estimates as a quantile sketch of the group.
+
+  :param groups: Array of indices of groups, for each of the values
+  :param groupCount: Number of groups
+  :param values: Array of values
+  :param percentiles: Percentiles to be estimated
+  :param relativeError: Upper bound for the relative error of estimated percentiles
+  :returns: tuple of (counts, (percentiles x groups) matrix of estimates, maxima) of groups
+
+  """
+  valid = ~numpy.isnan(values)
+  groups, values = groups[valid], values[valid]
+  counts = numpy.bincount(groups, minlength=groupCount)
+  minima = numpy.full(groupCount, numpy.inf)
+  maxima = numpy.full(groupCount, -numpy.inf)
+  numpy.minimum.at(minima, groups, values)
+  numpy.maximum.at(maxima, groups, values)
+
+  gamma = (1 + relativeError) / (1 - relativeError)
+  keys = numpy.zeros(len(values), dtype=numpy.int64)
+  bucketValues = numpy.zeros(1)
+  positive = values >= QuantileSketch.MIN_INDEXABLE_VALUE
+  if positive.any():
+    positiveKeys = numpy.ceil(numpy.log(values[positive]) / math.log(gamma)).astype(numpy.int64)
+    minKey = positiveKeys.min()
+    keys[positive] = positiveKeys - minKey + 1
+    exponents = numpy.arange(minKey, positiveKeys.max() + 1, dtype=numpy.float64)
+    bucketValues = numpy.concatenate((bucketValues, 2 * numpy.power(gamma, exponents) / (gamma + 1)))
+  bucketCount = len(bucketValues)
+
+  percentiles = numpy.asarray(percentiles, dtype=numpy.float64)
+  ranks = percentiles[:, numpy.newaxis] / 100 * (counts - 1)
+  estimates = numpy.full((len(percentiles), groupCount), numpy.nan)
+  chunkSize = max(1, HISTOGRAM_CELL_LIMIT // bucketCount)
+  for begin in range(0, groupCount, chunkSize):
+    end = min(begin + chunkSize, groupCount)
+    mask = (groups >= begin) & (groups < end) if groupCount > chunkSize else slice(None)
+    cells = (groups[mask] - begin) * bucketCount + keys[mask]
+    histogram = numpy.bincount(cells, minlength=(end - begin) * bucketCount).reshape(end - begin, bucketCount)
+    cumulativeCounts = histogram.cumsum(axis=1)
+    for i in range(len(percentiles)):
+      indices = (cumulativeCounts <= ranks[i, begin:end, numpy.newaxis]).sum(axis=1)
+      estimates[i, begin:end] = bucketValues[numpy.minimum(indices, bucketCount - 1)]
+  with numpy.errstate(invalid='ignore'):
+    estimates = numpy.clip(estimates, minima, maxima)
+  estimates = numpy.where(ranks <= 0, minima, numpy.where(ranks >= counts - 1, maxima, estimates))
+  estimates[:, counts == 0] = numpy.nan
+  maxima[counts == 0] = numpy.nan
+  return counts, estimates, maxima
+
+def buildWindowSeries(timelineCollection, windowSize=1000, percentiles=WINDOW_PERCENTILES, relativeError=0.01):
+  """
+  Builds series of latency statistics, for consecutive windows of timelines in a collection
+
+  Windows span from the earliest to the latest inception of timelines, windows without any
+  timelines have zero count and undefined (nan) percentiles and max.
+
+  :param timelineCollection: Collection of timelines with a common route
+  :param windowSize: Size of windows in milli seconds (Default value = 1000)
+  :param percentiles: Percentiles to be estimated for each window
+  :param relativeError: Upper bound for the relative error of estimated percentiles (Default value = 0.01)
+  :returns: list of window series for each of the segments, followed by a series for the total duration
+
+  """
+  if windowSize <= 0:
+    raise ValueError('window size must be positive - got {}'.format(windowSize))
+  if not 0 < relativeError < 1:
+    raise ValueError('relative error must be in the range (0, 1) - got {}'.format(relativeError))
+  names, segments, totals = buildDurationMatrix(timelineCollection)
+  if len(totals) == 0:
+    return []
+  windows = numpy.floor(gatherInceptions(timelineCollection) / float(windowSize)).astype(numpy.int64)
+  firstWindow = int(windows.min())
+  groups = windows - firstWindow
+  groupCount = int(groups.max()) + 1
+  begins = (numpy.arange(groupCount) + firstWindow) * windowSize
+  columns = [(beginProbeName, endProbeName, segments[:, i]) for i, (beginProbeName, endProbeName) in enumerate(names)]
+  columns.append((names[0][0] if names else None, names[-1][1] if names else None, totals))
+  windowSeriesList = []
+  for beginProbeName, endProbeName, values in columns:
+    counts, estimates, maxima = groupPercentiles(
+      groups, groupCount, numpy.asarray(values, dtype=numpy.float64), percentiles, relativeError
+    )
+    windowSeriesList.append(WindowSeries(
+      beginProbeName, endProbeName, windowSize, begins, counts, dict(zip(percentiles, estimates)), maxima
+    ))
+  return windowSeriesList
@@ -10,108 +10,64 @@ Author: Manikandan Dhamodharan, Morgan Stanley
 import time
 import numpy
 import logging
-from collections           import OrderedDict
-from xpedite.types.probe   import compareProbes
-from xpedite.types.route   import conflateRoutes
+from collections                      import OrderedDict
+from xpedite.types.probe              import compareProbes
+from xpedite.types.route              import conflateRoutes, RouteConflationIndex
+from xpedite.analytics.sketch         import QuantileSketch
+from xpedite.analytics.timelineMatrix import TimelineMatrix, NAN
+
+# timelines and time points are re-exported, for code and pickled profiles referring to this module
+from xpedite.analytics.timelineMatrix import Timeline, TimePoint # pylint: disable=unused-import
 
 LOGGER = logging.getLogger(__name__)
 
 TSC_EVENT_NAME = 'wall time'
 
-class Timeline(object):
-  """A timeline is a sequence of events happening as time progresses"""
-
-  def __init__(self, txn):
-    """
-    Creates an instance of Timeline for the given transaction
-
-    :param txn: Source transaction for this timeline
-    :type data: xpedite.transaction.Transaction
-    """
-    self.txn = txn
-    self.tsc = txn[0].tsc
-    self.txnId = txn.txnId
-    self.points = []
-    self.endpoint = None
-    self.inception = None
-
-  def addTimePoint(self, timePoint):
-    """
-    Adds a time point to this time line
-
-    :param timePoint: A time point for an event hapenning at a specific point in time
-    :type timePoint: xpedite.analytics.timeline.TimePoint
+class DeltaStats(object):
+  """Summary statistics of a delta series"""
 
+  def __init__(self, count, minimum, maximum, median, mean, standardDeviation, percentiles):
     """
-    self.points.append(timePoint)
+    Creates an instance of DeltaStats
 
-  @property
-  def duration(self):
-    """Elapsed wall time (in micro seconds) for this timeline"""
-    return self.endpoint.duration
-
-  def __getitem__(self, index):
-    """Returns a time point at a given index in this time line"""
-    return self.points[index]
-
-  def __len__(self):
-    """
-    Returns the length of this time line.
-
-    The length of a time line counts the number of timepoints in the line
+    :param count: Count of values in the series
+    :param minimum: Minimum value in the series
+    :param maximum: Maximum value in the series
+    :param median: Median value of the series
+    :param mean: Mean value of the series
+    :param standardDeviation: Standard deviation of the series
+    :param percentiles: Map of percentile to value in the series
 
     """
-    return len(self.points)
+    self.count = count
+    self.min = minimum
+    self.max = maximum
+    self.median = median
+    self.mean = mean
+    self.standardDeviation = standardDeviation
+    self.percentiles = percentiles
 
   def __repr__(self):
-    """Returns str representation of a timeline"""
-    pointStr = '\n\t'.join((str(point) for point in self.points))
-    return 'Timeline: id {} | ({})\n\t'.format(self.txnId, pointStr)
-
-  def __eq__(self, other):
-    return self.__dict__ == other.__dict__
-
-class TimePoint(object):
-  """A time point marks a specific instance of time in a time line"""
-
-  def __init__(self, name, point=None, duration=None, pmcNames=None, deltaPmcs=None, topdownValues=None, data=None):
-    """
-    Creates an instance of TimePoint
-
-    :param name: The name of this time point
-    :type name: str
-    :param point: The absolute point in time, when an event occurred
-    :type point: double
-    :param duration: The total duration (in micro seconds) spanned by this time point
-    :type duration: double
-    :param pmcNames: The list of pmu event names captured by this timepoint
-    :param deltaPmcs: The list of pmu event values captured by this timepoint
-    :param topdownValues: The list of topdown values computed for this timepoint
-    :param data: The 128 bit raw data captured by this timepoint
+    return 'DeltaStats: count {} | min {} | max {} | median {} | mean {} | std {} | percentiles {}'.format(
+      self.count, self.min, self.max, self.median, self.mean, self.standardDeviation, dict(self.percentiles)
+    )
 
-    """
-    self.name = name
-    self.point = point
-    self.duration = duration
-    self.pmcNames = pmcNames
-    self.deltaPmcs = deltaPmcs
-    self.topdownValues = topdownValues
-    self.data = data
+class DeltaSeries(object):
+  """
+  A series of duration (micro seconds) and pmu counter values
 
-  def __repr__(self):
-    """Returns str representation of a TimePoint"""
-    rep = 'TimePoint {0}: point {1:4,.3f} | duration {2:4,.3f}'.format(self.name, self.point, self.duration)
-    if self.deltaPmcs:
-      rep += ' | pmc {}'.format({self.pmcNames[i]: self.deltaPmcs[i] for i in range(len(self.deltaPmcs))})
-    return rep
+  Values are stored in a growable numpy buffer. Order statistics (min, max, median and
+  percentiles) share a single sort of the series, and are cached till the series is modified.
 
-  def __eq__(self, other):
-    return self.__dict__ == other.__dict__
+  Optionally (experimental), a series can be backed by a quantile sketch, to summarize values with bounded memory.
+  Sketched series don't retain values, and estimate order statistics within the sketch's relative error.
+  Timelines of the transactions are retained independent of sketching, hence sketches bound the memory
+  of delta series, not the memory of timeline stats.
+  """
 
-class DeltaSeries(object):
-  """A series of duration (micro seconds) and pmu counter values"""
+  INITIAL_CAPACITY = 64
 
-  def __init__(self, beginProbeName, endProbeName):
+  def __init__(self, beginProbeName, endProbeName, relativeError=None):
     """
     Creates an instance of Duration Series
 
@@ -122,59 +78,79 @@ class DeltaSeries(object):
     :type beginProbeName: str
     :param endProbeName: Name of the probe, that marks the end of this time period
     :type endProbeName: str
+    :param relativeError: Relative error of a sketch backing this series, None to retain all values
 
     """
     self.beginProbeName = beginProbeName
     self.endProbeName = endProbeName
-    self.series = []
-    self._count = 0
-    self._min = None
-    self._max = None
-    self._median = None
-    self._mean = None
-    self._standardDeviation = None
-    self.numpyArray = None
-
-  def _computeStats(self):
-    """Computes statistics for a series of druation/counter values"""
-    if self.series and self._count != len(self.series):
-      self._count = len(self.series)
-      self._min = min(self.series)
-      self._max = max(self.series)
-      self._median = numpy.median(self.series)
-      self._mean = numpy.mean(self.series)
-      self._standardDeviation = numpy.std(self.series)
-      self.numpyArray = numpy.array(self.series)
+    self.buffer = numpy.zeros(0, dtype=numpy.float64)
+    self.size = 0
+    self.sketch = QuantileSketch(relativeError) if relativeError else None
+    self._invalidate()
+
+  def _invalidate(self):
+    """Discards statistics cached for the series"""
+    self._sortedValues = None
+    self._cache = {}
+
+  @property
+  def values(self):
+    """Returns a numpy array with values in this delta series (empty for sketched series)"""
+    return self.buffer[:self.size]
+
+  def isSketched(self):
+    """Checks if this series is backed by a quantile sketch"""
+    return self.sketch is not None
+
+  def _reserve(self, count):
+    """Grows the buffer to store atleast count more values"""
+    required = self.size + count
+    if required > len(self.buffer):
+      buffer = numpy.zeros(max(required, 2 * len(self.buffer), self.INITIAL_CAPACITY), dtype=numpy.float64)
+      buffer[:self.size] = self.values
+      self.buffer = buffer
+
+  def _sorted(self):
+    """Returns the values of this series in ascending order, with NaN values at the end"""
+    if self._sortedValues is None:
+      self._sortedValues = numpy.sort(self.values)
+    return self._sortedValues
+
+  def _stat(self, name, compute):
+    """Returns a cached statistic, computing it on first use"""
+    value = self._cache.get(name)
+    if value is None:
+      value = compute()
+      self._cache[name] = value
+    return value
 
   def getStats(self):
     """Returns the underlying numpy array for this delta series"""
-    self._computeStats()
-    return self.numpyArray
+    return self.values
 
   def getCount(self):
     """Returns the count of values in this delta series"""
-    self._computeStats()
-    return self._count
+    return len(self)
 
   def getMin(self):
     """Returns the minimum value in this delta series"""
-    self._computeStats()
-    return self._min
+    return self.getPercentiles([0])[0] if len(self) else None
 
   def getMax(self):
     """Returns the maximum value in this delta series"""
-    self._computeStats()
-    return self._max
+    return self.getPercentiles([100])[0] if len(self) else None
 
   def getMedian(self):
     """Returns the median value of this delta series"""
-    self._computeStats()
-    return self._median
+    return self.getPercentiles([50])[0] if len(self) else None
 
   def getMean(self):
     """Returns the mean value of this delta series"""
-    self._computeStats()
-    return self._mean
+    if len(self) == 0:
+      return None
+    if self.isSketched():
+      return self._stat('mean', self.sketch.getMean)
+    return self._stat('mean', lambda: float(numpy.mean(self.values)))
 
   def getPercentile(self, percentile):
     """
@@ -183,13 +159,56 @@ class DeltaSeries(object):
     :param percentile: Percentile to extract
 
     """
-    self._computeStats()
-    return numpy.percentile(self.numpyArray, percentile)
+    return self.getPercentiles([percentile])[0]
+
+  def getPercentiles(self, percentiles):
+    """
+    Returns a list of values at the given percentiles in this delta series
+
+    Values are linearly interpolated between the closest ranks of the sorted series
+
+    :param percentiles: Percentiles to extract
+
+    """
+    missing = [percentile for percentile in percentiles if ('percentile', percentile) not in self._cache]
+    if missing and self.isSketched():
+      for percentile, value in zip(missing, self.sketch.getPercentiles(missing)):
+        self._cache[('percentile', percentile)] = value
+    elif missing:
+      sortedValues = self._sorted()
+      if not self.size or numpy.isnan(sortedValues[-1]):
+        values = [float('nan')] * len(missing)
+      else:
+        ranks = numpy.asarray(missing, dtype=numpy.float64) / 100 * (self.size - 1)
+        lower = numpy.floor(ranks).astype(numpy.intp)
+        upper = numpy.minimum(lower + 1, self.size - 1)
+        values = (sortedValues[lower] + (sortedValues[upper] - sortedValues[lower]) * (ranks - lower)).tolist()
+      for percentile, value in zip(missing, values):
+        self._cache[('percentile', percentile)] = value
+    return [self._cache[('percentile', percentile)] for percentile in percentiles]
 
   def getStandardDeviation(self):
     """Returns the standard deviation value of this delta series"""
-    self._computeStats()
-    return self._standardDeviation
+    if len(self) == 0:
+      return None
+    if self.isSketched():
+      return self._stat('standardDeviation', self.sketch.getStandardDeviation)
+    return self._stat('standardDeviation', lambda: float(numpy.std(self.values)))
+
+  def describe(self, percentiles=(95, 99)):
+    """
+    Returns summary statistics of this delta series
+
+    :param percentiles: Percentiles to be extracted, in addition to min, median and max
+
+    """
+    if len(self) == 0:
+      return DeltaStats(0, None, None, None, None, None, OrderedDict((p, None) for p in percentiles))
+    values = self.getPercentiles([0, 50, 100] + list(percentiles))
+    return DeltaStats(
+      len(self), values[0], values[2], values[1], self.getMean(), self.getStandardDeviation(),
+      OrderedDict(zip(percentiles, values[3:]))
+    )
 
   def addDelta(self, delta):
     """
@@ -199,22 +218,90 @@ class DeltaSeries(object):
     :type delta: C{double}
 
     """
-    self.series.append(delta)
+    if self.isSketched():
+      self.sketch.add(delta)
+    else:
+      self._reserve(1)
+      self.buffer[self.size] = delta
+      self.size += 1
+    self._invalidate()
+
+  def extend(self, deltas):
+    """
+    Adds a sequence of time duration/counter values to this series
+
+    :param deltas: Spans of time or pmc counter values to add to this series
+
+    """
+    deltas = numpy.asarray(deltas, dtype=numpy.float64)
+    if self.isSketched():
+      self.sketch.extend(deltas)
+    else:
+      self._reserve(len(deltas))
+      self.buffer[self.size:self.size + len(deltas)] = deltas
+      self.size += len(deltas)
+    self._invalidate()
+
+  def merge(self, other):
+    """
+    Adds values from other delta series to this series
+
+    A series retaining all values, can't be merged with a sketched series
+
+    :param other: Delta series with values to be added
+
+    """
+    if self.isSketched() and other.isSketched():
+      self.sketch.merge(other.sketch)
+      self._invalidate()
+    elif other.isSketched():
+      raise ValueError('cannot merge sketched series {} to {}'.format(other, self))
+    else:
+      self.extend(other.values)
 
   def __len__(self):
     """Returns the length of this delta Series"""
-    return len(self.series)
+    return len(self.sketch) if self.isSketched() else self.size
 
   def __getitem__(self, index):
     """Returns value at a given index in this series"""
-    return self.series[index]
+    if isinstance(index, slice):
+      return self.values[index].tolist()
+    if index < -self.size or index >= self.size:
+      raise IndexError('delta series index out of range')
+    return float(self.values[index])
+
+  def __iter__(self):
+    return iter(self.values.tolist())
 
   def __repr__(self):
     """Returns str representation of this delta Series"""
-    return 'Duration Series [{} -> {}]: {} elements'.format(self.beginProbeName, self.endProbeName, len(self.series))
+    return 'Duration Series [{} -> {}]: {} elements'.format(self.beginProbeName, self.endProbeName, self.size)
+
+  def __getstate__(self):
+    return {
+      'beginProbeName': self.beginProbeName, 'endProbeName': self.endProbeName, 'buffer': self.values.copy(),
+      'sketch': self.sketch,
+    }
+
+  def __setstate__(self, state):
+    self.beginProbeName = state['beginProbeName']
+    self.endProbeName = state['endProbeName']
+    self.sketch = state.get('sketch')
+    if 'buffer' in state:
+      self.buffer = state['buffer']
+    else:
+      self.buffer = numpy.array(state['series'], dtype=numpy.float64)
+    self.size = len(self.buffer)
+    self._invalidate()
 
   def __eq__(self, other):
-    return self.numpyArray.all() == other.numpyArray.all()
+    if self.isSketched() or other.isSketched():
+      return self.sketch == other.sketch
+    values, otherValues = self.values, other.values
+    return len(values) == len(otherValues) and bool(
+      ((values == otherValues) | (numpy.isnan(values) & numpy.isnan(otherValues))).all()
+    )
 
 class DeltaSeriesCollection(object):
   """A collection of delta series objects"""
@@ -240,6 +327,16 @@ class DeltaSeriesCollection(object):
     """Returns a delta series at a given index in this series"""
     return self.deltaSeriesList[index]
 
+  def merge(self, other):
+    """
+    Merges values of delta series in other collection, to the corresponding series in this collection
+
+    :param other: Delta series collection to be merged
+
+    """
+    for deltaSeries, otherDeltaSeries in zip(self.deltaSeriesList, other.deltaSeriesList):
+      deltaSeries.merge(otherDeltaSeries)
+
   def __repr__(self):
     """Returns str representation of this delta series collection"""
     durationSeriesCollectionStr = '{'
@@ -254,7 +351,17 @@ class DeltaSeriesCollection(object):
 class DeltaSeriesRepo(object):
   """A Repository of delta series collection objects"""
 
-  def __init__(self, events, topdownKeys, probes):
+  def __init__(self, events, topdownKeys, probes, relativeError=None):
+    """
+    Creates a repository with delta series for each pair of consecutive probes and events
+
+    :param events: PMU events collected for the profile session
+    :param topdownKeys: Topdown metrics computed for the profile session
+    :param probes: List of probes in the route of the transactions
+    :param relativeError: Relative error of sketches backing the delta series, None to retain all values
+
+    """
+    self.relativeError = relativeError
     self.deltaSeriesCollectionMap = OrderedDict([(TSC_EVENT_NAME, DeltaSeriesCollection(TSC_EVENT_NAME))])
     self.events = events
     self.pmcNames = [event.name for event in events] if events else []
@@ -269,9 +376,8 @@ class DeltaSeriesRepo(object):
 
     for deltaSeriesCollection in self.deltaSeriesCollectionMap.values():
       for i in range(1, len(probes)):
-        deltaSeriesCollection.addDeltaSeries(DeltaSeries(probes[i-1].name, probes[i].name))
-      deltaSeriesCollection.addDeltaSeries(DeltaSeries('Begin', 'End'))
-
+        deltaSeriesCollection.addDeltaSeries(DeltaSeries(probes[i-1].name, probes[i].name, relativeError))
+      deltaSeriesCollection.addDeltaSeries(DeltaSeries('Begin', 'End', relativeError))
 
   def addDeltaSeriesCollection(self, deltaSeriesCollection):
     """
@@ -316,6 +422,24 @@ class DeltaSeriesRepo(object):
     """Checks if this repository stores data for PMU events"""
     return self.eventNames and len(self.eventNames) > 0
 
+  def isSketched(self):
+    """Checks if delta series in this repository are backed by quantile sketches"""
+    return self.relativeError is not None
+
+  def merge(self, other):
+    """
+    Merges delta series from other repository, with the same probes and events
+
+    :param other: Delta series repository to be merged
+
+    """
+    for eventName, deltaSeriesCollection in self.deltaSeriesCollectionMap.items():
+      deltaSeriesCollection.merge(other[eventName])
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self.__dict__.setdefault('relativeError', None)
+
   def __repr__(self):
     """Returns str representation of this Duration Series Repo"""
     durationSeriesRepoStr = ''
@@ -427,24 +551,147 @@ class CounterMap(object):
   def __repr__(self):
     return '{} | {}'.format(self.eventsMap, self.counters)
 
+class CounterMatrix(object):
+  """
+  Counters of transactions in a route, gathered as (txns x probes) arrays
+
+  Transactions in a category share the probes of their route. Hence time stamp counters, threads
+  and pmc values of their counters, can be laid out as matrices with a row per transaction and
+  a column per probe in the route. Threads are stored as indices to a list of thread ids, shared
+  by transactions from all the counter stores.
+  """
+
+  def __init__(self, txns, route, probes, pmcCount):
+    """
+    Gathers counters of the given transactions
+
+    :param txns: Transactions taking the given route
+    :param route: Route (possibly conflated) taken by the transactions
+    :param probes: List of probes in the route
+    :param pmcCount: Number of pmu events collected for the profile session
 
-NAN = float('nan')
+    """
+    txnCount, probeCount = len(txns), len(route)
+    self.rows = numpy.zeros((txnCount, probeCount), dtype=numpy.intp)
+    self.tsc = numpy.zeros((txnCount, probeCount), dtype=numpy.int64)
+    self.threads = numpy.zeros((txnCount, probeCount), dtype=numpy.int32)
+    self.pmcCount = numpy.zeros((txnCount, probeCount), dtype=numpy.uint8)
+    self.pmcs = numpy.zeros((txnCount, probeCount, pmcCount), dtype=numpy.int64)
+    self.probeMatch = numpy.ones((txnCount, probeCount), dtype=bool)
+
+    conflationIndex = RouteConflationIndex()
+    threadLookup = OrderedDict()
+    groups = OrderedDict()
+    for i, txn in enumerate(txns):
+      indices = numpy.asarray(txn.indices)
+      if len(txn) > probeCount:
+        indices = indices[conflationIndex.conflate(txn.route, route)]
+      group = groups.setdefault(id(txn.store), (txn.store, [], []))
+      group[1].append(i)
+      group[2].append(indices)
+
+    for store, txnIndices, rowList in groups.values():
+      rows = numpy.array(rowList, dtype=numpy.intp).reshape(len(txnIndices), probeCount)
+      self.rows[txnIndices] = rows
+      self.tsc[txnIndices] = store.tsc[rows]
+      threadCodes = numpy.array(
+        [threadLookup.setdefault(threadId, len(threadLookup)) for threadId in store.threadIds], dtype=numpy.int32
+      )
+      self.threads[txnIndices] = threadCodes[store.threads[rows]]
+      self.pmcCount[txnIndices] = store.pmcCount[rows]
+      width = min(pmcCount, store.pmcs.shape[1])
+      if width:
+        self.pmcs[txnIndices, :, :width] = store.pmcs[rows, :width]
+      probeTable = numpy.array(
+        [[compareProbes(probe, storeProbe) for probe in probes] for storeProbe in store.probes], dtype=bool
+      ).reshape(len(store.probes), probeCount)
+      self.probeMatch[txnIndices] = probeTable[store.probeIds[rows], numpy.arange(probeCount)]
+    self.threadIds = list(threadLookup)
+
+  def findViolation(self, pmcCount):
+    """Returns index of the first transaction, that violates invariants of a timeline or None"""
+    violations = ~self.probeMatch.all(axis=1)
+    violations |= (self.tsc[:, 1:] == 0).any(axis=1)
+    violations |= (self.pmcCount[:, 1:] < pmcCount).any(axis=1)
+    offenders = numpy.flatnonzero(violations)
+    return offenders[0] if len(offenders) else None
+
+def validateTimeline(category, probes, txn, indices, pmcCount):
+  """
+  Validates counters of a transaction, to build a timeline for the given probes
+
+  :param category: Category of the transaction
+  :param probes: List of probes in the route of the timeline
+  :param txn: Transaction to be validated
+  :param indices: Indices of counters in the transaction, for each of the probes
+  :param pmcCount: Number of pmu events collected for the profile session
 
-def buildTimelineStats(category, route, probes, txnSubCollection): # pylint: disable=too-many-locals
+  """
+  from xpedite.types import InvariantViloation
+  for i, j in enumerate(indices):
+    probe = probes[i]
+    counter = txn[j]
+    if not compareProbes(probe, counter.probe):
+      raise InvariantViloation('category [{}] has mismatch of probes '
+        '"{}" vs "{}" in \n\ttransaction {}]\n\troute {}'.format(
+          category, probe, counter.probe, txn.txnId, probes
+        )
+      )
+    if not counter:
+      raise InvariantViloation(
+        'category [{}] has transaction {} with probe {} missing counter data'.format(
+          category, probe, txn.txnId
+        )
+      )
+    if i > 0:
+      if not counter.tsc:
+        raise InvariantViloation(
+          'category [{}] has transaction {} with missing tsc for probe {}/counter {}'.format(
+            category, txn.txnId, probe, counter
+          )
+        )
+      if len(counter.pmcs) < pmcCount:
+        raise InvariantViloation(
+          'category [{}] has transaction {} with counter {} '
+          'missing pmc samples {}/{}'.format(
+            category, txn.txnId, counter, len(counter.pmcs), pmcCount
+          )
+        )
+
+def buildInceptions(cpuInfo, beginTsc):
+  """
+  Computes inception (milli seconds elapsed since the first timeline) for each of the timelines
+
+  :param cpuInfo: Cpu info to convert tsc to wall time
+  :param beginTsc: Time stamp counter at the beginning of each of the timelines
+
+  """
+  inceptions = numpy.zeros(len(beginTsc), dtype=numpy.int64)
+  origins = numpy.flatnonzero(beginTsc)
+  if len(origins):
+    origin = origins[0]
+    elapsed = cpuInfo.convertCyclesToTime(beginTsc[origin + 1:] - beginTsc[origin]) / 1000
+    inceptions[origin + 1:] = elapsed.astype(numpy.int64)
+  return inceptions
+
+def buildTimelineStats(category, route, probes, txnSubCollection, relativeError=None): # pylint: disable=too-many-locals
   """
   Builds timeline statistics from a subcollection of transactions
 
+  Durations, pmc deltas and endpoint totals are computed for all transactions at once,
+  from a (txns x probes) matrix of counters, and retained as a timeline matrix
+
   :param probes: List of probes enabled for a profiling session
   :param txnSubCollection: A subcollection of transactions
+  :param relativeError: Relative error of sketches backing delta series, None to retain all values
 
   """
-  from xpedite.types import InvariantViloation
   begin = time.time()
   cpuInfo = txnSubCollection.cpuInfo
   topdownMetrics = txnSubCollection.topdownMetrics
   timelineCollection = []
   topdownKeys = topdownMetrics.topdownKeys() if topdownMetrics else []
-  deltaSeriesRepo = DeltaSeriesRepo(txnSubCollection.events, topdownKeys, probes)
+  deltaSeriesRepo = DeltaSeriesRepo(txnSubCollection.events, topdownKeys, probes, relativeError)
   pmcNames = deltaSeriesRepo.pmcNames
   eventsMap = deltaSeriesRepo.buildEventsMap()
   timelineStats = TimelineStats(
@@ -452,107 +699,55 @@ def buildTimelineStats(category, route, probes, txnSubCollection): # pylint: dis
     probes, timelineCollection, deltaSeriesRepo
   )
   tscDeltaSeriesCollection = deltaSeriesRepo.getTscDeltaSeriesCollection()
-
   pmcCount = len(txnSubCollection.events) if txnSubCollection.events else 0
-  inceptionTsc = None
-  defaultIndices = range(len(route))
-
-  totalTxnCount = len(txnSubCollection)
-  for txnCount, txn in enumerate(txnSubCollection):
-    timeline = Timeline(txn)
-    indices = conflateRoutes(txn.route, route) if len(txn) > len(route) else defaultIndices
-    firstCounter = prevCounter = None
-    maxTsc = 0
-    i = -1
-    endpoint = TimePoint('end', 0, deltaPmcs=([0]* pmcCount if pmcCount > 0 else None))
-    for j in indices:
-      i += 1
-      probe = probes[i]
-      counter = txn[j]
-      if not compareProbes(probe, counter.probe):
-        raise InvariantViloation('category [{}] has mismatch of probes '
-          '"{}" vs "{}" in \n\ttransaction {}]\n\troute {}'.format(
-            category, probe, counter.probe, txn.txnId, probes
-          )
-        )
-
-      if counter:
-        tsc = counter.tsc
-        maxTsc = max(maxTsc, tsc)
-        if not firstCounter:
-          firstCounter = prevCounter = counter
-        elif tsc:
-          duration = cpuInfo.convertCyclesToTime(tsc - prevCounter.tsc)
-          point = cpuInfo.convertCyclesToTime(prevCounter.tsc - firstCounter.tsc)
-          timePoint = TimePoint(probes[i-1].name, point, duration, data=prevCounter.data)
-
-          if len(counter.pmcs) < pmcCount:
-            raise InvariantViloation(
-              'category [{}] has transaction {} with counter {} '
-              'missing pmc samples {}/{}'.format(
-                category, txn.txnId, counter, len(counter.pmcs), pmcCount
-              )
-            )
-          if pmcCount != 0:
-            timePoint.pmcNames = pmcNames
-            timePoint.deltaPmcs = []
-            for k in range(pmcCount):
-              deltaPmc = counter.pmcs[k] - prevCounter.pmcs[k] if counter.threadId == prevCounter.threadId  else NAN
-              endpoint.deltaPmcs[k] += (deltaPmc if counter.threadId == prevCounter.threadId else 0)
-              timePoint.deltaPmcs.append(deltaPmc)
-              deltaSeriesRepo[pmcNames[k]][i-1].addDelta(deltaPmc)
-            if topdownMetrics:
-              counterMap = CounterMap(eventsMap, timePoint.deltaPmcs)
-              timePoint.topdownValues = topdownMetrics.compute(counterMap)
-              for td in timePoint.topdownValues:
-                deltaSeriesRepo[td.name][i-1].addDelta(td.value)
-          timeline.addTimePoint(timePoint)
-          tscDeltaSeriesCollection[i-1].addDelta(duration)
-          prevCounter = counter
-        else:
-          raise InvariantViloation(
-            'category [{}] has transaction {} with missing tsc for probe {}/counter {}'.format(
-              category, txn.txnId, probe, counter
-            )
-          )
-      else:
-        raise InvariantViloation(
-          'category [{}] has transaction {} with probe {} missing counter data'.format(
-            category, probe, txn.txnId
-          )
-        )
-
-    if prevCounter:
-      point = cpuInfo.convertCyclesToTime(prevCounter.tsc - firstCounter.tsc)
-      timeline.addTimePoint(TimePoint(probes[-1].name, point, 0, data=prevCounter.data))
-
-    endpoint.duration = cpuInfo.convertCyclesToTime(maxTsc - firstCounter.tsc)
-    if pmcCount != 0:
-      endpoint.pmcNames = pmcNames
-      for k, deltaPmc in enumerate(endpoint.deltaPmcs):
-        deltaSeriesRepo[pmcNames[k]][-1].addDelta(deltaPmc)
-      if topdownMetrics:
-        counterMap = CounterMap(eventsMap, endpoint.deltaPmcs)
-        endpoint.topdownValues = topdownMetrics.compute(counterMap)
-        for td in endpoint.topdownValues:
-          deltaSeriesRepo[td.name][-1].addDelta(td.value)
-    timeline.endpoint = endpoint
-
-    timelineCollection.append(timeline)
-    tscDeltaSeriesCollection[-1].addDelta(endpoint.duration)
-
-    elapsed = time.time() - begin
-    if elapsed >= 5:
-      LOGGER.completed(
-        '\tprocessed %d out of %d transactions | %0.2f%% complete |',
-        txnCount, totalTxnCount, float(100 * float(txnCount)/float(totalTxnCount))
-      )
-      begin = time.time()
-
-    if not inceptionTsc:
-      inceptionTsc = firstCounter.tsc
-      timeline.inception = 0
-    else:
-      timeline.inception = int(cpuInfo.convertCyclesToTime(firstCounter.tsc - inceptionTsc) / 1000)
-
+  txns = txnSubCollection.transactions
+  if not txns:
+    return timelineStats
+
+  matrix = CounterMatrix(txns, route, probes, pmcCount)
+  offender = matrix.findViolation(pmcCount)
+  if offender is not None:
+    txn = txns[offender]
+    indices = conflateRoutes(txn.route, route) if len(txn) > len(route) else range(len(route))
+    validateTimeline(category, probes, txn, indices, pmcCount)
+
+  tsc = matrix.tsc
+  txnCount = len(txns)
+  durations = cpuInfo.convertCyclesToTime(numpy.diff(tsc, axis=1))
+  points = cpuInfo.convertCyclesToTime(tsc - tsc[:, :1])
+  totals = cpuInfo.convertCyclesToTime(tsc.max(axis=1) - tsc[:, 0])
+  for i in range(len(probes) - 1):
+    tscDeltaSeriesCollection[i].extend(durations[:, i])
+  tscDeltaSeriesCollection[-1].extend(totals)
+
+  timelineMatrix = TimelineMatrix(
+    txns, buildInceptions(cpuInfo, tsc[:, 0]), [probe.name for probe in probes] + ['end'],
+    numpy.concatenate((points, numpy.zeros((txnCount, 1))), axis=1),
+    numpy.concatenate((durations, numpy.zeros((txnCount, 1)), totals[:, numpy.newaxis]), axis=1), matrix.rows,
+    numpy.array(matrix.threadIds, dtype=object)[matrix.threads[:, 0]]
+  )
+  if pmcCount:
+    sameThread = matrix.threads[:, 1:] == matrix.threads[:, :-1]
+    deltaPmcs = numpy.diff(matrix.pmcs, axis=1)
+    endpointPmcs = (deltaPmcs * sameThread[:, :, numpy.newaxis]).sum(axis=1)
+    for k, pmcName in enumerate(pmcNames):
+      for i in range(len(probes) - 1):
+        deltaSeriesRepo[pmcName][i].extend(numpy.where(sameThread[:, i], deltaPmcs[:, i, k], NAN))
+      deltaSeriesRepo[pmcName][-1].extend(endpointPmcs[:, k])
+    timelineMatrix.setPmcs(
+      pmcNames, [True] * (len(probes) - 1) + [False, True],
+      numpy.concatenate((
+        deltaPmcs, numpy.zeros((txnCount, 1, pmcCount), dtype=deltaPmcs.dtype), endpointPmcs[:, numpy.newaxis, :]
+      ), axis=1),
+      numpy.concatenate((~sameThread, numpy.zeros((txnCount, 2), dtype=bool)), axis=1)
+    )
+    if topdownMetrics:
+      topdownMatrix = timelineMatrix.computeTopdown(topdownMetrics, eventsMap)
+      for j, name in enumerate(topdownMatrix.names):
+        topdownColumn = timelineMatrix.topdownColumn(j)
+        for i in range(len(probes)):
+          deltaSeriesRepo[name][i].extend(topdownColumn[:, i])
+  timelineStats.timelineCollection = timelineMatrix
+
+  LOGGER.debug('built %d timelines for category [%s] in %0.2f sec', len(txns), category, time.time() - begin)
   return timelineStats
@@ -4,10 +4,15 @@ Module to filter timelines based on arbitrary criteria
 This module accepts a list of source profiles and builds new ones
 by filtering the timeline in source based on a predicate.
 
+Predicates are either declarative queries (xpedite.analytics.timelineQuery), evaluated
+as masks over timeline matrices, or arbitrary callables evaluated for each timeline.
+
 Author: Manikandan Dhamodharan, Morgan Stanley
 """
 
-from xpedite.profiler.profile import Profiles, Profile
+from xpedite.profiler.profile         import Profiles, Profile
+from xpedite.analytics.timelineMatrix import TimelineMatrix
+from xpedite.analytics.timelineQuery  import Predicate
 
 class TimelineFilter(object):
   """Implements logic to select a subset of timelines matching a filter criteria"""
@@ -19,9 +24,17 @@ class TimelineFilter(object):
     """
     Filters timelines from a collection
 
+    Timelines selected from a timeline matrix are retained as a new matrix
+
     :param timelineCollection: Timeline collection to be filtered
 
     """
+    if isinstance(self.predicate, Predicate):
+      return self.predicate.select(timelineCollection)
+    if isinstance(timelineCollection, TimelineMatrix):
+      return timelineCollection.take(
+        [i for i, timeline in enumerate(timelineCollection) if self.predicate(timeline)]
+      )
     filteredTlc = []
     for timeline in timelineCollection:
       if self.predicate(timeline):
@@ -62,12 +75,17 @@ class TimelineFilter(object):
     """
     Filters timelines from a collection of profiles
 
+    Parameters of declarative queries, like percentiles, are resolved from current timelines of all profiles
+
     :param profiles: collection of profiles to be filtered
 
     """
+    timelineFilter = self
+    if isinstance(self.predicate, Predicate):
+      timelineFilter = TimelineFilter(self.predicate.bind([profile.current.timelineCollection for profile in profiles]))
     filtredProfiles = Profiles(profiles.name, profiles.transactionRepo)
     for profile in profiles:
-      filteredProfile = self.filterProfile(profile)
+      filteredProfile = timelineFilter.filterProfile(profile)
       if filteredProfile:
         filtredProfiles.addProfile(filteredProfile)
     return filtredProfiles
@@ -76,10 +94,14 @@ def locateTimeline(profiles, txnId):
   """
   Performs a lookup of timeline object with txnId
 
+  Profiles are looked up with an index of transaction ids, other collections of profiles are scanned
+
   :param profiles: profiles holding a collection of timelines
   :param txnId: txnId of the timeline to lookup
 
   """
+  if isinstance(profiles, Profiles):
+    return profiles.locateTimeline(txnId)
   for profile in profiles:
     for timeline in profile.current.timelineCollection:
       if timeline.txnId == txnId:
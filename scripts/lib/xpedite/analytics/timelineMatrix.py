@@ -0,0 +1,441 @@
+"""
+Module with types to store timelines and time points
+
+A timeline is a sequence of time points, built from counters of a transaction.
+A timeline matrix stores points, durations, pmc values and topdown values of timelines with
+a common route, as arrays with a row per timeline. Timelines and time points in a matrix are
+materialized as lightweight views, on access.
+"""
+
+import numpy
+
+NAN = float('nan')
+
+class Timeline(object):
+  """A timeline is a sequence of events happening as time progresses"""
+
+  def __init__(self, txn):
+    """
+    Creates an instance of Timeline for the given transaction
+
+    :param txn: Source transaction for this timeline
+    :type data: xpedite.transaction.Transaction
+    """
+    self.txn = txn
+    self.tsc = txn[0].tsc
+    self.txnId = txn.txnId
+    self.points = []
+    self.endpoint = None
+    self.inception = None
+
+  def addTimePoint(self, timePoint):
+    """
+    Adds a time point to this time line
+
+    :param timePoint: A time point for an event hapenning at a specific point in time
+    :type timePoint: xpedite.analytics.timeline.TimePoint
+
+    """
+    self.points.append(timePoint)
+
+  @property
+  def duration(self):
+    """Elapsed wall time (in micro seconds) for this timeline"""
+    return self.endpoint.duration
+
+  def __getitem__(self, index):
+    """Returns a time point at a given index in this time line"""
+    return self.points[index]
+
+  def __len__(self):
+    """
+    Returns the length of this time line.
+
+    The length of a time line counts the number of timepoints in the line
+
+    """
+    return len(self.points)
+
+  def __repr__(self):
+    """Returns str representation of a timeline"""
+    pointStr = '\n\t'.join((str(point) for point in self.points))
+    return 'Timeline: id {} | ({})\n\t'.format(self.txnId, pointStr)
+
+  def __eq__(self, other):
+    return (self.txn, self.inception, self.points, self.endpoint) == (
+      other.txn, other.inception, other.points, other.endpoint
+    )
+
+class TimePoint(object):
+  """A time point marks a specific instance of time in a time line"""
+
+  ATTRIBUTES = ('name', 'point', 'duration', 'pmcNames', 'deltaPmcs', 'topdownValues', 'data')
+
+  def __init__(self, name, point=None, duration=None, pmcNames=None, deltaPmcs=None, topdownValues=None, data=None): # pylint: disable=too-many-positional-arguments
+    """
+    Creates an instance of TimePoint
+
+    :param name: The name of this time point
+    :type name: str
+    :param point: The absolute point in time, when an event occurred
+    :type point: double
+    :param duration: The total duration (in micro seconds) spanned by this time point
+    :type duration: double
+    :param pmcNames: The list of pmu event names captured by this timepoint
+    :param deltaPmcs: The list of pmu event values captured by this timepoint
+    :param topdownValues: The list of topdown values computed for this timepoint
+    :param data: The 128 bit raw data captured by this timepoint
+
+    """
+    self.name = name
+    self.point = point
+    self.duration = duration
+    self.pmcNames = pmcNames
+    self.deltaPmcs = deltaPmcs
+    self.topdownValues = topdownValues
+    self.data = data
+
+  def __repr__(self):
+    """Returns str representation of a TimePoint"""
+    rep = 'TimePoint {0}: point {1:4,.3f} | duration {2:4,.3f}'.format(self.name, self.point, self.duration)
+    if self.deltaPmcs:
+      rep += ' | pmc {}'.format({self.pmcNames[i]: self.deltaPmcs[i] for i in range(len(self.deltaPmcs))})
+    return rep
+
+  def __eq__(self, other):
+    return all(getattr(self, name) == getattr(other, name) for name in TimePoint.ATTRIBUTES)
+
+class TimelineView(Timeline):
+  """
+  A lightweight view of a timeline, stored in a row of a timeline matrix
+
+  Time points of the view are materialized from the matrix on access.
+  """
+
+  def __init__(self, matrix, index): # pylint: disable=super-init-not-called
+    """
+    Creates a view of a timeline in a timeline matrix
+
+    :param matrix: Timeline matrix storing the timeline
+    :type matrix: xpedite.analytics.timeline.TimelineMatrix
+    :param index: Index of the timeline in the matrix
+
+    """
+    self.matrix = matrix
+    self.index = index
+
+  @property
+  def txn(self):
+    """Source transaction for this timeline"""
+    return self.matrix.txns[self.index]
+
+  @property
+  def tsc(self):
+    """Time stamp counter of the first counter in the source transaction"""
+    return self.txn[0].tsc
+
+  @property
+  def txnId(self):
+    """Id of the source transaction for this timeline"""
+    return self.txn.txnId
+
+  @property
+  def inception(self):
+    """Time (in milli seconds) elapsed since the first timeline in the profile"""
+    return int(self.matrix.inceptions[self.index])
+
+  @property
+  def points(self):
+    """Returns a list of time points in this timeline"""
+    return [TimePointView(self.matrix, self.index, i) for i in range(len(self))]
+
+  @property
+  def endpoint(self):
+    """Returns the time point, that spans the whole timeline"""
+    return TimePointView(self.matrix, self.index, len(self))
+
+  @property
+  def duration(self):
+    """Elapsed wall time (in micro seconds) for this timeline"""
+    return self.matrix.durations[self.index, -1].item()
+
+  def addTimePoint(self, timePoint):
+    """Views of timelines in a timeline matrix are immutable"""
+    raise TypeError('cannot add time point {} to timeline {} in a timeline matrix'.format(timePoint, self.txnId))
+
+  def __getitem__(self, index):
+    """Returns a time point at a given index in this time line"""
+    if isinstance(index, slice):
+      return self.points[index]
+    count = len(self)
+    if index < -count or index >= count:
+      raise IndexError('timeline index out of range')
+    return TimePointView(self.matrix, self.index, index % count)
+
+  def __len__(self):
+    """Returns the number of time points in this timeline"""
+    return len(self.matrix.names) - 1
+
+class TimePointView(TimePoint):
+  """A lightweight view of a time point, stored in a column of a timeline matrix"""
+
+  def __init__(self, matrix, row, column): # pylint: disable=super-init-not-called
+    """
+    Creates a view of a time point in a timeline matrix
+
+    :param matrix: Timeline matrix storing the time point
+    :param row: Index of the timeline in the matrix
+    :param column: Index of the time point in the timeline (number of time points for the endpoint)
+
+    """
+    self.matrix = matrix
+    self.row = row
+    self.column = column
+
+  @property
+  def name(self):
+    """The name of this time point"""
+    return self.matrix.names[self.column]
+
+  @property
+  def point(self):
+    """The absolute point in time, when an event occurred"""
+    return self.matrix.points[self.row, self.column].item()
+
+  @property
+  def duration(self):
+    """The total duration (in micro seconds) spanned by this time point"""
+    return self.matrix.durations[self.row, self.column].item()
+
+  @property
+  def pmcNames(self):
+    """The list of pmu event names captured by this timepoint"""
+    return self.matrix.pmcNames if self.matrix.hasPmcs(self.column) else None
+
+  @property
+  def deltaPmcs(self):
+    """The list of pmu event values captured by this timepoint"""
+    if not self.matrix.hasPmcs(self.column):
+      return None
+    if self.matrix.nanMask[self.row, self.column]:
+      return [NAN] * len(self.matrix.pmcNames)
+    return self.matrix.pmcs[self.row, self.column].tolist()
+
+  @property
+  def topdownValues(self):
+    """The list of topdown values computed for this timepoint"""
+    return self.matrix.topdownValues(self.row, self.column)
+
+  @property
+  def data(self):
+    """The 128 bit raw data captured by this timepoint"""
+    dataRows = self.matrix.dataRows
+    if dataRows is not None and self.column < dataRows.shape[1]:
+      return self.matrix.txns[self.row].store.getData(int(dataRows[self.row, self.column]))
+    return None
+
+class TimelineMatrix(object):
+  """
+  A collection of timelines with a common route, stored as arrays with a row per timeline
+
+  Points and durations of time points are stored as (timelines x columns) matrices, with a column
+  for each of the time points, followed by a column for the endpoint. Pmc values are stored as a
+  (timelines x columns x events) matrix and topdown values as a matrix with a row for each of
+  the time points with pmc values.
+
+  Timelines and time points are materialized as lightweight views on access, sparing millions of
+  objects for profiles with a large number of transactions.
+  """
+
+  def __init__(self, txns, inceptions, names, points, durations, dataRows=None, threads=None): # pylint: disable=too-many-positional-arguments
+    """
+    Creates a matrix of timelines
+
+    :param txns: Source transactions of the timelines
+    :param inceptions: Time (in milli seconds) elapsed since the first timeline, for each of the timelines
+    :param names: Names of the time points, followed by name of the endpoint
+    :param points: Matrix (timelines x columns) of absolute points in time
+    :param durations: Matrix (timelines x columns) of durations (in micro seconds) spanned by time points
+    :param dataRows: Matrix (timelines x points) of counter indices in store of the transactions (Default value = None)
+    :param threads: Array of ids of the threads, that began each of the timelines (Default value = None)
+
+    """
+    self.txns = list(txns)
+    self.inceptions = numpy.asarray(inceptions, dtype=numpy.int64)
+    self.names = list(names)
+    self.points = points
+    self.durations = durations
+    self.dataRows = dataRows
+    self.threads = threads
+    self.pmcNames = None
+    self.pmcColumns = None
+    self.pmcs = None
+    self.nanMask = None
+    self.topdownMatrix = None
+
+  def setPmcs(self, pmcNames, pmcColumns, pmcs, nanMask):
+    """
+    Stores pmc values of time points in this matrix
+
+    :param pmcNames: Names of the pmu events
+    :param pmcColumns: Mask of columns, with time points capturing pmc values
+    :param pmcs: Matrix (timelines x columns x events) of pmc values
+    :param nanMask: Mask (timelines x columns) of time points, with pmc values lost to a change of thread
+
+    """
+    self.pmcNames = pmcNames
+    self.pmcColumns = numpy.asarray(pmcColumns, dtype=bool)
+    self.pmcs = pmcs
+    self.nanMask = nanMask
+
+  def hasPmcs(self, column):
+    """Checks if time points in the given column capture pmc values"""
+    return self.pmcColumns is not None and bool(self.pmcColumns[column])
+
+  @property
+  def slotCount(self):
+    """Returns the number of time points with pmc values, in each of the timelines"""
+    return int(self.pmcColumns.sum()) if self.pmcColumns is not None else 0
+
+  def pmcRows(self):
+    """Returns a matrix (rows x events) of pmc values, with a row for each time point with pmc values"""
+    nanMask = self.nanMask[:, self.pmcColumns, numpy.newaxis]
+    pmcs = numpy.where(nanMask, NAN, self.pmcs[:, self.pmcColumns])
+    return pmcs.reshape(len(self) * self.slotCount, len(self.pmcNames))
+
+  def computeTopdown(self, topdownMetrics, eventsMap):
+    """
+    Computes topdown values for time points with pmc values in this matrix
+
+    :param topdownMetrics: Topdown nodes and metrics to be computed
+    :param eventsMap: Map of pmu events for computation of topdown metrics
+
+    """
+    self.topdownMatrix = topdownMetrics.computeMatrix(eventsMap, self.pmcRows())
+    return self.topdownMatrix
+
+  def topdownColumn(self, index):
+    """Returns a matrix (timelines x time points with pmc values) of values for the topdown node at index"""
+    return self.topdownMatrix.column(index).reshape(len(self), self.slotCount)
+
+  def topdownValues(self, row, column):
+    """Returns topdown values of the time point at the given row and column"""
+    if self.topdownMatrix is None or not self.hasPmcs(column):
+      return None
+    slot = int(self.pmcColumns[:column].sum())
+    return self.topdownMatrix.row(row * self.slotCount + slot)
+
+  def isCompatible(self, other):
+    """Checks if timelines in other matrix share the layout of this matrix"""
+    if self.names != other.names or (self.dataRows is None) != (other.dataRows is None):
+      return False
+    if self.pmcColumns is None or other.pmcColumns is None:
+      return self.pmcColumns is None and other.pmcColumns is None
+    if (self.topdownMatrix is None) != (other.topdownMatrix is None) or (
+        self.topdownMatrix is not None and self.topdownMatrix.names != other.topdownMatrix.names):
+      return False
+    return self.pmcNames == other.pmcNames and self.pmcs.dtype == other.pmcs.dtype and bool(
+      (self.pmcColumns == other.pmcColumns).all()
+    )
+
+  def take(self, indices):
+    """
+    Builds a new timeline matrix, with timelines at the given indices
+
+    :param indices: Indices of timelines to be taken
+
+    """
+    indices = numpy.asarray(indices, dtype=numpy.intp).reshape(-1)
+    matrix = TimelineMatrix(
+      [self.txns[i] for i in indices.tolist()], self.inceptions[indices], self.names,
+      self.points[indices], self.durations[indices], None if self.dataRows is None else self.dataRows[indices],
+      None if self.threads is None else self.threads[indices]
+    )
+    if self.pmcColumns is not None:
+      matrix.setPmcs(self.pmcNames, self.pmcColumns, self.pmcs[indices], self.nanMask[indices])
+      if self.topdownMatrix is not None:
+        slots = numpy.arange(self.slotCount)
+        rows = indices[:, numpy.newaxis] * self.slotCount + slots
+        matrix.topdownMatrix = self.topdownMatrix.take(rows.reshape(-1))
+    return matrix
+
+  @staticmethod
+  def concatenate(matrices):
+    """
+    Builds a new timeline matrix, with timelines from the given compatible matrices
+
+    :param matrices: Matrices with timelines to be concatenated
+
+    """
+    first = matrices[0]
+    matrix = TimelineMatrix(
+      [txn for other in matrices for txn in other.txns],
+      numpy.concatenate([other.inceptions for other in matrices]), first.names,
+      numpy.concatenate([other.points for other in matrices]),
+      numpy.concatenate([other.durations for other in matrices]),
+      None if first.dataRows is None else numpy.concatenate([other.dataRows for other in matrices]),
+      None if any(other.threads is None for other in matrices) else numpy.concatenate(
+        [other.threads for other in matrices]
+      )
+    )
+    if first.pmcColumns is not None:
+      matrix.setPmcs(
+        first.pmcNames, first.pmcColumns, numpy.concatenate([other.pmcs for other in matrices]),
+        numpy.concatenate([other.nanMask for other in matrices])
+      )
+      if first.topdownMatrix is not None:
+        matrix.topdownMatrix = first.topdownMatrix.concatenate([other.topdownMatrix for other in matrices[1:]])
+    return matrix
+
+  def sort(self, key, reverse=False):
+    """
+    Sorts timelines in this matrix (in place), ordering the views of timelines by the given key
+
+    :param key: Callable to extract a comparison key from a timeline
+    :param reverse: Flag to sort in descending order
+
+    """
+    order = sorted(range(len(self)), key=lambda index: key(TimelineView(self, index)), reverse=reverse)
+    self.__dict__.update(self.take(order).__dict__)
+
+  def __len__(self):
+    """Returns the number of timelines in this matrix"""
+    return len(self.txns)
+
+  def __getitem__(self, index):
+    """Returns a view of the timeline at a given index in this matrix"""
+    if isinstance(index, slice):
+      return [TimelineView(self, i) for i in range(*index.indices(len(self)))]
+    count = len(self)
+    if index < -count or index >= count:
+      raise IndexError('timeline matrix index out of range')
+    return TimelineView(self, index % count)
+
+  def __iter__(self):
+    return (TimelineView(self, i) for i in range(len(self)))
+
+  def __repr__(self):
+    """Returns str representation of this timeline matrix"""
+    return 'Timeline Matrix: {} timelines | time points {}'.format(len(self), self.names[:-1])
+
+  def __eq__(self, other):
+    return len(self) == len(other) and list(self) == list(other)
+
+def concatTimelines(lhs, rhs):
+  """
+  Returns a collection with timelines in lhs, followed by timelines in rhs
+
+  Timeline matrices with a common layout are concatenated to a new matrix, other collections
+  are concatenated to a list of timelines
+
+  :param lhs: Leading collection of timelines
+  :param rhs: Trailing collection of timelines
+
+  """
+  if len(lhs) == 0 and isinstance(rhs, TimelineMatrix):
+    return rhs
+  if len(rhs) == 0 and isinstance(lhs, TimelineMatrix):
+    return lhs
+  if isinstance(lhs, TimelineMatrix) and isinstance(rhs, TimelineMatrix) and lhs.isCompatible(rhs):
+    return TimelineMatrix.concatenate([lhs, rhs])
+  return list(lhs) + list(rhs)
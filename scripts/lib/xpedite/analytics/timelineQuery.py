@@ -0,0 +1,451 @@
+"""
+Module to query timelines with declarative predicates
+
+Predicates are built by comparing fields of timelines, like duration of a segment,
+data captured by a probe, inception or transaction id, and are combined with the
+operators & (and), | (or) and ~ (not). For example
+
+  filter((duration('RxBegin', 'RxEnd') > 10) & (probeData('RxBegin') == '2a'))
+  filter(duration().top(1) | inception().between(1000, 2000))
+
+A predicate is evaluated to a boolean mask for a collection of timelines. Timelines stored
+in timeline matrices are evaluated with vectorized operations on the columns of the matrix,
+without materializing views of the timelines. Other collections are evaluated by gathering
+values of the fields, one timeline at a time.
+"""
+
+import operator
+import numpy
+from xpedite.types.counterStore       import FLAG_DATA, parseData
+from xpedite.analytics.timelineMatrix import TimelineMatrix
+
+class Predicate(object):
+  """Base class for predicates, that select a subset of timelines from a collection"""
+
+  def bind(self, collections): # pylint: disable=unused-argument
+    """
+    Returns a predicate, with parameters resolved using timelines from a group of collections
+
+    :param collections: Collections of timelines, used to resolve parameters like percentiles
+
+    """
+    return self
+
+  def checkBound(self):
+    """Raises, if parameters of this predicate need timelines of a collection to be resolved"""
+
+  def select(self, timelines):
+    """
+    Selects timelines matching this predicate from a collection
+
+    Timelines selected from a timeline matrix are retained as a new matrix
+
+    :param timelines: Collection of timelines to be filtered
+
+    """
+    indices = numpy.flatnonzero(self.mask(timelines))
+    if isinstance(timelines, TimelineMatrix):
+      return timelines.take(indices)
+    timelines = list(timelines)
+    return [timelines[i] for i in indices.tolist()]
+
+  def __call__(self, timeline):
+    """Checks if the given timeline matches this predicate, parameters like percentiles must be bound"""
+    self.checkBound()
+    return bool(self.mask([timeline])[0])
+
+  def __and__(self, other):
+    return Conjunction(self, other)
+
+  def __or__(self, other):
+    return Disjunction(self, other)
+
+  def __invert__(self):
+    return Negation(self)
+
+  def __bool__(self):
+    raise TypeError('predicates must be combined with operators & | ~ and can\'t be used in chained comparisons')
+
+  __nonzero__ = __bool__
+
+class Conjunction(Predicate):
+  """Selects timelines matching all of the predicates"""
+
+  def __init__(self, *predicates):
+    self.predicates = predicates
+
+  def mask(self, timelines):
+    """Returns a mask of timelines matching all of the predicates"""
+    mask = numpy.ones(len(timelines), dtype=bool)
+    for predicate in self.predicates:
+      mask &= predicate.mask(timelines)
+    return mask
+
+  def bind(self, collections):
+    return type(self)(*[predicate.bind(collections) for predicate in self.predicates])
+
+  def checkBound(self):
+    for predicate in self.predicates:
+      predicate.checkBound()
+
+class Disjunction(Conjunction):
+  """Selects timelines matching any of the predicates"""
+
+  def mask(self, timelines):
+    """Returns a mask of timelines matching any of the predicates"""
+    mask = numpy.zeros(len(timelines), dtype=bool)
+    for predicate in self.predicates:
+      mask |= predicate.mask(timelines)
+    return mask
+
+class Negation(Predicate):
+  """Selects timelines not matching a predicate"""
+
+  def __init__(self, predicate):
+    self.predicate = predicate
+
+  def mask(self, timelines):
+    """Returns a mask of timelines not matching the predicate"""
+    return ~self.predicate.mask(timelines)
+
+  def bind(self, collections):
+    return Negation(self.predicate.bind(collections))
+
+  def checkBound(self):
+    self.predicate.checkBound()
+
+class Comparison(Predicate):
+  """Selects timelines with values of a field, matching a comparison operator"""
+
+  def __init__(self, field, compare, operand):
+    self.field = field
+    self.compare = compare
+    self.operand = operand
+
+  def mask(self, timelines):
+    """Returns a mask of timelines with valid values of the field, matching the comparison"""
+    values, valid = self.field.values(timelines)
+    return valid & self.compare(values, self.operand).astype(bool)
+
+class Membership(Predicate):
+  """Selects timelines with values of a field, in a collection of values"""
+
+  def __init__(self, field, values):
+    self.field = field
+    self.members = list(values)
+
+  def mask(self, timelines):
+    """Returns a mask of timelines with valid values of the field, in the collection of values"""
+    values, valid = self.field.values(timelines)
+    return valid & numpy.isin(values, self.members)
+
+class Rank(Predicate):
+  """Selects timelines with values of a field, in the top (or bottom) percentile of a collection"""
+
+  def __init__(self, field, percent, top, threshold=None):
+    if not 0 <= percent <= 100:
+      raise ValueError('percent {} must be in the range [0, 100]'.format(percent))
+    self.field = field
+    self.percent = percent
+    self.top = top
+    self.threshold = threshold
+
+  def resolveThreshold(self, values):
+    """Returns the percentile of values, separating the top (or bottom) percent of timelines"""
+    if len(values) == 0:
+      return None
+    return numpy.percentile(values, 100 - self.percent if self.top else self.percent)
+
+  def bind(self, collections):
+    samples = [values[valid] for values, valid in (self.field.values(timelines) for timelines in collections)]
+    values = numpy.concatenate(samples) if samples else numpy.zeros(0)
+    return Rank(self.field, self.percent, self.top, self.resolveThreshold(values))
+
+  def checkBound(self):
+    if self.threshold is None:
+      raise ValueError(
+        '{} {} percent of timelines can\'t be resolved for a single timeline - select timelines with '
+        'filter() or bind the predicate to collections of timelines'.format('top' if self.top else 'bottom', self.percent)
+      )
+
+  def mask(self, timelines):
+    """Returns a mask of timelines with values of the field at or beyond the threshold percentile"""
+    values, valid = self.field.values(timelines)
+    threshold = self.threshold if self.threshold is not None else self.resolveThreshold(values[valid])
+    if threshold is None:
+      return numpy.zeros(len(values), dtype=bool)
+    return valid & (values >= threshold if self.top else values <= threshold)
+
+class Field(object):
+  """
+  Base class for fields of timelines
+
+  Comparing a field with a value builds a predicate, selecting timelines with matching values
+  """
+
+  dtype = numpy.float64
+
+  def values(self, timelines):
+    """
+    Returns a pair of (values, valid mask) of this field, for a collection of timelines
+
+    Fields missing in a timeline (for example, duration of a probe not in the route) are masked as invalid
+
+    :param timelines: Collection of timelines
+
+    """
+    if isinstance(timelines, TimelineMatrix):
+      return self.matrixValues(timelines)
+    values = [self.value(timeline) for timeline in timelines]
+    valid = numpy.array([value is not None for value in values], dtype=bool)
+    return numpy.array([0 if value is None else value for value in values], dtype=self.dtype), valid
+
+  def __lt__(self, operand):
+    return Comparison(self, operator.lt, operand)
+
+  def __le__(self, operand):
+    return Comparison(self, operator.le, operand)
+
+  def __gt__(self, operand):
+    return Comparison(self, operator.gt, operand)
+
+  def __ge__(self, operand):
+    return Comparison(self, operator.ge, operand)
+
+  def __eq__(self, operand):
+    return Comparison(self, operator.eq, operand)
+
+  def __ne__(self, operand):
+    return Comparison(self, operator.ne, operand)
+
+  __hash__ = None
+
+  def between(self, begin, end):
+    """
+    Selects timelines with values of this field in the range [begin, end)
+
+    :param begin: Inclusive lower bound of the range
+    :param end: Exclusive upper bound of the range
+
+    """
+    return (self >= begin) & (self < end)
+
+  def isin(self, values):
+    """
+    Selects timelines with values of this field in a collection of values
+
+    :param values: Collection of values to match
+
+    """
+    return Membership(self, values)
+
+  def top(self, percent):
+    """
+    Selects timelines with values of this field in the top percent of all timelines
+
+    :param percent: Percent of timelines to select
+
+    """
+    return Rank(self, percent, top=True)
+
+  def bottom(self, percent):
+    """
+    Selects timelines with values of this field in the bottom percent of all timelines
+
+    :param percent: Percent of timelines to select
+
+    """
+    return Rank(self, percent, top=False)
+
+def _locate(names, name):
+  """Returns index of a time point with the given name, None if not found"""
+  try:
+    return names.index(name)
+  except ValueError:
+    return None
+
+def _locatePoint(timeline, name):
+  """Returns index of a time point with the given name in a timeline, None if not found"""
+  return _locate([timePoint.name for timePoint in timeline.points], name)
+
+class Duration(Field):
+  """
+  Duration (in micro seconds) of a timeline or a segment of a timeline
+
+  Without probes, the field is the total duration of the timeline. Given a single probe, the
+  field is the duration of the time point for the probe, i.e. time elapsed till the next probe.
+  Given a pair of probes, the field is the time elapsed between the two probes.
+  """
+
+  def __init__(self, begin=None, end=None):
+    self.begin = begin
+    self.end = end
+
+  def matrixValues(self, matrix):
+    """Returns a pair of (durations, valid mask) for timelines in a timeline matrix"""
+    names = matrix.names[:-1]
+    if self.begin is None:
+      return matrix.durations[:, -1], numpy.ones(len(matrix), dtype=bool)
+    begin = _locate(names, self.begin)
+    end = begin if self.end is None else _locate(names, self.end)
+    if begin is None or end is None:
+      return numpy.zeros(len(matrix)), numpy.zeros(len(matrix), dtype=bool)
+    if self.end is None:
+      return matrix.durations[:, begin], numpy.ones(len(matrix), dtype=bool)
+    return matrix.points[:, end] - matrix.points[:, begin], numpy.ones(len(matrix), dtype=bool)
+
+  def value(self, timeline):
+    """Returns duration of the timeline or its segment, None if the timeline doesn't have the probes"""
+    if self.begin is None:
+      return timeline.duration
+    begin = _locatePoint(timeline, self.begin)
+    end = begin if self.end is None else _locatePoint(timeline, self.end)
+    if begin is None or end is None:
+      return None
+    if self.end is None:
+      return timeline[begin].duration
+    return timeline[end].point - timeline[begin].point
+
+class Inception(Field):
+  """Time (in milli seconds) elapsed, since the first timeline in the profile"""
+
+  dtype = numpy.int64
+
+  def matrixValues(self, matrix):
+    """Returns a pair of (inceptions, valid mask) for timelines in a timeline matrix"""
+    return matrix.inceptions, numpy.ones(len(matrix), dtype=bool)
+
+  def value(self, timeline):
+    """Returns inception of the timeline"""
+    return timeline.inception
+
+class TxnId(Field):
+  """Id of the transaction, for a timeline"""
+
+  dtype = numpy.int64
+
+  def matrixValues(self, matrix):
+    """Returns a pair of (transaction ids, valid mask) for timelines in a timeline matrix"""
+    txnIds = numpy.fromiter((txn.txnId for txn in matrix.txns), dtype=numpy.int64, count=len(matrix))
+    return txnIds, numpy.ones(len(matrix), dtype=bool)
+
+  def value(self, timeline):
+    """Returns id of the transaction for the timeline"""
+    return timeline.txnId
+
+class ProbeData(Field):
+  """
+  Data (formatted as a hex string) captured by a probe in a timeline
+
+  Timelines in a timeline matrix are matched for equality on the raw 128 bit data in counter stores
+  """
+
+  dtype = object
+
+  def __init__(self, name):
+    self.name = name
+
+  def locateDataRows(self, matrix):
+    """Returns the column of counter indices for the probe in a matrix, None if not found"""
+    column = _locate(matrix.names[:-1], self.name)
+    if column is None or matrix.dataRows is None or column >= matrix.dataRows.shape[1]:
+      return None
+    return matrix.dataRows[:, column]
+
+  def matrixValues(self, matrix):
+    """Returns a pair of (formatted data, valid mask) for timelines in a timeline matrix"""
+    dataRows = self.locateDataRows(matrix)
+    if dataRows is None:
+      return numpy.zeros(len(matrix), dtype=object), numpy.zeros(len(matrix), dtype=bool)
+    values = [txn.store.getData(int(row)) for txn, row in zip(matrix.txns, dataRows.tolist())]
+    return numpy.array(values, dtype=object), numpy.ones(len(matrix), dtype=bool)
+
+  def value(self, timeline):
+    """Returns data captured by the probe, None if the timeline doesn't have the probe"""
+    column = _locatePoint(timeline, self.name)
+    return None if column is None else timeline[column].data
+
+  def matchMatrix(self, matrix, members):
+    """
+    Returns a mask of timelines in a matrix, with data matching one of the members
+
+    :param matrix: Matrix of timelines to be matched
+    :param members: Collection of hex formatted values to match
+
+    """
+    mask = numpy.zeros(len(matrix), dtype=bool)
+    dataRows = self.locateDataRows(matrix)
+    if dataRows is None:
+      return mask
+    storeRows = {}
+    for i, txn in enumerate(matrix.txns):
+      storeRows.setdefault(id(txn.store), (txn.store, []))[1].append(i)
+    parsedMembers = [parseData(member) for member in members if member]
+    for store, rows in storeRows.values():
+      rows = numpy.array(rows, dtype=numpy.intp)
+      indices = dataRows[rows]
+      hasData = (store.flags[indices] & FLAG_DATA).astype(bool)
+      matches = ~hasData if '' in members else numpy.zeros(len(rows), dtype=bool)
+      dataHi, dataLo = store.dataHi[indices], store.dataLo[indices]
+      for member in parsedMembers:
+        if member is not None:
+          matches |= hasData & (dataHi == member[0]) & (dataLo == member[1])
+      if store.dataOverrides:
+        for i in numpy.flatnonzero(numpy.isin(indices, list(store.dataOverrides))).tolist():
+          matches[i] = store.getData(int(indices[i])) in members
+      mask[rows] = matches
+    return mask
+
+  def __eq__(self, operand):
+    return self.isin([operand])
+
+  def __ne__(self, operand):
+    return DataMembership(self, [operand], negate=True)
+
+  __hash__ = None
+
+  def isin(self, values):
+    return DataMembership(self, values)
+
+class DataMembership(Membership):
+  """Selects timelines with data captured by a probe, in (or not in) a collection of values"""
+
+  def __init__(self, field, values, negate=False):
+    super(DataMembership, self).__init__(field, values)
+    self.negate = negate
+
+  def mask(self, timelines):
+    """Returns a mask of timelines with data captured by the probe, in (or not in) the collection of values"""
+    if isinstance(timelines, TimelineMatrix):
+      if self.field.locateDataRows(timelines) is None:
+        return numpy.zeros(len(timelines), dtype=bool)
+      return self.field.matchMatrix(timelines, self.members) != self.negate
+    values, valid = self.field.values(timelines)
+    return valid & (numpy.isin(values, self.members) != self.negate)
+
+def duration(begin=None, end=None):
+  """
+  Returns a field for duration (in micro seconds) of timelines
+
+  :param begin: Name of the probe, at the beginning of the segment (Default value = None - whole timeline)
+  :param end: Name of the probe, at the end of the segment (Default value = None - till the next probe)
+
+  """
+  return Duration(begin, end)
+
+def inception():
+  """Returns a field for time (in milli seconds) elapsed, since the first timeline in the profile"""
+  return Inception()
+
+def txnId():
+  """Returns a field for id of the transaction for timelines"""
+  return TxnId()
+
+def probeData(name):
+  """
+  Returns a field for data captured by a probe in timelines
+
+  :param name: Name of the probe
+
+  """
+  return ProbeData(name)
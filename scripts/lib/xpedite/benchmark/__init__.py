@@ -6,6 +6,11 @@ This module implements the following features
   2. Discovery of all benchmarks stored under a parent directory
   3. Logic to load benchmark info and transactions from discovered benchmarks
 
+Transactions of benchmarks are loaded in parallel by a pool of worker processes and cached
+in a directory next to the benchmark, to skip loading of counters for repeat comparisons.
+Benchmarks in read only storage are cached in the transaction cache of xpedite config.
+The cache size limit (txnCacheSize) applies to each benchmark root, not to all the benchmarks.
+
 Author: Manikandan Dhamodharan, Morgan Stanley
 """
 
@@ -14,36 +19,25 @@ import shutil
 import logging
 from datetime                 import date
 from xpedite.txn.collector    import Collector
-from xpedite.types.dataSource import CsvDataSourceFactory, APPINFO_FILE_NAME
+from xpedite.types.dataSource import gatherDataSource, APPINFO_FILE_NAME
 from xpedite.types            import CpuInfo
 from xpedite.pmu.event        import Event
 from xpedite.benchmark.info   import makeBenchmarkInfo, loadBenchmarkInfo
-from xpediteBindings          import SamplesLoader
-from xpedite.util             import mkdir
+from xpedite.txn.columnar     import makeColumnarSamples
 from xpedite.dependencies     import Package, DEPENDENCY_LOADER
 DEPENDENCY_LOADER.load(Package.Six)
 
 LOGGER = logging.getLogger(__name__)
 
 BENCHMARK_DIR_NAME = 'benchmark'
-
-def makeSampleFilePath(path, threadId, tlsAddr):
-  """
-  Creates a new csv sample source file path for the given thread
-
-  :param path: Path of the data source directory
-  :param threadId: Id of thread collecting the samples
-  :param tlsAddr: Address of thread local storage of thread collecting the samples
-
-  """
-  path = os.path.join(path, '{}-{}'.format(threadId, tlsAddr))
-  mkdir(path)
-  return os.path.join(path, 'samples-0000.csv')
+BENCHMARK_CACHE_DIR_NAME = 'txnCache'
 
 def makeBenchmark(profiles, path):
   """
   Persists profiles to the file system for future benchmarking
 
+  Samples are persisted in columnar format, with a manifest listing the threads of the profile
+
   :param profiles: Profile data for the benchmark
   :param path: File system path to persist the benchmark
 
@@ -53,9 +47,7 @@ def makeBenchmark(profiles, path):
   if os.path.exists(path):
     raise Exception('Failed to make benchmark - path {} already exists'.format(path))
   txnCollection = profiles.transactionRepo.getCurrent()
-  for sampleFile in txnCollection.dataSource.files:
-    sampleFilePath = makeSampleFilePath(path, sampleFile.threadId, sampleFile.tlsAddr)
-    SamplesLoader.saveAsCsv(sampleFile.path, sampleFilePath)
+  makeColumnarSamples(txnCollection.dataSource.files, path)
   shutil.copyfile(txnCollection.dataSource.appInfoPath, os.path.join(path, APPINFO_FILE_NAME))
   makeBenchmarkInfo(benchmarkName, path, profiles.cpuInfo, profiles.events)
 
@@ -73,19 +65,58 @@ class Benchmark(object):
   def __repr__(self):
     return 'Benchmark {}: {}'.format(self.name, self.dataSource)
 
+  @property
+  def cachePath(self):
+    """Path of the transaction cache, next to the benchmark directory"""
+    return os.path.join(os.path.dirname(self.path), BENCHMARK_CACHE_DIR_NAME)
+
+  def buildTxnCache(self):
+    """
+    Builds a cache for transactions of this benchmark, returns None if caching is disabled
+
+    Transactions are cached next to the benchmark directory, falling back to the transaction cache
+    of xpedite config, if the benchmark directory is not writable
+
+    """
+    from xpedite.txn.cache    import TxnCache
+    from xpedite.dependencies import CONFIG
+    if CONFIG.txnCacheSize <= 0:
+      return None
+    path = self.cachePath
+    if not os.access(path if os.path.isdir(path) else os.path.dirname(path), os.W_OK):
+      if not CONFIG.txnCacheDir:
+        return None
+      LOGGER.debug('benchmark %s is not writable - caching transactions in %s', self.name, CONFIG.txnCacheDir)
+      path = CONFIG.txnCacheDir
+    return TxnCache(path, CONFIG.txnCacheSize)
+
+  def cacheKey(self, probes):
+    """
+    Builds a key for transactions of this benchmark, loaded with the given probes
+
+    :param probes: List of probes used to build transactions
+
+    """
+    from xpedite.txn.cache import buildRunKey
+    info = [self.name, self.legend, self.cpuInfo.cpuId, self.cpuInfo.frequency, self.events]
+    return buildRunKey(info, self.dataSource, probes)
+
 class BenchmarksCollector(object):
   """Collector to scan filesystem for gathering benchmarks"""
 
   def __init__(self, benchmarkPaths=None):
     self.benchmarkPaths = benchmarkPaths
 
-  def gatherBenchmarks(self, count):
+  def gatherBenchmarks(self, count=None):
     """
     Gathers benchmarks from a list of paths in the file system
 
-    :param count: Max count of benchmarks to load
+    :param count: Max count of benchmarks to load, defaults to the limit from xpedite config
 
     """
+    if count is None:
+      from xpedite.dependencies import CONFIG
+      count = CONFIG.benchmarkLimit
     benchmarks = []
     if not self.benchmarkPaths:
       return benchmarks
@@ -97,14 +128,14 @@ class BenchmarksCollector(object):
         if info:
           (benchmarkName, cpuInfo, path, legend, events) = info
           benchmark = Benchmark(benchmarkName, cpuInfo, path, legend, events)
-          dataSource = CsvDataSourceFactory().gather(benchmarkPath)
+          dataSource = gatherDataSource(benchmarkPath)
           if dataSource:
             benchmark.dataSource = dataSource
             benchmarks.append(benchmark)
         else:
           LOGGER.warning('skip processing benchmark %s. failed to load benchmark info', path)
 
-        if len(benchmarks) >= count:
+        if count and len(benchmarks) >= count:
           if i + 1 < len(self.benchmarkPaths):
             LOGGER.debug('skip processing %s benchmarks. limit reached.', self.benchmarkPaths[i+1:])
           break
@@ -113,18 +144,64 @@ class BenchmarksCollector(object):
     return benchmarks
 
   @staticmethod
-  def loadTxns(repo, counterFilter, benchmarks, loaderFactory):
+  def loadTxns(repo, counterFilter, benchmarks, loaderFactory, workerCount=None):
     """
     Loads transactions for a list of benchmarks
 
+    Transactions are loaded from the cache of each benchmark, if available. Benchmarks missing
+    in the cache are loaded in parallel by worker processes and persisted to their cache.
+
     :param repo: Transaction repo to collect transactions loaded for benchmarks
     :param counterFilter: Filter to exclude counters from loading
     :param benchmarks: List of benchmarks to be loaded
     :param loaderFactory: Factory to instantiate a loader instance
+    :param workerCount: Number of processes to load benchmarks in parallel, defaults to xpedite config
 
     """
+    from xpedite.util.workerPool  import WorkerPool, resolveWorkerCount
+    txnCollections = []
+    pendingLoads = []
     for benchmark in benchmarks:
       loader = loaderFactory(benchmark)
-      collector = Collector(counterFilter)
-      collector.loadDataSource(benchmark.dataSource, loader)
-      repo.addBenchmark(loader.getData())
+      txnCache = benchmark.buildTxnCache()
+      key = benchmark.cacheKey(loader.probes) if txnCache else None
+      txnCollection = txnCache.load(
+        key, loader.name, loader.cpuInfo, loader.probes, loader.topdownMetrics, loader.events, benchmark.dataSource
+      ) if txnCache else None
+      if txnCollection is None:
+        pendingLoads.append((len(txnCollections), benchmark, loader, txnCache, key))
+      txnCollections.append(txnCollection)
+
+    if pendingLoads:
+      workerCount = resolveWorkerCount(workerCount, len(pendingLoads))
+      LOGGER.info('loading %d benchmarks using %d workers', len(pendingLoads), workerCount)
+      sharedObjects = []
+      for _, benchmark, loader, _, _ in pendingLoads:
+        sharedObjects.extend(loader.probes)
+        sharedObjects.extend([loader.probeMap, loader.cpuInfo, benchmark.dataSource])
+      pool = WorkerPool(workerCount, sharedObjects=sharedObjects)
+      loads = pool.map(
+        lambda pendingLoad: BenchmarksCollector.loadBenchmark(counterFilter, pendingLoad[1], pendingLoad[2]),
+        pendingLoads
+      )
+      for (i, _, _, txnCache, key), txnCollection in zip(pendingLoads, loads):
+        if txnCache:
+          txnCache.save(key, txnCollection)
+        txnCollections[i] = txnCollection
+
+    for txnCollection in txnCollections:
+      repo.addBenchmark(txnCollection)
+
+  @staticmethod
+  def loadBenchmark(counterFilter, benchmark, loader):
+    """
+    Loads transactions of a benchmark from its sample files
+
+    :param counterFilter: Filter to exclude counters from loading
+    :param benchmark: Benchmark to be loaded
+    :param loader: Loader to build transactions out of the counters
+
+    """
+    collector = Collector(counterFilter)
+    collector.loadDataSource(benchmark.dataSource, loader)
+    return loader.getData()
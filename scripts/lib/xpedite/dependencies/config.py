@@ -9,6 +9,9 @@ Author: Manikandan Dhamodharan, Morgan Stanley
 
 import os
 
+# names of layouts for buckets of latency histograms (xpedite.types.BucketLayout)
+HISTOGRAM_BUCKET_LAYOUTS = ('Linear', 'Log', 'Hdr')
+
 class Config(object):
   """Xpedite config options"""
 
@@ -21,6 +24,18 @@ class Config(object):
       'https://raw.githubusercontent.com/andikleen/pmu-tools/93a31782131f907067339c883477075cfedb5451/'
     )
     self.sslContext = config.get('sslContext', buildDefaultContext())
+    self.workerCount = config.get('workerCount', 1)
+    # Experimental - relative error of quantile sketches backing delta series and latency histograms,
+    # None to retain all values. Sketches don't bound the memory of a profile session - transactions
+    # and timeline matrices still keep counters and durations of every transaction
+    self.deltaSeriesRelativeError = config.get('deltaSeriesRelativeError', None)
+    self.histogramBucketLayout = resolveBucketLayout(config.get('histogramBucketLayout', 'Linear'))
+    self.threadBreakdown = config.get('threadBreakdown', False)
+    self.txnCacheDir = config.get('txnCacheDir', os.path.join(self.logDir, 'txnCache'))
+    # Max size (in bytes) of a transaction cache, 0 to disable caching. Benchmarks are cached next to
+    # their directory, hence the limit applies to txnCacheDir and to each benchmark root separately
+    self.txnCacheSize = config.get('txnCacheSize', 2 * 1024 * 1024 * 1024)
+    self.benchmarkLimit = config.get('benchmarkLimit', None)
 
   def __repr__(self):
     cfgStr = 'Xpedite Configurations'
@@ -28,6 +43,21 @@ class Config(object):
       cfgStr += '\n\t{} - {}'.format(k, val)
     return cfgStr
 
+def resolveBucketLayout(layout):
+  """
+  Resolves name of a histogram bucket layout, ignoring case
+
+  :param layout: Name of the layout or a member of xpedite.types.BucketLayout
+
+  """
+  name = str(getattr(layout, 'name', layout))
+  for layoutName in HISTOGRAM_BUCKET_LAYOUTS:
+    if name.lower() == layoutName.lower():
+      return layoutName
+  raise Exception('invalid histogramBucketLayout "{}" in xpedite config - expected one of {}'.format(
+    layout, ', '.join(HISTOGRAM_BUCKET_LAYOUTS)
+  ))
+
 def buildDefaultContext():
   """ Build default SSL context """
   import ssl
@@ -9,6 +9,7 @@ This module implements the following commands, for use in jupyter shell
   3. stat - Generates statistics for a collection of transaction with the given route
   4. filter - filters transactions matching the given criteria
   5. diff - Compares statistics for a pair or a group of transactions
+  6. tail - Attributes tail latency of a collection of transactions to segments of their route
 
 Author: Manikandan Dhamodharan, Morgan Stanley
 """
@@ -98,6 +99,21 @@ def stat(routePoints=None, profiles=None):
     stats = StatsBuilder().buildStatsTable(profile.category, profile.current, profile.benchmarks)
     display(HTML(str(stats)))
 
+def tail(routePoints=None, profiles=None, percentiles=(99, 99.9)):
+  """
+  Attributes tail latency for a collection of conflated timelines, to segments of the route
+
+  :param routePoints: Indices of the conflated route (Default value = None)
+  :param profiles: Profiles with data for building stats (Default value = None)
+  :param percentiles: Percentiles of total latency, marking the beginning of tails (Default value = (99, 99.9))
+
+  """
+  from xpedite.report.tail import TailReportBuilder
+  profile = conflate(profiles, routePoints)
+  if profile:
+    tailReport = TailReportBuilder().buildTailReport(profile.category, profile.current, percentiles)
+    display(HTML(tailReport))
+
 def diffTxn(lhs, rhs, profiles):
   """
   Compares duration/pmc values for a pair of transactions
@@ -146,6 +162,7 @@ def diffTxns(lhs, rhs, profiles):
 
   """
   from xpedite.analytics.timelineFilter   import locateTimeline
+  from xpedite.analytics.timelineQuery    import txnId
   from xpedite.analytics.conflator        import Conflator
   from xpedite.report.stats               import StatsBuilder
 
@@ -165,8 +182,8 @@ def diffTxns(lhs, rhs, profiles):
     )))
     return
 
-  lhsProfiles = filter(lambda txn: txn.txnId in lhs)
-  rhsProfiles = filter(lambda txn: txn.txnId in rhs)
+  lhsProfiles = filter(txnId().isin(lhs))
+  rhsProfiles = filter(txnId().isin(rhs))
 
   for i, profile in enumerate(lhsProfiles.profiles):
     category = 'Route #{}'.format(i)
@@ -284,6 +301,15 @@ class FilteredProfiles(object):
     """
     return stat(routePoints, self.profiles)
 
+  def tail(self, routePoints=None, percentiles=(99, 99.9)):
+    """
+    Attributes tail latency for a collection of conflated timelines, to segments of the route
+
+    :param routePoints: Indices of the conflated route (Default value = None)
+    :param percentiles: Percentiles of total latency, marking the beginning of tails (Default value = (99, 99.9))
+    """
+    return tail(routePoints, self.profiles, percentiles)
+
   def txns(self, routePoints=None):
     """
     Conflates timelines across profiles with the given route points
@@ -300,6 +326,9 @@ def filter(predicate): #pylint: disable=redefined-builtin
   """
   Filters timelines across profiles using the given predicate
 
+  Declarative predicates, like duration('RxBegin', 'RxEnd') > 10, are evaluated for all the timelines
+  in a profile at once, other callables are invoked for each of the timelines
+
   :param predicate: predicate to be filter by
 
   """
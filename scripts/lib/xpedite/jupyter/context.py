@@ -55,6 +55,8 @@ class Context(object):
     try:
       self._profiles = self.loadProfiles()
       self.txn = Txn(self._profiles.pmcNames) if self._profiles else None
+      if self._profiles:
+        self._profiles.buildTxnIndex()
     except Exception:
       self.errMsg = traceback.format_exc()
     finally:
@@ -76,6 +76,7 @@ class TopdownMetrics(object):
   def __init__(self):
     self.nodes = []
     self.metrics = []
+    self._evaluators = {}
 
   def add(self, topdown, obj, condition=lambda n: True):
     """Adds a node or metric to this collection"""
@@ -129,6 +130,35 @@ class TopdownMetrics(object):
       topdownValues.append(metric.computeValue(counterMap))
     return topdownValues
 
+  def computeMatrix(self, eventsMap, pmcs):
+    """
+    Computes values of topdown nodes and metrices in this collection, for each row of a pmc matrix
+
+    Nodes and metrices are compiled once for each layout of events, to evaluate all the rows in one pass
+
+    :param eventsMap: Map of pmu event names to columns in the pmc matrix
+    :param pmcs: Matrix (rows x events) of pmc values
+
+    """
+    from xpedite.pmu.vectorizer import TopdownEvaluator
+    key = (
+      tuple(sorted(eventsMap.items())), tuple(id(node) for node in self.nodes),
+      tuple(id(metric) for metric in self.metrics)
+    )
+    evaluator = self._evaluators.get(key)
+    if evaluator is None:
+      evaluator = self._evaluators[key] = TopdownEvaluator(self, eventsMap)
+    return evaluator.evaluate(pmcs)
+
+  def __getstate__(self):
+    state = dict(self.__dict__)
+    state.pop('_evaluators', None)
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self._evaluators = {}
+
   def __eq__(self, other):
     if other:
       return (
@@ -0,0 +1,496 @@
+"""
+Compiler to evaluate topdown hierarchy for matrices of pmc values
+
+Values of topdown nodes and metrics are computed by python code, published for each of the
+cpu micro architectures (ratios modules). The code is written to compute values for one sample
+of pmc values at a time.
+
+This module compiles a rewritten copy of a ratios module, replacing operators and builtins,
+that can't operate on numpy arrays (boolean operators, conditional expressions, min and max),
+with element wise equivalents. The compiled code computes values and thresholds (breached)
+of a node, for all the rows of a pmc matrix, in one pass.
+
+Division by zero doesn't raise for numpy arrays. Rows with a zero divisor are recomputed
+one row at a time, to retain the error handling of the ratios modules.
+"""
+
+import ast
+import sys
+import copy
+import inspect
+import logging
+import operator
+import numpy
+
+LOGGER = logging.getLogger(__name__)
+
+class VectorOps(object):
+  """Element wise operators, for operands that are either scalars or numpy arrays"""
+
+  def __init__(self):
+    self.zeroDivisions = False
+
+  def flagZeroDivision(self, mask):
+    """Flags rows with a zero divisor"""
+    self.zeroDivisions = numpy.logical_or(self.zeroDivisions, mask)
+
+  def divide(self, operation, lhs, rhs):
+    """
+    Divides the operands, flagging rows with a zero divisor
+
+    Scalar operands are divided as is, to raise ZeroDivisionError for the ratios modules to handle
+
+    :param operation: Operator for the division (true division, floor division or modulo)
+    :param lhs: Dividend
+    :param rhs: Divisor
+
+    """
+    if isinstance(rhs, numpy.ndarray):
+      self.flagZeroDivision(rhs == 0)
+    elif isinstance(lhs, numpy.ndarray):
+      if rhs == 0:
+        self.flagZeroDivision(True)
+    return operation(lhs, rhs)
+
+  def trueDivide(self, lhs, rhs):
+    """Element wise equivalent of lhs / rhs"""
+    return self.divide(operator.truediv, lhs, rhs)
+
+  def floorDivide(self, lhs, rhs):
+    """Element wise equivalent of lhs // rhs"""
+    return self.divide(operator.floordiv, lhs, rhs)
+
+  def modulo(self, lhs, rhs):
+    """Element wise equivalent of lhs % rhs"""
+    return self.divide(operator.mod, lhs, rhs)
+
+  @staticmethod
+  def logicalAnd(*thunks):
+    """Element wise equivalent of 'and' for lazily evaluated operands"""
+    value = thunks[0]()
+    for thunk in thunks[1:]:
+      if isinstance(value, numpy.ndarray):
+        value = numpy.where(value.astype(bool), thunk(), value)
+      elif not value:
+        return value
+      else:
+        value = thunk()
+    return value
+
+  @staticmethod
+  def logicalOr(*thunks):
+    """Element wise equivalent of 'or' for lazily evaluated operands"""
+    value = thunks[0]()
+    for thunk in thunks[1:]:
+      if isinstance(value, numpy.ndarray):
+        value = numpy.where(value.astype(bool), value, thunk())
+      elif value:
+        return value
+      else:
+        value = thunk()
+    return value
+
+  @staticmethod
+  def logicalNot(value):
+    """Element wise equivalent of 'not'"""
+    if isinstance(value, numpy.ndarray):
+      return numpy.logical_not(value)
+    return not value
+
+  @staticmethod
+  def conditional(test, body, orelse):
+    """Element wise equivalent of conditional expressions (body if test else orelse)"""
+    if isinstance(test, numpy.ndarray):
+      return numpy.where(test.astype(bool), body(), orelse())
+    return body() if test else orelse()
+
+  @staticmethod
+  def minimum(*values, **kwargs):
+    """Element wise equivalent of min, retaining the first of equal or unordered values"""
+    if kwargs or len(values) < 2 or not any(isinstance(value, numpy.ndarray) for value in values):
+      return min(*values, **kwargs)
+    result = values[0]
+    for value in values[1:]:
+      result = numpy.where(value < result, value, result)
+    return result
+
+  @staticmethod
+  def maximum(*values, **kwargs):
+    """Element wise equivalent of max, retaining the first of equal or unordered values"""
+    if kwargs or len(values) < 2 or not any(isinstance(value, numpy.ndarray) for value in values):
+      return max(*values, **kwargs)
+    result = values[0]
+    for value in values[1:]:
+      result = numpy.where(value > result, value, result)
+    return result
+
+  def bindings(self):
+    """Returns a map of names used by the rewritten code, to the operators"""
+    return {
+      '_xpvTrueDivide': self.trueDivide,
+      '_xpvFloorDivide': self.floorDivide,
+      '_xpvModulo': self.modulo,
+      '_xpvAnd': self.logicalAnd,
+      '_xpvOr': self.logicalOr,
+      '_xpvNot': self.logicalNot,
+      '_xpvIf': self.conditional,
+      '_xpvMin': self.minimum,
+      '_xpvMax': self.maximum,
+    }
+
+class VectorTransformer(ast.NodeTransformer):
+  """Rewrites syntax tree of a ratios module, to use element wise operators"""
+
+  DIVISIONS = {ast.Div: '_xpvTrueDivide', ast.FloorDiv: '_xpvFloorDivide', ast.Mod: '_xpvModulo'}
+  BUILTINS = {'min': '_xpvMin', 'max': '_xpvMax'}
+
+  @staticmethod
+  def call(name, args):
+    """Builds a call expression for the given function and arguments"""
+    node = ast.parse('{}()'.format(name), mode='eval').body
+    node.args = args
+    return node
+
+  @staticmethod
+  def thunk(expression):
+    """Builds a lambda expression, to lazily evaluate the given expression"""
+    node = ast.parse('lambda: None', mode='eval').body
+    node.body = expression
+    return node
+
+  def visit_BinOp(self, node): # pylint: disable=invalid-name
+    """Rewrites division operators"""
+    self.generic_visit(node)
+    name = self.DIVISIONS.get(type(node.op))
+    if name:
+      return ast.copy_location(self.call(name, [node.left, node.right]), node)
+    return node
+
+  def visit_BoolOp(self, node): # pylint: disable=invalid-name
+    """Rewrites 'and' and 'or' operators"""
+    self.generic_visit(node)
+    name = '_xpvAnd' if isinstance(node.op, ast.And) else '_xpvOr'
+    return ast.copy_location(self.call(name, [self.thunk(value) for value in node.values]), node)
+
+  def visit_UnaryOp(self, node): # pylint: disable=invalid-name
+    """Rewrites 'not' operator"""
+    self.generic_visit(node)
+    if isinstance(node.op, ast.Not):
+      return ast.copy_location(self.call('_xpvNot', [node.operand]), node)
+    return node
+
+  def visit_IfExp(self, node): # pylint: disable=invalid-name
+    """Rewrites conditional expressions"""
+    self.generic_visit(node)
+    args = [node.test, self.thunk(node.body), self.thunk(node.orelse)]
+    return ast.copy_location(self.call('_xpvIf', args), node)
+
+  def visit_Compare(self, node): # pylint: disable=invalid-name
+    """Rewrites chained comparisons (a < b < c) to a conjunction of comparisons"""
+    self.generic_visit(node)
+    if len(node.ops) < 2:
+      return node
+    operands = [node.left] + node.comparators
+    comparisons = [
+      self.thunk(ast.Compare(left=copy.deepcopy(operands[i]), ops=[op], comparators=[copy.deepcopy(operands[i + 1])]))
+      for i, op in enumerate(node.ops)
+    ]
+    return ast.copy_location(self.call('_xpvAnd', comparisons), node)
+
+  def visit_Call(self, node): # pylint: disable=invalid-name
+    """Rewrites min and max builtins"""
+    self.generic_visit(node)
+    if isinstance(node.func, ast.Name) and node.func.id in self.BUILTINS:
+      node.func = ast.copy_location(ast.Name(id=self.BUILTINS[node.func.id], ctx=ast.Load()), node.func)
+    return node
+
+class CompiledRatios(object):
+  """Namespace of a ratios module, compiled to use element wise operators"""
+
+  def __init__(self, module, namespace, ops):
+    self.module = module
+    self.namespace = namespace
+    self.ops = ops
+
+  def lookupCompute(self, obj):
+    """Returns the compiled compute function for a node or metric of the ratios module"""
+    cls = self.namespace.get(type(obj).__name__)
+    return vars(cls).get('compute') if isinstance(cls, type) else None
+
+class RatiosCompiler(object):
+  """Compiles and caches ratios modules, to use element wise operators"""
+
+  cache = {}
+
+  @staticmethod
+  def compileModule(module):
+    """
+    Returns a compiled copy of the given ratios module
+
+    Returns None, if source of the module is not available
+
+    :param module: Ratios module to compile
+
+    """
+    compiled = RatiosCompiler.cache.get(module.__name__)
+    if compiled and compiled.module is module:
+      return compiled
+    try:
+      source = inspect.getsource(module)
+      tree = VectorTransformer().visit(ast.parse(source))
+      ast.fix_missing_locations(tree)
+      code = compile(tree, getattr(module, '__file__', module.__name__), 'exec')
+    except (IOError, OSError, TypeError, SyntaxError):
+      LOGGER.debug('failed to compile ratios module %s to evaluate matrices of pmc values', module.__name__)
+      return None
+    ops = VectorOps()
+    namespace = {'__name__': module.__name__, '__file__': getattr(module, '__file__', None)}
+    namespace.update(ops.bindings())
+    exec(code, namespace) # pylint: disable=exec-used
+    for name, value in vars(module).items():
+      if isinstance(value, (bool, int, float)) and name in namespace:
+        namespace[name] = value
+    compiled = CompiledRatios(module, namespace, ops)
+    RatiosCompiler.cache[module.__name__] = compiled
+    return compiled
+
+  @staticmethod
+  def lookupCompute(obj):
+    """Returns the compiled compute function for a node or metric of topdown hierarchy"""
+    module = sys.modules.get(type(obj).__module__)
+    compiled = RatiosCompiler.compileModule(module) if module else None
+    if compiled:
+      return compiled.lookupCompute(obj), compiled.ops
+    return None, None
+
+class NodeState(object):
+  """
+  Values and thresholds of a node in topdown hierarchy, for rows of a pmc matrix
+
+  Attributes other than values and thresholds are resolved from the node.
+  """
+
+  def __init__(self, node, parent):
+    self.__dict__['node'] = node
+    if parent is not None:
+      self.__dict__['parent'] = parent
+    self.__dict__['rowValues'] = None
+    self.__dict__['rowThresholds'] = None
+
+  def __getattr__(self, name):
+    return getattr(self.__dict__['node'], name)
+
+  def __setattr__(self, name, value):
+    self.__dict__[name] = value
+
+  def settle(self, rowValues, rowThresholds):
+    """Stores arrays of values and thresholds of the node, for each of the rows"""
+    self.__dict__.update(rowValues=rowValues, rowThresholds=rowThresholds, val=rowValues, thresh=rowThresholds)
+
+  def row(self, index):
+    """Returns state of the node for the row at the given index"""
+    parent = self.__dict__.get('parent')
+    state = NodeState(self.node, parent.row(index) if isinstance(parent, NodeState) else parent)
+    if self.rowValues is not None:
+      state.__dict__.update(val=self.rowValues[index].item(), thresh=self.rowThresholds[index].item())
+    return state
+
+def expandRows(value, rowCount, dtype):
+  """Returns a (read only) array of values for each of the rows, broadcasting scalar values"""
+  return numpy.broadcast_to(numpy.asarray(value, dtype=dtype), (rowCount,))
+
+class TopdownValueMatrix(object):
+  """Values of topdown nodes and metrics, for each row of a pmc matrix"""
+
+  def __init__(self, names, values, breached):
+    """
+    Constructs a matrix of topdown values
+
+    Values and thresholds are stored as (nodes x rows) matrices of float64 and bool
+
+    :param names: Names of the topdown nodes and metrics
+    :param values: Values (a sequence of rows per node or metric)
+    :param breached: Thresholds (a sequence of rows per node or metric)
+
+    """
+    shape = (len(names), -1) if names else (0, 0)
+    self.names = names
+    self.values = numpy.asarray(values, dtype=numpy.float64).reshape(shape)
+    self.breached = numpy.asarray(breached, dtype=bool).reshape(shape)
+
+  def column(self, index):
+    """Returns a numpy array with values of the node or metric at the given index"""
+    return self.values[index]
+
+  def row(self, index):
+    """Returns a list of topdown values for the row at the given index"""
+    from xpedite.pmu.hierarchy import TopdownValue
+    return [
+      TopdownValue(name, value, breached)
+      for name, value, breached in zip(self.names, self.values[:, index].tolist(), self.breached[:, index].tolist())
+    ]
+
+  def take(self, rows):
+    """
+    Builds a new matrix, with topdown values of the given rows
+
+    :param rows: Indices of rows to be taken
+
+    """
+    rows = numpy.asarray(rows, dtype=numpy.intp)
+    return TopdownValueMatrix(self.names, self.values[:, rows], self.breached[:, rows])
+
+  def concatenate(self, others):
+    """
+    Builds a new matrix, with rows of this matrix followed by rows of other matrices
+
+    :param others: Matrices with values of the same topdown nodes and metrics
+
+    """
+    matrices = [self] + list(others)
+    return TopdownValueMatrix(
+      self.names, numpy.concatenate([matrix.values for matrix in matrices], axis=1),
+      numpy.concatenate([matrix.breached for matrix in matrices], axis=1)
+    )
+
+  def __len__(self):
+    return self.values.shape[1]
+
+class TopdownEvaluator(object):
+  """Evaluates topdown nodes and metrics, for matrices of pmc values with a given layout of events"""
+
+  def __init__(self, topdownMetrics, eventsMap):
+    """
+    Compiles topdown nodes and metrics for the given layout of events
+
+    :param topdownMetrics: Topdown nodes and metrics to be evaluated
+    :param eventsMap: Map of pmu event names to columns in matrices of pmc values
+
+    """
+    self.topdownMetrics = topdownMetrics
+    self.eventsMap = eventsMap
+    self.targets = []
+    for node in topdownMetrics.nodes:
+      for child in (node.children if node.children else [node]):
+        self.targets.append((child, True))
+    for metric in topdownMetrics.metrics:
+      self.targets.append((metric, False))
+    self.names = [target.name for target, _ in self.targets]
+    self.computes = self.compileTargets()
+
+  def compileTargets(self):
+    """
+    Returns compiled compute functions for each of the targets
+
+    Returns None, if any of the targets can't be compiled or if a node is evaluated
+    ahead of its parent, since thresholds of nodes depend on the state of their parents
+    """
+    positions = {}
+    for i, (target, _) in enumerate(self.targets):
+      positions.setdefault(id(target), i)
+    computes = []
+    for i, (target, _) in enumerate(self.targets):
+      parent = getattr(target, 'parent', None)
+      if positions.get(id(parent), -1) > i:
+        return None
+      compute, ops = RatiosCompiler.lookupCompute(target)
+      if compute is None:
+        return None
+      computes.append((compute, ops))
+    return computes
+
+  def buildEventRetriever(self, pmcs):
+    """Returns a delegate to locate columns of pmu events in a matrix of pmc values"""
+    columns = {}
+    def delegate(event, level):
+      """
+      Returns values of a pmu event for all rows of the matrix
+
+      :param event: PMC event being looked up
+      :param level: Level of node in the topdown hierarchy tree
+
+      """
+      if callable(event):
+        return event(delegate, level)
+      column = columns.get(event)
+      if column is None:
+        column = columns[event] = pmcs[:, self.eventsMap[event]]
+      return column
+    return delegate
+
+  def buildRowRetriever(self, pmcs, index):
+    """Returns a delegate to locate values of pmu events in a row of a matrix of pmc values"""
+    def delegate(event, level):
+      """
+      Returns value of a pmu event for a row of the matrix
+
+      :param event: PMC event being looked up
+      :param level: Level of node in the topdown hierarchy tree
+
+      """
+      if callable(event):
+        return event(delegate, level)
+      return float(pmcs[index, self.eventsMap[event]])
+    return delegate
+
+  def computeRow(self, state, compute, pmcs, index):
+    """Computes value and threshold of a node for the row at the given index"""
+    rowState = state.row(index)
+    compute(rowState, self.buildRowRetriever(pmcs, index))
+    return rowState.val, rowState.thresh
+
+  def computeTarget(self, state, compute, ops, pmcs):
+    """Computes values and thresholds of a node for all rows of the pmc matrix"""
+    rowCount = len(pmcs)
+    ops.zeroDivisions = False
+    try:
+      with numpy.errstate(all='ignore'):
+        compute(state, self.buildEventRetriever(pmcs))
+      rowValues = expandRows(state.val, rowCount, numpy.float64)
+      rowThresholds = expandRows(state.thresh, rowCount, bool)
+      errorRows = numpy.flatnonzero(numpy.broadcast_to(ops.zeroDivisions, (rowCount,))).tolist()
+      if errorRows:
+        rowValues, rowThresholds = rowValues.copy(), rowThresholds.copy()
+    except Exception: # pylint: disable=broad-except
+      rowValues, rowThresholds = numpy.zeros(rowCount), numpy.zeros(rowCount, dtype=bool)
+      errorRows = range(rowCount)
+    for index in errorRows:
+      rowValues[index], rowThresholds[index] = self.computeRow(state, compute, pmcs, index)
+    state.settle(rowValues, rowThresholds)
+
+  def evaluate(self, pmcs):
+    """
+    Computes values of topdown nodes and metrics, for each row of the given pmc values
+
+    :param pmcs: Matrix (rows x events) of pmc values
+
+    """
+    pmcs = numpy.asarray(pmcs, dtype=numpy.float64).reshape(len(pmcs), -1) if len(pmcs) else numpy.zeros((0, 0))
+    if self.computes is None or len(pmcs) == 0:
+      return self.evaluateRows(pmcs)
+    states = {}
+    values, breached = [], []
+    for (target, isNode), (compute, ops) in zip(self.targets, self.computes):
+      parent = getattr(target, 'parent', None)
+      state = NodeState(target, states.get(id(parent), parent))
+      self.computeTarget(state, compute, ops, pmcs)
+      states[id(target)] = state
+      if isNode:
+        values.append(state.rowValues * 100)
+        breached.append(state.rowThresholds)
+      else:
+        values.append(state.rowValues)
+        breached.append(numpy.zeros(len(pmcs), dtype=bool))
+    if len(pmcs):
+      for target, _ in self.targets:
+        state = states[id(target)]
+        target.val, target.thresh = state.rowValues[-1].item(), state.rowThresholds[-1].item()
+    return TopdownValueMatrix(self.names, values, breached)
+
+  def evaluateRows(self, pmcs):
+    """Computes values of topdown nodes and metrics, one row at a time"""
+    from xpedite.analytics.timeline import CounterMap
+    rows = [self.topdownMetrics.compute(CounterMap(self.eventsMap, row)) for row in pmcs]
+    values = [[row[i].value for row in rows] for i in range(len(self.names))]
+    breached = [[row[i].breached for row in rows] for i in range(len(self.names))]
+    return TopdownValueMatrix(self.names, values, breached)
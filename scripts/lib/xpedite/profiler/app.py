@@ -13,7 +13,7 @@ import time
 import logging
 from xpedite.profiler.environment import Environment, RemoteEnvironment
 from xpedite.transport.net        import isIpLocal
-from xpedite.types.dataSource     import CsvDataSourceFactory
+from xpedite.types.dataSource     import gatherDataSource
 
 LOGGER = logging.getLogger(__name__)
 
@@ -187,7 +187,7 @@ class XpediteDormantApp(XpediteApp):
 
   def __init__(self, name, ip, appInfoPath, runId=None, dataSourcePath=None, workspace=None):
     """Constructs an instance of XpediteDormantApp"""
-    dataSource = CsvDataSourceFactory().gather(dataSourcePath) if dataSourcePath else None
+    dataSource = gatherDataSource(dataSourcePath) if dataSourcePath else None
     if dataSource:
       LOGGER.warning('Data source detected. overriding appinfo to %s', dataSource.appInfoPath)
       appInfoPath = dataSource.appInfoPath
@@ -8,12 +8,14 @@ The module loads the follwing details about a target xpedite process
   3. binary path - path of the target binary
   4. probes      - List of  instrument xpedite probes
 
+Probes are indexed both by the hex formatted and the integer address of their recorder return sites.
+
 Author: Manikandan Dhamodharan, Morgan Stanley
 """
 
 import os
 import logging
-from xpedite.util.probeFactory import ProbeFactory
+from xpedite.util.probeFactory import ProbeFactory, ReturnSiteIndex
 
 LOGGER = logging.getLogger(__name__)
 
@@ -41,6 +43,7 @@ class AppInfo(object):
     self.executableName = None
     self.tscHz = None
     self.probes = None
+    self.returnSiteIndex = None
     self.workspace = workspace
 
   def load(self):
@@ -96,6 +99,7 @@ class AppInfo(object):
         )
 
       self.probes = ProbeFactory(self.workspace).buildFromRecords(records[self.MIN_RECORD_COUNT:])
+      self.returnSiteIndex = ReturnSiteIndex(self.probes)
     else:
       self.raiseError('failed to load appinfo from file {} | missing mandatory records'.format(self.path))
 
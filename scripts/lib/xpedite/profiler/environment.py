@@ -176,6 +176,11 @@ class Environment(object):
     """List of probes instrumented in the target process"""
     return self.appInfo.probes
 
+  @property
+  def returnSiteIndex(self):
+    """Index to lookup probes by integer address of recorder return sites"""
+    return self.appInfo.returnSiteIndex
+
   def gatherFiles(self, pattern):
     """
     Gathers files matching the given pattern
@@ -73,6 +73,7 @@ class Profiles(object):
     self.name = name
     self.transactionRepo = transactionRepo
     self.profiles = []
+    self._txnIndex = None
 
   def addProfile(self, profile):
     """
@@ -82,6 +83,42 @@ class Profiles(object):
 
     """
     self.profiles.append(profile)
+    self._txnIndex = None
+
+  def buildTxnIndex(self):
+    """
+    Builds an index of transaction id to (profile, index) of timelines in the current run
+
+    Timelines are looked up in the order of profiles, hence the first timeline for a transaction id wins
+
+    """
+    from xpedite.analytics.timelineMatrix import TimelineMatrix
+    txnIndex = {}
+    for profile in self.profiles:
+      timelineCollection = profile.current.timelineCollection
+      if isinstance(timelineCollection, TimelineMatrix):
+        txnIds = (txn.txnId for txn in timelineCollection.txns)
+      else:
+        txnIds = (timeline.txnId for timeline in timelineCollection)
+      for index, txnId in enumerate(txnIds):
+        txnIndex.setdefault(txnId, (profile, index))
+    self._txnIndex = txnIndex
+    return txnIndex
+
+  def locateTimeline(self, txnId):
+    """
+    Looks up timeline for a transaction in the current run
+
+    :param txnId: Id of the transaction to lookup
+    :returns: The timeline for the given transaction id or None
+
+    """
+    txnIndex = self._txnIndex if self._txnIndex is not None else self.buildTxnIndex()
+    location = txnIndex.get(txnId)
+    if location:
+      profile, index = location
+      return profile.current.timelineCollection[index]
+    return None
 
   def makeBenchmark(self, path):
     """
@@ -130,5 +167,14 @@ class Profiles(object):
       profilesStr += '\n{}'.format(profile)
     return profilesStr
 
+  def __getstate__(self):
+    state = dict(self.__dict__)
+    state.pop('_txnIndex', None)
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self._txnIndex = None
+
   def __eq__(self, other):
-    return self.__dict__ == other.__dict__
+    return (self.name, self.transactionRepo, self.profiles) == (other.name, other.transactionRepo, other.profiles)
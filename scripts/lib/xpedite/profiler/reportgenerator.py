@@ -3,21 +3,24 @@ Report generator
 
 This module provides the following report generation features
   1. Load and categorize transactions
-  2. Build latency distribution histograms for each category of transactions
+  2. Build latency distribution histograms for each category of transactions (optionally broken down by thread)
   3. Build html report with (stats, histograms, transaction list) for each category, route combination
   4. Generate environment reports
 
 Author: Manikandan Dhamodharan, Morgan Stanley
 """
-import numpy
 import logging
+import numpy
 import xpedite.report
 from xpedite.report.histogram        import (
                                        formatLegend, formatBuckets, buildHistograms,
-                                       buildBuckets, buildDistribution, Histogram
+                                       buildBuckets, buildSketchBuckets, buildDistribution, Histogram
                                      )
 from xpedite.util                    import timeAction
+from xpedite.types                   import BucketLayout
 from xpedite.analytics               import Analytics, CURRENT_RUN
+from xpedite.analytics.timeline      import DeltaSeries
+from xpedite.dependencies            import CONFIG
 
 LOGGER = logging.getLogger(__name__)
 
@@ -53,10 +56,20 @@ class ReportGenerator(object):
         'instead found {}'.format(txnCollections[0].name)
       )
 
-    elapsedTimeBundles = self.analytics.buildElapsedTimeBundles(txnCollections, classifier)
+    threadBundles = {}
+    relativeError = CONFIG.deltaSeriesRelativeError
+    elapsedTimeBundles = self.analytics.buildElapsedTimeBundles(
+      txnCollections, classifier, threadBundles if CONFIG.threadBreakdown else None, relativeError
+    )
+    layout = CONFIG.histogramBucketLayout
+    layout = layout if isinstance(layout, BucketLayout) else BucketLayout[layout]
 
     for category, elaspsedTimeBundle in elapsedTimeBundles.items():
-      buckets = buildBuckets(elaspsedTimeBundle[0], 35)
+      if relativeError:
+        buckets = buildSketchBuckets(elaspsedTimeBundle[0].sketch, 35, layout)
+      else:
+        elaspsedTimeBundle = [numpy.asarray(elapsedTimeList, dtype=numpy.float64) for elapsedTimeList in elaspsedTimeBundle]
+        buckets = buildBuckets(elaspsedTimeBundle[0], 35, layout)
       if not buckets:
         LOGGER.debug('category %s has not enough data points to generate histogram', category)
         continue
@@ -66,16 +79,26 @@ class ReportGenerator(object):
       yaxis = []
       conflatedCounts = []
       LOGGER.debug('Bucket values:')
-      for i, elapsedTimeList in enumerate(elaspsedTimeBundle):
+      titles = [txnCollection.name for txnCollection in txnCollections[:len(elaspsedTimeBundle)]]
+      threadMap = threadBundles.get(category, {})
+      if len(threadMap) > 1:
+        titles += ['{} - thread {}'.format(txnCollections[0].name, threadId) for threadId in threadMap]
+        elaspsedTimeBundle = elaspsedTimeBundle + list(threadMap.values())
+      for title, elapsedTimeList in zip(titles, elaspsedTimeBundle):
+        if relativeError:
+          elapsedTimeSeries = elapsedTimeList
+        else:
+          elapsedTimeSeries = DeltaSeries(category, category)
+          elapsedTimeSeries.extend(elapsedTimeList)
         bucketValues, conflatedCountersCount = timeAction('building counter distribution',
-          lambda bkts=buckets, etl=elapsedTimeList: buildDistribution(bkts, etl)
+          lambda bkts=buckets, etl=elapsedTimeList, ets=elapsedTimeSeries: ets.sketch.buildDistribution(bkts)
+            if ets.isSketched() else buildDistribution(bkts, etl)
         )
         conflatedCounts.append(conflatedCountersCount)
         LOGGER.debug('%s', bucketValues)
-        title = txnCollections[i].name
+        stats = elapsedTimeSeries.describe([95, 99])
         legend = formatLegend(
-          title, min(elapsedTimeList), max(elapsedTimeList), numpy.mean(elapsedTimeList), numpy.median(elapsedTimeList),
-          numpy.percentile(elapsedTimeList, 95), numpy.percentile(elapsedTimeList, 99)
+          title, stats.min, stats.max, stats.mean, stats.median, stats.percentiles[95], stats.percentiles[99]
         )
         yaxis.append((legend, bucketValues))
 
@@ -5,10 +5,19 @@ This module provides logic to build buckets and distributions for a
 collection of values. The bucket values and counts are plotted in x and y
 axis respectively.
 
+Buckets are laid out in one of the following layouts
+  1. Linear - equal width buckets, spanning half to twice the mean of values below the 95th percentile
+  2. Log - logarithmically scaled buckets, spanning the minimum to the maximum value
+  3. Hdr - buckets with boundaries at powers of two, each subdivided into equal width sub buckets
+
+Buckets for values summarized by a quantile sketch, are laid out with bounds estimated from the sketch.
+
 Author: Manikandan Dhamodharan, Morgan Stanley
 """
 
-import bisect
+import math
+import numpy
+from xpedite.types import BucketLayout
 
 class Histogram(object):
   """Stores data and attributes needed for creating histograms"""
@@ -101,50 +110,156 @@ def buildHistograms(ticks, series, stack=False):
     )
   return options, data
 
-def buildBuckets(series, bucketCount):
+def buildLinearBuckets(values, bucketCount):
   """
-  Builds buckets for given elapsed tsc distribution bundle
+  Builds equal width buckets, spanning half to twice the mean of values below the 95th percentile
 
-  :param series: series of values
+  :param values: array of values
   :param bucketCount: number of buckets
 
   """
-  series = sorted(series)
-  confidence = series[0:int(.95 * len(series))]
-  total = sum(confidence)
-  count = len(confidence)
+  count = int(.95 * len(values))
   if count <= 0:
     return None
-  mean = total / count
+  confidence = numpy.partition(values, count - 1)[:count]
+  return spanLinearBuckets(confidence.sum() / count, bucketCount)
+
+def spanLinearBuckets(mean, bucketCount):
+  """
+  Builds equal width buckets, spanning half to twice the given mean
+
+  :param mean: mean of values below the 95th percentile
+  :param bucketCount: number of buckets
+
+  """
   lowerBound = mean / 2
   upperBound = mean * 2
-  bucketSize = (upperBound - lowerBound) / bucketCount
-  buckets = []
-  if bucketSize != 0:
-    bucket = lowerBound
-    while bucket <= upperBound:
-      buckets.append(bucket)
-      bucket += bucketSize
-  return buckets
+  if upperBound == lowerBound:
+    return []
+  return numpy.linspace(lowerBound, upperBound, bucketCount + 1).tolist()
+
+def buildLogBuckets(values, bucketCount):
+  """
+  Builds logarithmically scaled buckets, spanning the minimum to the maximum of positive values
+
+  :param values: array of values
+  :param bucketCount: number of buckets
+
+  """
+  values = values[values > 0]
+  if len(values) == 0:
+    return None
+  return spanLogBuckets(values.min(), values.max(), bucketCount)
+
+def spanLogBuckets(lowerBound, upperBound, bucketCount):
+  """
+  Builds logarithmically scaled buckets, spanning the given bounds
+
+  :param lowerBound: minimum of positive values
+  :param upperBound: maximum of positive values
+  :param bucketCount: number of buckets
+
+  """
+  if upperBound == lowerBound:
+    return []
+  return numpy.geomspace(lowerBound, upperBound, bucketCount + 1).tolist()
+
+def buildHdrBuckets(values, bucketCount):
+  """
+  Builds buckets with boundaries at powers of two, spanning the minimum to the maximum of positive values
+
+  Each power of two range is split to equal width sub buckets, with the number of sub buckets
+  chosen to build approximately bucketCount buckets in total
+
+  :param values: array of values
+  :param bucketCount: number of buckets
+
+  """
+  values = values[values > 0]
+  if len(values) == 0:
+    return None
+  return spanHdrBuckets(values.min(), values.max(), bucketCount)
+
+def spanHdrBuckets(lowerBound, upperBound, bucketCount):
+  """
+  Builds buckets with boundaries at powers of two, spanning the given bounds
+
+  :param lowerBound: minimum of positive values
+  :param upperBound: maximum of positive values
+  :param bucketCount: number of buckets
+
+  """
+  if upperBound == lowerBound:
+    return []
+  lowerExponent = int(math.floor(math.log(lowerBound, 2)))
+  upperExponent = max(int(math.ceil(math.log(upperBound, 2))), lowerExponent + 1)
+  exponents = numpy.arange(lowerExponent, upperExponent, dtype=numpy.float64)
+  subBucketCount = max(1, int(round(float(bucketCount) / len(exponents))))
+  subBuckets = 1 + numpy.arange(subBucketCount) / float(subBucketCount)
+  buckets = numpy.append((numpy.exp2(exponents)[:, numpy.newaxis] * subBuckets).reshape(-1), 2.0 ** upperExponent)
+  begin = numpy.searchsorted(buckets, lowerBound, side='left')
+  end = numpy.searchsorted(buckets, upperBound, side='left')
+  return buckets[begin:end + 1].tolist()
+
+def buildBuckets(series, bucketCount, layout=BucketLayout.Linear):
+  """
+  Builds buckets for given elapsed tsc distribution bundle
+
+  :param series: series of values
+  :param bucketCount: number of buckets
+  :param layout: layout of the buckets (Default value = BucketLayout.Linear)
+  :type layout: xpedite.types.BucketLayout
+
+  """
+  values = numpy.asarray(series, dtype=numpy.float64)
+  if layout == BucketLayout.Log:
+    return buildLogBuckets(values, bucketCount)
+  if layout == BucketLayout.Hdr:
+    return buildHdrBuckets(values, bucketCount)
+  return buildLinearBuckets(values, bucketCount)
+
+def buildSketchBuckets(sketch, bucketCount, layout=BucketLayout.Linear):
+  """
+  Builds buckets for values summarized by a quantile sketch
+
+  Bounds of the buckets are estimated from buckets of the sketch, within the relative error of the sketch
+
+  :param sketch: Quantile sketch of the values
+  :type sketch: xpedite.analytics.sketch.QuantileSketch
+  :param bucketCount: number of buckets
+  :param layout: layout of the buckets (Default value = BucketLayout.Linear)
+  :type layout: xpedite.types.BucketLayout
+
+  """
+  values, counts = sketch.getValueCounts()
+  if layout in (BucketLayout.Log, BucketLayout.Hdr):
+    values = values[values > 0]
+    if len(values) == 0:
+      return None
+    spanBuckets = spanLogBuckets if layout == BucketLayout.Log else spanHdrBuckets
+    return spanBuckets(values[0], values[-1], bucketCount)
+  count = int(.95 * counts.sum())
+  if count <= 0:
+    return None
+  confidenceCounts = numpy.minimum(counts, numpy.maximum(count - (numpy.cumsum(counts) - counts), 0))
+  return spanLinearBuckets((values * confidenceCounts).sum() / count, bucketCount)
 
 def buildDistribution(buckets, valueSeries):
   """
   Builds distribution for the given value series
 
+  A value is counted in the first bucket, with a boundary not less than the value.
+  Values exceeding the last boundary are conflated to the last bucket.
+
   :param buckets: buckets in the histogram
   :param valueSeries: series to build distribution from
 
   """
-  bucketValues = [0] * len(buckets)
-  conflatedCountersCount = 0
-  for value in valueSeries:
-    index = bisect.bisect_left(buckets, value)
-    if index < len(bucketValues):
-      bucketValues[index] += 1
-    else:
-      bucketValues[len(bucketValues) - 1] += 1
-      conflatedCountersCount += 1
-  return bucketValues, conflatedCountersCount
+  values = numpy.asarray(valueSeries, dtype=numpy.float64)
+  indices = numpy.searchsorted(numpy.asarray(buckets, dtype=numpy.float64), values, side='left')
+  conflatedCountersCount = int(numpy.count_nonzero(indices >= len(buckets)))
+  bucketValues = numpy.bincount(numpy.minimum(indices, len(buckets) - 1), minlength=len(buckets))
+  return bucketValues.tolist(), conflatedCountersCount
 
 def formatBuckets(buckets):
   """
@@ -3,8 +3,10 @@ Module to build a html summary with stats, timelines and flots
 
 This module creates a static html page with the following details
   1. Statistics tables for wall time and performance counters
-  2. Latency flots at both transaction and probe level granularities
-  3. Table of transactions sorted by result order
+  2. Statistics broken down by thread (when enabled with config option threadBreakdown)
+  3. Attribution of tail latency to segments of the route
+  4. Latency flots at both transaction and probe level granularities
+  5. Table of transactions sorted by result order
 
 For profiles using benchmarks, the stats and flots will include
 benchmark data side by side with current run.
@@ -24,6 +26,7 @@ from xpedite.report.markup  import (
 from xpedite.util           import makeUniqueId
 from xpedite.report.flot    import FlotBuilder
 from xpedite.report.stats   import StatsBuilder
+from xpedite.report.tail    import TailReportBuilder
 from xpedite.types          import ResultOrder
 
 LOGGER = logging.getLogger(__name__)
@@ -258,6 +261,22 @@ class ReportBuilder(object):
         begin = time.time()
     return tableContainer
 
+  @staticmethod
+  def buildThreadBreakdownReport(category, timelineStats):
+    """
+    Builds statistics for timelines broken down by thread, for profiles with transactions from many threads
+
+    :param category: Category of the transactions in this profile
+    :param timelineStats: Time line and duration series statistics
+
+    """
+    from xpedite.dependencies import CONFIG
+    if not CONFIG.threadBreakdown:
+      return ''
+    from xpedite.analytics import Analytics
+    breakdown = Analytics.buildThreadBreakdown(timelineStats, CONFIG.deltaSeriesRelativeError)
+    return StatsBuilder().buildBreakdownTable(category, breakdown) if len(breakdown) > 1 else ''
+
   def buildReport(self, timelineStats, benchmarkTlsMap, probes, category, resultOrder, threshold,
     logAbsoluteValues=False, logTimeline=False, logData=False):
     """
@@ -285,11 +304,15 @@ class ReportBuilder(object):
     flotBuilder = FlotBuilder()
     flotMarkup = flotBuilder.buildBenchmarkFlot(category, timelineStats, benchmarkTlsMap)
     statsReport = StatsBuilder().buildStatsTable(category, timelineStats, benchmarkTlsMap)
+    breakdownReport = self.buildThreadBreakdownReport(category, timelineStats)
+    tailReport = TailReportBuilder().buildTailReport(category, timelineStats)
 
     reportTitle = HTML().h3('{} Transaction Time lines'.format(category))
 
     return (HTML_BEGIN +
       statsReport +
+      breakdownReport +
+      tailReport +
       flotMarkup +
       str(reportTitle) +
       pmuScript +
@@ -96,13 +96,14 @@ class StatsBuilder(object):
       row.td('{0:,}'.format(i), klass=TD_KEY)
       row.td(deltaSeries.beginProbeName, klass=TD_KEY)
       row.td(deltaSeries.endProbeName, klass=TD_KEY)
-      row.td(DURATION_FORMAT.format(deltaSeries.getMin()))
-      row.td(DURATION_FORMAT.format(deltaSeries.getMax()))
-      row.td(DURATION_FORMAT.format(deltaSeries.getMedian()))
-      row.td(DURATION_FORMAT.format(deltaSeries.getMean()))
-      row.td(DURATION_FORMAT.format(deltaSeries.getPercentile(self.percentile1)))
-      row.td(DURATION_FORMAT.format(deltaSeries.getPercentile(self.percentile2)))
-      row.td(DURATION_FORMAT.format(deltaSeries.getStandardDeviation()))
+      stats = deltaSeries.describe([self.percentile1, self.percentile2])
+      row.td(DURATION_FORMAT.format(stats.min))
+      row.td(DURATION_FORMAT.format(stats.max))
+      row.td(DURATION_FORMAT.format(stats.median))
+      row.td(DURATION_FORMAT.format(stats.mean))
+      row.td(DURATION_FORMAT.format(stats.percentiles[self.percentile1]))
+      row.td(DURATION_FORMAT.format(stats.percentiles[self.percentile2]))
+      row.td(DURATION_FORMAT.format(stats.standardDeviation))
     return tableWrapper
 
   def buildDifferentialStatsTable(self, deltaSeriesCollection, refDsc, klass, style):
@@ -128,29 +129,18 @@ class StatsBuilder(object):
       row.td(deltaSeries.beginProbeName, klass=TD_KEY)
       row.td(deltaSeries.endProbeName, klass=TD_KEY)
 
-      delta = deltaSeries.getMin() - refDsc[i-1].getMin()
-      row.td(fmt.format(deltaSeries.getMin(), getDeltaMarkup(delta), delta), klass=getDeltaType(delta))
-
-      delta = deltaSeries.getMax() - refDsc[i-1].getMax()
-      row.td(fmt.format(deltaSeries.getMax(), getDeltaMarkup(delta), delta), klass=getDeltaType(delta))
-
-      delta = deltaSeries.getMedian() - refDsc[i-1].getMedian()
-      row.td(fmt.format(deltaSeries.getMedian(), getDeltaMarkup(delta), delta), klass=getDeltaType(delta))
-
-      delta = deltaSeries.getMean() - refDsc[i-1].getMean()
-      row.td(fmt.format(deltaSeries.getMean(), getDeltaMarkup(delta), delta), klass=getDeltaType(delta))
-
-      percentile1 = deltaSeries.getPercentile(self.percentile1)
-      delta = percentile1 - refDsc[i-1].getPercentile(self.percentile1)
-      row.td(fmt.format(percentile1, getDeltaMarkup(delta), delta), klass=getDeltaType(delta))
-
-      percentile2 = deltaSeries.getPercentile(self.percentile2)
-      delta = percentile2 - refDsc[i-1].getPercentile(self.percentile2)
-      row.td(fmt.format(percentile2, getDeltaMarkup(delta), delta), klass=getDeltaType(delta))
-
-      delta = deltaSeries.getStandardDeviation() - refDsc[i-1].getStandardDeviation()
-      row.td(fmt.format(
-        deltaSeries.getStandardDeviation(), getDeltaMarkup(delta), delta), klass=getDeltaType(delta))
+      stats = deltaSeries.describe([self.percentile1, self.percentile2])
+      refStats = refDsc[i-1].describe([self.percentile1, self.percentile2])
+      values = [
+        (stats.min, refStats.min), (stats.max, refStats.max), (stats.median, refStats.median),
+        (stats.mean, refStats.mean),
+        (stats.percentiles[self.percentile1], refStats.percentiles[self.percentile1]),
+        (stats.percentiles[self.percentile2], refStats.percentiles[self.percentile2]),
+        (stats.standardDeviation, refStats.standardDeviation),
+      ]
+      for value, refValue in values:
+        delta = value - refValue
+        row.td(fmt.format(value, getDeltaMarkup(delta), delta), klass=getDeltaType(delta))
     return table
 
   def _buildStatsTable(self, eventName, deltaSeriesCollection, benchmarkTlsMap):
@@ -181,6 +171,32 @@ class StatsBuilder(object):
       statsReport += str(self.buildTrivialStatsTable(deltaSeriesCollection))
     return statsReport
 
+  def buildBreakdownTable(self, category, breakdown, dimension='thread'):
+    """
+    Builds tabs with statistics for groups of transactions, sharing a key along a dimension
+
+    :param category: Category of transactions in the given breakdown
+    :param breakdown: Map of key to timeline statistics for transactions with the key
+    :param dimension: Name of the dimension of the breakdown (Default value = 'thread')
+
+    """
+    if not breakdown:
+      return ''
+    element = HTML().div(klass=TIME_POINT_STATS_TITLE)
+    element.h3('{0} latency statistics by {1} ({2} {1}s)'.format(category, dimension, len(breakdown)),
+      style='display: inline')
+    tabHeader = ''
+    tabBody = ''
+    for i, (key, timelineStats) in enumerate(breakdown.items()):
+      tabId = '{}_{}_{}'.format(dimension, i, makeUniqueId())
+      tabHeader += TAB_HEADER_FMT.format(
+        tabId, tabState(i == 0), '{} {} ({})'.format(dimension, key, len(timelineStats))
+      )
+      table = self.buildTrivialStatsTable(timelineStats.getTscDeltaSeriesCollection())
+      tabBody += TAB_BODY_FMT.format(tabId, tabContentState(i == 0), table)
+    tabBody = TAB_BODY_PREFIX + tabBody + TAB_BODY_SUFFIX
+    return str(element) + TAB_CONTAINER_FMT.format(tabHeader, tabBody) + TAB_JS
+
   def buildStatsTable(self, category, timelineStats, benchmarkTlsMap):
     """
     Builds a table with statistics for current profile session side by side with benchmarks
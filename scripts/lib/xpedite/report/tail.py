@@ -0,0 +1,105 @@
+"""
+Module to build html tables, attributing tail latency of transactions to segments of their route
+
+The report has a tab for each of the tail percentiles, with a table comparing segment durations
+in tail and median transactions, along with conditional percentiles and correlation with total duration.
+"""
+
+import math
+from xpedite.report.markup         import (
+                                     HTML, TIME_POINT_STATS_TITLE, TRIVIAL_STATS_TABLE,
+                                     TABLE_SUMMARY, TD_KEY, DURATION_FORMAT
+                                   )
+from xpedite.util                  import makeUniqueId
+from xpedite.analytics.tail        import attributeTail, TAIL_PERCENTILES
+from xpedite.report.tabs           import (
+                                     TAB_HEADER_FMT, TAB_BODY_FMT, TAB_BODY_PREFIX,
+                                     TAB_BODY_SUFFIX, TAB_JS, TAB_CONTAINER_FMT,
+                                     tabState, tabContentState
+                                   )
+
+def formatValue(fmt, value):
+  """Formats a value, rendering undefined values as n/a"""
+  return 'n/a' if value is None or math.isnan(value) else fmt.format(value)
+
+class TailReportBuilder(object):
+  """Builds tail latency attribution for a collection of transactions sharing a category and route combination"""
+
+  @staticmethod
+  def buildTailTitle(category, transactionCount):
+    """
+    Builds title markup for the tail attribution report
+
+    :param category: Category of transactions in this profile
+    :param transactionCount: Number of transactions
+
+    """
+    element = HTML().div(klass=TIME_POINT_STATS_TITLE)
+    element.h3('{} tail latency attribution ({} transactions)'.format(category, transactionCount),
+      style='display: inline')
+    return element
+
+  @staticmethod
+  def buildTailTable(attribution):
+    """
+    Builds a html table attributing excess latency of tail transactions to segments
+
+    :param attribution: Attribution of tail latency for a percentile
+    :type attribution: xpedite.analytics.tail.TailAttribution
+
+    """
+    tableWrapper = HTML().div()
+    tableWrapper.p(
+      'p{} total latency >= {} us | {} tail vs {} median transactions | mean total {} us vs {} us'.format(
+        attribution.percentile, DURATION_FORMAT.format(attribution.threshold), attribution.tailCount,
+        attribution.medianCount, DURATION_FORMAT.format(attribution.tailMean),
+        DURATION_FORMAT.format(attribution.medianMean)
+      )
+    )
+    table = tableWrapper.table(border='1', klass='{} {}'.format(TABLE_SUMMARY, TRIVIAL_STATS_TABLE))
+    heading = table.thead.tr
+    percentiles = sorted(attribution.segments[0].percentiles) if attribution.segments else []
+    for title in ['No', 'Begin probe', 'End probe', 'Median txns mean', 'Tail txns mean', 'Excess', 'Share %']:
+      heading.th(title)
+    for percentile in percentiles:
+      heading.th('{}% (all)'.format(percentile))
+      heading.th('{}% (tail)'.format(percentile))
+    heading.th('Correlation with total')
+    tbody = table.tbody
+    for i, segment in enumerate(attribution.segments, 1):
+      row = tbody.tr
+      row.td('{0:,}'.format(i), klass=TD_KEY)
+      row.td(segment.beginProbeName, klass=TD_KEY)
+      row.td(segment.endProbeName, klass=TD_KEY)
+      row.td(DURATION_FORMAT.format(segment.medianMean))
+      row.td(DURATION_FORMAT.format(segment.tailMean))
+      row.td(DURATION_FORMAT.format(segment.excess))
+      row.td(formatValue('{0:,.2f}', segment.share))
+      for percentile in percentiles:
+        row.td(DURATION_FORMAT.format(segment.percentiles[percentile]))
+        row.td(DURATION_FORMAT.format(segment.tailPercentiles[percentile]))
+      row.td(formatValue('{0:.3f}', segment.correlation))
+    return tableWrapper
+
+  def buildTailReport(self, category, timelineStats, percentiles=TAIL_PERCENTILES):
+    """
+    Builds tabs with tail latency attribution for each of the given percentiles
+
+    :param category: Category of transactions in the given timelineStats
+    :param timelineStats: Time line and duration series statistics
+    :type timelineStats: xpedite.analytics.timeline.TimelineStats
+    :param percentiles: Percentiles of total latency, marking the beginning of tails
+
+    """
+    attributions = attributeTail(timelineStats.timelineCollection, percentiles)
+    if not attributions:
+      return ''
+    tailReport = str(self.buildTailTitle(category, len(timelineStats)))
+    tabHeader = ''
+    tabBody = ''
+    for i, attribution in enumerate(attributions):
+      tabId = 'tail_p{}_{}'.format(attribution.percentile, makeUniqueId()).replace('.', '_')
+      tabHeader += TAB_HEADER_FMT.format(tabId, tabState(i == 0), 'p{}'.format(attribution.percentile))
+      tabBody += TAB_BODY_FMT.format(tabId, tabContentState(i == 0), self.buildTailTable(attribution))
+    tabBody = TAB_BODY_PREFIX + tabBody + TAB_BODY_SUFFIX
+    return tailReport + TAB_CONTAINER_FMT.format(tabHeader, tabBody) + TAB_JS
@@ -10,7 +10,9 @@ of probes, that got hit, during program execution to achieve the functionality.
 Author: Manikandan Dhamodharan, Morgan Stanley
 """
 
-from xpedite.util.probeFactory import ProbeIndexFactory
+import numpy
+from xpedite.util.probeFactory  import ProbeIndexFactory
+from xpedite.types.counterStore import CounterStore, CounterView
 
 class Transaction(object):
   """
@@ -18,17 +20,26 @@ class Transaction(object):
 
   A transaction stores data (timestamps and h/w counters) from a collection of probes, that got hit, during program
   execution to achieve the functionality.
+
+  Counters of a transaction are not stored as objects. A transaction holds indices of its counters in a
+  counter store, shared by all transactions of a profile session.
   """
 
   def __init__(self, counter, txnId):
     self.txnId = txnId
-    self.counters = [counter]
+    self.store = counter.store if isinstance(counter, CounterView) else CounterStore()
+    self.indices = [self.store.indexOf(counter)]
     self.probeMap = None
     self.route = None
     self.begin = None
     self.end = None
     self.hasEndProbe = False
 
+  @property
+  def counters(self):
+    """Returns a list of views for counters in this transaction"""
+    return self.store.views(self.indices)
+
   def addCounter(self, counter, isEndProbe):
     """
     Adds the given counter to this transaction
@@ -37,7 +48,18 @@ class Transaction(object):
     :param isEndProbe: Flag to indicate, if the counter is sampled by an end probe
 
     """
-    self.counters.append(counter)
+    self.indices.append(self.store.indexOf(counter))
+    self.hasEndProbe = (self.hasEndProbe or isEndProbe)
+
+  def addIndices(self, indices, isEndProbe):
+    """
+    Adds counters at the given indices of this transaction's store
+
+    :param indices: Indices of counters to be added
+    :param isEndProbe: Flag to indicate, if any of the counters is sampled by an end probe
+
+    """
+    self.indices.extend(indices)
     self.hasEndProbe = (self.hasEndProbe or isEndProbe)
 
   def join(self, other):
@@ -47,7 +69,26 @@ class Transaction(object):
     :param other: Transaction with counters to be added
 
     """
-    self.counters = sorted(self.counters + other.counters, key=lambda counter: counter.tsc)
+    if other.store is self.store:
+      otherIndices = list(other.indices)
+    else:
+      otherIndices = [self.store.indexOf(counter) for counter in other.counters]
+    indices = numpy.array(list(self.indices) + otherIndices, dtype=numpy.intp)
+    order = numpy.argsort(self.store.tsc[indices], kind='stable')
+    self.indices = indices[order].tolist()
+
+  def rebase(self, store, newStore, offset):
+    """
+    Relocates counters of this transaction, after the given store was merged to a new store
+
+    :param store: Store with counters of this transaction
+    :param newStore: Store, that the counters were merged to
+    :param offset: Offset of the merged counters in the new store
+
+    """
+    if self.store is store:
+      self.store = newStore
+      self.indices = [index + offset for index in self.indices]
 
   def hasProbe(self, probe):
     """
@@ -88,7 +129,7 @@ class Transaction(object):
 
     """
     if probe in self.probeMap:
-      return self.counters[self.probeMap[probe][index]]
+      return self.store.view(self.indices[self.probeMap[probe][index]])
     return None
 
   def getElapsedTsc(self):
@@ -101,25 +142,47 @@ class Transaction(object):
 
     Populates the begin probe, end probe and route for this transaction
     """
-    self.begin = min(self.counters, key=lambda c: c.tsc)
-    self.end = max(self.counters, key=lambda c: c.tsc)
+    self.indices = numpy.array(self.indices, dtype=numpy.intp)
+    tscs = self.store.tsc[self.indices]
+    self.begin = self.store.view(int(self.indices[numpy.argmin(tscs)]))
+    self.end = self.store.view(int(self.indices[numpy.argmax(tscs)]))
     index = ProbeIndexFactory.buildIndex(self.counters)
     self.route = index.route
     self.probeMap = index.probeMap
 
   def __getitem__(self, index):
-    return self.counters[index]
+    if isinstance(index, slice):
+      return self.store.views(self.indices[index])
+    return self.store.view(self.indices[index])
 
   def __len__(self):
     """Returns the number of samples in a transaction"""
-    return len(self.counters)
+    return len(self.indices)
 
   def __iter__(self):
-    return self.counters.__iter__()
+    return iter(self.counters)
 
   def __repr__(self):
     probeStr = ' -> '.join([counter.probe.getCanonicalName() for counter in self.counters])
     return 'Transaction: id {} | ({})'.format(self.txnId, probeStr)
 
+  def __deepcopy__(self, memo):
+    clone = Transaction.__new__(Transaction)
+    clone.__dict__.update(self.__dict__)
+    clone.indices = list(self.indices)
+    return clone
+
+  def __setstate__(self, state):
+    if 'counters' in state:
+      # transactions pickled before counters were kept in a store
+      store = CounterStore()
+      state['indices'] = numpy.array([store.append(counter) for counter in state.pop('counters')], dtype=numpy.intp)
+      state['store'] = store
+    self.__dict__.update(state)
+
   def __eq__(self, other):
-    return self.__dict__ == other.__dict__
+    return (
+      self.txnId == other.txnId and self.hasEndProbe == other.hasEndProbe and self.route == other.route
+      and self.probeMap == other.probeMap and self.begin == other.begin and self.end == other.end
+      and self.counters == other.counters
+    )
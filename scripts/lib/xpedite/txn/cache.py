@@ -0,0 +1,269 @@
+"""
+Persistent cache of transactions
+
+Reports regenerated for a previous profile session (xpedite report -r <runId>) decode all the
+sample files of the run and rebuild the same transactions, even if only the classifier or the
+transaction filter was changed. This module persists transactions built by loaders, to skip
+extraction and loading of counters for subsequent reports.
+
+Entries are stored in a columnar format - a NumPy (.npy) file for each column of the counter store
+and for the indices of transactions, along with a pickled header with probes and thread ids.
+Entries are keyed by a digest of the inputs, that determine the transactions built by a loader -
+the run id, size and modification time of sample files and the list of probes.
+
+The cache is bounded by a configurable size limit. Least recently used entries are evicted,
+to make room for new entries.
+"""
+
+import os
+import json
+import shutil
+import pickle
+import hashlib
+import logging
+import numpy
+from xpedite.types.counterStore import CounterStore
+from xpedite.txn                import Transaction
+from xpedite.txn.collection     import TxnCollection
+
+LOGGER = logging.getLogger(__name__)
+
+CACHE_FORMAT_VERSION = 1
+HEADER_FILE_NAME = 'header.pkl'
+STORE_COLUMNS = ('tsc', 'probeIds', 'threads', 'dataHi', 'dataLo', 'flags', 'pmcCount', 'pmcs')
+TXN_COLUMNS = ('txnIds', 'lengths', 'indices', 'begins', 'ends', 'hasEndProbe', 'routeIds')
+
+def _probeKey(probe):
+  """Returns a json serializable identity of a probe"""
+  return [
+    type(probe).__name__, probe.name, getattr(probe, 'sysName', None), getattr(probe, 'filePath', None),
+    getattr(probe, 'lineNo', None)
+  ]
+
+def _fileKey(path):
+  """Returns a json serializable identity of a file (name, size and modification time) or a directory of files"""
+  if os.path.isdir(path):
+    return [os.path.basename(path), [_fileKey(os.path.join(path, name)) for name in sorted(os.listdir(path))]]
+  stat = os.stat(path)
+  return [os.path.basename(path), stat.st_size, stat.st_mtime]
+
+def _directorySize(path):
+  """Returns the total size of files in a directory"""
+  return sum(os.path.getsize(os.path.join(path, fileName)) for fileName in os.listdir(path))
+
+def buildRunKey(runId, dataSource, probes):
+  """
+  Builds a key for transactions of a profile session, loaded from binary or columnar sample files
+
+  :param runId: Unique identifier of the profile session or json serializable info of a benchmark
+  :param dataSource: Data source with sample files for threads in the profile session
+  :param probes: List of probes used to build transactions
+
+  """
+  sampleFiles = [
+    [sampleFile.threadId, sampleFile.tlsAddr] + _fileKey(sampleFile.path) for sampleFile in dataSource.files
+  ]
+  appInfo = _fileKey(dataSource.appInfoPath) if os.path.isfile(dataSource.appInfoPath) else None
+  return buildKey(runId, appInfo, sampleFiles, [_probeKey(probe) for probe in probes])
+
+def buildKey(*components):
+  """
+  Builds a digest of json serializable components, to key entries in a transaction cache
+
+  :param components: Components, that identify the transactions
+
+  """
+  payload = json.dumps([CACHE_FORMAT_VERSION] + list(components), sort_keys=True, default=str)
+  return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def saveTxns(path, txnCollection):
+  """
+  Persists counter store and transactions of a collection in columnar format
+
+  :param path: Path of the directory for the persisted transactions
+  :param txnCollection: Collection of transactions sharing a counter store
+  :returns: count of bytes persisted
+
+  """
+  txns = list(txnCollection.txnMap.values())
+  store = txns[0].store
+  if any(txn.store is not store for txn in txns):
+    raise Exception('cannot persist transactions of {} - detected more than one counter store'.format(
+      txnCollection.name
+    ))
+  routeIds = {}
+  columns = {name : getattr(store, name)[:store.size] for name in STORE_COLUMNS}
+  columns.update({
+    'txnIds'      : numpy.array([txn.txnId for txn in txns], dtype=numpy.int64),
+    'lengths'     : numpy.array([len(txn) for txn in txns], dtype=numpy.int64),
+    'indices'     : numpy.concatenate([txn.indices for txn in txns]).astype(numpy.intp),
+    'begins'      : numpy.array([txn.begin.index for txn in txns], dtype=numpy.intp),
+    'ends'        : numpy.array([txn.end.index for txn in txns], dtype=numpy.intp),
+    'hasEndProbe' : numpy.array([txn.hasEndProbe for txn in txns], dtype=bool),
+    'routeIds'    : numpy.array([routeIds.setdefault(id(txn.route), len(routeIds)) for txn in txns], dtype=numpy.int64),
+  })
+  os.makedirs(path)
+  for name, column in columns.items():
+    numpy.save(os.path.join(path, name + '.npy'), column)
+  header = {
+    'version' : CACHE_FORMAT_VERSION, 'size' : store.size, 'probes' : store.probes,
+    'threadIds' : store.threadIds, 'dataOverrides' : store.dataOverrides
+  }
+  with open(os.path.join(path, HEADER_FILE_NAME), 'wb') as headerFile:
+    pickle.dump(header, headerFile, pickle.HIGHEST_PROTOCOL)
+  return _directorySize(path)
+
+def loadTxns(path, name, cpuInfo, probes, topdownMetrics, events, dataSource): # pylint: disable=too-many-positional-arguments
+  """
+  Loads a collection of transactions, persisted in columnar format
+
+  Transactions sharing a route, share the route and probe map of the first transaction with the route.
+
+  :param path: Path of the directory with the persisted transactions
+  :param name: Name of the transaction collection
+  :param cpuInfo: Cpu info of the host running target app
+  :param probes: List of probes enabled for the profile session
+  :param topdownMetrics: Top down metrics to be computed
+  :param events: PMU events collected for the profiling session
+  :param dataSource: Data source with sample files of the transactions
+
+  """
+  with open(os.path.join(path, HEADER_FILE_NAME), 'rb') as headerFile:
+    header = pickle.load(headerFile)
+  if header.get('version') != CACHE_FORMAT_VERSION:
+    raise Exception('unsupported cache format version {}'.format(header.get('version')))
+  columns = {name : numpy.load(os.path.join(path, name + '.npy')) for name in STORE_COLUMNS + TXN_COLUMNS}
+
+  store = CounterStore()
+  store.__setstate__(dict(
+    ((name, columns[name]) for name in STORE_COLUMNS), size=header['size'], probes=header['probes'],
+    threadIds=header['threadIds'], dataOverrides=header['dataOverrides']
+  ))
+  offsets = numpy.concatenate(([0], numpy.cumsum(columns['lengths'])))
+  routes = {}
+  txnMap = {}
+  for i, txnId in enumerate(columns['txnIds'].tolist()):
+    indices = columns['indices'][offsets[i]:offsets[i + 1]]
+    txn = Transaction(store.view(int(indices[0])), txnId)
+    txn.indices = indices
+    txn.hasEndProbe = bool(columns['hasEndProbe'][i])
+    routeId = int(columns['routeIds'][i])
+    if routeId in routes:
+      txn.route, txn.probeMap = routes[routeId]
+      txn.begin = store.view(int(columns['begins'][i]))
+      txn.end = store.view(int(columns['ends'][i]))
+    else:
+      txn.finalize()
+      routes[routeId] = (txn.route, txn.probeMap)
+    txnMap[txnId] = txn
+  return TxnCollection(name, cpuInfo, txnMap, probes, topdownMetrics, events, dataSource, finalized=True)
+
+class TxnCache(object):
+  """A size bounded directory of persisted transaction collections, with least recently used eviction"""
+
+  def __init__(self, path, sizeLimit):
+    """
+    Constructs a transaction cache
+
+    :param path: Path of the cache directory
+    :param sizeLimit: Max size (in bytes) of persisted transactions
+
+    """
+    self.path = path
+    self.sizeLimit = sizeLimit
+
+  @staticmethod
+  def fromConfig():
+    """Builds a transaction cache from xpedite config, returns None if the cache is disabled"""
+    from xpedite.dependencies import CONFIG
+    if CONFIG.txnCacheDir and CONFIG.txnCacheSize > 0:
+      return TxnCache(CONFIG.txnCacheDir, CONFIG.txnCacheSize)
+    return None
+
+  def entryPath(self, key):
+    """Returns path of the entry for the given key"""
+    return os.path.join(self.path, key)
+
+  def load(self, key, name, cpuInfo, probes, topdownMetrics, events, dataSource): # pylint: disable=too-many-positional-arguments
+    """
+    Loads transactions for the given key, returns None if the cache has no entry for the key
+
+    :param key: Key of the cached transactions
+    :param name: Name of the transaction collection
+    :param cpuInfo: Cpu info of the host running target app
+    :param probes: List of probes enabled for the profile session
+    :param topdownMetrics: Top down metrics to be computed
+    :param events: PMU events collected for the profiling session
+    :param dataSource: Data source with sample files of the transactions
+
+    """
+    path = self.entryPath(key)
+    if not os.path.isdir(path):
+      return None
+    try:
+      txnCollection = loadTxns(path, name, cpuInfo, probes, topdownMetrics, events, dataSource)
+    except Exception as ex:
+      LOGGER.warning('discarding corrupt transaction cache entry %s - %s', path, ex)
+      shutil.rmtree(path, ignore_errors=True)
+      return None
+    try:
+      os.utime(os.path.join(path, HEADER_FILE_NAME), None)
+    except OSError as ex:
+      LOGGER.debug('failed to mark transaction cache entry %s as recently used - %s', path, ex)
+    LOGGER.info('loaded %d transactions from cache %s', len(txnCollection.txnMap), path)
+    return txnCollection
+
+  def save(self, key, txnCollection):
+    """
+    Persists transactions for the given key, evicting least recently used entries to stay under the size limit
+
+    :param key: Key of the transactions
+    :param txnCollection: Collection of transactions to be cached
+    :returns: True, if the transactions were cached
+
+    """
+    path = self.entryPath(key)
+    if os.path.isdir(path) or not txnCollection.txnMap:
+      return False
+    stagingPath = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+      size = saveTxns(stagingPath, txnCollection)
+      if size > self.sizeLimit:
+        LOGGER.debug('skip caching transactions of size %d bytes, exceeding cache limit', size)
+        shutil.rmtree(stagingPath, ignore_errors=True)
+        return False
+      os.rename(stagingPath, path)
+    except Exception as ex:
+      LOGGER.warning('failed to cache transactions at %s - %s', path, ex)
+      shutil.rmtree(stagingPath, ignore_errors=True)
+      return False
+    self.evict(key)
+    return True
+
+  def entries(self):
+    """Returns a list of (last used time, size, key) for entries in this cache"""
+    entries = []
+    if os.path.isdir(self.path):
+      for key in os.listdir(self.path):
+        path = self.entryPath(key)
+        headerPath = os.path.join(path, HEADER_FILE_NAME)
+        if not key.endswith('.tmp') and os.path.isfile(headerPath):
+          entries.append((os.path.getmtime(headerPath), _directorySize(path), key))
+    return entries
+
+  def evict(self, retainedKey=None):
+    """
+    Evicts least recently used entries, till the size of this cache is under the size limit
+
+    :param retainedKey: Key of an entry, that must not be evicted (Default value = None)
+
+    """
+    entries = sorted(self.entries())
+    totalSize = sum(size for _, size, _ in entries)
+    for _, size, key in entries:
+      if totalSize <= self.sizeLimit:
+        break
+      if key != retainedKey:
+        LOGGER.debug('evicting transaction cache entry %s', key)
+        shutil.rmtree(self.entryPath(key), ignore_errors=True)
+        totalSize -= size
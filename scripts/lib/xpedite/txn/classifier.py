@@ -8,9 +8,14 @@ However custom classifiers can be used to,  classify transaction based on arbitr
 A category is just a string, that gets tagged on a transaction.
 Classifiers are invoked for each transaction prior to profile and report generation.
 
+Classifiers may optionally implement classifyBatch(txns), returning a list with category of
+each of the transactions, to amortize the cost of classification across a batch of transactions.
+
 Author: Manikandan Dhamodharan, Morgan Stanley
 """
 
+import inspect
+
 class DefaultClassifier(object):
 
   """Classifies all transactions to one default category"""
@@ -25,6 +30,16 @@ class DefaultClassifier(object):
     """
     return 'Transaction'
 
+  @staticmethod
+  def classifyBatch(txns):
+    """
+    Maps all transactions in a batch to one category
+
+    :param txns: Transactions to be classified
+
+    """
+    return ['Transaction'] * len(txns)
+
   def __eq__(self, other):
     return self.__dict__ == other.__dict__
 
@@ -58,7 +73,109 @@ class ProbeDataClassifier(object):
     if counter:
       data = counter.data
       if self.typeMapper:
-        return self.typeMapper(data)
+        return self.mapData(data)
     else:
-      return self.typeMapper(None)
+      return self.mapData(None)
     return 'Transaction'
+
+  def classifyBatch(self, txns):
+    """
+    Extracts data from the probe of each transaction in a batch and maps the data to categories
+
+    :param txns: Transactions to be classified
+
+    """
+    categories = []
+    for txn in txns:
+      counter = txn.getCounterForProbe(self.probe)
+      categories.append(self.mapData(counter.data if counter else None))
+    return categories
+
+  def mapData(self, data):
+    """
+    Maps probe data to a transaction category
+
+    :param data: Data captured by the probe, None for transactions without the probe
+
+    """
+    return self.typeMapper(data)
+
+class MemoizingProbeDataClassifier(ProbeDataClassifier):
+
+  """
+  Classifies transactions based on data in a given probe, memoizing categories of probe data
+
+  The type mapper is invoked once for each distinct value of probe data. Use this classifier
+  with type mappers, that are pure functions of the probe data (like a map of message types).
+
+  Batches of transactions are memoized by the raw (integer) form of probe data, to skip
+  formatting data as hex strings, for values seen before.
+  """
+
+  def __init__(self, probe, typeMapper):
+    """
+    Constructs an instance of MemoizingProbeDataClassifier
+
+    :param probe: A probe that is expected to be in the transaction
+    :type probe: xpedite.types.probe.Probe
+    :param typeMapper: a callback to map probe data to a category
+
+    """
+    ProbeDataClassifier.__init__(self, probe, typeMapper)
+    self.categories = {}
+    self.rawCategories = {}
+
+  def classifyBatch(self, txns):
+    """
+    Classifies a batch of transactions, decoding probe data only for unseen values of raw data
+
+    :param txns: Transactions to be classified
+
+    """
+    categories = []
+    for txn in txns:
+      counter = txn.getCounterForProbe(self.probe)
+      rawData = counter.rawData if counter else None
+      try:
+        category = self.rawCategories[rawData]
+      except KeyError:
+        category = self.rawCategories[rawData] = self.mapData(counter.data if counter else None)
+      categories.append(category)
+    return categories
+
+  def mapData(self, data):
+    """
+    Maps probe data to a transaction category, invoking type mapper for unseen values of data
+
+    :param data: Data captured by the probe, None for transactions without the probe
+
+    """
+    try:
+      return self.categories[data]
+    except KeyError:
+      category = self.categories[data] = self.typeMapper(data)
+      return category
+
+def _definingClass(cls, name):
+  """Returns the class in method resolution order of cls, that defines an attribute with the given name"""
+  for klass in inspect.getmro(cls):
+    if name in vars(klass):
+      return klass
+  return None
+
+def classifyTxns(classifier, txns):
+  """
+  Classifies a batch of transactions
+
+  Classifiers implementing classifyBatch are invoked once for the batch, other classifiers
+  are invoked for each of the transactions. A classifyBatch inherited from a base class,
+  is not used for subclasses overriding classify.
+
+  :param classifier: Predicate to classify transactions into different categories
+  :param txns: Transactions to be classified
+
+  """
+  batchClass = _definingClass(classifier.__class__, 'classifyBatch')
+  if batchClass is not None and issubclass(batchClass, _definingClass(classifier.__class__, 'classify') or object):
+    return classifier.classifyBatch(txns)
+  return [classifier.classify(txn) for txn in txns]
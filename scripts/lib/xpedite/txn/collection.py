@@ -44,11 +44,12 @@ class TxnSubCollection(object):
 class TxnCollection(object):
   """A collection of transactions sharing a common route"""
 
-  def __init__(self, name, cpuInfo, txnMap, probes, topdownMetrics, events, dataSource):
+  def __init__(self, name, cpuInfo, txnMap, probes, topdownMetrics, events, dataSource, finalized=False):
     self.name = name
     self.cpuInfo = cpuInfo
-    for txn in txnMap.values():
-      txn.finalize()
+    if not finalized:
+      for txn in txnMap.values():
+        txn.finalize()
     self.txnMap = OrderedDict(sorted(txnMap.items(), key=lambda pair: pair[1].begin.tsc))
     if len(self.txnMap) != len(txnMap):
       raise Exception('failed to reorder transaction for {}'.format(name))
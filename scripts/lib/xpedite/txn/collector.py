@@ -1,12 +1,12 @@
 """
 Collector to collect and process profile data
-This module is used to load counter data from xpedite text format sample files.
+This module is used to load counter data from xpedite text (csv) and columnar format sample files.
 
 Author: Manikandan Dhamodharan, Morgan Stanley
 """
 
-import time
 import logging
+import itertools
 from xpedite.txn.extractor      import Extractor
 
 LOGGER = logging.getLogger(__name__)
@@ -14,15 +14,16 @@ LOGGER = logging.getLogger(__name__)
 class Collector(Extractor):
   """Parses sample files to gather time and pmu counters"""
 
-  def __init__(self, counterFilter):
+  def __init__(self, counterFilter, workerCount=None):
     """
     Constructs an instance of collector
 
     :param counterFilter: a filter to exclude compromised or unused counters
     :type counterFilter: xpedite.filter.TrivialCounterFilter
+    :param workerCount: Number of processes to load sample files in parallel, defaults to xpedite config
 
     """
-    Extractor.__init__(self, counterFilter)
+    Extractor.__init__(self, counterFilter, workerCount)
 
   @staticmethod
   def formatPath(path, maxChars):
@@ -47,59 +48,86 @@ class Collector(Extractor):
     loader.beginCollection(dataSource)
     appInfo = AppInfo(dataSource.appInfoPath)
     appInfo.load()
-    self.loadSamples(loader, appInfo.probes, dataSource)
+    self.loadSamples(loader, appInfo.returnSiteIndex, dataSource)
     loader.endCollection()
 
-  def loadSamples(self, loader, probes, dataSource):
+  def loadSamples(self, loader, returnSiteIndex, dataSource):
     """
     Loads counters for a profile session from csv sample files
 
     :param loader: Loader to build transactions out of the counters
-    :param probes: A list of probes associated with samples in a file
-    :param path: Path to sample file for a thread with counter data in csv format
+    :param returnSiteIndex: Index of probes associated with samples in a file
+    :param dataSource: Data source with sample files for threads in the profile session
 
     """
+    return self.loadSampleFiles(loader, returnSiteIndex, dataSource.files)
+
+  def loadSampleFile(self, loader, returnSiteIndex, sampleFile):
+    """
+    Loads counters from a csv, columnar or binary sample file
+
+    :param loader: Loader to build transactions out of the counters
+    :param returnSiteIndex: Index of probes instrumented in target application
+    :param sampleFile: Sample file with counters of a thread
+
+    """
+    from xpedite.types.dataSource import SampleFileFormat
+    if sampleFile.fmt == SampleFileFormat.CSV:
+      return self.loadCounters(sampleFile.threadId, loader, returnSiteIndex, sampleFile.path)
+    if sampleFile.fmt == SampleFileFormat.COLUMNAR:
+      return self.loadColumns(sampleFile.threadId, loader, returnSiteIndex, sampleFile.path)
+    return Extractor.loadSampleFile(self, loader, returnSiteIndex, sampleFile)
+
+  def loadColumns(self, threadId, loader, returnSiteIndex, path):
+    """
+    Loads counters for a thread from memory mapped columns of samples
+
+    :param threadId: Id of the thread, that captured the counters
+    :param loader: Loader to build transactions out of the counters
+    :param returnSiteIndex: Index of probes instrumented in target application
+    :param path: Path to directory with columns of samples
+    :returns: count of records loaded from the columns
+
+    """
+    from xpedite.txn.columnar import loadColumns, iterColumnBatches
+    LOGGER.debug('loading columns %s', self.formatPath(path, 70))
     recordCount = 0
-    for sampleFile in dataSource.files:
-      loader.beginLoad(sampleFile.threadId, sampleFile.tlsAddr)
-      recordCount += self.loadCounters(sampleFile.threadId, loader, probes, sampleFile.path)
-      loader.endLoad()
-    self.logCounterFilterReport()
+    for batch in iterColumnBatches(loadColumns(path), self.BATCH_SIZE):
+      recordCount += self.loadSampleBatch(threadId, loader, returnSiteIndex, batch)
     return recordCount
 
-  def loadCounters(self, threadId, loader, probes, path):
+  def loadCounters(self, threadId, loader, returnSiteIndex, path):
     """
     Loads counters for a thread from csv sample files
 
     :param loader: Loader to build transactions out of the counters
     :param threadId: Id of the thread, that captured the counters
     :type threadId: str
-    :param probes: Map of probes instrumented in target application
+    :param returnSiteIndex: Index of probes instrumented in target application
     :param path: Path to file with counters to be loaded
     :type path: str
 
     """
-    LOGGER.info('loading report file %s -> ', self.formatPath(path, 70))
-    begin = time.time()
+    LOGGER.debug('loading report file %s', self.formatPath(path, 70))
     with open(path) as fileHandle:
+      next(fileHandle, None)
       recordCount = 0
-      for record in fileHandle:
-        if recordCount > 0:
-          self.loadCounter(threadId, loader, probes, record)
-        recordCount += 1
-      elapsed = time.time() - begin
-      LOGGER.completed('%d records | %d txns loaded in %0.2f sec.', recordCount-1,
-        loader.getCount(), elapsed)
+      records = list(itertools.islice(fileHandle, self.BATCH_SIZE))
+      while records:
+        self.loadRecords(threadId, loader, returnSiteIndex, records)
+        recordCount += len(records)
+        records = list(itertools.islice(fileHandle, self.BATCH_SIZE))
       return recordCount
 
-  def gatherCounters(self, app, loader):
+  def gatherCounters(self, app, loader, dataSource=None):
     """
     Gathers time and pmu counters from sample files for a profile session
 
     :param app: Handle to the instance of the xpedite app
     :param loader: Loader to build transactions out of the counters
+    :param dataSource: Binary sample files of the app, gathered from the app if None (Default value = None)
 
     """
     if app.dataSource:
       return self.loadDataSource(app.dataSource, loader)
-    return Extractor.gatherCounters(self, app, loader)
+    return Extractor.gatherCounters(self, app, loader, dataSource)
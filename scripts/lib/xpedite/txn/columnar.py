@@ -0,0 +1,93 @@
+"""
+Module to persist and load samples in columnar format
+
+Samples of a thread are decoded to columns (time stamp counter, return site, probe data,
+flags and pmc values) and persisted as NumPy (.npy) files in a directory for the thread.
+Column files are memory mapped on load and fed to the extractor in batches, without
+formatting or parsing text.
+
+A json manifest, in the parent directory, lists the threads in order of their sample files,
+along with the path to column directories and the count of samples of each thread.
+"""
+
+import os
+import json
+import logging
+import numpy
+from xpedite.types.dataSource import (
+                                SampleFileFormat, COLUMNAR_DIR_NAME, MANIFEST_FILE_NAME, COLUMNAR_FORMAT_VERSION
+                              )
+from xpedite.util             import mkdir
+
+LOGGER = logging.getLogger(__name__)
+
+SAMPLE_COLUMNS = ('tsc', 'returnSite', 'dataHi', 'dataLo', 'flags', 'pmcCount', 'pmc')
+
+def saveColumns(path, columns):
+  """
+  Persists columns of decoded samples, to a directory with a .npy file for each column
+
+  :param path: Path of the directory for the columns
+  :param columns: Map of column name to numpy arrays, in the layout of SamplesLoader.toArrays()
+  :returns: count of persisted samples
+
+  """
+  mkdir(path)
+  for name in SAMPLE_COLUMNS:
+    numpy.save(os.path.join(path, name + '.npy'), columns[name])
+  return len(columns['tsc'])
+
+def loadColumns(path, mmapMode='r'):
+  """
+  Loads columns of samples, persisted in the given directory
+
+  :param path: Path of the directory with the columns
+  :param mmapMode: Mode to memory map the column files, None to read columns to memory (Default value = 'r')
+
+  """
+  return {name : numpy.load(os.path.join(path, name + '.npy'), mmap_mode=mmapMode) for name in SAMPLE_COLUMNS}
+
+def iterColumnBatches(columns, batchSize):
+  """
+  Iterates columns of samples, as batches of a fixed size
+
+  :param columns: Map of column name to numpy arrays
+  :param batchSize: Max count of samples in a batch
+
+  """
+  for begin in range(0, len(columns['tsc']), batchSize):
+    yield {name : column[begin:begin + batchSize] for name, column in columns.items()}
+
+def makeColumnarSamples(sampleFiles, path):
+  """
+  Persists binary sample files of a profile session in columnar format
+
+  :param sampleFiles: Binary sample files for threads in the profile session
+  :param path: Path of the data source directory
+  :returns: path to the manifest of the persisted samples
+
+  """
+  from xpediteBindings import SamplesLoader
+  columnarPath = os.path.join(path, COLUMNAR_DIR_NAME)
+  threads = []
+  dirNames = set()
+  for sampleFile in sampleFiles:
+    if sampleFile.fmt != SampleFileFormat.BINARY:
+      raise Exception('Failed to persist columns - expected binary sample file, got {}'.format(sampleFile))
+    dirName = '{}-{}'.format(sampleFile.threadId, sampleFile.tlsAddr)
+    if dirName in dirNames:
+      dirName = '{}-{}'.format(dirName, len(threads))
+    dirNames.add(dirName)
+    columns = SamplesLoader(sampleFile.path).toArrays()
+    sampleCount = saveColumns(os.path.join(columnarPath, dirName), columns)
+    LOGGER.debug('persisted %d samples of thread %s in columnar format', sampleCount, sampleFile.threadId)
+    threads.append({
+      'threadId' : sampleFile.threadId, 'tlsAddr' : sampleFile.tlsAddr, 'path' : dirName, 'sampleCount' : sampleCount
+    })
+
+  manifestPath = os.path.join(columnarPath, MANIFEST_FILE_NAME)
+  mkdir(columnarPath)
+  with open(manifestPath, 'w') as manifestFile:
+    json.dump({'version' : COLUMNAR_FORMAT_VERSION, 'columns' : SAMPLE_COLUMNS, 'threads' : threads}, manifestFile,
+      indent=2)
+  return manifestPath
@@ -4,127 +4,291 @@ Extractor to extract and collect xpedite samples data
 This module is used to load counter data from xpedite binary sample files.
 A decoder is used to open and extract timing and pmc data captured by
 probes in the target application.
-Each such decoded record is inturn used to construct a Counter object for
-transaction building.
+Decoded records are appended to the counter store of the loader and views of the
+stored counters are used for transaction building.
 
 Author: Manikandan Dhamodharan, Morgan Stanley
 """
 
+import copy
 import time
 import logging
-from xpedite.types            import Counter
-from xpedite.types.dataSource import BinaryDataSourceFactory
-from xpediteBindings          import SamplesLoader
+import numpy
+from xpedite.types              import Counter
+from xpedite.types.dataSource   import BinaryDataSourceFactory
+from xpedite.types.counterStore import CounterView, FLAG_DATA, FLAG_PMC, parseData
+from xpedite.txn.filter         import TrivialCounterFilter
+from xpediteBindings            import SamplesLoader
 
 LOGGER = logging.getLogger(__name__)
 
 class Extractor(object):
   """Parses sample files to load counters for the current profile session"""
 
-  def __init__(self, counterFilter):
+  BATCH_SIZE = 65536
+
+  def __init__(self, counterFilter, workerCount=None):
     """
     Constructs a new instance of extractor
 
     :param counterFilter: Filter to exclude out compromised or unused counters
     :type counterFilter: xpedite.filter.TrivialCounterFilter
+    :param workerCount: Number of processes to load sample files in parallel, defaults to xpedite config
 
     """
     self.counterFilter = counterFilter
+    self.workerCount = workerCount
     self.orphanedSamplesCount = 0
 
-  def gatherCounters(self, app, loader):
+  def gatherCounters(self, app, loader, dataSource=None):
     """
     Gathers time and pmu counters from sample files for the current profile session
 
     :param app: Handle to the instance of the xpedite app
     :type app: xpedite.profiler.environment.XpediteApp
     :param loader: Loader to build transactions out of the counters
+    :param dataSource: Binary sample files of the app, gathered from the app if None (Default value = None)
 
     """
-    dataSource = BinaryDataSourceFactory().gather(app)
+    dataSource = dataSource if dataSource else BinaryDataSourceFactory().gather(app)
     loader.beginCollection(dataSource)
-
-    for sampleFile in dataSource.files:
-      LOGGER.info('loading counters for thread %s from file %s -> ', sampleFile.threadId, sampleFile.path)
-      iterBegin = begin = time.time()
-      loader.beginLoad(sampleFile.threadId, sampleFile.tlsAddr)
-      samplesLoader = SamplesLoader(sampleFile.path)
-      recordCount = 0
-      for sample in samplesLoader:
-        self.loadSample(sampleFile.threadId, loader, app.probes, sample)
-        elapsed = time.time() - iterBegin
-        if elapsed >= 5:
-          LOGGER.completed('\tprocessed %d counters | ', recordCount-1)
-          iterBegin = time.time()
-        recordCount += 1
-      loader.endLoad()
-      elapsed = time.time() - begin
-      self.logCounterFilterReport()
-      if self.orphanedSamplesCount:
-        LOGGER.warning('detected mismatch in binary vs app info - %d counters ignored', self.orphanedSamplesCount)
-      LOGGER.completed('%d records | %d txns loaded in %0.2f sec.', recordCount-1, loader.getCount(), elapsed)
+    self.loadSampleFiles(loader, app.returnSiteIndex, dataSource.files)
     if loader.isCompromised() or loader.getTxnCount() <= 0:
       LOGGER.warning(loader.report())
     elif loader.isNotAccounted():
       LOGGER.debug(loader.report())
     loader.endCollection()
 
-  def loadSample(self, threadId, loader, probes, sample):
+  def loadSampleFiles(self, loader, returnSiteIndex, sampleFiles):
+    """
+    Loads counters from sample files of all threads in a profile session
+
+    Sample files are loaded in parallel by spawned loaders in worker processes, if
+    more than one worker is configured. The spawned loaders are merged in the order
+    of sample files, to build transactions identical to a serial load.
+
+    :param loader: Loader to build transactions out of the counters
+    :param returnSiteIndex: Index of probes instrumented in target application
+    :param sampleFiles: List of sample files for threads in the profile session
+    :returns: count of records loaded from the sample files
+
+    """
+    from xpedite.util.workerPool import WorkerPool, resolveWorkerCount
+    recordCount = 0
+    workerCount = resolveWorkerCount(self.workerCount, len(sampleFiles))
+    if workerCount > 1:
+      LOGGER.info('loading counters for %d threads using %d workers', len(sampleFiles), workerCount)
+      pool = WorkerPool(workerCount, sharedObjects=self.sharedObjects(loader, returnSiteIndex))
+      threadLoads = pool.map(lambda sampleFile: self.loadThread(loader.spawn(), returnSiteIndex, sampleFile), sampleFiles)
+    else:
+      threadLoads = (self.loadThread(loader, returnSiteIndex, sampleFile, verbose=True) for sampleFile in sampleFiles)
+
+    for sampleFile, threadLoad in zip(sampleFiles, threadLoads):
+      threadLoader, threadRecordCount, orphanedSamplesCount, counterFilter, elapsed = threadLoad
+      if threadLoader is not loader:
+        LOGGER.info('loaded counters for thread %s from file %s -> ', sampleFile.threadId, sampleFile.path)
+        loader.merge(threadLoader)
+        self.orphanedSamplesCount += orphanedSamplesCount
+      self.counterFilter.merge(counterFilter)
+      self.logCounterFilterReport()
+      LOGGER.completed('%d records | %d txns loaded in %0.2f sec.', threadRecordCount, loader.getCount(), elapsed)
+      recordCount += threadRecordCount
+
+    if self.orphanedSamplesCount:
+      LOGGER.warning('detected mismatch in binary vs app info - %d counters ignored', self.orphanedSamplesCount)
+    return recordCount
+
+  @staticmethod
+  def sharedObjects(loader, returnSiteIndex):
+    """Returns objects, that are shared by transactions built in parent and worker processes"""
+    sharedObjects = list(returnSiteIndex.probes) + list(loader.probes)
+    return sharedObjects + [loader.probeMap]
+
+  def loadThread(self, loader, returnSiteIndex, sampleFile, verbose=False):
+    """
+    Loads counters from the sample file of a thread
+
+    :param loader: Loader to build transactions out of the counters
+    :param returnSiteIndex: Index of probes instrumented in target application
+    :param sampleFile: Sample file with counters of a thread
+    :param verbose: Flag to log the beginning of the load
+    :returns: a tuple of loader, count of loaded records, count of orphaned samples, a filter with
+              statistics of the filtered counters and elapsed time
+
+    """
+    if verbose:
+      LOGGER.info('loading counters for thread %s from file %s -> ', sampleFile.threadId, sampleFile.path)
+    begin = time.time()
+    orphanedSamplesCount = self.orphanedSamplesCount
+    loader.beginLoad(sampleFile.threadId, sampleFile.tlsAddr)
+    recordCount = self.loadSampleFile(loader, returnSiteIndex, sampleFile)
+    loader.endLoad()
+    counterFilter = copy.copy(self.counterFilter)
+    self.counterFilter.reset()
+    return loader, recordCount, self.orphanedSamplesCount - orphanedSamplesCount, counterFilter, time.time() - begin
+
+  def loadSampleFile(self, loader, returnSiteIndex, sampleFile):
+    """
+    Loads counters from a binary sample file
+
+    :param loader: Loader to build transactions out of the counters
+    :param returnSiteIndex: Index of probes instrumented in target application
+    :param sampleFile: Sample file with counters of a thread
+    :returns: count of records loaded from the sample file
+
+    """
+    iterBegin = time.time()
+    samplesLoader = SamplesLoader(sampleFile.path)
+    recordCount = 0
+    for batch in samplesLoader.iterBatches(self.BATCH_SIZE):
+      recordCount += self.loadSampleBatch(sampleFile.threadId, loader, returnSiteIndex, batch)
+      elapsed = time.time() - iterBegin
+      if elapsed >= 5:
+        LOGGER.completed('\tprocessed %d counters | ', recordCount)
+        iterBegin = time.time()
+    return recordCount
+
+  def loadSample(self, threadId, loader, returnSiteIndex, sample):
     """
     Loads time and pmu counters from xpedite sample objects
 
     :param threadId: Id of thread collecting the samples
     :param loader: loader to build transactions out of the counters
-    :param probes: Map of probes instrumented in target application
+    :param returnSiteIndex: Index of probes instrumented in target application
     :param sample: An object with binding to underlying C++ Sample object
 
     """
-    addr = hex(sample.returnSite())
-    if addr not in probes:
+    probe = returnSiteIndex.get(sample.returnSite())
+    if probe is None:
       self.orphanedSamplesCount += 1
       return None
-    data = sample.dataStr() if sample.hasData() else ''
-    counter = Counter(threadId, probes[addr], data, sample.tsc())
+    data = ''
+    if sample.hasData():
+      dataLo, dataHi = sample.data()
+      data = (dataHi, dataLo)
+    counter = Counter(threadId, probe, data, sample.tsc())
     if sample.hasPmc():
       for i in range(sample.pmcCount()):
         counter.addPmc(sample.pmc(i))
+    counter = loader.store.view(loader.store.append(counter))
     if self.counterFilter.canLoad(counter):
       loader.loadCounter(counter)
     return counter
 
+  def loadSampleBatch(self, threadId, loader, returnSiteIndex, batch):
+    """
+    Loads time and pmu counters from a batch of decoded xpedite samples
+
+    :param threadId: Id of thread collecting the samples
+    :param loader: loader to build transactions out of the counters
+    :param returnSiteIndex: Index of probes instrumented in target application
+    :param batch: Columnar batch of samples, decoded by SamplesLoader.iterBatches()
+    :returns: count of samples in the batch
+
+    """
+    probeIndices = returnSiteIndex.locate(batch['returnSite'])
+    sampleCount = len(probeIndices)
+    validIndices = numpy.flatnonzero(probeIndices >= 0)
+    self.orphanedSamplesCount += sampleCount - len(validIndices)
+    if len(validIndices) < sampleCount:
+      batch = {name : column[validIndices] for name, column in batch.items()}
+      probeIndices = probeIndices[validIndices]
+
+    store = loader.store
+    probeIds = store.internProbes(returnSiteIndex.probes)
+    indices = store.extend(
+      threadId, probeIds[probeIndices] if len(probeIds) else probeIndices, batch['tsc'], batch['dataHi'],
+      batch['dataLo'], batch['flags'], batch['pmcCount'], batch['pmc']
+    )
+    self.loadCounterViews(loader, indices)
+    return sampleCount
+
+  def loadCounterViews(self, loader, indices):
+    """
+    Loads counters at the given indices of loader's counter store
+
+    :param loader: loader to build transactions out of the counters
+    :param indices: Indices of counters in the store
+
+    """
+    if not isinstance(self.counterFilter, TrivialCounterFilter):
+      store = loader.store
+      indices = [index for index in indices if self.counterFilter.canLoad(CounterView(store, index))]
+    loader.loadCounterBatch(indices)
+
   MIN_FIELD_COUNT = 2
   INDEX_TSC = 0
   INDEX_ADDR = 1
   INDEX_DATA = 2
   INDEX_PMC = 3
 
-  def loadCounter(self, threadId, loader, probes, record):
+  def loadCounter(self, threadId, loader, returnSiteIndex, record):
     """
     Loads time and pmu counters from the given record
 
     :param threadId: Id of thread collecting the samples
     :param loader: loader to build transactions out of the counters
-    :param probes: Map of probes instrumented in target application
+    :param returnSiteIndex: Index of probes instrumented in target application
     :param record: A sample record in csv format
 
     """
-    fields = record.split(',')
-    if len(fields) < self.MIN_FIELD_COUNT:
-      raise Exception('detected record with < {} fields - \nrecord: "{}"\n'.format(self.MIN_FIELD_COUNT, record))
-    addr = fields[self.INDEX_ADDR]
-    if addr not in probes:
-      self.orphanedSamplesCount += 1
-      return None
-    data = fields[self.INDEX_DATA]
-    tsc = int(fields[self.INDEX_TSC], 16)
+    indices = self.loadRecords(threadId, loader, returnSiteIndex, [record])
+    return loader.store.view(indices[0]) if indices else None
 
-    counter = Counter(threadId, probes[addr], data, tsc)
-    if len(fields) > self.MIN_FIELD_COUNT:
-      for pmc in fields[self.MIN_FIELD_COUNT+1:]:
-        counter.addPmc(int(pmc))
-    if self.counterFilter.canLoad(counter):
-      loader.loadCounter(counter)
-    return counter
+  def loadRecords(self, threadId, loader, returnSiteIndex, records):
+    """
+    Loads time and pmu counters from a batch of records
+
+    :param threadId: Id of thread collecting the samples
+    :param loader: loader to build transactions out of the counters
+    :param returnSiteIndex: Index of probes instrumented in target application
+    :param records: A list of sample records in csv format
+    :returns: indices of the loaded counters in loader's counter store
+
+    """
+    store = loader.store
+    probeIds, tscs, dataHis, dataLos, flags, pmcCounts, pmcs = [], [], [], [], [], [], []
+    dataOverrides = {}
+    for record in records:
+      fields = record.split(',')
+      if len(fields) < self.MIN_FIELD_COUNT:
+        raise Exception('detected record with < {} fields - \nrecord: "{}"\n'.format(self.MIN_FIELD_COUNT, record))
+      try:
+        probe = returnSiteIndex.get(int(fields[self.INDEX_ADDR], 16))
+      except ValueError:
+        probe = None
+      if probe is None:
+        self.orphanedSamplesCount += 1
+        continue
+      tscs.append(int(fields[self.INDEX_TSC], 16))
+      probeIds.append(store.internProbe(probe))
+      flag, dataHi, dataLo = 0, 0, 0
+      data = fields[self.INDEX_DATA].strip() if len(fields) > self.INDEX_DATA else ''
+      if data:
+        flag = FLAG_DATA
+        parsedData = parseData(data)
+        if parsedData:
+          dataHi, dataLo = parsedData
+        else:
+          dataOverrides[len(tscs) - 1] = data
+      counterPmcs = [int(pmc) for pmc in fields[self.INDEX_PMC:]]
+      if counterPmcs:
+        flag |= FLAG_PMC
+      dataHis.append(dataHi)
+      dataLos.append(dataLo)
+      flags.append(flag)
+      pmcCounts.append(len(counterPmcs))
+      pmcs.append(counterPmcs)
+
+    pmcWidth = max(pmcCounts) if pmcCounts else 0
+    pmcMatrix = numpy.zeros((len(pmcs), pmcWidth), dtype=numpy.uint64)
+    for i, counterPmcs in enumerate(pmcs):
+      pmcMatrix[i, :len(counterPmcs)] = counterPmcs
+    indices = store.extend(threadId, probeIds, tscs, dataHis, dataLos, flags, pmcCounts, pmcMatrix)
+    for i, data in dataOverrides.items():
+      store.dataOverrides[indices[i]] = data
+    self.loadCounterViews(loader, indices)
+    return indices
 
   def logCounterFilterReport(self):
     """Logs statistics on the number of filtered counters"""
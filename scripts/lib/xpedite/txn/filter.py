@@ -24,6 +24,9 @@ class TrivialCounterFilter(object):
   def report(self):
     """Defaults to nop"""
 
+  def merge(self, other):
+    """Defaults to nop"""
+
 class AnonymousCounterFilter(object):
   """Filter to exclude counters missing txn id"""
 
@@ -79,6 +82,18 @@ class AnonymousCounterFilter(object):
     self.totalInspectedCounters = 0
     self.warmupCounters = 0
 
+  def merge(self, other):
+    """
+    Accumulates statistics of another filter, used to load counters of a thread in a worker process
+
+    :param other: Filter with statistics to be merged
+
+    """
+    self.extraneousCounters += other.extraneousCounters
+    self.nullIdCounters += other.nullIdCounters
+    self.totalInspectedCounters += other.totalInspectedCounters
+    self.warmupCounters += other.warmupCounters
+
   def report(self):
     """Returns statistics on the number of filtered counters"""
     totalFilteredCounters = self.extraneousCounters + self.nullIdCounters + self.warmupCounters
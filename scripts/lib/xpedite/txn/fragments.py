@@ -6,11 +6,17 @@ This module handles loading of transaction fragments from multiple threads.
 The loaded fragments are linked (suspending to resuming and vice versa) to
 create a chain of framgents to complete a transaction.
 
+Chains are joined with an iterative walk of the links, hence the depth of chains is not
+limited by the recursion limit. Chains branching from a common fragment share the counter
+indices of the common prefix, and counters of a chain are merged from sorted runs of its fragments.
+
 Author: Manikandan Dhamodharan, Morgan Stanley
 """
 
 import copy
+import heapq
 import logging
+import numpy
 LOGGER = logging.getLogger(__name__)
 
 class Key(object):
@@ -73,10 +79,16 @@ class TxnFragment(object):
 class TxnFragments(object):
   """A collection of suspending and resuming transaction fragemnts"""
 
-  def __init__(self):
-    """Constructs an instance of transaction fragment collection"""
+  def __init__(self, recordLinks=False):
+    """
+    Constructs an instance of transaction fragment collection
+
+    :param recordLinks: Flag to record links, for collections of spawned loaders to be merged
+
+    """
     self.fragments = {}
     self.rootFragments = []
+    self.links = [] if recordLinks else None
     self.nextTxnId = 0
 
   def addResumeFragment(self, linkId, txn):
@@ -90,16 +102,7 @@ class TxnFragments(object):
 
     """
     resumeFragment = TxnFragment(txn, resumeId=linkId)
-    resumeKey = ResumeKey(linkId)
-    resumeFragments = self.fragments.get(resumeKey, None)
-    if not resumeFragments:
-      resumeFragments = []
-      self.fragments.update({resumeKey:resumeFragments})
-      suspendFragment = self.fragments.get(SuspendKey(linkId), None)
-      if suspendFragment:
-        # found the previous fragment suspending the txn
-        suspendFragment.next = resumeFragments
-    resumeFragments.append(resumeFragment)
+    self.linkResumeFragment(ResumeKey(linkId), resumeFragment)
     LOGGER.trace('Adding %s', resumeFragment)
     return resumeFragment
 
@@ -116,36 +119,155 @@ class TxnFragments(object):
     if not fragment:
       fragment = TxnFragment(txn, suspendId=linkId)
       self.rootFragments.append(fragment)
-    self.fragments.update({SuspendKey(linkId):fragment})
-    resumeFragments = self.fragments.get(ResumeKey(linkId), None)
+    self.linkSuspendFragment(SuspendKey(linkId), fragment)
+    LOGGER.trace('Adding %s', fragment)
+
+  def linkResumeFragment(self, resumeKey, resumeFragment):
+    """
+    Adds a resuming fragment to the fragments for its key, linking the suspending fragment (if any)
+
+    :param resumeKey: Key of the resuming fragment
+    :param resumeFragment: Fragment of the resumed transaction
+
+    """
+    if self.links is not None:
+      self.links.append((resumeKey, resumeFragment))
+    resumeFragments = self.fragments.get(resumeKey, None)
+    if not resumeFragments:
+      resumeFragments = []
+      self.fragments.update({resumeKey:resumeFragments})
+      suspendFragment = self.fragments.get(SuspendKey(resumeKey.linkId), None)
+      if suspendFragment:
+        # found the previous fragment suspending the txn
+        suspendFragment.next = resumeFragments
+    resumeFragments.append(resumeFragment)
+
+  def linkSuspendFragment(self, suspendKey, fragment):
+    """
+    Maps a suspending fragment to its key, linking the resuming fragments (if any)
+
+    :param suspendKey: Key of the suspending fragment
+    :param fragment: Fragment of the suspended transaction
+
+    """
+    if self.links is not None:
+      self.links.append((suspendKey, fragment))
+    self.fragments.update({suspendKey:fragment})
+    resumeFragments = self.fragments.get(ResumeKey(suspendKey.linkId), None)
     if resumeFragments:
-      # found the previous fragment suspending the txn
+      # found the next fragments resuming the txn
       fragment.next = resumeFragments
-    LOGGER.trace('Adding %s', fragment)
 
-  def joinFragments(self, txns, txn, fragments):
-    """Joins fragments in a link to compose a compound transaction"""
-    if not fragments:
-      self.nextTxnId += 1
-      txn.txnId = self.nextTxnId
-      txns.append(txn)
-    elif len(fragments) == 1:
-      txn.join(fragments[0].txn)
-      self.joinFragments(txns, txn, fragments[0].next)
+  def merge(self, other):
+    """
+    Merges fragments of another collection, with links identical to adding them to self
+
+    Links of the other collection are replayed in the order, the fragments were added to it.
+    Hence, fragments linked under many keys or sharing a key with fragments of self, end up
+    linked exactly as if they were added to self.
+
+    :param other: Fragments collected from the samples of a subsequent thread, with recorded links
+
+    """
+    for _, fragment in other.links:
+      fragment.next = None
+    for key, fragment in other.links:
+      if key.resuming:
+        self.linkResumeFragment(key, fragment)
+      else:
+        self.linkSuspendFragment(key, fragment)
+    other.links = None
+    self.rootFragments.extend(other.rootFragments)
+
+  def transactions(self):
+    """Yields transactions of all the fragments in the collection"""
+    for key, fragments in self.fragments.items():
+      if key.resuming:
+        for fragment in fragments:
+          yield fragment.txn
+      else:
+        yield fragments.txn
+    for fragment in self.rootFragments:
+      yield fragment.txn
+
+  @staticmethod
+  def buildRun(store, txn):
+    """
+    Builds a run of counter indices of a fragment, sorted by time stamp counter
+
+    :param store: Store with counters of the compound transaction
+    :param txn: Transaction of the fragment
+    :returns: tuple of sorted indices and their time stamp counters
+
+    """
+    if txn.store is store:
+      indices = numpy.array(txn.indices, dtype=numpy.intp)
     else:
-      txnClone = copy.deepcopy(txn)
-      for i, fragment in enumerate(fragments):
-        txn.join(fragment.txn)
-        self.joinFragments(txns, txn, fragment.next)
-        if i+1 < len(fragments) -1:
-          txn = copy.deepcopy(txnClone)
-        else:
-          txn = txnClone
+      indices = numpy.array([store.indexOf(counter) for counter in txn.counters], dtype=numpy.intp)
+    tscs = store.tsc[indices]
+    if (tscs[1:] < tscs[:-1]).any():
+      order = numpy.argsort(tscs, kind='stable')
+      indices, tscs = indices[order], tscs[order]
+    return indices, tscs
+
+  @staticmethod
+  def mergeRuns(runs):
+    """
+    Merges sorted runs of counter indices, ordering counters with equal tsc by the order of their runs
+
+    Runs of a chain seldom overlap in time, such runs are concatenated without comparing counters
+
+    :param runs: List of runs (tuple of indices and tscs) in the order of fragments in a chain
+    :returns: list of merged counter indices
+
+    """
+    if all(len(run[1]) > 0 for run in runs):
+      firsts = numpy.array([run[1][0] for run in runs[1:]])
+      lasts = numpy.array([run[1][-1] for run in runs[:-1]])
+      if (firsts >= lasts).all():
+        return numpy.concatenate([run[0] for run in runs]).tolist()
+    merged = heapq.merge(*[zip(tscs.tolist(), indices.tolist()) for indices, tscs in runs], key=lambda pair: pair[0])
+    return [index for _, index in merged]
+
+  def joinFragments(self, txns, rootFragment):
+    """
+    Joins fragments in the links from a root fragment, to compose a compound transaction for each chain
+
+    Links are walked depth first with an explicit stack, keeping runs of the fragments in the current
+    chain. The first chain reuses the transaction of the root fragment, others are composed in shallow
+    clones of the root transaction, with their own list of counter indices.
+
+    :param txns: List to collect the compound transactions
+    :param rootFragment: Fragment, that began the chains of fragments
+
+    """
+    rootTxn = rootFragment.txn
+    store = rootTxn.store
+    if not rootFragment.next:
+      self.nextTxnId += 1
+      rootTxn.txnId = self.nextTxnId
+      txns.append(rootTxn)
+      return
+    runs = []
+    stack = [(rootFragment, 0)]
+    txn = None
+    while stack:
+      fragment, depth = stack.pop()
+      del runs[depth:]
+      runs.append(self.buildRun(store, fragment.txn))
+      if fragment.next:
+        stack.extend((nextFragment, depth + 1) for nextFragment in reversed(fragment.next))
+      else:
+        txn = rootTxn if txn is None else copy.copy(rootTxn)
+        txn.indices = self.mergeRuns(runs)
+        self.nextTxnId += 1
+        txn.txnId = self.nextTxnId
+        txns.append(txn)
 
   def join(self, nextTxnId):
     """Joins all fragments in the collection to compose a compound transactions"""
     self.nextTxnId = nextTxnId
     txns = []
     for rootFragment in self.rootFragments:
-      self.joinFragments(txns, rootFragment.txn, rootFragment.next)
+      self.joinFragments(txns, rootFragment)
     return txns
@@ -7,10 +7,12 @@ The BoundedTxnLoader builds transactions based on scopes and bounds.
 Author: Manikandan Dhamodharan, Morgan Stanley
 """
 
+import numpy
 from xpedite.txn                 import Transaction
 from xpedite.txn.collection      import TxnCollection
 from xpedite.types.containers    import ProbeMap
 from xpedite.txn.fragments       import TxnFragments
+from xpedite.types.counterStore  import CounterStore, CounterView
 from collections                 import OrderedDict
 
 class AbstractTxnLoader(object):
@@ -39,6 +41,7 @@ class AbstractTxnLoader(object):
 
   def reset(self):
     """Resets the state of the loader"""
+    self.store = CounterStore()
     self.processedCounterCount = 0
     self.txns = OrderedDict()
     self.compromisedTxns = []
@@ -106,8 +109,70 @@ class AbstractTxnLoader(object):
       self.compromisedTxns.append(self.currentTxn)
       self.currentTxn = None
 
+  def loadCounterBatch(self, indices):
+    """
+    Loads a batch of counters, collected by the current thread
+
+    :param indices: Indices of counters in the store, in the order of collection
+
+    """
+    for index in indices:
+      self.loadCounter(CounterView(self.store, index))
+
+  def spawn(self):
+    """Returns a new loader of the same type, to load samples of a thread in a worker process"""
+    return type(self)(self.name, None, self.probes, None, None)
+
+  def merge(self, other):
+    """
+    Merges transactions and statistics of a spawned loader to self
+
+    Spawned loaders must be merged in the same order, their threads would be loaded serially
+
+    :param other: Spawned loader, that loaded samples of a single thread
+
+    """
+    self.mergeStore(other)
+    self.processedCounterCount += other.processedCounterCount
+    for txn in other.txns.values():
+      AbstractTxnLoader.appendTxn(self, txn)
+    self.compromisedTxns.extend(other.compromisedTxns)
+    self.nonTxnCounters.extend(other.nonTxnCounters)
+
+  def transactions(self):
+    """Yields all the transactions (complete or not) held by this loader"""
+    for txn in self.txns.values():
+      yield txn
+    for txn in self.compromisedTxns:
+      yield txn
+    if self.currentTxn:
+      yield self.currentTxn
+
+  def mergeStore(self, other):
+    """
+    Merges counters of a spawned loader to self's store and relocates transactions of the spawned loader
+
+    :param other: Spawned loader, that loaded samples of a single thread
+
+    """
+    offset = self.store.merge(other.store)
+    for txn in other.transactions():
+      txn.rebase(other.store, self.store, offset)
+
+    def rebaseCounters(counters):
+      """Relocates views of counters in the store of the spawned loader"""
+      return [
+        CounterView(self.store, counter.index + offset)
+        if isinstance(counter, CounterView) and counter.store is other.store else counter for counter in counters
+      ]
+
+    other.nonTxnCounters = rebaseCounters(other.nonTxnCounters)
+    other.ephemeralCounters = rebaseCounters(other.ephemeralCounters)
+    other.store = self.store
+
   def getData(self):
     """Returns a collection of all the loaded transactions"""
+    self.store.trim()
     return TxnCollection(
       self.name, self.cpuInfo, self.txns, self.probes, self.topdownMetrics, self.events, self.dataSource
     )
@@ -119,6 +184,16 @@ class AbstractTxnLoader(object):
 class BoundedTxnLoader(AbstractTxnLoader):
   """Loads transactions bounded by well defined begin/end probes"""
 
+  # Targets of the ephemeral counters, that preceded the first txn in a thread
+  EPHEMERAL_TO_NON_TXN = 1
+  EPHEMERAL_TO_COMPROMISED_TXN = 2
+
+  # Roles of probes in demarcating transactions
+  ROLE_BEGIN = 1
+  ROLE_RESUME = 2
+  ROLE_END = 4
+  ROLE_SUSPEND = 8
+
   def __init__(self, name, cpuInfo, probes, topdownMetrics, events):
     """
     Constructs a loader, that builds transactions based on probe bounds (begin/end probes)
@@ -137,6 +212,7 @@ class BoundedTxnLoader(AbstractTxnLoader):
     self.fragments = TxnFragments()
     self.resumeFragment = None
     self.suspendingTxn = False
+    self.leadingEphemeralTarget = None
 
   def appendTxn(self, txn):
     """
@@ -188,10 +264,12 @@ class BoundedTxnLoader(AbstractTxnLoader):
     else:
       if userProbe.canBeginTxn or userProbe.canResumeTxn:
         self.currentTxn = self.buildTxn(counter, userProbe.canResumeTxn)
+        self.leadingEphemeralTarget = self.leadingEphemeralTarget or self.EPHEMERAL_TO_NON_TXN
         if self.ephemeralCounters:
           self.nonTxnCounters.extend(self.ephemeralCounters)
           self.ephemeralCounters = []
       elif userProbe.canEndTxn or userProbe.canSuspendTxn:
+        self.leadingEphemeralTarget = self.leadingEphemeralTarget or self.EPHEMERAL_TO_COMPROMISED_TXN
         compromisedTxn = self.buildTxn(counter)
         for eCounter in self.ephemeralCounters:
           compromisedTxn.addCounter(eCounter, False)
@@ -200,6 +278,116 @@ class BoundedTxnLoader(AbstractTxnLoader):
       else:
         self.ephemeralCounters.append(counter)
 
+  def probeRoles(self):
+    """Returns a numpy array with bitmask of roles, for each probe interned in the store"""
+    roles = numpy.zeros(len(self.store.probes), dtype=numpy.uint8)
+    for probeId, probe in enumerate(self.store.probes):
+      userProbe = self.probeMap.get(probe, probe)
+      roles[probeId] = (
+        (self.ROLE_BEGIN if userProbe.canBeginTxn else 0) | (self.ROLE_RESUME if userProbe.canResumeTxn else 0) |
+        (self.ROLE_END if userProbe.canEndTxn else 0) | (self.ROLE_SUSPEND if userProbe.canSuspendTxn else 0)
+      )
+    return roles
+
+  def loadCounterBatch(self, indices):
+    """
+    Associates a batch of counters, collected by the current thread with transactions
+
+    Transaction boundaries for the whole batch are located with array operations, instead of
+    running the state machine in loadCounter for each counter. Counters between boundaries are
+    sliced to transactions, hence the per counter cost is limited to a few vector operations.
+
+    The transactions, fragments and statistics built are identical to loading the counters one
+    at a time with loadCounter, which remains the reference implementation.
+
+    :param indices: Indices of counters in the store, in the order of collection
+
+    """
+    indices = numpy.asarray(indices, dtype=numpy.intp)
+    count = len(indices)
+    if not count:
+      return
+    self.processedCounterCount += count
+    roles = self.probeRoles()[self.store.probeIds[indices]]
+    isBegin = (roles & (self.ROLE_BEGIN | self.ROLE_RESUME)) != 0
+    isResume = (roles & self.ROLE_RESUME) != 0
+    isEnd = ~isBegin & ((roles & (self.ROLE_END | self.ROLE_SUSPEND)) != 0)
+    suspends = numpy.flatnonzero(isEnd & ((roles & self.ROLE_SUSPEND) != 0))
+
+    # A begin probe starts a new txn, unless it's nested in a txn, that is yet to see an end probe.
+    # Resume probes always start a new txn
+    bounds = numpy.flatnonzero(isBegin | isEnd)
+    precededByBegin = numpy.empty(len(bounds), dtype=bool)
+    if len(bounds):
+      precededByBegin[0] = self.currentTxn is not None and not self.currentTxn.hasEndProbe
+      precededByBegin[1:] = isBegin[bounds[:-1]]
+    starts = bounds[isBegin[bounds] & (isResume[bounds] | ~precededByBegin)]
+    lastEnd = numpy.maximum.accumulate(numpy.where(isEnd, numpy.arange(count), -1))
+    segments = numpy.append(starts, count)
+
+    self.loadLeadingCounters(indices, isEnd, lastEnd, suspends, segments[0])
+    for i, start in enumerate(starts):
+      end = segments[i + 1]
+      if self.currentTxn:
+        if self.ephemeralCounters:
+          self.nonTxnCounters.extend(self.ephemeralCounters)
+          self.ephemeralCounters = []
+        self.appendTxn(self.currentTxn)
+      else:
+        self.leadingEphemeralTarget = self.leadingEphemeralTarget or self.EPHEMERAL_TO_NON_TXN
+        if self.ephemeralCounters:
+          self.nonTxnCounters.extend(self.ephemeralCounters)
+          self.ephemeralCounters = []
+      self.currentTxn = self.buildTxn(CounterView(self.store, indices[start]), bool(isResume[start]))
+      self.loadTxnCounters(indices, lastEnd, suspends, start + 1, end)
+
+  def loadLeadingCounters(self, indices, isEnd, lastEnd, suspends, end):
+    """
+    Associates counters, preceding the first txn begin/resume probe in a batch
+
+    The counters extend the current txn (if any) or build compromised txns at end probes
+
+    """
+    if end <= 0:
+      return
+    if self.currentTxn:
+      self.loadTxnCounters(indices, lastEnd, suspends, 0, end)
+      return
+    begin = 0
+    for txnEnd in numpy.flatnonzero(isEnd[:end]):
+      self.leadingEphemeralTarget = self.leadingEphemeralTarget or self.EPHEMERAL_TO_COMPROMISED_TXN
+      compromisedTxn = self.buildTxn(CounterView(self.store, indices[txnEnd]))
+      for eCounter in self.ephemeralCounters:
+        compromisedTxn.addCounter(eCounter, False)
+      compromisedTxn.addIndices(indices[begin:txnEnd].tolist(), False)
+      self.compromisedTxns.append(compromisedTxn)
+      self.ephemeralCounters = []
+      begin = txnEnd + 1
+    self.ephemeralCounters.extend(self.store.views(indices[begin:end].tolist()))
+
+  def loadTxnCounters(self, indices, lastEnd, suspends, begin, end):
+    """
+    Adds counters in the range [begin, end) of a batch to the current txn
+
+    Counters following the last end probe in the range, are held back as ephemeral counters
+
+    """
+    txn = self.currentTxn
+    txnEnd = lastEnd[end - 1] if end > begin else -1
+    if txnEnd >= begin:
+      for eCounter in self.ephemeralCounters:
+        txn.addCounter(eCounter, False)
+      txn.addIndices(indices[begin:txnEnd + 1].tolist(), True)
+      for suspend in suspends[numpy.searchsorted(suspends, begin):numpy.searchsorted(suspends, txnEnd, 'right')]:
+        self.suspendingTxn = True
+        linkId = '{:x}{}'.format(int(self.store.tsc[indices[suspend]]), self.tlsAddr)
+        self.fragments.addSuspendFragment(linkId, txn, self.resumeFragment)
+      self.ephemeralCounters = self.store.views(indices[txnEnd + 1:end].tolist())
+    elif txn.hasEndProbe:
+      self.ephemeralCounters.extend(self.store.views(indices[begin:end].tolist()))
+    else:
+      txn.addIndices(indices[begin:end].tolist(), False)
+
   def buildTxn(self, counter, resumeTxn=False):
     """
     Constructs a new transaction instance
@@ -218,6 +406,11 @@ class BoundedTxnLoader(AbstractTxnLoader):
     self.nextFragmentId += 1
     return Transaction(counter, self.nextFragmentId)
 
+  def beginLoad(self, threadId, tlsAddr):
+    """Marks beginning of the current load session"""
+    AbstractTxnLoader.beginLoad(self, threadId, tlsAddr)
+    self.leadingEphemeralTarget = None
+
   def endLoad(self):
     """Marks end of the current load session"""
     if self.currentTxn:
@@ -227,6 +420,55 @@ class BoundedTxnLoader(AbstractTxnLoader):
         self.compromisedTxns.append(self.currentTxn)
     self.currentTxn = None
 
+  def spawn(self):
+    """Returns a new loader, recording links of fragments to be merged to self"""
+    loader = AbstractTxnLoader.spawn(self)
+    loader.fragments = TxnFragments(recordLinks=True)
+    return loader
+
+  def merge(self, other):
+    """
+    Merges transactions, fragments and statistics of a spawned loader to self
+
+    Transactions are renumbered and fragments are linked, exactly as if the samples
+    were loaded serially by this loader.
+
+    :param other: Spawned loader, that loaded samples of a single thread
+
+    """
+    self.mergeStore(other)
+    if self.ephemeralCounters:
+      # ephemeral counters carry over to the next thread, till the first txn boundary
+      if other.leadingEphemeralTarget == self.EPHEMERAL_TO_NON_TXN:
+        self.nonTxnCounters.extend(self.ephemeralCounters)
+      elif other.leadingEphemeralTarget == self.EPHEMERAL_TO_COMPROMISED_TXN:
+        # carried counters precede the ephemeral counters of the spawned loader, following the end counter
+        compromisedTxn = other.compromisedTxns[0]
+        compromisedTxn.indices[1:1] = [compromisedTxn.store.indexOf(eCounter) for eCounter in self.ephemeralCounters]
+      else:
+        other.ephemeralCounters = self.ephemeralCounters + other.ephemeralCounters
+    self.ephemeralCounters = other.ephemeralCounters
+    self.processedCounterCount += other.processedCounterCount
+    for txn in other.txns.values():
+      self.nextTxnId += 1
+      txn.txnId = self.nextTxnId
+      AbstractTxnLoader.appendTxn(self, txn)
+    for txn in other.compromisedTxns:
+      # ids of resumed txns are link ids, other ids are fragment ids of the spawned loader
+      if isinstance(txn.txnId, int):
+        txn.txnId += self.nextFragmentId
+    self.compromisedTxns.extend(other.compromisedTxns)
+    self.nonTxnCounters.extend(other.nonTxnCounters)
+    self.nextFragmentId += other.nextFragmentId
+    self.fragments.merge(other.fragments)
+
+  def transactions(self):
+    """Yields all the transactions (complete, compromised or fragments) held by this loader"""
+    for txn in AbstractTxnLoader.transactions(self):
+      yield txn
+    for txn in self.fragments.transactions():
+      yield txn
+
   def endCollection(self):
     """Ends loading of samples from multiple threads of a target process"""
     txns = self.fragments.join(self.nextTxnId)
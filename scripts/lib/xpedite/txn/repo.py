@@ -117,6 +117,36 @@ def loaderFactory(loaderType, benchmark, probes, benchmarkProbes, topdownCache,
 class TxnRepoFactory(object):
   """Factory to build a repository of transactions"""
 
+  @staticmethod
+  def loadCurrentTxns(app, collector, loader):
+    """
+    Loads transactions for the current profile session
+
+    Transactions for reports of a previous run, are loaded from (and persisted to) the transaction cache
+
+    :param app: An instance of xpedite app, to interact with target application
+    :param collector: Collector to gather counters from sample files
+    :param loader: Loader to build transactions out of the counters
+
+    """
+    from xpedite.txn.cache        import TxnCache, buildRunKey
+    from xpedite.types.dataSource import BinaryDataSourceFactory
+    txnCache = TxnCache.fromConfig() if app.dryRun and not app.dataSource else None
+    if not txnCache:
+      collector.gatherCounters(app, loader)
+      return loader.getData()
+
+    dataSource = BinaryDataSourceFactory().gather(app)
+    key = buildRunKey(app.runId, dataSource, loader.probes)
+    currentTxns = txnCache.load(
+      key, loader.name, loader.cpuInfo, loader.probes, loader.topdownMetrics, loader.events, dataSource
+    )
+    if currentTxns is None:
+      collector.gatherCounters(app, loader, dataSource)
+      currentTxns = loader.getData()
+      txnCache.save(key, currentTxns)
+    return currentTxns
+
   @staticmethod
   def buildTxnRepo(app, cpuInfo, probes, topdownCache, topdownMetrics,
     events, benchmarkProbes, benchmarkPaths):
@@ -145,8 +175,7 @@ class TxnRepoFactory(object):
     loaderType = BoundedTxnLoader
     loader = loaderType(CURRENT_RUN, cpuInfo, probes, topdownMetrics, events)
 
-    timeAction('gathering counters', lambda: collector.gatherCounters(app, loader))
-    currentTxns = loader.getData()
+    currentTxns = timeAction('gathering counters', lambda: TxnRepoFactory.loadCurrentTxns(app, collector, loader))
 
     if not currentTxns:
       if loader.processedCounterCount:
@@ -163,7 +192,7 @@ class TxnRepoFactory(object):
     if benchmarkPaths:
       benchmarksCollector = BenchmarksCollector(benchmarkPaths)
       benchmarksCollector.loadTxns(
-        repo, counterFilter, benchmarksCollector.gatherBenchmarks(10), loaderFactory=lambda benchmark: loaderFactory(
+        repo, counterFilter, benchmarksCollector.gatherBenchmarks(), loaderFactory=lambda benchmark: loaderFactory(
           loaderType, benchmark, probes, benchmarkProbes, topdownCache, topdownMetrics
         )
       )
@@ -9,6 +9,36 @@ from xpedite.dependencies import Package, DEPENDENCY_LOADER
 DEPENDENCY_LOADER.load(Package.Enum, Package.Six)
 from enum import Enum # pylint: disable=wrong-import-position
 
+_MASK_64 = (1 << 64) - 1
+
+def formatData(dataHi, dataLo):
+  """
+  Formats 128 bit probe data, as a hex string
+
+  :param dataHi: Upper 64 bits of the probe data
+  :param dataLo: Lower 64 bits of the probe data
+
+  """
+  return '{:x}{:016x}'.format(dataHi, dataLo)
+
+def parseData(data):
+  """
+  Parses hex formatted probe data to a pair of (upper, lower) 64 bit integers
+
+  Returns None, if the data can't be reproduced from the integer representation
+
+  :param data: Probe data formatted as a hex string
+
+  """
+  try:
+    value = int(data, 16)
+  except ValueError:
+    return None
+  dataHi, dataLo = value >> 64, value & _MASK_64
+  if dataHi > _MASK_64 or formatData(dataHi, dataLo) != data:
+    return None
+  return dataHi, dataLo
+
 class Counter(object):
 
   """
@@ -16,17 +46,39 @@ class Counter(object):
 
   A counter can store cpu time stamp counter (tsc) and a collection
   of pmc values collected by any of the core and offcore pmu units
+
+  Probe data decoded from binary samples is kept as a pair of (upper, lower) 64 bit
+  integers and formatted as a hex string, only when the data is accessed
   """
 
   def __init__(self, threadId, probe, data, tsc):
+    """
+    Constructs a counter
+
+    :param threadId: Id of the thread, that collected the counter
+    :param probe: Probe, that collected the counter
+    :param data: Probe data as a hex string or a tuple of (upper, lower) 64 bits of the data
+    :param tsc: Time stamp counter of the sample
+
+    """
     self.threadId = threadId
     self.probe = probe
-    data = data.strip()
     self.txnId = None
-    self.data = data
+    self.rawData = data if isinstance(data, tuple) else data.strip()
     self.tsc = tsc
     self.pmcs = []
 
+  @property
+  def data(self):
+    """Probe data formatted as a hex string"""
+    rawData = self.rawData
+    return formatData(*rawData) if isinstance(rawData, tuple) else rawData
+
+  @data.setter
+  def data(self, data):
+    """Replaces probe data with the given hex string"""
+    self.rawData = data
+
   def addPmc(self, pmc):
     """
     Adds the given pmc value to the counter
@@ -54,7 +106,16 @@ class Counter(object):
     return rep
 
   def __eq__(self, other):
-    return self.__dict__ == other.__dict__
+    return (
+      self.threadId == other.threadId and self.probe == other.probe and self.txnId == other.txnId
+      and self.data == other.data and self.tsc == other.tsc and self.pmcs == other.pmcs
+    )
+
+  def __setstate__(self, state):
+    if 'data' in state:
+      # counters pickled before probe data was decoded lazily
+      state['rawData'] = state.pop('data')
+    self.__dict__.update(state)
 
 class ResultOrder(Enum):
   """Sort order of transactions in latency constituent reports"""
@@ -80,6 +141,18 @@ class RouteConflation(Enum):
       return self.__dict__ == other.__dict__
     return None
 
+class BucketLayout(Enum):
+  """Layout of buckets in latency distribution histograms"""
+
+  Linear = 1
+  Log = 2
+  Hdr = 3
+
+  def __eq__(self, other):
+    if other:
+      return self.__dict__ == other.__dict__
+    return None
+
 class CpuInfo(object):
   """Info about cpu model and configuration"""
 
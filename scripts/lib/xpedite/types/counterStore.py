@@ -0,0 +1,278 @@
+"""
+Compact storage for counters
+
+A CounterStore holds the time stamp counters, probes, threads, data and pmc values
+of counters, as a struct of arrays backed by growable numpy buffers.
+
+Counters are not stored as objects. Instead, a light weight CounterView is built on
+access, to provide the same interface as xpedite.types.Counter for transactions,
+classifiers and the Jupyter shell.
+"""
+
+import numpy
+from xpedite.types import Counter, formatData, parseData
+
+FLAG_DATA = 1
+FLAG_PMC = 2
+
+class CounterView(Counter):
+  """A read only view of a counter, in a counter store"""
+
+  __slots__ = ('store', 'index')
+
+  txnId = None
+
+  def __init__(self, store, index): # pylint: disable=super-init-not-called
+    self.store = store
+    self.index = index
+
+  @property
+  def threadId(self):
+    """Id of the thread, that collected the counter"""
+    return self.store.threadIds[self.store.threads[self.index]]
+
+  @property
+  def probe(self):
+    """Probe, that collected the counter"""
+    return self.store.probes[self.store.probeIds[self.index]]
+
+  @property
+  def tsc(self):
+    """Time stamp counter of the sample"""
+    return int(self.store.tsc[self.index])
+
+  @property
+  def data(self):
+    """Probe data formatted as a hex string"""
+    return self.store.getData(self.index)
+
+  @property
+  def rawData(self):
+    """Probe data as a tuple of (upper, lower) 64 bit integers, or a string for data without such form"""
+    return self.store.getRawData(self.index)
+
+  @property
+  def pmcs(self):
+    """List of pmc values collected by the probe"""
+    return self.store.getPmcs(self.index)
+
+  def __reduce__(self):
+    return (CounterView, (self.store, self.index))
+
+class CounterStore(object):
+  """Stores counters as a struct of numpy arrays"""
+
+  def __init__(self):
+    self.size = 0
+    self.probes = []
+    self.threadIds = []
+    self.dataOverrides = {}
+    self.tsc = numpy.zeros(0, dtype=numpy.uint64)
+    self.probeIds = numpy.zeros(0, dtype=numpy.int32)
+    self.threads = numpy.zeros(0, dtype=numpy.int32)
+    self.dataHi = numpy.zeros(0, dtype=numpy.uint64)
+    self.dataLo = numpy.zeros(0, dtype=numpy.uint64)
+    self.flags = numpy.zeros(0, dtype=numpy.uint8)
+    self.pmcCount = numpy.zeros(0, dtype=numpy.uint8)
+    self.pmcs = numpy.zeros((0, 0), dtype=numpy.uint64)
+    self._buildLookups()
+
+  def _buildLookups(self):
+    """Builds lookup tables for interned probes and threads"""
+    self._probeLookup = {id(probe) : i for i, probe in enumerate(self.probes)}
+    self._threadLookup = {threadId : i for i, threadId in enumerate(self.threadIds)}
+
+  def __len__(self):
+    return self.size
+
+  def reserve(self, count, pmcWidth=0):
+    """
+    Grows the buffers to store atleast count more counters, with pmcWidth pmc values each
+
+    Buffers are grown geometrically, the first growth is sized to the requested count, to keep
+    stores of transactions built from a few plain counters small
+
+    :param count: Number of counters to be appended
+    :param pmcWidth: Maximum number of pmc values in the counters to be appended
+
+    """
+    capacity = len(self.tsc)
+    required = self.size + count
+    if required > capacity:
+      capacity = max(required, 2 * capacity)
+      for name in ('tsc', 'probeIds', 'threads', 'dataHi', 'dataLo', 'flags', 'pmcCount'):
+        column = getattr(self, name)
+        grownColumn = numpy.zeros(capacity, dtype=column.dtype)
+        grownColumn[:self.size] = column[:self.size]
+        setattr(self, name, grownColumn)
+    if capacity > self.pmcs.shape[0] or pmcWidth > self.pmcs.shape[1]:
+      pmcs = numpy.zeros((capacity, max(pmcWidth, self.pmcs.shape[1])), dtype=numpy.uint64)
+      pmcs[:self.size, :self.pmcs.shape[1]] = self.pmcs[:self.size]
+      self.pmcs = pmcs
+
+  def trim(self):
+    """Releases unused capacity of the buffers"""
+    for name in ('tsc', 'probeIds', 'threads', 'dataHi', 'dataLo', 'flags', 'pmcCount', 'pmcs'):
+      setattr(self, name, getattr(self, name)[:self.size].copy())
+
+  def internProbe(self, probe):
+    """Returns id of the given probe in this store"""
+    probeId = self._probeLookup.get(id(probe))
+    if probeId is None:
+      probeId = len(self.probes)
+      self.probes.append(probe)
+      self._probeLookup[id(probe)] = probeId
+    return probeId
+
+  def internProbes(self, probes):
+    """Returns a numpy array with ids of the given probes in this store"""
+    return numpy.array([self.internProbe(probe) for probe in probes], dtype=numpy.int32)
+
+  def internThread(self, threadId):
+    """Returns index of the given thread id in this store"""
+    index = self._threadLookup.get(threadId)
+    if index is None:
+      index = len(self.threadIds)
+      self.threadIds.append(threadId)
+      self._threadLookup[threadId] = index
+    return index
+
+  def extend(self, threadId, probeIds, tsc, dataHi, dataLo, flags, pmcCount, pmcs): # pylint: disable=too-many-positional-arguments
+    """
+    Appends a batch of counters, collected by a thread
+
+    :param threadId: Id of the thread, that collected the counters
+    :param probeIds: Ids (interned in this store) of probes, that collected the counters
+    :param tsc: Time stamp counters of the samples
+    :param dataHi: Upper 64 bits of the probe data
+    :param dataLo: Lower 64 bits of the probe data
+    :param flags: Bitmask of FLAG_DATA and FLAG_PMC for each counter
+    :param pmcCount: Number of pmc values collected by each counter
+    :param pmcs: Matrix of pmc values (counters x pmc count)
+    :returns: range of indices of the appended counters
+
+    """
+    count = len(probeIds)
+    pmcs = numpy.asarray(pmcs, dtype=numpy.uint64).reshape(count, -1) if count else numpy.zeros((0, 0))
+    self.reserve(count, pmcs.shape[1])
+    begin, end = self.size, self.size + count
+    self.tsc[begin:end] = tsc
+    self.probeIds[begin:end] = probeIds
+    self.threads[begin:end] = self.internThread(threadId)
+    self.dataHi[begin:end] = dataHi
+    self.dataLo[begin:end] = dataLo
+    self.flags[begin:end] = flags
+    self.pmcCount[begin:end] = pmcCount
+    self.pmcs[begin:end, :pmcs.shape[1]] = pmcs
+    self.size = end
+    return range(begin, end)
+
+  def append(self, counter):
+    """
+    Appends a copy of the given counter
+
+    :param counter: Counter to be appended
+    :returns: index of the appended counter
+
+    """
+    index = self.size
+    self.reserve(1, len(counter.pmcs))
+    self.tsc[index] = counter.tsc
+    self.probeIds[index] = self.internProbe(counter.probe)
+    self.threads[index] = self.internThread(counter.threadId)
+    flags = 0
+    rawData = counter.rawData
+    if rawData:
+      flags |= FLAG_DATA
+      data = rawData if isinstance(rawData, tuple) else parseData(rawData)
+      if data:
+        self.dataHi[index], self.dataLo[index] = data
+      else:
+        self.dataOverrides[index] = rawData
+    if counter.pmcs:
+      flags |= FLAG_PMC
+      self.pmcs[index, :len(counter.pmcs)] = counter.pmcs
+    self.flags[index] = flags
+    self.pmcCount[index] = len(counter.pmcs)
+    self.size += 1
+    return index
+
+  def indexOf(self, counter):
+    """
+    Returns index of the given counter, appending a copy, if the counter is not in this store
+
+    :param counter: Counter to be located
+    """
+    if isinstance(counter, CounterView) and counter.store is self:
+      return counter.index
+    return self.append(counter)
+
+  def merge(self, other):
+    """
+    Appends all the counters from other store
+
+    :param other: Store with counters to be appended
+    :returns: offset of the other store's counters in this store
+
+    """
+    offset = self.size
+    if other.size:
+      probeIds = self.internProbes(other.probes)[other.probeIds[:other.size]]
+      threads = numpy.array([self.internThread(threadId) for threadId in other.threadIds], dtype=numpy.int32)
+      self.reserve(other.size, other.pmcs.shape[1])
+      end = offset + other.size
+      self.tsc[offset:end] = other.tsc[:other.size]
+      self.probeIds[offset:end] = probeIds
+      self.threads[offset:end] = threads[other.threads[:other.size]]
+      self.dataHi[offset:end] = other.dataHi[:other.size]
+      self.dataLo[offset:end] = other.dataLo[:other.size]
+      self.flags[offset:end] = other.flags[:other.size]
+      self.pmcCount[offset:end] = other.pmcCount[:other.size]
+      self.pmcs[offset:end, :other.pmcs.shape[1]] = other.pmcs[:other.size]
+      self.size = end
+      for index, data in other.dataOverrides.items():
+        self.dataOverrides[index + offset] = data
+    return offset
+
+  def getRawData(self, index):
+    """Returns probe data of the counter at the given index, as a tuple of (upper, lower) 64 bit integers"""
+    if self.flags[index] & FLAG_DATA:
+      data = self.dataOverrides.get(index)
+      return data if data is not None else (int(self.dataHi[index]), int(self.dataLo[index]))
+    return ''
+
+  def getData(self, index):
+    """Returns probe data of the counter at the given index, formatted as a hex string"""
+    if self.flags[index] & FLAG_DATA:
+      data = self.dataOverrides.get(index)
+      return data if data is not None else formatData(int(self.dataHi[index]), int(self.dataLo[index]))
+    return ''
+
+  def getPmcs(self, index):
+    """Returns a list of pmc values collected by the counter at the given index"""
+    return self.pmcs[index, :self.pmcCount[index]].tolist()
+
+  def view(self, index):
+    """Returns a view of the counter at the given index"""
+    return CounterView(self, index)
+
+  def views(self, indices):
+    """Returns a list of views for counters at the given indices"""
+    return [CounterView(self, index) for index in indices]
+
+  def __getstate__(self):
+    state = dict(self.__dict__)
+    del state['_probeLookup']
+    del state['_threadLookup']
+    for name in ('tsc', 'probeIds', 'threads', 'dataHi', 'dataLo', 'flags', 'pmcCount', 'pmcs'):
+      state[name] = state[name][:self.size]
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self._buildLookups()
+
+  def __repr__(self):
+    return 'Counter store: {} counters | {} probes | {} threads'.format(
+      self.size, len(self.probes), len(self.threadIds)
+    )
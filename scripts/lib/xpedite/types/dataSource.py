@@ -1,11 +1,17 @@
 """
-Class definitions used in gathering and loading binary and csv sample files
+Class definitions used in gathering and loading binary, csv and columnar sample files
+
+Benchmarks persist samples in a columnar layout - a directory for each thread with a
+NumPy (.npy) file for each column of decoded samples (see xpedite.txn.columnar).
+A json manifest lists the threads and their column directories. Benchmarks made by
+older versions of xpedite, with samples in csv format, are gathered by CsvDataSourceFactory.
 
 Author: Manikandan Dhamodharan, Morgan Stanley
 """
 
 import os
 import re
+import json
 import fnmatch
 import logging
 from xpedite.dependencies import Package, DEPENDENCY_LOADER
@@ -13,6 +19,9 @@ DEPENDENCY_LOADER.load(Package.Enum, Package.Six)
 from enum import Enum # pylint: disable=wrong-import-position
 
 APPINFO_FILE_NAME = 'appinfo.txt'
+COLUMNAR_DIR_NAME = 'columns'
+MANIFEST_FILE_NAME = 'manifest.json'
+COLUMNAR_FORMAT_VERSION = 1
 LOGGER = logging.getLogger(__name__)
 
 class SampleFileFormat(Enum):
@@ -20,6 +29,7 @@ class SampleFileFormat(Enum):
 
   BINARY = 1
   CSV = 2
+  COLUMNAR = 3
 
   def __eq__(self, other):
     if other:
@@ -146,3 +156,62 @@ class BinaryDataSourceFactory(object):
         raise Exception('failed to extract thread info for file {}'.format(filePath))
       files.append(SampleFile(threadId, tlsAddr, filePath, SampleFileFormat.BINARY))
     return DataSource(app.appInfoPath, files)
+
+class ColumnarDataSourceFactory(object):
+  """Factory to create data source, with samples persisted in columnar format"""
+
+  @staticmethod
+  def manifestPath(path):
+    """
+    Returns path of the manifest, for a data source directory
+
+    :param path: path to directory with sample data
+
+    """
+    return os.path.join(path, COLUMNAR_DIR_NAME, MANIFEST_FILE_NAME)
+
+  @staticmethod
+  def canGather(path):
+    """
+    Checks, if the given directory has samples persisted in columnar format
+
+    :param path: path to directory with sample data
+
+    """
+    return os.path.isfile(ColumnarDataSourceFactory.manifestPath(path))
+
+  def gather(self, path):
+    """
+    Gathers appinfo and columnar sample files listed in the manifest, to build a data source
+
+    :param path: path to directory with sample data
+
+    """
+    appInfoPath = os.path.join(path, APPINFO_FILE_NAME)
+    if not os.path.isfile(appInfoPath):
+      LOGGER.error('skipping data source %s - detected missing appinfo file %s', path, APPINFO_FILE_NAME)
+      return None
+
+    manifestPath = self.manifestPath(path)
+    with open(manifestPath) as manifestFile:
+      manifest = json.load(manifestFile)
+    version = manifest.get('version')
+    if version != COLUMNAR_FORMAT_VERSION:
+      LOGGER.error('skipping data source %s - detected unsupported columnar format version %s', path, version)
+      return None
+    files = []
+    for thread in manifest['threads']:
+      filePath = os.path.join(os.path.dirname(manifestPath), thread['path'])
+      files.append(SampleFile(thread['threadId'], thread['tlsAddr'], filePath, SampleFileFormat.COLUMNAR))
+    return DataSource(appInfoPath, files)
+
+def gatherDataSource(path):
+  """
+  Gathers a data source from a directory, with samples in columnar or csv format
+
+  :param path: path to directory with sample data
+
+  """
+  if ColumnarDataSourceFactory.canGather(path):
+    return ColumnarDataSourceFactory().gather(path)
+  return CsvDataSourceFactory().gather(path)
@@ -8,6 +8,8 @@ Routes are used for aggregating and conflating transaction objects.
 Author: Manikandan Dhamodharan, Morgan Stanley
 """
 
+import numpy
+
 class Route(object):
   """A sequence of probes in program execution order"""
 
@@ -49,3 +51,63 @@ def conflateRoutes(srcRoute, dstRoute):
   if len(dstRoute) == len(indices):
     return indices[::-1]
   return None
+
+class RouteConflationIndex(object):
+  """
+  Memoizes indices of probes, for conflating source routes to destination routes
+
+  Routes of transactions are interned (see ProbeIndexFactory), hence a profile has only a
+  handful of distinct routes, shared by all of its transactions. The index is keyed by identity
+  of the interned routes, to conflate each pair of routes only once.
+  """
+
+  def __init__(self):
+    self.indexVectors = {}
+    self.routes = {}
+
+  def conflate(self, srcRoute, dstRoute):
+    """
+    Returns a read only vector of indices of probes in srcRoute, that conflate to dstRoute
+
+    Returns None, if the source route can't be conflated to the destination route
+
+    :param srcRoute: Route to be conflated to destination route
+    :param dstRoute: Traget route to conflate to
+
+    """
+    key = (id(srcRoute), id(dstRoute))
+    try:
+      return self.indexVectors[key]
+    except KeyError:
+      pass
+    indices = conflateRoutes(srcRoute, dstRoute)
+    if indices:
+      indices = numpy.array(indices, dtype=numpy.intp)
+      indices.flags.writeable = False
+    else:
+      indices = None
+    # holding references to the routes, prevents reuse of their ids, while the index is alive
+    self.routes[id(srcRoute)] = srcRoute
+    self.routes[id(dstRoute)] = dstRoute
+    self.indexVectors[key] = indices
+    return indices
+
+  def buildCompatibilityTable(self, srcRoutes, dstRoutes):
+    """
+    Builds a table mapping identity of each source route to a list of conflatable destination routes
+
+    :param srcRoutes: Collection of routes to be conflated
+    :param dstRoutes: Ordered collection of target routes
+
+    """
+    dstRoutes = list(dstRoutes)
+    table = {}
+    for srcRoute in srcRoutes:
+      if id(srcRoute) not in table:
+        table[id(srcRoute)] = [
+          dstRoute for dstRoute in dstRoutes if self.conflate(srcRoute, dstRoute) is not None
+        ]
+    return table
+
+  def __len__(self):
+    return len(self.indexVectors)
@@ -6,6 +6,7 @@ This module provides a factory to build probes
 Author: Manikandan Dhamodharan, Morgan Stanley
 """
 
+import numpy
 from xpedite.types import InvariantViloation
 from xpedite.types.probe import AnchoredProbe
 from xpedite.types.containers import ProbeMap
@@ -87,6 +88,55 @@ class ProbeFactory(object):
           raise InvariantViloation('detected record missing field {} - \n{}\n{}'.format(error, record, fields))
     return probes
 
+class ReturnSiteIndex(object):
+  """
+  Index to lookup probes by integer address of their recorder return sites
+
+  Samples carry the return site address of the recorder, that collected the sample.
+  The index supports lookup of a single address and vectorized lookup of arrays of addresses.
+  """
+
+  def __init__(self, probes):
+    """
+    Constructs an index for the given probes
+
+    :param probes: Map of hex formatted recorder return site to probes
+
+    """
+    self.probeMap = {int(returnSite, 16) : probe for returnSite, probe in probes.items()}
+    returnSites = sorted(self.probeMap)
+    self.returnSites = numpy.array(returnSites, dtype=numpy.uint64)
+    self.probes = [self.probeMap[returnSite] for returnSite in returnSites]
+
+  def get(self, returnSite, default=None):
+    """
+    Returns probe for the given return site address
+
+    :param returnSite: Integer address of recorder return site
+    :param default: Value to return for unknown addresses (Default value = None)
+
+    """
+    return self.probeMap.get(returnSite, default)
+
+  def locate(self, returnSites):
+    """
+    Returns indices of probes (in self.probes) for an array of return site addresses
+
+    Addresses missing in the index (orphaned samples) are mapped to -1
+
+    :param returnSites: numpy array of return site addresses
+
+    """
+    returnSites = numpy.asarray(returnSites, dtype=numpy.uint64)
+    if not self.probes:
+      return numpy.full(len(returnSites), -1, dtype=numpy.int64)
+    indices = numpy.searchsorted(self.returnSites, returnSites)
+    indices = numpy.minimum(indices, len(self.probes) - 1)
+    return numpy.where(self.returnSites[indices] == returnSites, indices, -1)
+
+  def __len__(self):
+    return len(self.probes)
+
 class ProbeIndexFactory(object):
 
   """Utility class to intern probe map generation"""
@@ -0,0 +1,124 @@
+"""
+Worker pool to fan out independent tasks to forked processes
+
+Worker processes are forked from the parent, hence tasks and their arguments are
+inherited without any serialization. Only the results are pickled back to the
+parent, in the order of the submitted items.
+
+Objects registered as shared (probes, probe maps etc.) are not serialized with
+the results. Instead, the parent's instances are substituted during unpickling,
+to preserve the identity of objects shared across all the tasks.
+"""
+
+import io
+import logging
+from six.moves import cPickle as pickle
+
+LOGGER = logging.getLogger(__name__)
+
+_POOL_STATE = None
+_WORKER_SHARED_IDS = None
+
+def resolveWorkerCount(workerCount=None, taskCount=None):
+  """
+  Resolves the number of worker processes to use for a parallel action
+
+  :param workerCount: Requested number of workers, defaults to the value from xpedite config
+  :param taskCount: Number of tasks to be processed (Default value = None)
+
+  """
+  if workerCount is None:
+    from xpedite.dependencies import CONFIG
+    workerCount = CONFIG.workerCount
+  if workerCount <= 0:
+    import multiprocessing
+    workerCount = multiprocessing.cpu_count()
+  if taskCount is not None:
+    workerCount = min(workerCount, taskCount)
+  return max(workerCount, 1)
+
+def _forkContext():
+  """Returns a multiprocessing context, that forks worker processes"""
+  import multiprocessing
+  if hasattr(multiprocessing, 'get_context'):
+    return multiprocessing.get_context('fork')
+  return multiprocessing
+
+class _Pickler(pickle.Pickler):
+  """Pickler to replace shared objects with persistent ids"""
+
+  def __init__(self, stream, sharedIds):
+    pickle.Pickler.__init__(self, stream, pickle.HIGHEST_PROTOCOL)
+    self.sharedIds = sharedIds
+
+  def persistent_id(self, obj): # pylint: disable=method-hidden
+    """Returns index of obj in the shared objects table, if obj is shared"""
+    return self.sharedIds.get(id(obj))
+
+class _Unpickler(pickle.Unpickler):
+  """Unpickler to substitute parent's instances of shared objects"""
+
+  def __init__(self, stream, sharedObjects):
+    pickle.Unpickler.__init__(self, stream)
+    self.sharedObjects = sharedObjects
+
+  def persistent_load(self, pid): # pylint: disable=method-hidden
+    """Returns the shared object with the given persistent id"""
+    return self.sharedObjects[pid]
+
+def _runTask(index):
+  """Runs the task for item at the given index in a worker process"""
+  global _WORKER_SHARED_IDS # pylint: disable=global-statement
+  task, items, sharedObjects = _POOL_STATE
+  result = task(items[index])
+  if _WORKER_SHARED_IDS is None:
+    _WORKER_SHARED_IDS = {id(obj) : i for i, obj in enumerate(sharedObjects)}
+  stream = io.BytesIO()
+  _Pickler(stream, _WORKER_SHARED_IDS).dump(result)
+  return stream.getvalue()
+
+class WorkerPool(object):
+  """Runs a task for a collection of items, in parallel using forked worker processes"""
+
+  def __init__(self, workerCount=None, sharedObjects=None):
+    """
+    Constructs a pool of worker processes
+
+    :param workerCount: Number of worker processes, defaults to the value from xpedite config
+    :param sharedObjects: Objects to be shared (not copied) between parent and the results of tasks
+
+    """
+    self.workerCount = workerCount
+    self.sharedObjects = list(sharedObjects) if sharedObjects else []
+
+  def map(self, task, items):
+    """
+    Yields results of invoking task for each of the given items, in the order of items
+
+    Tasks are run serially in the parent, if the pool resolves to a single worker
+
+    :param task: Callable to be invoked in worker processes, with an item as argument
+    :param items: Collection of items to be processed
+
+    """
+    global _POOL_STATE # pylint: disable=global-statement
+    items = list(items)
+    workerCount = resolveWorkerCount(self.workerCount, len(items))
+    if workerCount <= 1 or _POOL_STATE is not None:
+      for item in items:
+        yield task(item)
+      return
+
+    LOGGER.debug('forking %d workers to process %d items', workerCount, len(items))
+    _POOL_STATE = (task, items, self.sharedObjects)
+    try:
+      pool = _forkContext().Pool(workerCount)
+    finally:
+      _POOL_STATE = None
+    try:
+      for data in pool.imap(_runTask, range(len(items))):
+        yield _Unpickler(io.BytesIO(data), self.sharedObjects).load()
+      pool.close()
+    finally:
+      pool.terminate()
+      pool.join()
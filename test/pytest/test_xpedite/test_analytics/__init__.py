@@ -0,0 +1,31 @@
+"""
+This package contains pytests for Xpedite's analytics, including:
+
+- Tests for timelines and delta series built from transactions
+- Tests for timelines stored in timeline matrices
+- Tests for quantile sketches backing delta series
+- Tests for memoized conflation of routes
+- Tests for breakdown of elapsed time and timeline statistics by thread
+- Tests for conflation of timelines
+- Tests for lookup and filtering of timelines in profiles, with callables and declarative queries
+- Tests for attribution of tail latency to segments of timelines
+- Tests for latency statistics of timelines aggregated over windows of time
+"""
+
+import numpy
+from xpedite.analytics.timelineMatrix import TimelineMatrix
+
+def buildTimelineMatrix(names, segments, inceptions=None):
+  """
+  Builds a matrix of timelines, from durations of segments between consecutive probes
+
+  :param names: Names of probes in the route, followed by the name of the end point
+  :param segments: Matrix (timelines x segments) of durations, with a segment for each pair of consecutive probes
+  :param inceptions: Inceptions of the timelines, defaults to zeros
+
+  """
+  count = len(segments)
+  inceptions = numpy.zeros(count) if inceptions is None else inceptions
+  points = numpy.concatenate((numpy.zeros((count, 1)), segments.cumsum(axis=1), numpy.zeros((count, 1))), axis=1)
+  durations = numpy.concatenate((segments, numpy.zeros((count, 1)), points[:, -2:-1]), axis=1)
+  return TimelineMatrix([None] * count, inceptions, names, points, durations)
@@ -0,0 +1,141 @@
+"""
+Tests to validate memoized conflation of routes, used to aggregate transactions to benchmark routes
+and breakdown of transactions by thread
+"""
+
+import random
+from collections                  import OrderedDict
+import numpy
+from xpedite.types.probe          import Probe
+from xpedite.types.route          import Route, RouteConflationIndex, conflateRoutes
+from xpedite.types.counterStore   import CounterStore
+from xpedite.txn.collection       import TxnCollection, TxnSubCollection
+from xpedite.txn.classifier       import ProbeDataClassifier
+from xpedite.analytics            import Analytics
+from xpedite.analytics.aggregator import RouteConflatingAggregator, TxnAggregator
+from xpedite.analytics.timeline   import buildTimelineStats
+from test_xpedite.test_analytics.test_timeline import PROBES as TXN_PROBES, CPU_INFO, buildTxn
+
+PROBES = [Probe('Probe{}'.format(i), 'Probe{}'.format(i)) for i in range(6)]
+
+class Txn(object):
+  """A transaction stub with an interned route"""
+
+  def __init__(self, txnId, route):
+    self.txnId = txnId
+    self.route = route
+
+class SourceTree(object):
+  """A tree of benchmark routes, for a single category"""
+
+  def __init__(self, routes):
+    self.routes = OrderedDict((route, None) for route in routes)
+
+  def getChildren(self, ancestry):
+    """Returns the benchmark routes"""
+    return self.routes if ancestry == ['category'] else None
+
+def buildRoutes(rng, count):
+  """Builds routes with random subsequences of probes"""
+  routes = []
+  for _ in range(count):
+    probes = [probe for probe in PROBES if rng.random() < 0.6] or PROBES[:1]
+    routes.append(Route(probes))
+  return routes
+
+def test_conflation_index():
+  """Compares memoized index vectors against conflation of routes"""
+  rng = random.Random(7)
+  routes = buildRoutes(rng, 24)
+  index = RouteConflationIndex()
+  for _ in range(2):
+    for srcRoute in routes:
+      for dstRoute in routes:
+        expected = conflateRoutes(srcRoute, dstRoute)
+        indices = index.conflate(srcRoute, dstRoute)
+        if expected:
+          assert indices.tolist() == expected
+          assert not indices.flags.writeable
+        else:
+          assert indices is None
+  assert len(index) == len(routes) ** 2
+
+def test_route_conflating_aggregator():
+  """Validates aggregation of transactions using a compatibility table of routes"""
+  rng = random.Random(11)
+  routes = buildRoutes(rng, 12)
+  srcTree = SourceTree(buildRoutes(rng, 4) + [Route(PROBES[-1:])])
+  benchmarkRoutes = list(srcTree.routes)
+  txns = [Txn(txnId, rng.choice(routes)) for txnId in range(200)]
+  txnSubCollection = TxnSubCollection('current', None, txns, PROBES, None, None)
+  aggregator = RouteConflatingAggregator(srcTree)
+  routeMap = aggregator.aggregateTxnsByRoutes(txnSubCollection, ['category'])
+
+  expected = OrderedDict()
+  for txn in txns:
+    for dstRoute in benchmarkRoutes:
+      if conflateRoutes(txn.route, dstRoute):
+        expected.setdefault(id(dstRoute), []).append(txn.txnId)
+  assert list(expected)
+  assert {id(route) : [txn.txnId for txn in collection] for route, collection in routeMap.items()} == expected
+  for collection in routeMap.values():
+    assert collection.name == 'current'
+  assert not aggregator.aggregateTxnsByRoutes(txnSubCollection, ['unknown'])
+
+def test_group_indices_by_key():
+  """Validates positions of keys are grouped by value, preserving the order of positions"""
+  groups = TxnAggregator.groupIndicesByKey(['7', '3', '7', '5', '3', '7'])
+  assert list(groups) == ['3', '5', '7']
+  assert [positions.tolist() for positions in groups.values()] == [[1, 4], [3], [0, 2, 5]]
+  assert not TxnAggregator.groupIndicesByKey([])
+
+def test_thread_breakdown():
+  """Validates elapsed time and timeline statistics are broken down by thread, across counter stores"""
+  stores = [CounterStore(), CounterStore()]
+  txns = []
+  for txnId in range(60):
+    store = stores[txnId % 2]
+    threadId = '{}'.format(3 - txnId % 3 if txnId % 2 else 1 + txnId % 3)
+    tsc = 1000000 * (txnId + 1)
+    elapsed = 2000 * int(threadId)
+    txns.append(buildTxn(store, txnId, [
+      (threadId, tsc, ()), ('9', tsc + 1000, ()), ('9', tsc + 1000 + elapsed, ())
+    ]))
+  subCollection = TxnSubCollection('test', CPU_INFO, txns, TXN_PROBES, None, None)
+  classifications = []
+  classifier = ProbeDataClassifier(TXN_PROBES[0], lambda data: classifications.append(data) or 'category')
+  threadMap = TxnAggregator.groupElapsedTimeByThread(subCollection, CPU_INFO, classifier)
+  assert list(threadMap) == ['category'] and list(threadMap['category']) == ['1', '2', '3']
+  for threadId, times in threadMap['category'].items():
+    assert len(times) == 20 and times.tolist() == [0.5 + int(threadId)] * 20
+
+  del classifications[:]
+  threadBundles = {}
+  txnCollection = TxnCollection('test', CPU_INFO, OrderedDict((txn.txnId, txn) for txn in txns), TXN_PROBES,
+    None, None, None, finalized=True)
+  elapsedTimeBundles = Analytics.buildElapsedTimeBundles([txnCollection], classifier, threadBundles)
+  assert len(classifications) == len(txns)
+  assert elapsedTimeBundles == {
+    'category' : [TxnAggregator.groupElapsedTime(subCollection, CPU_INFO, classifier)['category']]
+  }
+  assert list(threadBundles) == ['category'] and list(threadBundles['category']) == ['1', '2', '3']
+  for threadId, times in threadBundles['category'].items():
+    assert times.tolist() == threadMap['category'][threadId].tolist()
+  sketchedBundles = {}
+  elapsedTimeBundles = Analytics.buildElapsedTimeBundles([txnCollection], classifier, sketchedBundles, 0.01)
+  series, = elapsedTimeBundles['category']
+  assert series.isSketched() and len(series) == len(txns) and len(series.values) == 0
+  assert series.getMin() == 1.5 and series.getMax() == 3.5
+  for threadId, threadSeries in sketchedBundles['category'].items():
+    assert threadSeries.isSketched() and len(threadSeries) == 20 and threadSeries.getMean() == 0.5 + int(threadId)
+
+  timelineStats = buildTimelineStats('category', txns[0].route, TXN_PROBES, subCollection)
+  assert timelineStats.timelineCollection.threads.tolist() == [txn[0].threadId for txn in txns]
+  breakdown = Analytics.buildThreadBreakdown(timelineStats)
+  assert list(breakdown) == ['1', '2', '3'] and sum(len(stats) for stats in breakdown.values()) == 60
+  for threadId, stats in breakdown.items():
+    assert stats.name == threadId and all(txn[0].threadId == threadId for txn in stats.timelineCollection.txns)
+    tscSeries = stats.getTscDeltaSeriesCollection()
+    assert list(tscSeries[0]) == [0.5] * 20 and list(tscSeries[-1]) == [0.5 + int(threadId)] * 20
+  reordered = timelineStats.timelineCollection.take(numpy.arange(59, -1, -1))
+  assert reordered.threads.tolist() == [txn[0].threadId for txn in reversed(txns)]
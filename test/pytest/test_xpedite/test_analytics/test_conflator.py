@@ -0,0 +1,106 @@
+"""
+Tests to validate conflation of timelines, reducing time points as matrices
+"""
+
+import math
+import random
+from xpedite.types                    import Counter, CpuInfo
+from xpedite.types.probe              import Probe, TxnBeginProbe, TxnEndProbe
+from xpedite.types.route              import Route, conflateRoutes
+from xpedite.types.counterStore       import CounterStore
+from xpedite.txn                      import Transaction
+from xpedite.txn.collection           import TxnSubCollection
+from xpedite.analytics.timeline       import buildTimelineStats
+from xpedite.analytics.conflator      import Conflator
+from xpedite.analytics.timelineMatrix import TimelineMatrix
+
+PROBES = [TxnBeginProbe('Begin', 'Begin')] + [
+  Probe('Probe{}'.format(i), 'Probe{}'.format(i)) for i in range(5)
+] + [TxnEndProbe('End', 'End')]
+CPU_INFO = CpuInfo('GenuineIntel-6-3F', 2000 * 1000 * 1000)
+
+class Event(object):
+  """A pmu event with name"""
+
+  def __init__(self, name):
+    self.name = name
+    self.uarchName = name
+
+def buildTimelineStatsForTxns(rng, txnCount, pmcCount):
+  """Builds timeline stats for transactions, with counters collected by randomly switching threads"""
+  store = CounterStore()
+  txns = []
+  tsc = 1000
+  for txnId in range(txnCount):
+    txn = None
+    threadId = '1'
+    for probe in PROBES:
+      tsc += rng.randint(1, 5000)
+      if rng.random() < 0.1:
+        threadId = rng.choice('123')
+      counter = Counter(threadId, probe, '', tsc)
+      counter.pmcs = [rng.randint(0, 10 ** 6) for _ in range(pmcCount)]
+      if txn:
+        txn.addCounter(counter, probe is PROBES[-1])
+      else:
+        txn = Transaction(store.view(store.append(counter)), txnId)
+    txn.finalize()
+    txns.append(txn)
+  events = [Event('event{}'.format(i)) for i in range(pmcCount)]
+  subCollection = TxnSubCollection('test', CPU_INFO, txns, PROBES, None, events)
+  return buildTimelineStats('category', txns[0].route, PROBES, subCollection)
+
+def assertIdentical(lhs, rhs):
+  """Asserts the values are of the same type and equal, treating nan values as equal"""
+  if isinstance(lhs, float) and math.isnan(lhs):
+    assert isinstance(rhs, float) and math.isnan(rhs)
+  else:
+    assert type(lhs) is type(rhs) and lhs == rhs
+
+def assertTimepoint(lhs, rhs):
+  """Asserts the time points are identical"""
+  assert (lhs.name, lhs.point, lhs.pmcNames) == (rhs.name, rhs.point, rhs.pmcNames)
+  assertIdentical(lhs.duration, rhs.duration)
+  if lhs.deltaPmcs is None or rhs.deltaPmcs is None:
+    assert lhs.deltaPmcs is None and rhs.deltaPmcs is None
+  else:
+    assert len(lhs.deltaPmcs) == len(rhs.deltaPmcs)
+    for lhsPmc, rhsPmc in zip(lhs.deltaPmcs, rhs.deltaPmcs):
+      assertIdentical(lhsPmc, rhsPmc)
+
+def test_conflate_timeline_columns():
+  """Compares timelines conflated as matrices against timelines conflated one time point at a time"""
+  rng = random.Random(3)
+  conflator = Conflator()
+  for _ in range(20):
+    timelineStats = buildTimelineStatsForTxns(rng, rng.randint(1, 30), rng.choice([0, 2, 3]))
+    probes = [probe for probe in PROBES if rng.random() < 0.6] or PROBES[:1]
+    routeIndices = conflateRoutes(timelineStats.route, Route(probes))
+    eventsMap = timelineStats.buildEventsMap()
+    timelines = []
+    conflator.conflateTimelineCollection(routeIndices, timelineStats.timelineCollection, timelines, eventsMap, None)
+    assert len(timelines) == len(timelineStats.timelineCollection)
+    for timeline, srcTimeline in zip(timelines, timelineStats.timelineCollection):
+      expected = conflator.conflateTimelinePoints(srcTimeline, routeIndices, eventsMap, None)
+      assert timeline.txn is srcTimeline.txn and timeline.inception == srcTimeline.inception
+      assert len(timeline) == len(expected) == len(routeIndices)
+      for timePoint, expectedTimePoint in zip(timeline.points + [timeline.endpoint],
+                                              expected.points + [expected.endpoint]):
+        assertTimepoint(timePoint, expectedTimePoint)
+
+def test_conflate_timeline_matrix():
+  """Compares delta series built from a matrix of conflated timelines against series built from each time point"""
+  timelineStats = buildTimelineStatsForTxns(random.Random(5), 25, 3)
+  route = Route([PROBES[0], PROBES[3], PROBES[-1]])
+  conflatedStats = Conflator.createTimelineStats(timelineStats, 'category', route)
+  for _ in range(2):
+    assert Conflator().conflateTimelineStats(route, timelineStats, conflatedStats)
+  assert isinstance(conflatedStats.timelineCollection, TimelineMatrix) and len(conflatedStats) == 50
+
+  expectedRepo = Conflator.createTimelineStats(timelineStats, 'category', route).deltaSeriesRepo
+  Conflator.addTimelines(expectedRepo, list(conflatedStats.timelineCollection))
+  deltaSeriesRepo = Conflator.buildDeltaSeriesRepo(conflatedStats)
+  for eventName, deltaSeriesCollection in expectedRepo.items():
+    assert len(deltaSeriesCollection) == len(deltaSeriesRepo[eventName]) == len(route)
+    for deltaSeries, expectedSeries in zip(deltaSeriesRepo[eventName], deltaSeriesCollection):
+      assert len(deltaSeries) == 50 and deltaSeries == expectedSeries
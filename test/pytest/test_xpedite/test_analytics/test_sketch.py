@@ -0,0 +1,89 @@
+"""
+Tests to validate quantile sketches and sketched delta series, against exact statistics
+"""
+
+import math
+import random
+import numpy
+import pytest
+from xpedite.analytics.sketch   import QuantileSketch
+from xpedite.analytics.timeline import DeltaSeries
+from xpedite.report.histogram   import buildDistribution
+
+RELATIVE_ERROR = 0.01
+PERCENTILES = [0, 1, 25, 50, 75, 90, 95, 99, 99.9, 100]
+
+def buildValues(seed, count=20000):
+  """Builds a long tailed series of values"""
+  rand = random.Random(seed)
+  return [rand.lognormvariate(3, 1) for _ in range(count)] + [0.0, -5.0]
+
+def assertWithinError(estimates, values):
+  """Asserts estimated percentiles are within the relative error of a neighbouring value in the series"""
+  sortedValues = numpy.sort(values)
+  for percentile, estimate in zip(PERCENTILES, estimates):
+    rank = percentile / 100.0 * (len(values) - 1)
+    lower = sortedValues[int(math.floor(rank))]
+    upper = sortedValues[int(math.ceil(rank))]
+    tolerance = RELATIVE_ERROR * max(abs(lower), abs(upper)) + 1e-12
+    assert lower - tolerance <= estimate <= upper + tolerance
+
+def test_sketch_accuracy():
+  """
+  Test percentiles estimated by a sketch are within the relative error
+  """
+  values = buildValues(1)
+  sketch = QuantileSketch(RELATIVE_ERROR)
+  sketch.extend(values)
+  assert len(sketch) == len(values)
+  assertWithinError(sketch.getPercentiles(PERCENTILES), values)
+  assert sketch.getMean() == pytest.approx(numpy.mean(values))
+  assert sketch.getStandardDeviation() == pytest.approx(numpy.std(values))
+
+  buckets = list(numpy.linspace(10, 100, 19))
+  bucketValues, conflatedCount = sketch.buildDistribution(buckets)
+  exactBucketValues, exactConflatedCount = buildDistribution(buckets, values)
+  assert sum(bucketValues) == sum(exactBucketValues)
+  assert conflatedCount == pytest.approx(exactConflatedCount, rel=0.05)
+
+def test_sketch_merge():
+  """
+  Test merging sketches of partitions, matches a sketch of all the values
+  """
+  values = buildValues(2)
+  sketch = QuantileSketch(RELATIVE_ERROR)
+  sketch.extend(values)
+  mergedSketch = QuantileSketch(RELATIVE_ERROR)
+  for i in range(0, len(values), 3000):
+    partSketch = QuantileSketch(RELATIVE_ERROR)
+    partSketch.extend(values[i:i + 3000])
+    mergedSketch.merge(partSketch)
+  assert mergedSketch.positiveBuckets == sketch.positiveBuckets
+  assert mergedSketch.getPercentiles(PERCENTILES) == sketch.getPercentiles(PERCENTILES)
+  with pytest.raises(ValueError):
+    mergedSketch.merge(QuantileSketch(0.05))
+
+def test_sketched_delta_series():
+  """
+  Test statistics of sketched delta series approximate the exact series
+  """
+  values = buildValues(3)
+  exactSeries = DeltaSeries('Begin', 'End')
+  sketchedSeries = DeltaSeries('Begin', 'End', RELATIVE_ERROR)
+  for deltaSeries in (exactSeries, sketchedSeries):
+    deltaSeries.extend(values[:10000])
+    for value in values[10000:]:
+      deltaSeries.addDelta(value)
+
+  assert sketchedSeries.isSketched() and len(sketchedSeries) == len(exactSeries)
+  stats = sketchedSeries.describe(PERCENTILES)
+  assertWithinError(list(stats.percentiles.values()), values)
+  assert stats.min == exactSeries.getMin() and stats.max == exactSeries.getMax()
+  assert stats.mean == pytest.approx(exactSeries.getMean())
+
+  otherSeries = DeltaSeries('Begin', 'End', RELATIVE_ERROR)
+  otherSeries.addDelta(1e6)
+  sketchedSeries.merge(otherSeries)
+  assert sketchedSeries.getMax() == 1e6 and len(sketchedSeries) == len(values) + 1
+  with pytest.raises(ValueError):
+    exactSeries.merge(otherSeries)
@@ -0,0 +1,47 @@
+"""
+Tests to validate attribution of tail latency to segments of timelines
+"""
+
+import numpy
+import pytest
+from xpedite.analytics.tail           import attributeTail, buildDurationMatrix
+from test_xpedite.test_analytics      import buildTimelineMatrix
+
+NAMES = ['Begin', 'Parse', 'Route', 'Send', 'End', 'end']
+
+def buildTailMatrix(count):
+  """Builds a matrix of timelines, with a segment driving the tail latency"""
+  rng = numpy.random.RandomState(1)
+  segments = rng.uniform(1, 2, size=(count, len(NAMES) - 2))
+  segments[:, 1] += rng.pareto(3, size=count) * 5
+  segments[:, 3] = 0.5
+  return buildTimelineMatrix(NAMES, segments)
+
+def test_tail_attribution():
+  """Validates segments are attributed excess latency of tail transactions, in matrices and lists of timelines"""
+  matrix = buildTailMatrix(20000)
+  names, segments, totals = buildDurationMatrix(matrix)
+  assert names == [('Begin', 'Parse'), ('Parse', 'Route'), ('Route', 'Send'), ('Send', 'End')]
+  attributions = attributeTail(matrix)
+  assert [attribution.percentile for attribution in attributions] == [99, 99.9]
+  for attribution in attributions:
+    tailMask = totals >= numpy.percentile(totals, attribution.percentile)
+    assert attribution.tailCount == tailMask.sum() and attribution.medianCount >= 900
+    assert attribution.tailMean == pytest.approx(totals[tailMask].mean())
+    assert sum(segment.share for segment in attribution.segments) == pytest.approx(100)
+    assert attribution.rankSegments()[0].endProbeName == 'Route' and attribution.segments[1].share > 90
+    assert attribution.segments[3].excess == 0 and numpy.isnan(attribution.segments[3].correlation)
+    for i, segment in enumerate(attribution.segments):
+      assert segment.tailMean == pytest.approx(segments[tailMask, i].mean())
+      assert segment.tailPercentiles[99] == pytest.approx(numpy.percentile(segments[tailMask, i], 99))
+      assert segment.percentiles[50] == pytest.approx(numpy.median(segments[:, i]))
+      if i < 3:
+        assert segment.correlation == pytest.approx(numpy.corrcoef(segments[:, i], totals)[0, 1])
+
+  timelines = list(matrix.take(numpy.arange(500)))
+  expected = attributeTail(matrix.take(numpy.arange(500)), [90], [25, 75])
+  for attribution, expectedAttribution in zip(attributeTail(timelines, [90], [25, 75]), expected):
+    assert repr(attribution) == repr(expectedAttribution)
+  assert not attributeTail([]) and not attributeTail(matrix.take([]))
+  attribution, = attributeTail(matrix.take([0, 1]), [50])
+  assert attribution.tailCount == 1 and attribution.medianCount == 1
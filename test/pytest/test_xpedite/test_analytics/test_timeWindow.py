@@ -0,0 +1,76 @@
+"""
+Tests to validate latency statistics of timelines, aggregated over windows of time
+"""
+
+import numpy
+import pytest
+from xpedite.analytics.sketch         import QuantileSketch
+from xpedite.analytics                import timeWindow
+from xpedite.analytics.timeWindow     import buildWindowSeries, groupPercentiles
+from test_xpedite.test_analytics      import buildTimelineMatrix
+
+NAMES = ['Begin', 'Parse', 'Send', 'end']
+
+def orderStatistics(values, percentiles):
+  """Returns values at the (lower) rank of the given percentiles"""
+  values = numpy.sort(values)
+  return values[(numpy.asarray(percentiles) / 100.0 * (len(values) - 1)).astype(int)]
+
+def buildPausedMatrix(count):
+  """Builds a matrix of timelines, with periodic pauses in the duration of a segment"""
+  rng = numpy.random.RandomState(1)
+  inceptions = numpy.sort(rng.randint(0, 60000, size=count)) + 2000
+  segments = rng.lognormal(0, 0.5, size=(count, len(NAMES) - 2))
+  segments[(inceptions // 1000) % 10 == 0, 1] += 100
+  return buildTimelineMatrix(NAMES, segments, inceptions)
+
+def test_group_percentiles(monkeypatch):
+  """Validates percentiles of groups match quantile sketches of each group, with histograms built in chunks"""
+  rng = numpy.random.RandomState(7)
+  groups = rng.randint(0, 50, size=20000)
+  values = rng.exponential(10, size=len(groups))
+  values[::97] = 0
+  values[::101] = numpy.nan
+  percentiles = [0, 25, 50, 99, 99.9, 100]
+  counts, estimates, maxima = groupPercentiles(groups, 52, values, percentiles, 0.02)
+  for group in range(50):
+    groupValues = values[(groups == group) & ~numpy.isnan(values)]
+    sketch = QuantileSketch(0.02)
+    sketch.extend(groupValues)
+    assert counts[group] == len(groupValues) and maxima[group] == groupValues.max()
+    assert estimates[:, group].tolist() == pytest.approx(sketch.getPercentiles(percentiles))
+    for estimate, exact in zip(estimates[:, group], orderStatistics(groupValues, percentiles)):
+      assert abs(estimate - exact) <= 0.02 * exact + 1e-9 or estimate == 0
+  assert counts[50:].tolist() == [0, 0] and numpy.isnan(estimates[:, 50:]).all() and numpy.isnan(maxima[50:]).all()
+  monkeypatch.setattr(timeWindow, 'HISTOGRAM_CELL_LIMIT', 1000)
+  chunkedCounts, chunkedEstimates, chunkedMaxima = groupPercentiles(groups, 52, values, percentiles, 0.02)
+  assert numpy.array_equal(chunkedCounts, counts) and numpy.array_equal(chunkedMaxima, maxima, equal_nan=True)
+  assert numpy.array_equal(chunkedEstimates, estimates, equal_nan=True)
+
+def test_window_series():
+  """Validates windows of matrices and lists of timelines, expose periodic pauses"""
+  matrix = buildPausedMatrix(30000)
+  windowSeriesList = buildWindowSeries(matrix, 1000, [50, 99])
+  assert [(series.beginProbeName, series.endProbeName) for series in windowSeriesList] == [
+    ('Begin', 'Parse'), ('Parse', 'Send'), ('Begin', 'Send')
+  ]
+  series = windowSeriesList[1]
+  assert len(series) == 60 and series.begins[0] == 2000 and series.begins[-1] == 61000
+  assert series.counts.sum() == 30000
+  pauses = series.begins[series.percentiles[50] > 50].tolist()
+  assert pauses == [10000, 20000, 30000, 40000, 50000, 60000]
+  windows = matrix.inceptions // 1000 - 2
+  for i in range(len(series)):
+    windowValues = matrix.durations[windows == i, -1]
+    assert windowSeriesList[-1].maxima[i] == windowValues.max()
+    exact, = orderStatistics(windowValues, [99])
+    assert windowSeriesList[-1].percentiles[99][i] == pytest.approx(exact, rel=0.01)
+
+  sparse = matrix.take(numpy.flatnonzero((matrix.inceptions < 3000) | (matrix.inceptions >= 7000)))
+  series = buildWindowSeries(list(sparse), 1000)[-1]
+  assert series.counts[1:5].tolist() == [0] * 4 and numpy.isnan(series.maxima[1:5]).all()
+  dfDict = series.toDataFrameDict()
+  assert sorted(dfDict) == ['50%', '99%', 'begin', 'count', 'max'] and len(dfDict['count']) == len(series)
+  assert not buildWindowSeries(matrix.take([]))
+  with pytest.raises(ValueError):
+    buildWindowSeries(matrix, 0)
@@ -0,0 +1,163 @@
+"""
+Tests to validate timelines and delta series, built from a matrix of counters
+"""
+
+import math
+import pickle
+import random
+import numpy
+import pytest
+from xpedite.types                    import Counter, CpuInfo, InvariantViloation
+from xpedite.types.probe              import Probe, TxnBeginProbe, TxnEndProbe
+from xpedite.types.counterStore       import CounterStore
+from xpedite.txn                      import Transaction
+from xpedite.txn.collection           import TxnSubCollection
+from xpedite.analytics.timeline       import buildTimelineStats, DeltaSeries
+from xpedite.analytics.timelineMatrix import TimelineMatrix, TimePoint, concatTimelines
+
+PROBES = [TxnBeginProbe('Begin', 'Begin'), Probe('Work', 'Work'), TxnEndProbe('End', 'End')]
+CPU_INFO = CpuInfo('GenuineIntel-6-3F', 2000 * 1000 * 1000)
+
+class Event(object):
+  """A pmu event with name"""
+
+  def __init__(self, name):
+    self.name = name
+    self.uarchName = name
+
+EVENTS = [Event('cycles'), Event('instructions')]
+
+def buildTxn(store, txnId, samples):
+  """Builds a transaction from samples of (threadId, tsc, pmcs) for each of the probes"""
+  txn = None
+  for probe, (threadId, tsc, pmcs) in zip(PROBES, samples):
+    counter = Counter(threadId, probe, '', tsc)
+    counter.pmcs = list(pmcs)
+    if txn:
+      txn.addCounter(counter, probe is PROBES[-1])
+    else:
+      txn = Transaction(store.view(store.append(counter)), txnId)
+  txn.finalize()
+  return txn
+
+def test_timeline_stats():
+  """
+  Test durations, pmc deltas and endpoint totals of timelines
+  """
+  store = CounterStore()
+  txns = [
+    buildTxn(store, 1, [('1', 2000, (10, 20)), ('1', 4000, (15, 40)), ('1', 10000, (25, 45))]),
+    buildTxn(store, 2, [('1', 4002000, (10, 20)), ('2', 4004000, (99, 99)), ('2', 4006000, (100, 100))]),
+  ]
+  subCollection = TxnSubCollection('test', CPU_INFO, txns, PROBES, None, EVENTS)
+  timelineStats = buildTimelineStats('category', txns[0].route, PROBES, subCollection)
+
+  timeline = timelineStats.timelineCollection[0]
+  assert [point.duration for point in timeline] == [1.0, 3.0, 0]
+  assert [point.point for point in timeline] == [0.0, 1.0, 4.0]
+  assert [point.deltaPmcs for point in timeline.points[:-1]] == [[5, 20], [10, 5]]
+  assert timeline.endpoint.duration == 4.0
+  assert timeline.endpoint.deltaPmcs == [15, 25]
+  assert timelineStats.timelineCollection[1].inception == 2
+
+  crossThreadTimeline = timelineStats.timelineCollection[1]
+  assert all(math.isnan(pmc) for pmc in crossThreadTimeline[0].deltaPmcs)
+  assert crossThreadTimeline[1].deltaPmcs == [1, 1]
+  assert crossThreadTimeline.endpoint.deltaPmcs == [1, 1]
+
+  tscSeries = timelineStats.getTscDeltaSeriesCollection()
+  assert [list(series) for series in tscSeries] == [[1.0, 1.0], [3.0, 1.0], [4.0, 2.0]]
+  cyclesSeries = timelineStats.deltaSeriesRepo['cycles']
+  assert cyclesSeries[0][0] == 5 and math.isnan(cyclesSeries[0][1])
+  assert list(cyclesSeries[-1]) == [15, 1]
+
+def test_timeline_matrix():
+  """
+  Test timelines stored in a timeline matrix, are materialized as views on access
+  """
+  store = CounterStore()
+  txns = [
+    buildTxn(store, 1, [('1', 2000, (10, 20)), ('1', 4000, (15, 40)), ('1', 10000, (25, 45))]),
+    buildTxn(store, 2, [('1', 4002000, (10, 20)), ('2', 4004000, (99, 99)), ('2', 4006000, (100, 100))]),
+    buildTxn(store, 3, [('1', 6002000, (10, 20)), ('1', 6012000, (20, 20)), ('1', 6014000, (30, 30))]),
+  ]
+  subCollection = TxnSubCollection('test', CPU_INFO, txns, PROBES, None, EVENTS)
+  timelineStats = buildTimelineStats('category', txns[0].route, PROBES, subCollection)
+  matrix = timelineStats.timelineCollection
+  assert isinstance(matrix, TimelineMatrix) and len(matrix) == 3
+
+  timeline = matrix[-1]
+  assert timeline.txn is txns[2] and timeline.txnId == 3 and timeline.tsc == 6002000
+  assert len(timeline) == 3 and len(timeline[1:]) == 2 and timeline.duration == 6.0
+  assert [point.name for point in timeline] == ['Begin', 'Work', 'End']
+  assert timeline[0] == TimePoint('Begin', 0.0, 5.0, ['cycles', 'instructions'], [10, 0], data='')
+  assert timeline[2].pmcNames is None and timeline[2].deltaPmcs is None
+  assert (timeline.endpoint.name, timeline.endpoint.deltaPmcs) == ('end', [20, 10])
+  with pytest.raises(IndexError):
+    _ = timeline[3]
+
+  reordered = matrix.take([2, 0])
+  assert [tl.txnId for tl in reordered] == [3, 1] and reordered[0] == matrix[2]
+  reordered.sort(key=lambda tl: tl.duration)
+  assert [tl.txnId for tl in reordered] == [1, 3]
+  assert reordered == matrix.take([0, 2])
+
+  timelines = concatTimelines(matrix.take([1]), reordered)
+  assert isinstance(timelines, TimelineMatrix) and [tl.txnId for tl in timelines] == [2, 1, 3]
+  assert all(math.isnan(pmc) for pmc in timelines[0][0].deltaPmcs)
+  assert concatTimelines([], matrix) is matrix
+  assert [tl.txnId for tl in concatTimelines(list(matrix[:1]), matrix)] == [1, 1, 2, 3]
+
+  clone = pickle.loads(pickle.dumps(matrix))
+  assert [(tl.txnId, tl.inception, tl.duration) for tl in clone] == [(1, 0, 4.0), (2, 2, 2.0), (3, 3, 6.0)]
+  assert [point.deltaPmcs for point in clone[0].points] == [point.deltaPmcs for point in matrix[0].points]
+
+def test_timeline_invariants():
+  """
+  Test transactions with missing pmc samples, violate timeline invariants
+  """
+  store = CounterStore()
+  txns = [
+    buildTxn(store, 1, [('1', 2000, (10, 20)), ('1', 4000, (15, 40)), ('1', 10000, (25, 45))]),
+    buildTxn(store, 2, [('1', 20000, (10, 20)), ('1', 22000, (99,)), ('1', 24000, (100, 100))]),
+  ]
+  subCollection = TxnSubCollection('test', CPU_INFO, txns, PROBES, None, EVENTS)
+  with pytest.raises(InvariantViloation) as error:
+    buildTimelineStats('category', txns[0].route, PROBES, subCollection)
+  assert 'has transaction 2 with counter' in str(error.value)
+  assert 'missing pmc samples 1/2' in str(error.value)
+
+def test_delta_series():
+  """
+  Test statistics of delta series match numpy and are refreshed, when the series grows
+  """
+  rand = random.Random(7)
+  values = [rand.uniform(0, 1000) for _ in range(1001)]
+  deltaSeries = DeltaSeries('Begin', 'End')
+  deltaSeries.extend(values[:500])
+  for value in values[500:]:
+    deltaSeries.addDelta(value)
+  assert len(deltaSeries) == len(values) and list(deltaSeries) == values
+
+  stats = deltaSeries.describe([25, 95, 99.9])
+  assert stats.count == len(values)
+  assert stats.min == min(values) and stats.max == max(values)
+  assert stats.median == pytest.approx(numpy.median(values))
+  assert stats.mean == pytest.approx(numpy.mean(values))
+  assert stats.standardDeviation == pytest.approx(numpy.std(values))
+  for percentile, value in stats.percentiles.items():
+    assert value == pytest.approx(numpy.percentile(values, percentile))
+    assert deltaSeries.getPercentile(percentile) == value
+
+  deltaSeries.addDelta(5000)
+  assert deltaSeries.getMax() == 5000
+  assert deltaSeries.getMedian() == pytest.approx(numpy.median(values + [5000]))
+
+  deltaSeries.addDelta(float('nan'))
+  assert math.isnan(deltaSeries.getPercentile(50))
+  assert pickle.loads(pickle.dumps(deltaSeries)) == deltaSeries
+
+  legacySeries = DeltaSeries.__new__(DeltaSeries)
+  legacySeries.__setstate__({'beginProbeName': 'Begin', 'endProbeName': 'End', 'series': values, '_count': 0})
+  assert list(legacySeries) == values
+  assert legacySeries.getMin() == min(values)
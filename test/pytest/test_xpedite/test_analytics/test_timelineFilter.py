@@ -0,0 +1,121 @@
+"""
+Tests to validate lookup and filtering of timelines in profiles, with callables and declarative queries
+"""
+
+import pickle
+import pytest
+from xpedite.types                          import Counter
+from xpedite.types.counterStore             import CounterStore
+from xpedite.txn                            import Transaction
+from xpedite.txn.collection                 import TxnSubCollection
+from xpedite.profiler.profile               import Profile, Profiles
+from xpedite.analytics.timeline             import buildTimelineStats
+from xpedite.analytics.timelineMatrix       import TimelineMatrix
+from xpedite.analytics.timelineFilter       import TimelineFilter, locateTimeline
+from xpedite.analytics.timelineQuery        import duration, inception, txnId, probeData
+from test_xpedite.test_analytics.test_timeline import PROBES, CPU_INFO, EVENTS
+
+def buildTxn(store, txnNumber):
+  """Builds a transaction, with durations and probe data varying with the transaction id"""
+  txn = None
+  tsc = 200000 * txnNumber
+  for i, probe in enumerate(PROBES):
+    tsc += 20 * (i + 1) + (txnNumber * 37) % (50 * (i + 1))
+    data = '' if txnNumber % 5 == 0 or i != 1 else '{:x}'.format(txnNumber % 4 << 64 | 10)
+    counter = Counter('1', probe, data, tsc)
+    counter.pmcs = [txnNumber * 3, txnNumber * 7]
+    if txn:
+      txn.addCounter(counter, probe is PROBES[-1])
+    else:
+      txn = Transaction(store.view(store.append(counter)), txnNumber)
+  txn.finalize()
+  return txn
+
+def buildProfile(store, txnIds):
+  """Builds a profile with timelines for transactions with the given ids"""
+  txns = [buildTxn(store, txnNumber) for txnNumber in txnIds]
+  subCollection = TxnSubCollection('test', CPU_INFO, txns, PROBES, None, EVENTS)
+  return Profile('test', buildTimelineStats('category', txns[0].route, PROBES, subCollection), {})
+
+def buildProfiles():
+  """Builds profiles with timelines for even and odd transaction ids"""
+  store = CounterStore()
+  profiles = Profiles('test', None)
+  profiles.addProfile(buildProfile(store, range(2, 200, 2)))
+  profiles.addProfile(buildProfile(store, range(1, 200, 2)))
+  return profiles
+
+def test_locate_timeline():
+  """Validates lookup of timelines, using an index of transaction ids"""
+  profiles = buildProfiles()
+  for txnNumber in [1, 2, 99, 198, 199]:
+    timeline = profiles.locateTimeline(txnNumber)
+    assert timeline.txnId == txnNumber and timeline.txn is locateTimeline(list(profiles), txnNumber).txn
+    assert locateTimeline(profiles, txnNumber).txn is timeline.txn
+  assert profiles.locateTimeline(0) is None and profiles.locateTimeline(200) is None
+
+  profiles.addProfile(buildProfile(CounterStore(), [0, 1]))
+  assert profiles.locateTimeline(0).txnId == 0
+  assert profiles.locateTimeline(1).txn is profiles[1].current.timelineCollection[0].txn
+
+  clone = pickle.loads(pickle.dumps(profiles))
+  assert clone.locateTimeline(151).txnId == 151 and clone.locateTimeline(201) is None
+
+def test_filter_timelines():
+  """Validates timelines selected by a filter, are retained as a timeline matrix"""
+  profiles = TimelineFilter(lambda timeline: timeline.txnId % 3 == 0).apply(buildProfiles())
+  assert len(profiles) == 2
+  for profile in profiles:
+    assert isinstance(profile.current.timelineCollection, TimelineMatrix)
+    assert all(timeline.txnId % 3 == 0 for timeline in profile.current.timelineCollection)
+  assert profiles.locateTimeline(3).txnId == 3 and profiles.locateTimeline(4) is None
+  assert len(profiles[0].current.getTotalDurationSeries()) == len(range(6, 200, 6))
+
+def test_query_timelines():
+  """Compares timelines selected by declarative queries against timelines selected by equivalent callables"""
+  profiles = buildProfiles()
+  payload = '{:x}'.format(2 << 64 | 10)
+  queries = [
+    (duration() > 0.1, lambda timeline: timeline.duration > 0.1),
+    (duration('Work') <= 0.06, lambda timeline: timeline[1].duration <= 0.06),
+    (duration('Begin', 'End') > 0.1, lambda timeline: timeline[2].point - timeline[0].point > 0.1),
+    (duration('Work', 'Missing') > 0, lambda timeline: False),
+    (~(duration('Missing') > 0), lambda timeline: True),
+    (inception().between(5, 12), lambda timeline: 5 <= timeline.inception < 12),
+    (txnId().isin([3, 8, 500]), lambda timeline: timeline.txnId in (3, 8)),
+    ((txnId() < 50) | (txnId() >= 150), lambda timeline: not 50 <= timeline.txnId < 150),
+    (probeData('Work') == payload, lambda timeline: timeline[1].data == payload),
+    (probeData('Work') != payload, lambda timeline: timeline[1].data != payload),
+    (probeData('Work') == '', lambda timeline: timeline.txnId % 5 == 0),
+    (probeData('Work').isin([payload, 'a']) & (txnId() > 100), lambda timeline: timeline[1].data in (payload, 'a')
+     and timeline.txnId > 100),
+  ]
+  for query, predicate in queries:
+    expected = TimelineFilter(predicate).apply(profiles)
+    for filtered in (TimelineFilter(query).apply(profiles), TimelineFilter(query.bind([])).apply(profiles)):
+      assert [profile.current.timelineCollection for profile in filtered] == [
+        profile.current.timelineCollection for profile in expected
+      ]
+      for profile, expectedProfile in zip(filtered, expected):
+        assert isinstance(profile.current.timelineCollection, TimelineMatrix)
+        assert profile.current.deltaSeriesRepo == expectedProfile.current.deltaSeriesRepo
+    for profile in profiles:
+      timelines = list(profile.current.timelineCollection)
+      assert query.select(timelines) == [timeline for timeline in timelines if predicate(timeline)]
+
+def test_query_percentiles():
+  """Validates percentiles of declarative queries, resolved across timelines of all profiles"""
+  profiles = buildProfiles()
+  durations = sorted(timeline.duration for profile in profiles for timeline in profile.current.timelineCollection)
+  filtered = TimelineFilter(duration().top(10)).apply(profiles)
+  selected = sorted(timeline.duration for profile in filtered for timeline in profile.current.timelineCollection)
+  assert selected == durations[-len(selected):] and 20 <= len(selected) <= 25
+  filtered = TimelineFilter(duration().bottom(0)).apply(profiles)
+  assert [timeline.duration for profile in filtered for timeline in profile.current.timelineCollection] == durations[:1]
+  timelines = list(profiles[0].current.timelineCollection)
+  assert len(duration().top(50).select(timelines)) == len(timelines) // 2 + len(timelines) % 2
+  for predicate in (duration().top(100), ~duration().bottom(10) & (duration() > 0)):
+    with pytest.raises(ValueError):
+      predicate(timelines[0])
+  predicate = (duration().top(10) | (duration() < 0)).bind([timelines])
+  assert [timeline for timeline in timelines if predicate(timeline)] == predicate.select(timelines)
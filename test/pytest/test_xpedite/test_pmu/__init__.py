@@ -4,6 +4,7 @@ This package contains pytests for Xpedite's performance counters, including:
 - Tests for allocation
 - A test to orchestrate events loading
 - Test for PMC related commands: metrics, events, and topdown
+- Tests for topdown hierarchy evaluated for matrices of pmc values
 
 Below is a lit of CPUs currently supported by Xpedite
 """
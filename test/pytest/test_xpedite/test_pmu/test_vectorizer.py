@@ -0,0 +1,104 @@
+"""
+Tests to validate topdown hierarchy compiled to evaluate matrices of pmc values
+"""
+
+import math
+import numpy
+from xpedite.pmu.event                   import TopdownMetrics, TopdownNode, Metric
+from xpedite.pmu.topdown                 import Topdown
+from xpedite.pmu.vectorizer              import RatiosCompiler
+from xpedite.analytics.timeline          import CounterMap
+from test_xpedite.test_pmu               import topdownRatios
+
+EVENT_NAMES = [
+  'CPU_CLK_UNHALTED.THREAD', 'INST_RETIRED.ANY', 'IDQ_UOPS_NOT_DELIVERED.CORE',
+  'IDQ_UOPS_NOT_DELIVERED.CYCLES_0_UOPS_DELIV.CORE', 'UOPS_ISSUED.ANY', 'UOPS_RETIRED.RETIRE_SLOTS',
+  'UOPS_EXECUTED.CYCLES_GE_3', 'UOPS_EXECUTED.CYCLES_GE_2', 'CYCLE_ACTIVITY.STALLS_MEM_ANY',
+]
+
+class EventsDb(object):
+  """Events database for a hypothetical cpu, without any known events"""
+
+  @staticmethod
+  def topdownRatios():
+    """Returns topdown ratios for the cpu"""
+    return topdownRatios
+
+  def __contains__(self, eventName):
+    return False
+
+def buildTopdownMetrics(keys):
+  """Builds topdown metrics, with a new topdown hierarchy for the given keys"""
+  topdown = Topdown(EventsDb())
+  topdownMetrics = TopdownMetrics()
+  for key in keys:
+    topdownMetrics.add(topdown, key)
+  return topdownMetrics
+
+def buildPmcs(rowCount):
+  """Builds pmc values with zero clocks and nan values in a few rows"""
+  rand = numpy.random.RandomState(11)
+  pmcs = rand.randint(0, 5000, size=(rowCount, len(EVENT_NAMES))).astype(numpy.float64)
+  pmcs[:, 0] += 1000
+  pmcs[::7, 0] = 0
+  pmcs[::11, 4] = 0
+  pmcs[5::13] = numpy.nan
+  return pmcs
+
+def assertEqual(lhs, rhs):
+  """Asserts the values are equal, treating nan values as equal"""
+  if isinstance(lhs, float) and math.isnan(lhs):
+    assert isinstance(rhs, float) and math.isnan(rhs)
+  else:
+    assert lhs == rhs and isinstance(lhs, bool) == isinstance(rhs, bool)
+
+def evaluate(keys, pmcs):
+  """Compares values of topdown metrics computed for a matrix against values computed for each row"""
+  eventsMap = {name : i for i, name in enumerate(EVENT_NAMES)}
+  topdownMetrics = buildTopdownMetrics(keys)
+  topdownMatrix = topdownMetrics.computeMatrix(eventsMap, pmcs)
+  referenceMetrics = buildTopdownMetrics(keys)
+  assert len(topdownMatrix) == len(pmcs)
+  for i, row in enumerate(pmcs):
+    expected = referenceMetrics.compute(CounterMap(eventsMap, row.tolist()))
+    values = topdownMatrix.row(i)
+    assert [value.name for value in values] == [value.name for value in expected]
+    for value, expectedValue in zip(values, expected):
+      assertEqual(value.value, expectedValue.value)
+      assertEqual(value.breached, expectedValue.breached)
+  return topdownMetrics
+
+def test_compiled_topdown_metrics():
+  """Validates values and thresholds of nodes and metrics evaluated for a matrix of pmc values"""
+  pmcs = buildPmcs(100)
+  keys = [TopdownNode('Root'), TopdownNode('FrontendBound'), TopdownNode('BackendBound'), Metric('IPC'),
+          Metric('RetireFraction')]
+  topdownMetrics = evaluate(keys, pmcs)
+  evaluator, = topdownMetrics._evaluators.values() # pylint: disable=protected-access
+  assert evaluator.computes is not None
+  assert RatiosCompiler.compileModule(topdownRatios).lookupCompute(topdownMetrics.nodes[1]) is not None
+
+def test_topdown_metrics_evaluated_by_rows():
+  """Validates nodes evaluated ahead of their parents, are evaluated one row at a time"""
+  keys = [TopdownNode('FrontendBound'), TopdownNode('Root')]
+  topdownMetrics = evaluate(keys, buildPmcs(30))
+  evaluator, = topdownMetrics._evaluators.values() # pylint: disable=protected-access
+  assert evaluator.computes is None
+  topdownMatrix = topdownMetrics.computeMatrix({}, numpy.zeros((0, 0)))
+  assert len(topdownMatrix) == 0 and topdownMatrix.values.shape == (len(topdownMatrix.names), 0)
+
+def test_topdown_matrix_rows():
+  """Validates rows taken and concatenated from a matrix of topdown values"""
+  pmcs = buildPmcs(20)
+  eventsMap = {name : i for i, name in enumerate(EVENT_NAMES)}
+  topdownMatrix = buildTopdownMetrics([TopdownNode('Root'), Metric('IPC')]).computeMatrix(eventsMap, pmcs)
+  rows = [3, 1, 3, 19]
+  taken = topdownMatrix.take(rows)
+  combined = taken.concatenate([topdownMatrix])
+  assert taken.values.dtype == numpy.float64 and taken.breached.dtype == bool
+  assert len(taken) == len(rows) and len(combined) == len(rows) + len(pmcs)
+  for i, row in enumerate(rows + list(range(len(pmcs)))):
+    for value, expectedValue in zip(combined.row(i), topdownMatrix.row(row)):
+      assert value.name == expectedValue.name
+      assertEqual(value.value, expectedValue.value)
+      assertEqual(value.breached, expectedValue.breached)
@@ -0,0 +1,212 @@
+"""
+Topdown ratios for a hypothetical cpu, modelled after the ratios modules published for intel cpus
+
+The nodes exercise division by zero, boolean operators on thresholds, conditional expressions,
+min/max builtins, chained comparisons, lambda events and control flow dependent on pmc values.
+"""
+
+# pylint: disable=invalid-name,missing-docstring,attribute-defined-outside-init,too-few-public-methods
+# pylint: disable=unused-argument,old-style-class,no-init,chained-comparison,multiple-statements,use-dict-literal
+
+smt_enabled = False
+Pipeline_Width = 4
+
+def handle_error(obj, msg):
+  obj.errcount += 1
+  obj.val = 0
+  obj.thresh = False
+
+def handle_error_metric(obj, msg):
+  obj.errcount += 1
+  obj.val = 0
+
+def CLKS(self, EV, level):
+  return EV("CPU_CLK_UNHALTED.THREAD", level)
+
+def SLOTS(self, EV, level):
+  return Pipeline_Width * CLKS(self, EV, level) if not smt_enabled else 2 * Pipeline_Width * CLKS(self, EV, level)
+
+def IPC(self, EV, level):
+  return EV("INST_RETIRED.ANY", level) / CLKS(self, EV, level)
+
+def Retire_Fraction(self, EV, level):
+  return EV("UOPS_RETIRED.RETIRE_SLOTS", level) / EV("UOPS_ISSUED.ANY", level)
+
+def Few_Uops_Executed(self, EV, level):
+  return EV("UOPS_EXECUTED.CYCLES_GE_3", level) if (IPC(self, EV, level) > 1.8) else EV("UOPS_EXECUTED.CYCLES_GE_2", level)
+
+class Frontend_Bound:
+  name = "Frontend_Bound"
+  domain = "Slots"
+  area = "FE"
+  level = 1
+  htoff = False
+  sample = []
+  errcount = 0
+  sibling = None
+  def compute(self, EV):
+    try:
+      self.val = EV("IDQ_UOPS_NOT_DELIVERED.CORE", 1) / SLOTS(self, EV, 1)
+      self.thresh = (self.val > 0.2)
+    except ZeroDivisionError:
+      handle_error(self, "Frontend_Bound zero division")
+    return self.val
+  desc = "Slots, where the frontend undersupplies the backend"
+
+class Frontend_Latency:
+  name = "Frontend_Latency"
+  domain = "Slots"
+  area = "FE"
+  level = 2
+  htoff = False
+  sample = []
+  errcount = 0
+  sibling = None
+  def compute(self, EV):
+    try:
+      self.val = Pipeline_Width * EV("IDQ_UOPS_NOT_DELIVERED.CYCLES_0_UOPS_DELIV.CORE", 2) / SLOTS(self, EV, 2)
+      self.thresh = (self.val > 0.15) and self.parent.thresh
+    except ZeroDivisionError:
+      handle_error(self, "Frontend_Latency zero division")
+    return self.val
+  desc = "Slots, where the frontend delivers no uops"
+
+class Frontend_Bandwidth:
+  name = "Frontend_Bandwidth"
+  domain = "Slots"
+  area = "FE"
+  level = 2
+  htoff = False
+  sample = []
+  errcount = 0
+  sibling = None
+  def compute(self, EV):
+    try:
+      self.val = EV(lambda EV, level: EV("IDQ_UOPS_NOT_DELIVERED.CORE", level) - Pipeline_Width *
+                    EV("IDQ_UOPS_NOT_DELIVERED.CYCLES_0_UOPS_DELIV.CORE", level), 2) / SLOTS(self, EV, 2)
+      self.thresh = 0.05 < self.val < 0.5 and self.parent.thresh
+    except ZeroDivisionError:
+      handle_error(self, "Frontend_Bandwidth zero division")
+    return self.val
+  desc = "Slots, where the frontend delivers some uops"
+
+class Retiring:
+  name = "Retiring"
+  domain = "Slots"
+  area = "RET"
+  level = 1
+  htoff = False
+  sample = []
+  errcount = 0
+  sibling = None
+  def compute(self, EV):
+    try:
+      self.val = min(EV("UOPS_RETIRED.RETIRE_SLOTS", 1) / SLOTS(self, EV, 1), 1)
+      self.thresh = (self.val > 0.7) or not (self.val > 0.1)
+    except ZeroDivisionError:
+      handle_error(self, "Retiring zero division")
+    return self.val
+  desc = "Slots, utilized by useful work"
+
+class Backend_Bound:
+  name = "Backend_Bound"
+  domain = "Slots"
+  area = "BE"
+  level = 1
+  htoff = False
+  sample = []
+  errcount = 0
+  sibling = None
+  def compute(self, EV):
+    try:
+      self.val = max(0, 1 - (EV("IDQ_UOPS_NOT_DELIVERED.CORE", 1) + EV("UOPS_ISSUED.ANY", 1)) / SLOTS(self, EV, 1))
+      self.thresh = (self.val > 0.2)
+    except ZeroDivisionError:
+      handle_error(self, "Backend_Bound zero division")
+    return self.val
+  desc = "Slots, where the backend lacks resources to accept uops"
+
+class Core_Bound:
+  name = "Core_Bound"
+  domain = "Clocks"
+  area = "BE/Core"
+  level = 2
+  htoff = False
+  sample = []
+  errcount = 0
+  sibling = None
+  def compute(self, EV):
+    try:
+      self.val = Few_Uops_Executed(self, EV, 2) / CLKS(self, EV, 2)
+      self.thresh = (self.val > 0.1) and self.parent.thresh
+    except ZeroDivisionError:
+      handle_error(self, "Core_Bound zero division")
+    return self.val
+  desc = "Cycles, where execution ports are under utilized"
+
+class Memory_Bound:
+  name = "Memory_Bound"
+  domain = "Clocks"
+  area = "BE/Mem"
+  level = 2
+  htoff = False
+  sample = []
+  errcount = 0
+  sibling = None
+  def compute(self, EV):
+    try:
+      stalls = EV("CYCLE_ACTIVITY.STALLS_MEM_ANY", 2)
+      if stalls > 1000:
+        self.val = stalls / CLKS(self, EV, 2)
+      else:
+        self.val = 0
+      self.thresh = (self.val > 0.2) and self.parent.thresh
+    except ZeroDivisionError:
+      handle_error(self, "Memory_Bound zero division")
+    return self.val
+  desc = "Cycles, stalled for memory accesses"
+
+class Metric_IPC:
+  name = "IPC"
+  domain = "Metric"
+  maxval = 5
+  errcount = 0
+  def compute(self, EV):
+    try:
+      self.val = IPC(self, EV, 0)
+      self.thresh = True
+    except ZeroDivisionError:
+      handle_error_metric(self, "IPC zero division")
+  desc = "Instructions per cycle"
+
+class Metric_Retire_Fraction:
+  name = "Retire_Fraction"
+  domain = "Metric"
+  maxval = 1
+  errcount = 0
+  def compute(self, EV):
+    try:
+      self.val = Retire_Fraction(self, EV, 0)
+      self.thresh = True
+    except ZeroDivisionError:
+      handle_error_metric(self, "Retire_Fraction zero division")
+  desc = "Fraction of issued uops, that retired"
+
+class Setup:
+  def __init__(self, r):
+    o = dict()
+    n = Frontend_Bound() ; r.run(n) ; o["Frontend_Bound"] = n
+    n = Frontend_Latency() ; r.run(n) ; o["Frontend_Latency"] = n
+    n = Frontend_Bandwidth() ; r.run(n) ; o["Frontend_Bandwidth"] = n
+    n = Retiring() ; r.run(n) ; o["Retiring"] = n
+    n = Backend_Bound() ; r.run(n) ; o["Backend_Bound"] = n
+    n = Core_Bound() ; r.run(n) ; o["Core_Bound"] = n
+    n = Memory_Bound() ; r.run(n) ; o["Memory_Bound"] = n
+
+    o["Frontend_Latency"].parent = o["Frontend_Bound"]
+    o["Frontend_Bandwidth"].parent = o["Frontend_Bound"]
+    o["Core_Bound"].parent = o["Backend_Bound"]
+    o["Memory_Bound"].parent = o["Backend_Bound"]
+
+    n = Metric_IPC() ; r.metric(n)
+    n = Metric_Retire_Fraction() ; r.metric(n)
@@ -70,6 +70,20 @@ def test_report_vs_baseline(scenarioName):
   with SCENARIO_LOADER[scenarioName] as scenarios:
     compareVsBaseline(CONTEXT, scenarios)
 
+def test_parallel_report_vs_baseline(scenarioName):
+  """
+  Run xpedite report, with sample files of threads loaded by worker processes and compare
+  the profiles against previously generated profiles from the same xpedite run
+  """
+  from xpedite.dependencies import CONFIG
+  workerCount = CONFIG.workerCount
+  CONFIG.workerCount = 4
+  try:
+    with SCENARIO_LOADER[scenarioName] as scenarios:
+      compareVsBaseline(CONTEXT, scenarios)
+  finally:
+    CONFIG.workerCount = workerCount
+
 def test_record_vs_report(capsys, scenarioName):
   """
   Run xpedite record and xpedite report to compare profiles
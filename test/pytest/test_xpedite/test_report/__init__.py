@@ -0,0 +1,7 @@
+"""
+This package contains pytests for Xpedite's report generation, including:
+
+- Tests for buckets and distributions of latency histograms, with validation of the bucket layout in config
+- Tests for tail latency attribution reports
+- Tests for statistics broken down by thread
+"""
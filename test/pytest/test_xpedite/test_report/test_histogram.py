@@ -0,0 +1,88 @@
+"""
+Tests to validate buckets and distributions of latency histograms, for linear, log and hdr bucket layouts
+and validation of the bucket layout in xpedite config
+"""
+
+import bisect
+import numpy
+import pytest
+from xpedite.types               import BucketLayout
+from xpedite.report.histogram    import buildBuckets, buildSketchBuckets, buildDistribution
+from xpedite.analytics.sketch    import QuantileSketch
+from xpedite.dependencies.config import Config, HISTOGRAM_BUCKET_LAYOUTS
+
+def buildValues(seed, count):
+  """Builds log normally distributed values, with a long tail"""
+  return numpy.random.RandomState(seed).lognormal(2, 1, count).tolist()
+
+def test_linear_buckets():
+  """Compares linear buckets against buckets spanning half to twice the mean, of values below 95th percentile"""
+  values = buildValues(1, 1000)
+  confidence = sorted(values)[:950]
+  mean = sum(confidence) / len(confidence)
+  buckets = buildBuckets(values, 35)
+  assert len(buckets) == 36
+  assert buckets[0] == pytest.approx(mean / 2) and buckets[-1] == pytest.approx(mean * 2)
+  assert numpy.diff(buckets) == pytest.approx([mean * 1.5 / 35] * 35)
+  assert buildBuckets(values[:1], 35) is None
+  assert buildBuckets([0] * 10, 35) == []
+
+@pytest.mark.parametrize('layout', [BucketLayout.Log, BucketLayout.Hdr])
+def test_tail_buckets(layout):
+  """Validates log and hdr buckets span all the values, without conflating the tail"""
+  values = buildValues(2, 5000) + [0]
+  buckets = buildBuckets(values, 35, layout)
+  assert all(lower < upper for lower, upper in zip(buckets, buckets[1:]))
+  positives = [value for value in values if value > 0]
+  assert min(positives) <= buckets[0] < 2 * min(positives) and buckets[-2] < max(positives) <= buckets[-1]
+  bucketValues, conflatedCount = buildDistribution(buckets, values)
+  assert conflatedCount == 0 and sum(bucketValues) == len(values)
+  if layout == BucketLayout.Log:
+    assert len(buckets) == 36 and numpy.diff(numpy.log(buckets)) == pytest.approx([numpy.log(buckets[1] / buckets[0])] * 35)
+  else:
+    assert 30 <= len(buckets) <= 45
+    mantissas = sorted(set(round(bucket / 2 ** numpy.floor(numpy.log2(bucket)), 9) for bucket in buckets))
+    assert mantissas[0] == 1 and numpy.diff(mantissas + [2]) == pytest.approx([2 - mantissas[-1]] * len(mantissas))
+  assert buildBuckets([0, -1], 35, layout) is None and buildBuckets([5, 5], 35, layout) == []
+
+def test_distribution():
+  """Compares distribution of values against counts of values bisected to buckets"""
+  values = buildValues(3, 2000)
+  buckets = buildBuckets(values, 35)
+  expected = [0] * len(buckets)
+  conflatedCount = 0
+  for value in values + buckets:
+    index = bisect.bisect_left(buckets, value)
+    conflatedCount += index >= len(buckets)
+    expected[min(index, len(buckets) - 1)] += 1
+  assert buildDistribution(buckets, numpy.array(values + buckets)) == (expected, conflatedCount)
+  assert conflatedCount > 0
+
+@pytest.mark.parametrize('layout', list(BucketLayout))
+def test_sketch_buckets(layout):
+  """Compares buckets for values summarized by a quantile sketch, against buckets built from the values"""
+  values = buildValues(4, 5000) + [0]
+  sketch = QuantileSketch(0.01)
+  sketch.extend(values)
+  buckets, expectedBuckets = buildSketchBuckets(sketch, 35, layout), buildBuckets(values, 35, layout)
+  if layout == BucketLayout.Hdr:
+    assert abs(len(buckets) - len(expectedBuckets)) <= 1 and buckets[-1] == expectedBuckets[-1]
+  else:
+    assert buckets == pytest.approx(expectedBuckets, rel=0.02)
+  bucketValues, conflatedCount = sketch.buildDistribution(buckets)
+  assert sum(bucketValues) == len(values) and (conflatedCount == 0 or layout == BucketLayout.Linear)
+  for constants in ([], [0] * 10, [5, 5], [-1, 0]):
+    sketch = QuantileSketch(0.01)
+    sketch.extend(constants)
+    expectedBuckets = buildBuckets(constants, 35, layout)
+    assert buildSketchBuckets(sketch, 35, layout) == (pytest.approx(expectedBuckets, rel=0.02) if expectedBuckets else expectedBuckets)
+
+def test_config_bucket_layout():
+  """Validates bucket layouts in config are matched to bucket layouts, ignoring case"""
+  assert HISTOGRAM_BUCKET_LAYOUTS == tuple(layout.name for layout in BucketLayout)
+  assert Config({}).histogramBucketLayout == 'Linear'
+  for layout in BucketLayout:
+    for value in (layout, layout.name, layout.name.lower(), layout.name.upper()):
+      assert BucketLayout[Config({'histogramBucketLayout' : value}).histogramBucketLayout] == layout
+  with pytest.raises(Exception, match='expected one of Linear, Log, Hdr'):
+    Config({'histogramBucketLayout' : 'exponential'})
@@ -0,0 +1,20 @@
+"""
+Tests to validate html tabs, with statistics of transactions broken down by thread
+"""
+
+import random
+from xpedite.analytics                       import Analytics
+from xpedite.report.stats                    import StatsBuilder
+from test_xpedite.test_analytics.test_conflator import PROBES, buildTimelineStatsForTxns
+
+def test_thread_breakdown_report():
+  """Validates breakdown report has a tab for each thread, with a row for each segment of the route"""
+  timelineStats = buildTimelineStatsForTxns(random.Random(5), 300, 0)
+  breakdown = Analytics.buildThreadBreakdown(timelineStats)
+  assert len(breakdown) > 1
+  report = StatsBuilder().buildBreakdownTable('category', breakdown)
+  assert 'category latency statistics by thread ({} threads)'.format(len(breakdown)) in report
+  for threadId, stats in breakdown.items():
+    assert '>thread {} ({})</a>'.format(threadId, len(stats)) in report
+  assert report.count('<td class="tdKey">{}</td>'.format(PROBES[1].name)) == 2 * len(breakdown)
+  assert StatsBuilder().buildBreakdownTable('category', {}) == ''
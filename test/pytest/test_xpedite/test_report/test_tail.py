@@ -0,0 +1,18 @@
+"""
+Tests to validate html tabs, attributing tail latency of transactions to segments of their route
+"""
+
+import random
+from xpedite.report.tail                     import TailReportBuilder
+from test_xpedite.test_analytics.test_conflator import PROBES, buildTimelineStatsForTxns
+
+def test_tail_report():
+  """Validates tail report has a tab for each tail percentile, with a row for each segment of the route"""
+  timelineStats = buildTimelineStatsForTxns(random.Random(3), 200, 0)
+  report = TailReportBuilder().buildTailReport('category', timelineStats, [90, 99.9])
+  assert 'category tail latency attribution (200 transactions)' in report
+  assert '>p90</a>' in report and '>p99.9</a>' in report
+  for begin, end in zip(PROBES[:-1], PROBES[1:]):
+    assert '<td class="tdKey">{}</td><td class="tdKey">{}</td>'.format(begin.name, end.name) in report
+  assert report.count('Correlation with total') == 2
+  assert TailReportBuilder().buildTailReport('category', buildTimelineStatsForTxns(random.Random(3), 1, 0)) != ''
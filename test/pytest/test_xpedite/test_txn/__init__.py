@@ -0,0 +1,11 @@
+"""
+This package contains pytests for Xpedite's transaction building, including:
+
+- Tests for parallel loading of sample files from multiple threads
+- Tests for storage of counters in a counter store
+- Tests for classification of transactions in batches
+- Tests for joining of suspended and resumed transaction fragments, with a stress benchmark for deep chains
+- Tests for loading samples persisted in columnar format, against binary and csv sample files
+- Tests for transactions persisted in the transaction cache, with least recently used eviction
+- Tests for parallel loading of benchmarks, with transactions cached next to each benchmark
+"""
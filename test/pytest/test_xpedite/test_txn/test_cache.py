@@ -0,0 +1,176 @@
+"""
+Tests to validate transactions persisted in the transaction cache, match the transactions
+built by loaders, along with keying and least recently used eviction of cache entries
+and parallel loading of benchmarks with a cache next to each benchmark
+"""
+
+import os
+import glob
+import shutil
+import numpy
+from xpedite.types             import CpuInfo
+from xpedite.types.dataSource  import BinaryDataSourceFactory, DataSource, SampleFile, SampleFileFormat, APPINFO_FILE_NAME
+from xpedite.txn.loader        import BoundedTxnLoader
+from xpedite.txn.cache         import TxnCache, buildRunKey, HEADER_FILE_NAME
+from xpedite.txn.columnar      import makeColumnarSamples
+from xpedite.txn.filter        import TrivialCounterFilter
+from xpedite.txn.repo          import TxnRepo
+from xpedite.benchmark         import BenchmarksCollector, BENCHMARK_DIR_NAME
+from xpedite.benchmark.info    import makeBenchmarkInfo
+from test_xpedite              import PARAMETERS_DATA_DIR, PROFILE_INFO_PATH, XPEDITE_APP_INFO_PARAMETER_PATH, loadProfileInfo
+from test_xpedite.test_txn.test_loader   import PROBES, WORK, buildThreads, loadThread
+from test_xpedite.test_txn.test_columnar import SCENARIO_NAME, extractScenario
+
+def buildTxnCollection(seed):
+  """Builds a collection of transactions, with fragments suspended and resumed across threads"""
+  loader = BoundedTxnLoader('cache', None, PROBES, None, None)
+  for threadId, tlsAddr, counters in buildThreads(4, 64, seed):
+    views = [loader.store.view(loader.store.append(counter)) for counter in counters]
+    loadThread(loader, (threadId, tlsAddr, views))
+  loader.endCollection()
+  return loader.getData()
+
+def loadCollection(txnCache, key, txnCollection):
+  """Loads transactions for a key, with meta data of the given collection"""
+  return txnCache.load(
+    key, txnCollection.name, txnCollection.cpuInfo, txnCollection.probes, txnCollection.topdownMetrics,
+    txnCollection.events, txnCollection.dataSource
+  )
+
+def test_cached_vs_loaded_txns(tmp_path):
+  """Compares transactions loaded from the cache, against transactions built by the loader"""
+  txnCache = TxnCache(str(tmp_path), 1 << 30)
+  for seed in range(4):
+    txnCollection = buildTxnCollection(seed)
+    key = 'seed{}'.format(seed)
+    assert loadCollection(txnCache, key, txnCollection) is None
+    assert txnCache.save(key, txnCollection) and not txnCache.save(key, txnCollection)
+    cachedCollection = loadCollection(txnCache, key, txnCollection)
+    assert list(cachedCollection.txnMap) == list(txnCollection.txnMap)
+    assert cachedCollection == txnCollection
+    for txn, cachedTxn in zip(txnCollection, cachedCollection):
+      assert numpy.array_equal(txn.indices, cachedTxn.indices) and txn.route is cachedTxn.route
+
+  path = txnCache.entryPath('seed0')
+  with open(os.path.join(path, 'indices.npy'), 'wb') as columnFile:
+    columnFile.write(b'corrupt')
+  assert loadCollection(txnCache, 'seed0', txnCollection) is None and not os.path.exists(path)
+
+def test_eviction(tmp_path):
+  """Validates least recently used entries are evicted, to keep the cache under its size limit"""
+  txnCollection = buildTxnCollection(0)
+  txnCache = TxnCache(str(tmp_path), 1 << 30)
+  for i in range(3):
+    txnCache.save('entry{}'.format(i), txnCollection)
+    os.utime(os.path.join(txnCache.entryPath('entry{}'.format(i)), HEADER_FILE_NAME), (1000 + i, 1000 + i))
+  entrySize = txnCache.entries()[0][1]
+  assert loadCollection(txnCache, 'entry0', txnCollection) is not None
+
+  txnCache.sizeLimit = 3 * entrySize
+  assert txnCache.save('entry3', txnCollection)
+  assert sorted(key for _, _, key in txnCache.entries()) == ['entry0', 'entry2', 'entry3']
+  txnCache.sizeLimit = entrySize - 1
+  assert not txnCache.save('entry4', txnCollection) and len(txnCache.entries()) == 3
+  txnCache.evict()
+  assert not txnCache.entries()
+
+def test_read_only_cache(tmp_path, monkeypatch):
+  """Validates entries are loaded, when the cache can't be marked as recently used"""
+  txnCollection = buildTxnCollection(0)
+  txnCache = TxnCache(str(tmp_path), 1 << 30)
+  assert txnCache.save('entry', txnCollection)
+
+  def utime(path, _times):
+    """Fails to update times of a file, like a file in read only storage"""
+    raise OSError(13, 'Permission denied', path)
+
+  monkeypatch.setattr(os, 'utime', utime)
+  assert loadCollection(txnCache, 'entry', txnCollection) == txnCollection
+
+def test_run_key(tmp_path):
+  """Validates keys of runs change with sample files and probes"""
+  paths = [os.path.join(str(tmp_path), name) for name in ('appinfo.txt', 'samples.data')]
+  for path in paths:
+    with open(path, 'w') as sampleFile:
+      sampleFile.write('samples')
+  dataSource = DataSource(paths[0], [SampleFile('1', 'tls', paths[1], SampleFileFormat.BINARY)])
+  key = buildRunKey(1, dataSource, PROBES)
+  assert key == buildRunKey(1, dataSource, list(PROBES))
+  assert key != buildRunKey(2, dataSource, PROBES)
+  assert key != buildRunKey(1, dataSource, [probe for probe in PROBES if probe is not WORK])
+  with open(paths[1], 'a') as sampleFile:
+    sampleFile.write('more samples')
+  assert key != buildRunKey(1, dataSource, PROBES)
+
+def makeBenchmarks(path, count):
+  """Makes benchmarks with columnar samples of a scenario, returning paths and probes of the benchmarks"""
+  scenarioPath = extractScenario(path, SCENARIO_NAME)
+  profileInfo = loadProfileInfo(scenarioPath, PROFILE_INFO_PATH)
+  sampleFiles = []
+  for filePath in sorted(glob.glob(os.path.join(scenarioPath, PARAMETERS_DATA_DIR, '*.data'))):
+    threadId, tlsAddr = BinaryDataSourceFactory().extractThreadInfo(filePath)
+    sampleFiles.append(SampleFile(threadId, tlsAddr, filePath, SampleFileFormat.BINARY))
+  benchmarkPaths = []
+  for i in range(count):
+    benchmarkPaths.append(os.path.join(str(path), 'run{}'.format(i)))
+    benchmarkPath = os.path.join(benchmarkPaths[-1], BENCHMARK_DIR_NAME)
+    makeColumnarSamples(sampleFiles, benchmarkPath)
+    shutil.copyfile(
+      os.path.join(scenarioPath, XPEDITE_APP_INFO_PARAMETER_PATH), os.path.join(benchmarkPath, APPINFO_FILE_NAME)
+    )
+    makeBenchmarkInfo('run{}'.format(i), benchmarkPath, CpuInfo('GenuineIntel-6-3F', 2000000000))
+  return benchmarkPaths, profileInfo.probes
+
+def loadBenchmarks(benchmarks, probes, workerCount):
+  """Loads transactions of benchmarks to a new transaction repo"""
+  repo = TxnRepo()
+  BenchmarksCollector.loadTxns(
+    repo, TrivialCounterFilter(), benchmarks,
+    lambda benchmark: BoundedTxnLoader(benchmark.name, benchmark.cpuInfo, probes, None, benchmark.events),
+    workerCount=workerCount
+  )
+  return repo.getBenchmarks()
+
+def test_benchmark_cache(tmp_path, monkeypatch):
+  """Compares benchmarks loaded in parallel and from their cache, against a serial load"""
+  benchmarkPaths, probes = makeBenchmarks(tmp_path, 3)
+  benchmarks = BenchmarksCollector(benchmarkPaths).gatherBenchmarks()
+  assert [benchmark.name for benchmark in benchmarks] == ['run0', 'run1', 'run2']
+  assert len(BenchmarksCollector(benchmarkPaths).gatherBenchmarks(2)) == 2
+
+  expectedCollections = loadBenchmarks(benchmarks, probes, 1)
+  for benchmarkPath in benchmarkPaths:
+    shutil.rmtree(os.path.join(benchmarkPath, 'txnCache'))
+  for workerCount in (3, 1):
+    collections = loadBenchmarks(benchmarks, probes, workerCount)
+    assert list(collections) == list(expectedCollections) == ['run0', 'run1', 'run2']
+    for name, collection in collections.items():
+      expectedCollection = expectedCollections[name]
+      assert collection == expectedCollection and len(collection.txnMap) > 0
+      assert all(probe is expectedProbe for probe, expectedProbe in zip(collection.probes, probes))
+      assert collection.dataSource is expectedCollection.dataSource
+      assert [list(txn.indices) for txn in collection] == [list(txn.indices) for txn in expectedCollection]
+    assert all(len(TxnCache(benchmark.cachePath, 1 << 30).entries()) == 1 for benchmark in benchmarks)
+    monkeypatch.setattr(BenchmarksCollector, 'loadBenchmark', None)
+
+  key = benchmarks[0].cacheKey(probes)
+  assert key == benchmarks[0].cacheKey(list(probes)) and key != benchmarks[0].cacheKey(probes[1:])
+  assert key != benchmarks[1].cacheKey(probes)
+
+def test_read_only_benchmark_cache(tmp_path, monkeypatch):
+  """Validates benchmarks in read only storage are cached in the transaction cache of xpedite config"""
+  from xpedite.dependencies import CONFIG
+  benchmarkPaths, probes = makeBenchmarks(tmp_path, 2)
+  benchmarks = BenchmarksCollector(benchmarkPaths).gatherBenchmarks()
+  cacheDir = os.path.join(str(tmp_path), 'txnCache')
+  monkeypatch.setattr(CONFIG, 'txnCacheDir', cacheDir)
+  access = os.access
+  monkeypatch.setattr(os, 'access', lambda path, mode: path not in benchmarkPaths and access(path, mode))
+
+  expectedCollections = loadBenchmarks(benchmarks, probes, 2)
+  assert all(not os.path.exists(benchmark.cachePath) for benchmark in benchmarks)
+  assert len(TxnCache(cacheDir, 1 << 30).entries()) == 2
+  monkeypatch.setattr(BenchmarksCollector, 'loadBenchmark', None)
+  collections = loadBenchmarks(benchmarks, probes, 2)
+  assert list(collections) == list(expectedCollections) == ['run0', 'run1']
+  assert all(collection == expectedCollections[name] for name, collection in collections.items())
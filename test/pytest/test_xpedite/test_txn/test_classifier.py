@@ -0,0 +1,83 @@
+"""
+Tests to validate classification of transactions in batches, with and without memoization of categories
+"""
+
+from xpedite.types                import Counter, CpuInfo
+from xpedite.types.probe          import Probe, TxnBeginProbe, TxnEndProbe
+from xpedite.types.counterStore   import CounterStore
+from xpedite.txn                  import Transaction
+from xpedite.txn.collection       import TxnSubCollection
+from xpedite.txn.classifier       import (
+                                    DefaultClassifier, ProbeDataClassifier, MemoizingProbeDataClassifier, classifyTxns
+                                  )
+from xpedite.analytics.aggregator import TxnAggregator
+
+PROBES = [TxnBeginProbe('Begin', 'Begin'), Probe('Type', 'Type'), TxnEndProbe('End', 'End')]
+CPU_INFO = CpuInfo('GenuineIntel-6-3F', 2000 * 1000 * 1000)
+
+class TypeMapper(object):
+  """Maps probe data to categories, counting invocations"""
+
+  def __init__(self):
+    self.invocations = 0
+
+  def __call__(self, data):
+    self.invocations += 1
+    return 'Type {}'.format(data) if data else 'Untyped'
+
+class ReversedClassifier(ProbeDataClassifier):
+  """A classifier overriding classify, without a batch implementation"""
+
+  def classify(self, txn):
+    return ProbeDataClassifier.classify(self, txn)[::-1]
+
+def buildTxnSubCollection(txnCount):
+  """Builds transactions with varying probe data, skipping the typed probe in every seventh transaction"""
+  store = CounterStore()
+  txns = []
+  for txnId in range(txnCount):
+    txn = None
+    for i, probe in enumerate(PROBES):
+      if i == 1 and txnId % 7 == 0:
+        continue
+      counter = Counter('1', probe, '{:x}'.format(txnId % 4) if i == 1 else '', 1000 * txnId + 10 * i * (txnId % 5))
+      if txn:
+        txn.addCounter(counter, probe is PROBES[-1])
+      else:
+        txn = Transaction(store.view(store.append(counter)), txnId)
+    txn.finalize()
+    txns.append(txn)
+  return TxnSubCollection('test', CPU_INFO, txns, PROBES, None, None)
+
+def test_classify_batch():
+  """Compares categories of transactions classified in a batch against categories of each transaction"""
+  txns = buildTxnSubCollection(100).transactions
+  mapper = TypeMapper()
+  memoizingClassifier = MemoizingProbeDataClassifier(PROBES[1], mapper)
+  for classifier in [DefaultClassifier(), ProbeDataClassifier(PROBES[1], TypeMapper()), memoizingClassifier,
+                     ReversedClassifier(PROBES[1], TypeMapper())]:
+    categories = classifyTxns(classifier, txns)
+    assert categories == [classifier.classify(txn) for txn in txns]
+  assert len(set(categories)) == 5 and categories[0] == 'depytnU'
+  assert mapper.invocations == 5
+  assert classifyTxns(memoizingClassifier, []) == []
+
+def test_aggregate_batch():
+  """Validates transactions aggregated by categories, using a memoizing classifier"""
+  txnSubCollection = buildTxnSubCollection(60)
+  mapper = TypeMapper()
+  classifier = MemoizingProbeDataClassifier(PROBES[1], mapper)
+  groupMap = TxnAggregator.groupTxns(txnSubCollection, classifier)
+  assert sorted(groupMap) == ['Type 0', 'Type 1', 'Type 2', 'Type 3', 'Untyped']
+  for category, subCollection in groupMap.items():
+    assert all(ProbeDataClassifier(PROBES[1], TypeMapper()).classify(txn) == category for txn in subCollection)
+  assert sum(len(subCollection) for subCollection in groupMap.values()) == 60
+  assert len(TxnAggregator.groupTxns(txnSubCollection, classifier, mustHaveProbes=PROBES[1:2])) == 4
+
+  elapsedTimeGroup = TxnAggregator.groupElapsedTime(txnSubCollection, CPU_INFO, classifier)
+  elapsedTscGroup = TxnAggregator.groupElapsedTscByScope(txnSubCollection, PROBES[0], PROBES[2], classifier)
+  for category, subCollection in groupMap.items():
+    elapsedTscs = [txn.getElapsedTsc() for txn in subCollection]
+    assert elapsedTscGroup[category] == elapsedTscs
+    assert elapsedTimeGroup[category] == [CPU_INFO.convertCyclesToTime(tsc) for tsc in elapsedTscs]
+  assert mapper.invocations == 5
@@ -0,0 +1,136 @@
+"""
+Tests to validate samples persisted in columnar format, load the same counters and transactions
+as the binary and csv sample files, they were converted from
+"""
+
+import os
+import json
+import glob
+import shutil
+import tarfile
+import numpy
+import pytest
+from xpedite.types.dataSource  import (
+                                  BinaryDataSourceFactory, DataSource, SampleFile, SampleFileFormat,
+                                  ColumnarDataSourceFactory, gatherDataSource, APPINFO_FILE_NAME
+                                )
+from xpedite.txn.columnar      import makeColumnarSamples, loadColumns, iterColumnBatches, SAMPLE_COLUMNS
+from xpedite.txn.collector     import Collector
+from xpedite.txn.extractor     import Extractor
+from xpedite.txn.filter        import TrivialCounterFilter, AnonymousCounterFilter
+from xpedite.txn.loader        import BoundedTxnLoader
+from xpediteBindings           import SamplesLoader
+from test_xpedite              import (
+                                  DIR_PATH, PARAMETERS_DATA_DIR, PROFILE_INFO_PATH, XPEDITE_APP_INFO_PARAMETER_PATH,
+                                  loadProfileInfo
+                                )
+
+SCENARIO_NAME = 'dataTxnAppRegular'
+BENCHMARK_SCENARIO_NAME = 'allocatorAppBenchmark'
+STORE_COLUMNS = ('tsc', 'dataHi', 'dataLo', 'flags', 'pmcCount')
+
+def extractScenario(path, name):
+  """Extracts samples and app info of a scenario, returning the scenario directory"""
+  with tarfile.open(os.path.join(DIR_PATH, 'dataPy3', name + '.tar.gz')) as tarFile:
+    tarFile.extractall(str(path))
+  return os.path.join(str(path), name)
+
+def loadDataSource(dataSource, probes):
+  """Loads transactions from a data source, returning the loader"""
+  loader = BoundedTxnLoader(SCENARIO_NAME, None, probes, None, None)
+  Collector(TrivialCounterFilter(), workerCount=1).loadDataSource(dataSource, loader)
+  return loader
+
+def assertSameLoad(loader, expectedLoader):
+  """Asserts loaders built the same counters and transactions"""
+  store, expectedStore = loader.store, expectedLoader.store
+  assert len(store) == len(expectedStore) > 0
+  for name in STORE_COLUMNS:
+    assert numpy.array_equal(getattr(store, name)[:len(store)], getattr(expectedStore, name)[:len(store)])
+  assert [store.probes[probeId].sysName for probeId in store.probeIds[:len(store)]] == [
+    expectedStore.probes[probeId].sysName for probeId in expectedStore.probeIds[:len(store)]
+  ]
+  assert store.dataOverrides == expectedStore.dataOverrides
+  assert loader.getTxnCount() == expectedLoader.getTxnCount() > 0
+  txns, expectedTxns = loader.getData(), expectedLoader.getData()
+  assert [list(txn.indices) for txn in txns.getSubCollection()] == [
+    list(txn.indices) for txn in expectedTxns.getSubCollection()
+  ]
+
+def test_columnar_vs_binary(tmp_path):
+  """Compares counters and transactions loaded from columns, against loads of binary and csv sample files"""
+  scenarioPath = extractScenario(tmp_path, SCENARIO_NAME)
+  profileInfo = loadProfileInfo(scenarioPath, PROFILE_INFO_PATH)
+  appInfoPath = os.path.join(scenarioPath, XPEDITE_APP_INFO_PARAMETER_PATH)
+  sampleFiles = []
+  for filePath in sorted(glob.glob(os.path.join(scenarioPath, PARAMETERS_DATA_DIR, '*.data'))):
+    threadId, tlsAddr = BinaryDataSourceFactory().extractThreadInfo(filePath)
+    sampleFiles.append(SampleFile(threadId, tlsAddr, filePath, SampleFileFormat.BINARY))
+  binaryLoader = loadDataSource(DataSource(appInfoPath, sampleFiles), profileInfo.probes)
+
+  benchmarkPath = os.path.join(str(tmp_path), 'benchmark')
+  manifestPath = makeColumnarSamples(sampleFiles, benchmarkPath)
+  shutil.copyfile(appInfoPath, os.path.join(benchmarkPath, APPINFO_FILE_NAME))
+  dataSource = gatherDataSource(benchmarkPath)
+  assert [sampleFile.fmt for sampleFile in dataSource.files] == [SampleFileFormat.COLUMNAR] * len(sampleFiles)
+  assert [(sampleFile.threadId, sampleFile.tlsAddr) for sampleFile in dataSource.files] == [
+    (sampleFile.threadId, sampleFile.tlsAddr) for sampleFile in sampleFiles
+  ]
+  assertSameLoad(loadDataSource(dataSource, profileInfo.probes), binaryLoader)
+
+  columns = loadColumns(dataSource.files[0].path)
+  arrays = SamplesLoader(sampleFiles[0].path).toArrays()
+  assert sorted(columns) == sorted(SAMPLE_COLUMNS) and isinstance(columns['tsc'], numpy.memmap)
+  for name in SAMPLE_COLUMNS:
+    assert numpy.array_equal(columns[name], arrays[name])
+  batches = list(iterColumnBatches(columns, 1000))
+  assert [len(batch['tsc']) for batch in batches[:-1]] == [1000] * (len(batches) - 1)
+  assert sum(len(batch['pmc']) for batch in batches) == len(columns['tsc'])
+
+  csvPaths = []
+  for i, sampleFile in enumerate(sampleFiles):
+    csvPaths.append(os.path.join(str(tmp_path), 'samples-{:04d}.csv'.format(i)))
+    SamplesLoader.saveAsCsv(sampleFile.path, csvPaths[-1])
+  csvFiles = [
+    SampleFile(sampleFile.threadId, sampleFile.tlsAddr, csvPath, SampleFileFormat.CSV)
+    for sampleFile, csvPath in zip(sampleFiles, csvPaths)
+  ]
+  assertSameLoad(loadDataSource(DataSource(appInfoPath, csvFiles), profileInfo.probes), binaryLoader)
+
+  with open(manifestPath) as manifestFile:
+    manifest = json.load(manifestFile)
+  assert [thread['sampleCount'] for thread in manifest['threads']] == [len(columns['tsc'])]
+  manifest['version'] += 1
+  with open(manifestPath, 'w') as manifestFile:
+    json.dump(manifest, manifestFile)
+  assert ColumnarDataSourceFactory.canGather(benchmarkPath) and gatherDataSource(benchmarkPath) is None
+  with pytest.raises(Exception):
+    makeColumnarSamples(csvFiles, os.path.join(str(tmp_path), 'csvBenchmark'))
+
+def test_gather_csv_benchmark(tmp_path):
+  """Validates benchmarks with samples in csv format, are gathered by the csv data source factory"""
+  benchmarkPath = os.path.join(extractScenario(tmp_path, BENCHMARK_SCENARIO_NAME), 'benchmark')
+  assert not ColumnarDataSourceFactory.canGather(benchmarkPath)
+  dataSource = gatherDataSource(benchmarkPath)
+  assert dataSource.files and all(sampleFile.fmt == SampleFileFormat.CSV for sampleFile in dataSource.files)
+
+def test_parallel_filter_report(tmp_path, monkeypatch):
+  """Validates counters filtered in worker processes, are reported by the parent as in a serial load"""
+  scenarioPath = extractScenario(tmp_path, SCENARIO_NAME)
+  profileInfo = loadProfileInfo(scenarioPath, PROFILE_INFO_PATH)
+  appInfoPath = os.path.join(scenarioPath, XPEDITE_APP_INFO_PARAMETER_PATH)
+  filePath = sorted(glob.glob(os.path.join(scenarioPath, PARAMETERS_DATA_DIR, '*.data')))[0]
+  threadId, tlsAddr = BinaryDataSourceFactory().extractThreadInfo(filePath)
+  dataSource = DataSource(appInfoPath, [SampleFile(threadId, tlsAddr, filePath, SampleFileFormat.BINARY)] * 2)
+  reports = []
+
+  def logCounterFilterReport(extractor):
+    """Collects reports of the filter, in place of logging"""
+    reports.append(extractor.counterFilter.report())
+    extractor.counterFilter.reset()
+
+  monkeypatch.setattr(Extractor, 'logCounterFilterReport', logCounterFilterReport)
+  for workerCount in (1, 2):
+    loader = BoundedTxnLoader(SCENARIO_NAME, None, profileInfo.probes, None, None)
+    Collector(AnonymousCounterFilter(profileInfo.probes[1:]), workerCount=workerCount).loadDataSource(dataSource, loader)
+  assert len(reports) == 4 and reports[0] and reports[:2] == reports[2:]
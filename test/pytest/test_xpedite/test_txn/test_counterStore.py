@@ -0,0 +1,98 @@
+"""
+Tests to validate counters stored in a counter store, match the counters they were built from
+"""
+
+import pickle
+from xpedite.types              import Counter, formatData, parseData
+from xpedite.types.probe        import Probe
+from xpedite.types.counterStore import CounterStore
+from xpedite.txn                import Transaction
+
+PROBES = [Probe('Probe{}'.format(i), 'Probe{}'.format(i)) for i in range(3)]
+
+def buildCounters():
+  """Builds counters with and without data and pmc values"""
+  counters = []
+  for i in range(16):
+    data = '{:x}{:016x}'.format(i, i * 7) if i % 2 else ''
+    counter = Counter(str(i % 3), PROBES[i % 3], data, 1000 + i)
+    for pmc in range(i % 4):
+      counter.addPmc(pmc * 100 + i)
+    counters.append(counter)
+  counters[3].data = 'not-hex'
+  return counters
+
+def test_store_views():
+  """
+  Test views of stored counters compare equal to the original counters
+  """
+  counters = buildCounters()
+  store = CounterStore()
+  indices = [store.append(counter) for counter in counters]
+  assert store.views(indices) == counters
+  assert pickle.loads(pickle.dumps(store)).views(indices) == counters
+
+  other = CounterStore()
+  other.append(counters[0])
+  offset = other.merge(store)
+  assert offset == 1
+  assert other.views(range(1, len(other))) == counters
+
+def test_raw_data():
+  """
+  Test counters built from raw (upper, lower) integers of probe data, match counters built from hex strings
+  """
+  counters = buildCounters()
+  rawCounters = []
+  for counter in counters:
+    rawData = parseData(counter.data) if counter.data else None
+    rawCounter = Counter(counter.threadId, counter.probe, rawData or counter.data, counter.tsc)
+    rawCounter.pmcs = counter.pmcs
+    rawCounters.append(rawCounter)
+  assert rawCounters == counters
+  assert rawCounters[1].rawData == (1, 7) and rawCounters[1].data == formatData(1, 7) == counters[1].data
+  assert rawCounters[3].rawData == 'not-hex' and rawCounters[0].rawData == ''
+  assert parseData(formatData(1 << 63, 5)) == (1 << 63, 5) and parseData('0') is None
+
+  store = CounterStore()
+  indices = [store.append(counter) for counter in counters]
+  rawStore = CounterStore()
+  rawIndices = [rawStore.append(counter) for counter in rawCounters]
+  assert (store.dataHi == rawStore.dataHi).all() and (store.dataLo == rawStore.dataLo).all()
+  assert store.dataOverrides == rawStore.dataOverrides == {3: 'not-hex'}
+  views = rawStore.views(rawIndices)
+  assert views == counters and [view.rawData for view in views] == [counter.rawData for counter in rawCounters]
+  assert [view.rawData for view in store.views(indices)] == [counter.rawData for counter in rawCounters]
+  state = rawCounters[1].__dict__.copy()
+  state['data'] = state.pop('rawData')
+  legacyCounter = Counter.__new__(Counter)
+  legacyCounter.__setstate__(state)
+  assert legacyCounter == counters[1]
+  assert pickle.loads(pickle.dumps(rawCounters[1])) == counters[1]
+
+def test_transaction_join():
+  """
+  Test joined transactions order counters by tsc and share the store
+  """
+  counters = buildCounters()
+  store = CounterStore()
+  views = store.views([store.append(counter) for counter in counters])
+  txn = Transaction(views[0], 1)
+  other = Transaction(views[1], 2)
+  for i, view in enumerate(views[2:]):
+    (txn if i % 2 else other).addCounter(view, False)
+  txn.join(other)
+  assert txn.store is store
+  assert txn.counters == counters
+
+def test_transaction_store_capacity():
+  """
+  Test stores of transactions built from plain counters, grow to fit the counters
+  """
+  counters = buildCounters()
+  txn = Transaction(counters[0], 1)
+  assert len(txn.store.tsc) == txn.store.pmcs.shape[0] == 1
+  for counter in counters[1:]:
+    txn.addCounter(counter, False)
+  assert len(txn.store) == len(counters) <= len(txn.store.tsc) < 2 * len(counters)
+  assert txn.counters == counters
@@ -0,0 +1,110 @@
+"""
+Tests to validate joining of suspended and resumed transaction fragments, including a stress
+benchmark with deep chains of fragments
+"""
+
+import copy
+import time
+import logging
+import numpy
+from xpedite.types             import Counter
+from xpedite.txn.loader        import BoundedTxnLoader
+from xpedite.txn.fragments     import TxnFragments
+from test_xpedite.test_txn.test_loader import (
+                                 BEGIN, END, SUSPEND, RESUME, WORK, PROBES, buildThreads, loadThread
+                               )
+
+LOGGER = logging.getLogger(__name__)
+
+def referenceJoin(fragments, nextTxnId):
+  """Joins fragments by recursion along chains, copying transactions for each branch"""
+  txns = []
+
+  def joinFragments(txn, nextFragments):
+    """Joins fragments in a link"""
+    if not nextFragments:
+      txn.txnId = nextTxnId + len(txns) + 1
+      txns.append(txn)
+      return
+    clone = copy.deepcopy(txn)
+    for i, fragment in enumerate(nextFragments):
+      txn = txn if i == 0 else copy.deepcopy(clone)
+      txn.join(fragment.txn)
+      joinFragments(txn, fragment.next)
+
+  for rootFragment in fragments.rootFragments:
+    joinFragments(rootFragment.txn, rootFragment.next)
+  return txns
+
+def loadFragments(threads):
+  """Loads counters of threads, returning the loader with fragments pending join"""
+  loader = BoundedTxnLoader('fragments', None, PROBES, None, None)
+  for thread in threads:
+    loadThread(loader, thread)
+  return loader
+
+def buildChain(depth, fanOut=1):
+  """Builds counters of a thread, with a transaction suspended and resumed depth times"""
+  counters = []
+  linkIds = []
+  tsc = 0
+  for level in range(depth + 1):
+    resumeIds = linkIds or [None]
+    linkIds = []
+    for linkId in resumeIds:
+      for _ in range(fanOut if linkId else 1):
+        tsc += 1
+        counters.append(Counter('1', RESUME if linkId else BEGIN, linkId or '', tsc))
+        tsc += 1
+        counters.append(Counter('1', WORK, '', tsc))
+        tsc += 1
+        if level < depth:
+          counters.append(Counter('1', SUSPEND, '', tsc))
+          linkIds.append('{:x}{}'.format(tsc, 'tls'))
+        else:
+          counters.append(Counter('1', END, '', tsc))
+  return '1', 'tls', counters
+
+def test_join_vs_reference():
+  """Compares transactions joined by walking links, against joins by recursion along chains"""
+  for seed in range(8):
+    threads = buildThreads(4, 64, seed)
+    loader = loadFragments(threads)
+    referenceLoader = loadFragments(threads)
+    txns = loader.fragments.join(loader.nextTxnId)
+    referenceTxns = referenceJoin(referenceLoader.fragments, referenceLoader.nextTxnId)
+    assert len(txns) == len(referenceTxns)
+    for txn, referenceTxn in zip(txns, referenceTxns):
+      assert txn.txnId == referenceTxn.txnId
+      assert list(txn.indices) == list(referenceTxn.indices)
+
+def test_merge_runs():
+  """Validates runs are merged in order of tsc, with ties ordered by the order of runs"""
+  runs = [
+    (numpy.array([0, 1, 2]), numpy.array([10, 20, 30])), (numpy.array([3, 4]), numpy.array([20, 25])),
+    (numpy.array([], dtype=int), numpy.array([], dtype=int)), (numpy.array([5, 6]), numpy.array([5, 30]))
+  ]
+  assert TxnFragments.mergeRuns(runs) == [5, 0, 1, 3, 4, 2, 6]
+  assert TxnFragments.mergeRuns([runs[0], (numpy.array([7, 8]), numpy.array([30, 40]))]) == [0, 1, 2, 7, 8]
+
+def test_fan_out_chains():
+  """Validates each branch of fragments fanning out to many resumes, is joined to a transaction"""
+  loader = loadFragments([buildChain(6, fanOut=2)])
+  txns = loader.fragments.join(0)
+  assert len(txns) == 2 ** 6 and [txn.txnId for txn in txns] == list(range(1, 2 ** 6 + 1))
+  for txn in txns:
+    tscs = [counter.tsc for counter in txn]
+    assert len(tscs) == 3 * 7 and tscs == sorted(tscs)
+  assert len({id(txn) for txn in txns}) == len(txns) and txns[0] is loader.fragments.rootFragments[0].txn
+
+def test_deep_chain_stress():
+  """Stress benchmark, joining a chain of fragments suspended and resumed 10k times"""
+  depth = 10000
+  loader = loadFragments([buildChain(depth)])
+  begin = time.time()
+  loader.endCollection()
+  elapsed = time.time() - begin
+  LOGGER.info('joined chain of %d fragments in %0.3f sec', depth + 1, elapsed)
+  txn, = loader.txns.values()
+  tscs = [counter.tsc for counter in txn]
+  assert tscs == list(range(1, 3 * (depth + 1) + 1))
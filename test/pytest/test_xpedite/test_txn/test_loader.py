@@ -0,0 +1,149 @@
+"""
+Tests to validate transactions built by loaders in worker processes and by
+vectorized batch loads, match a serial load with the reference state machine
+"""
+
+import random
+import logging.config
+from xpedite.types             import Counter
+from xpedite.types.probe       import Probe, TxnBeginProbe, TxnEndProbe, TxnSuspendProbe, TxnResumeProbe
+from xpedite.txn.loader        import BoundedTxnLoader
+from xpedite.util.workerPool   import WorkerPool
+from logger                    import LOG_CONFIG_PATH
+
+logging.config.fileConfig(LOG_CONFIG_PATH)
+
+BEGIN = TxnBeginProbe('Begin', 'Begin')
+END = TxnEndProbe('End', 'End')
+SUSPEND = TxnSuspendProbe('Suspend', 'Suspend')
+RESUME = TxnResumeProbe('Resume', 'Resume')
+WORK = Probe('Work', 'Work')
+PROBES = [BEGIN, END, SUSPEND, RESUME, WORK]
+
+def buildThreads(threadCount, txnCount, seed):
+  """Builds streams of counters for threads, with txns suspended and resumed across threads"""
+  rand = random.Random(seed)
+  tsc = 0
+  linkIds = []
+  threads = []
+  for threadId in range(threadCount):
+    tlsAddr = 'tls{}'.format(threadId)
+    counters = []
+
+    def addCounter(probe, data=''):
+      """Appends a counter with monotonic tsc to the current thread"""
+      counters.append(Counter(str(threadId), probe, data, tsc)) # pylint: disable=cell-var-from-loop
+
+    for _ in range(rand.randint(0, 2)):
+      tsc += 1
+      addCounter(WORK)
+    for _ in range(txnCount):
+      tsc += 1
+      if linkIds and rand.random() < 0.4:
+        addCounter(RESUME, rand.choice(linkIds))
+      elif rand.random() < 0.1:
+        addCounter(END)
+      else:
+        addCounter(BEGIN)
+      for _ in range(rand.randint(0, 3)):
+        tsc += 1
+        addCounter(WORK)
+      tsc += 1
+      if rand.random() < 0.3:
+        addCounter(SUSPEND)
+        linkIds.append('{:x}{}'.format(tsc, tlsAddr))
+      else:
+        addCounter(END)
+      for _ in range(rand.randint(0, 1)):
+        tsc += 1
+        addCounter(WORK)
+    threads.append((str(threadId), tlsAddr, counters))
+  return threads
+
+def loadThread(loader, thread):
+  """Loads counters of a thread"""
+  threadId, tlsAddr, counters = thread
+  loader.beginLoad(threadId, tlsAddr)
+  for counter in counters:
+    loader.loadCounter(counter)
+  loader.endLoad()
+  return loader
+
+def test_parallel_vs_serial_load():
+  """
+  Compares transactions and fragments built by loaders in worker processes, against a serial load
+  """
+  for seed in range(8):
+    for threads in (buildThreads(4, 64, seed), [buildChaoticThread(i, 256, seed * 8 + i) for i in range(3)]):
+      serialLoader = BoundedTxnLoader('serial', None, PROBES, None, None)
+      for thread in threads:
+        loadThread(serialLoader, thread)
+      serialLoader.endCollection()
+
+      loader = BoundedTxnLoader('parallel', None, PROBES, None, None)
+      pool = WorkerPool(3, sharedObjects=PROBES)
+      for threadLoader in pool.map(lambda thread: loadThread(loader.spawn(), thread), threads): # pylint: disable=cell-var-from-loop
+        loader.merge(threadLoader)
+        assert threadLoader.fragments.links is None
+      loader.endCollection()
+
+      assert list(loader.txns.keys()) == list(serialLoader.txns.keys())
+      assert list(loader.txns.values()) == list(serialLoader.txns.values())
+      assert loader.processedCounterCount == serialLoader.processedCounterCount
+      assert [txn.txnId for txn in loader.compromisedTxns] == [txn.txnId for txn in serialLoader.compromisedTxns]
+      assert loader.compromisedTxns == serialLoader.compromisedTxns
+      assert loader.nonTxnCounters == serialLoader.nonTxnCounters
+      assert loader.ephemeralCounters == serialLoader.ephemeralCounters
+      assert loader.nextFragmentId == serialLoader.nextFragmentId
+      assert loader.fragments.links is None and serialLoader.fragments.links is None
+
+def buildChaoticThread(threadId, counterCount, seed):
+  """Builds a stream of counters with random probes, to exercise nested, orphaned and compromised txns"""
+  rand = random.Random(seed)
+  tlsAddr = 'tls{}'.format(threadId)
+  linkIds = []
+  counters = []
+  for tsc in range(1, counterCount + 1):
+    probe = rand.choice([BEGIN, END, SUSPEND, RESUME, WORK, WORK, WORK])
+    data = ''
+    if probe is RESUME:
+      data = rand.choice(linkIds) if linkIds else 'orphan'
+    elif probe is SUSPEND:
+      linkIds.append('{:x}{}'.format(tsc, tlsAddr))
+    counters.append(Counter(str(threadId), probe, data, tsc))
+  return str(threadId), tlsAddr, counters
+
+def test_batch_vs_reference_load():
+  """
+  Compares transactions built by vectorized batch loads, against the reference state machine
+  """
+  for seed in range(16):
+    rand = random.Random(seed)
+    threads = [buildChaoticThread(threadId, 256, seed * 8 + threadId) for threadId in range(3)]
+    referenceLoader = BoundedTxnLoader('reference', None, PROBES, None, None)
+    batchLoader = BoundedTxnLoader('batch', None, PROBES, None, None)
+    for threadId, tlsAddr, counters in threads:
+      for loader in (referenceLoader, batchLoader):
+        loader.beginLoad(threadId, tlsAddr)
+        indices = [loader.store.append(counter) for counter in counters]
+        if loader is referenceLoader:
+          for index in indices:
+            loader.loadCounter(loader.store.view(index))
+        else:
+          while indices:
+            batchSize = rand.randint(1, 64)
+            loader.loadCounterBatch(indices[:batchSize])
+            indices = indices[batchSize:]
+      assert batchLoader.leadingEphemeralTarget == referenceLoader.leadingEphemeralTarget
+      referenceLoader.endLoad()
+      batchLoader.endLoad()
+    referenceLoader.endCollection()
+    batchLoader.endCollection()
+
+    assert list(batchLoader.txns.keys()) == list(referenceLoader.txns.keys())
+    assert list(batchLoader.txns.values()) == list(referenceLoader.txns.values())
+    assert batchLoader.compromisedTxns == referenceLoader.compromisedTxns
+    assert batchLoader.processedCounterCount == referenceLoader.processedCounterCount
+    assert batchLoader.nonTxnCounters == referenceLoader.nonTxnCounters
+    assert batchLoader.ephemeralCounters == referenceLoader.ephemeralCounters
+    assert batchLoader.nextFragmentId == referenceLoader.nextFragmentId